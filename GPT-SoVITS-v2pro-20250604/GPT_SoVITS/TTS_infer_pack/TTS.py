@@ -32,12 +32,18 @@ from transformers import AutoModelForMaskedLM, AutoTokenizer
 
 from tools.audio_sr import AP_BWE
 from tools.i18n.i18n import I18nAuto, scan_language_list
+from TTS_infer_pack.onnx_backend import MIN_STEPS, ONNXBackend, sample_token
+from TTS_infer_pack.prompt_cache import PROMPT_TEXT_FIELDS, REF_AUDIO_FIELDS, PromptFeatureCache, file_digest
 from TTS_infer_pack.text_segmentation_method import splits
 from TTS_infer_pack.TextPreprocessor import TextPreprocessor
 from sv import SV
 
 resample_transform_dict = {}
 
+# 分块流式合成: 每块前额外解码的上文 token 数, 以及与上一块交叉淡化 (SOLA) 的 token 数
+STREAM_CONTEXT_TOKENS = 12
+STREAM_OVERLAP_TOKENS = 2
+
 
 def resample(audio_tensor, sr0, sr1, device):
     global resample_transform_dict
@@ -326,6 +332,15 @@ class TTS_Config:
         self.vits_weights_path = self.configs.get("vits_weights_path", None)
         self.bert_base_path = self.configs.get("bert_base_path", None)
         self.cnhuhbert_base_path = self.configs.get("cnhuhbert_base_path", None)
+        # 多音色参考特征缓存: 最大音色数 (0 为关闭)、内存上限 (MB)、持久化目录 (空为不持久化)
+        self.prompt_cache_size = int(self.configs.get("prompt_cache_size", 64))
+        self.prompt_cache_max_mb = float(self.configs.get("prompt_cache_max_mb", 512))
+        self.prompt_cache_dir = self.configs.get("prompt_cache_dir", "") or ""
+        # 推理后端: "torch" 或 "onnx" (T2S 解码与 VITS 解码使用 onnx_export.py 导出的模型, 仅 CPU)
+        self.inference_backend = self.configs.get("inference_backend", "torch") or "torch"
+        assert self.inference_backend in ["torch", "onnx"], "Invalid inference_backend!"
+        self.onnx_model_dir = self.configs.get("onnx_model_dir", "") or ""
+        self.onnx_num_threads = int(self.configs.get("onnx_num_threads", 0))
         self.languages = self.v1_languages if self.version == "v1" else self.v2_languages
 
         self.use_vocoder: bool = False
@@ -384,6 +399,12 @@ class TTS_Config:
             "vits_weights_path": self.vits_weights_path,
             "bert_base_path": self.bert_base_path,
             "cnhuhbert_base_path": self.cnhuhbert_base_path,
+            "prompt_cache_size": self.prompt_cache_size,
+            "prompt_cache_max_mb": self.prompt_cache_max_mb,
+            "prompt_cache_dir": self.prompt_cache_dir,
+            "inference_backend": self.inference_backend,
+            "onnx_model_dir": self.onnx_model_dir,
+            "onnx_num_threads": self.onnx_num_threads,
         }
         return self.config
 
@@ -423,6 +444,7 @@ class TTS:
         self.cnhuhbert_model: CNHubert = None
         self.vocoder = None
         self.sr_model: AP_BWE = None
+        self.onnx_backend: ONNXBackend = None
         self.sv_model = None
         self.sr_model_not_exist: bool = False
 
@@ -435,6 +457,8 @@ class TTS:
         }
 
         self._init_models()
+        if self.configs.inference_backend == "onnx":
+            self.init_onnx_backend(self.configs.onnx_model_dir)
 
         self.text_preprocessor: TextPreprocessor = TextPreprocessor(
             self.bert_model, self.bert_tokenizer, self.configs.device
@@ -450,7 +474,13 @@ class TTS:
             "bert_features": None,
             "norm_text": None,
             "aux_ref_audio_paths": [],
+            "cache_key": None,
         }
+        self.prompt_features = PromptFeatureCache(
+            max_entries=self.configs.prompt_cache_size,
+            max_bytes=int(self.configs.prompt_cache_max_mb * 1024 * 1024),
+            cache_dir=self.configs.prompt_cache_dir or None,
+        )
 
         self.stop_flag: bool = False
         self.precision: torch.dtype = torch.float16 if self.configs.is_half else torch.float32
@@ -482,6 +512,8 @@ class TTS:
             self.bert_model = self.bert_model.half()
 
     def init_vits_weights(self, weights_path: str):
+        if not self._same_weights(weights_path, self.configs.vits_weights_path):
+            self.release_onnx_backend()
         self.configs.vits_weights_path = weights_path
         version, model_version, if_lora_v3 = get_sovits_version_from_path_fast(weights_path)
         if "Pro" in model_version:
@@ -584,6 +616,8 @@ class TTS:
 
     def init_t2s_weights(self, weights_path: str):
         print(f"Loading Text2Semantic weights from {weights_path}")
+        if not self._same_weights(weights_path, self.configs.t2s_weights_path):
+            self.release_onnx_backend()
         self.configs.t2s_weights_path = weights_path
         self.configs.save_configs()
         self.configs.hz = 50
@@ -659,6 +693,40 @@ class TTS:
         else:
             self.vocoder = self.vocoder.to(self.configs.device)
 
+    def init_onnx_backend(self, model_dir: str):
+        """
+        Load the ONNX Runtime sessions exported by onnx_export.py from model_dir.
+        The graphs must be exported from the currently loaded GPT / SoVITS weights.
+        """
+        self.onnx_backend = ONNXBackend(
+            model_dir, num_threads=self.configs.onnx_num_threads, eos=self.t2s_model.model.EOS
+        )
+        self.configs.onnx_model_dir = model_dir
+        self.configs.inference_backend = "onnx"
+
+    @staticmethod
+    def _same_weights(weights_path: str, current_path: str) -> bool:
+        return bool(weights_path) and bool(current_path) and os.path.abspath(weights_path) == os.path.abspath(current_path)
+
+    def release_onnx_backend(self):
+        """
+        Drop the ONNX Runtime sessions and fall back to the torch backend.
+        Called when GPT / SoVITS weights switch to a different file: the exported graphs belong to the
+        previous weights and would otherwise be mixed with features from the new torch models.
+        Reloading the current weights (error recovery in run / run_batched) keeps the ONNX backend.
+        Call init_onnx_backend again with graphs exported from the new weights to re-enable it.
+        """
+        if self.onnx_backend is None:
+            return
+        print(f"Warning: weights changed, ONNX models in {self.configs.onnx_model_dir} no longer match, falling back to torch backend")
+        self.onnx_backend = None
+        self.configs.inference_backend = "torch"
+        self.configs.onnx_model_dir = ""
+
+    @property
+    def use_onnx(self) -> bool:
+        return self.onnx_backend is not None and self.configs.inference_backend == "onnx"
+
     def init_sr_model(self):
         if self.sr_model is not None:
             return
@@ -687,6 +755,7 @@ class TTS:
 
         self.configs.is_half = enable
         self.precision = torch.float16 if enable else torch.float32
+        self.text_preprocessor.clear_feature_cache()
         if save:
             self.configs.save_configs()
         if enable:
@@ -719,6 +788,7 @@ class TTS:
             device: torch.device, the device to use for all models.
         """
         self.configs.device = device
+        self.text_preprocessor.clear_feature_cache()
         if save:
             self.configs.save_configs()
         if self.t2s_model is not None:
@@ -744,6 +814,7 @@ class TTS:
         self._set_prompt_semantic(ref_audio_path)
         self._set_ref_spec(ref_audio_path)
         self._set_ref_audio_path(ref_audio_path)
+        self.prompt_cache["cache_key"] = None
 
     def _set_ref_audio_path(self, ref_audio_path):
         self.prompt_cache["ref_audio_path"] = ref_audio_path
@@ -980,6 +1051,308 @@ class TTS:
         """
         self.stop_flag = True
 
+    def _prepare_reference(
+        self,
+        ref_audio_path: str,
+        aux_ref_audio_paths: list,
+        prompt_text: str,
+        prompt_lang: str,
+        no_prompt_text: bool,
+    ) -> str:
+        """
+        Load the reference audio, auxiliary reference audios and prompt text features into prompt_cache
+        (skipped when they are already cached).
+
+        Returns:
+            str: the normalized prompt text.
+        """
+        if not no_prompt_text:
+            prompt_text = prompt_text.strip("\n")
+            if prompt_text[-1] not in splits:
+                prompt_text += "。" if prompt_lang != "en" else "."
+            print(i18n("实际输入的参考文本:"), prompt_text)
+
+        if ref_audio_path is not None:
+            if not os.path.exists(ref_audio_path):
+                raise ValueError(f"{ref_audio_path} not exists")
+            cache_key = self._prompt_cache_key(ref_audio_path, None if no_prompt_text else prompt_text, prompt_lang)
+            if cache_key != self.prompt_cache["cache_key"]:
+                self._load_prompt_features(cache_key, ref_audio_path, None if no_prompt_text else prompt_text, prompt_lang)
+        elif not no_prompt_text and self.prompt_cache["prompt_text"] != prompt_text:
+            self._set_prompt_text_features(prompt_text, prompt_lang)
+            self.prompt_cache["cache_key"] = None
+
+        aux_ref_audio_paths = aux_ref_audio_paths if aux_ref_audio_paths is not None else []
+        paths = set(aux_ref_audio_paths) & set(self.prompt_cache["aux_ref_audio_paths"])
+        if not (len(list(paths)) == len(aux_ref_audio_paths) == len(self.prompt_cache["aux_ref_audio_paths"])):
+            self.prompt_cache["aux_ref_audio_paths"] = aux_ref_audio_paths
+            self.prompt_cache["refer_spec"] = [self.prompt_cache["refer_spec"][0]]
+            for path in aux_ref_audio_paths:
+                if path in [None, ""]:
+                    continue
+                if not os.path.exists(path):
+                    print(i18n("音频文件不存在，跳过："), path)
+                    continue
+                self.prompt_cache["refer_spec"].append(self._get_ref_spec(path))
+        return prompt_text
+
+    def _prompt_cache_key(self, ref_audio_path: str, prompt_text: str, prompt_lang: str) -> tuple:
+        """
+        Key of the multi-speaker prompt cache: reference audio content, prompt text / language
+        and everything that changes the extracted features (model version, weights, device, precision).
+        """
+        return (
+            file_digest(ref_audio_path),
+            prompt_text,
+            prompt_lang if prompt_text is not None else None,
+            self.configs.version,
+            self.configs.vits_weights_path,
+            self.configs.cnhuhbert_base_path,
+            self.configs.bert_base_path,
+            str(self.configs.device),
+            self.configs.is_half,
+        )
+
+    def _load_prompt_features(self, cache_key: tuple, ref_audio_path: str, prompt_text: str, prompt_lang: str):
+        """
+        Switch prompt_cache to the features of another voice, taking them from the
+        multi-speaker cache when possible and extracting (then caching) them otherwise.
+        prompt_text is None when the request has no prompt text.
+        """
+        entry = self.prompt_features.get(cache_key, self.configs.device)
+        if entry is None:
+            self.set_ref_audio(ref_audio_path)
+            if prompt_text is not None:
+                self._set_prompt_text_features(prompt_text, prompt_lang)
+            fields = REF_AUDIO_FIELDS + (PROMPT_TEXT_FIELDS if prompt_text is not None else ())
+            entry = {name: self.prompt_cache.get(name) for name in fields}
+            entry["refer_spec"] = self.prompt_cache["refer_spec"][:1]
+            self.prompt_features.put(cache_key, entry)
+        else:
+            self.prompt_cache.update(entry)
+            # 条目中只有主参考音频, 辅助参考音频需重新加载
+            self.prompt_cache["refer_spec"] = list(entry["refer_spec"])
+            self.prompt_cache["aux_ref_audio_paths"] = []
+            self._set_ref_audio_path(ref_audio_path)
+        self.prompt_cache["cache_key"] = cache_key
+
+    def _set_prompt_text_features(self, prompt_text: str, prompt_lang: str):
+        phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
+            prompt_text, prompt_lang, self.configs.version
+        )
+        self.prompt_cache["prompt_text"] = prompt_text
+        self.prompt_cache["prompt_lang"] = prompt_lang
+        self.prompt_cache["phones"] = phones
+        self.prompt_cache["bert_features"] = bert_features
+        self.prompt_cache["norm_text"] = norm_text
+
+    def snapshot_prompt_state(self) -> dict:
+        """
+        Copy of the active reference state (prompt_cache). Streaming callers that release the
+        inference lock between chunks take a snapshot after each chunk and restore it before the
+        next one, since other requests may switch the reference audio in the meantime.
+        """
+        state = dict(self.prompt_cache)
+        state["refer_spec"] = list(self.prompt_cache["refer_spec"])
+        state["aux_ref_audio_paths"] = list(self.prompt_cache["aux_ref_audio_paths"])
+        return state
+
+    def restore_prompt_state(self, state: dict):
+        """Make a snapshot taken by snapshot_prompt_state the active reference state again."""
+        self.prompt_cache.update(state)
+        self.prompt_cache["refer_spec"] = list(state["refer_spec"])
+        self.prompt_cache["aux_ref_audio_paths"] = list(state["aux_ref_audio_paths"])
+
+    def get_prompt_cache_stats(self) -> dict:
+        """Hit / miss / memory statistics of the multi-speaker prompt cache."""
+        stats = self.prompt_features.get_stats()
+        stats["active_ref_audio_path"] = self.prompt_cache["ref_audio_path"]
+        return stats
+
+    def _predict_semantic(
+        self,
+        item: dict,
+        no_prompt_text: bool,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+    ):
+        """
+        Predict semantic tokens for one batch produced by to_batch().
+
+        Returns:
+            Tuple[list, list]: pred_semantic_list and idx_list from the T2S model.
+        """
+        batch_phones_len: torch.LongTensor = item["phones_len"]
+        all_phoneme_ids: torch.LongTensor = item["all_phones"]
+        all_phoneme_lens: torch.LongTensor = item["all_phones_len"]
+        all_bert_features: torch.LongTensor = item["all_bert_features"]
+        norm_text: str = item["norm_text"]
+        max_len = item["max_len"]
+
+        print(i18n("前端处理后的文本(每句):"), norm_text)
+        if no_prompt_text:
+            prompt = None
+        else:
+            prompt = (
+                self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
+            )
+
+        print(f"############ {i18n('预测语义Token')} ############")
+        if self.use_onnx and prompt is not None:
+            return self.onnx_backend.infer_batch(
+                all_phoneme_ids,
+                all_phoneme_lens,
+                prompt.cpu(),
+                all_bert_features,
+                top_k=top_k,
+                top_p=top_p,
+                temperature=temperature,
+                repetition_penalty=repetition_penalty,
+                early_stop_num=self.configs.hz * self.configs.max_sec,
+            )
+        pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
+            all_phoneme_ids,
+            all_phoneme_lens,
+            prompt,
+            all_bert_features,
+            # prompt_phone_len=ph_offset,
+            top_k=top_k,
+            top_p=top_p,
+            temperature=temperature,
+            early_stop_num=self.configs.hz * self.configs.max_sec,
+            max_len=max_len,
+            repetition_penalty=repetition_penalty,
+        )
+        return pred_semantic_list, idx_list
+
+    def _synthesize_fragments(
+        self,
+        batch_phones: List[torch.LongTensor],
+        pred_semantic_list: list,
+        idx_list: list,
+        speed_factor: float = 1.0,
+        sample_steps: int = 32,
+        parallel_infer: bool = True,
+    ) -> List[torch.Tensor]:
+        """
+        Decode the predicted semantic tokens of one batch into audio fragments (one per text segment).
+        """
+        refer_audio_spec = []
+        if self.is_v2pro:
+            sv_emb = []
+        for spec, audio_tensor in self.prompt_cache["refer_spec"]:
+            spec = spec.to(dtype=self.precision, device=self.configs.device)
+            refer_audio_spec.append(spec)
+            if self.is_v2pro:
+                sv_emb.append(self.sv_model.compute_embedding3(audio_tensor))
+
+        batch_audio_fragment = []
+
+        # ## vits并行推理 method 1
+        # pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
+        # pred_semantic_len = torch.LongTensor([item.shape[0] for item in pred_semantic_list]).to(self.configs.device)
+        # pred_semantic = self.batch_sequences(pred_semantic_list, axis=0, pad_value=0).unsqueeze(0)
+        # max_len = 0
+        # for i in range(0, len(batch_phones)):
+        #     max_len = max(max_len, batch_phones[i].shape[-1])
+        # batch_phones = self.batch_sequences(batch_phones, axis=0, pad_value=0, max_length=max_len)
+        # batch_phones = batch_phones.to(self.configs.device)
+        # batch_audio_fragment = (self.vits_model.batched_decode(
+        #         pred_semantic, pred_semantic_len, batch_phones, batch_phones_len,refer_audio_spec
+        #     ))
+        print(f"############ {i18n('合成音频')} ############")
+        if self._use_onnx_vits(speed_factor):
+            ref_audio = self._onnx_ref_audio()
+            for i, idx in enumerate(idx_list):
+                _pred_semantic = pred_semantic_list[i][-idx:] if idx > 0 else pred_semantic_list[i][:0]
+                batch_audio_fragment.append(self.onnx_backend.decode(_pred_semantic, batch_phones[i], ref_audio))
+        elif not self.configs.use_vocoder:
+            if speed_factor == 1.0:
+                print(f"{i18n('并行合成中')}...")
+                # ## vits并行推理 method 2
+                pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
+                upsample_rate = math.prod(self.vits_model.upsample_rates)
+                audio_frag_idx = [
+                    pred_semantic_list[i].shape[0] * 2 * upsample_rate
+                    for i in range(0, len(pred_semantic_list))
+                ]
+                audio_frag_end_idx = [sum(audio_frag_idx[: i + 1]) for i in range(0, len(audio_frag_idx))]
+                all_pred_semantic = (
+                    torch.cat(pred_semantic_list).unsqueeze(0).unsqueeze(0).to(self.configs.device)
+                )
+                _batch_phones = torch.cat(batch_phones).unsqueeze(0).to(self.configs.device)
+                if self.is_v2pro != True:
+                    _batch_audio_fragment = self.vits_model.decode(
+                        all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor
+                    ).detach()[0, 0, :]
+                else:
+                    _batch_audio_fragment = self.vits_model.decode(
+                        all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
+                    ).detach()[0, 0, :]
+                audio_frag_end_idx.insert(0, 0)
+                batch_audio_fragment = [
+                    _batch_audio_fragment[audio_frag_end_idx[i - 1] : audio_frag_end_idx[i]]
+                    for i in range(1, len(audio_frag_end_idx))
+                ]
+            else:
+                # ## vits串行推理
+                for i, idx in enumerate(tqdm(idx_list)):
+                    phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
+                    _pred_semantic = (
+                        pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
+                    )  # .unsqueeze(0)#mq要多unsqueeze一次
+                    if self.is_v2pro != True:
+                        audio_fragment = self.vits_model.decode(
+                            _pred_semantic, phones, refer_audio_spec, speed=speed_factor
+                        ).detach()[0, 0, :]
+                    else:
+                        audio_fragment = self.vits_model.decode(
+                            _pred_semantic, phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
+                        ).detach()[0, 0, :]
+                    batch_audio_fragment.append(audio_fragment)  ###试试重建不带上prompt部分
+        else:
+            if parallel_infer:
+                print(f"{i18n('并行合成中')}...")
+                audio_fragments = self.using_vocoder_synthesis_batched_infer(
+                    idx_list, pred_semantic_list, batch_phones, speed=speed_factor, sample_steps=sample_steps
+                )
+                batch_audio_fragment.extend(audio_fragments)
+            else:
+                for i, idx in enumerate(tqdm(idx_list)):
+                    phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
+                    _pred_semantic = (
+                        pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
+                    )  # .unsqueeze(0)#mq要多unsqueeze一次
+                    audio_fragment = self.using_vocoder_synthesis(
+                        _pred_semantic, phones, speed=speed_factor, sample_steps=sample_steps
+                    )
+                    batch_audio_fragment.append(audio_fragment)
+        return batch_audio_fragment
+
+    def _use_onnx_vits(self, speed_factor: float) -> bool:
+        # 导出的 VITS 模型只支持 v1/v2、单参考音频且不支持语速调整, 其余情况仍用 PyTorch 解码
+        return (
+            self.use_onnx
+            and self.onnx_backend.has_vits
+            and self.configs.version in ["v1", "v2"]
+            and len(self.prompt_cache["refer_spec"]) == 1
+            and speed_factor == 1.0
+        )
+
+    def _onnx_ref_audio(self) -> torch.Tensor:
+        """Mono reference audio at the model sampling rate (input of the exported VITS model)."""
+        audio = self.prompt_cache["raw_audio"]
+        if audio.shape[0] == 2:
+            audio = audio.mean(0).unsqueeze(0)
+        if self.prompt_cache["raw_sr"] != self.configs.sampling_rate:
+            audio = resample(audio, self.prompt_cache["raw_sr"], self.configs.sampling_rate, audio.device)
+        maxx = audio.abs().max()
+        if maxx > 1:
+            audio = audio / min(2, maxx)
+        return audio.float().cpu()
+
     @torch.no_grad()
     def run(self, inputs: dict):
         """
@@ -1002,6 +1375,7 @@ class TTS:
                     "batch_threshold": 0.75,      # float. threshold for batch splitting.
                     "split_bucket: True,          # bool. whether to split the batch into multiple buckets.
                     "return_fragment": False,     # bool. step by step return the audio fragment.
+                    "stream_chunk_size": 0,       # int. with return_fragment, vocode every N semantic tokens (0: every text segment).
                     "speed_factor":1.0,           # float. control the speed of the synthesized audio.
                     "fragment_interval":0.3,      # float. to control the interval of the audio fragment.
                     "seed": -1,                   # int. random seed for reproducibility.
@@ -1030,6 +1404,7 @@ class TTS:
         speed_factor = inputs.get("speed_factor", 1.0)
         split_bucket = inputs.get("split_bucket", True)
         return_fragment = inputs.get("return_fragment", False)
+        stream_chunk_size = int(inputs.get("stream_chunk_size", 0) or 0)
         fragment_interval = inputs.get("fragment_interval", 0.3)
         seed = inputs.get("seed", -1)
         seed = -1 if seed in ["", None] else seed
@@ -1078,6 +1453,11 @@ class TTS:
         if no_prompt_text and self.configs.use_vocoder:
             raise NO_PROMPT_ERROR("prompt_text cannot be empty when using SoVITS_V3")
 
+        chunk_streaming = return_fragment and stream_chunk_size > 0
+        if chunk_streaming and (no_prompt_text or self.configs.use_vocoder or speed_factor != 1.0):
+            print(i18n("分块流式合成需要参考文本, 且不支持 V3/V4 模型与语速调节, 已改为按分段返回"))
+            chunk_streaming = False
+
         if ref_audio_path in [None, ""] and (
             (self.prompt_cache["prompt_semantic"] is None) or (self.prompt_cache["refer_spec"] in [None, []])
         ):
@@ -1087,41 +1467,9 @@ class TTS:
 
         ###### setting reference audio and prompt text preprocessing ########
         t0 = time.perf_counter()
-        if (ref_audio_path is not None) and (
-            ref_audio_path != self.prompt_cache["ref_audio_path"]
-            or (self.is_v2pro and self.prompt_cache["refer_spec"][0][1] is None)
-        ):
-            if not os.path.exists(ref_audio_path):
-                raise ValueError(f"{ref_audio_path} not exists")
-            self.set_ref_audio(ref_audio_path)
-
-        aux_ref_audio_paths = aux_ref_audio_paths if aux_ref_audio_paths is not None else []
-        paths = set(aux_ref_audio_paths) & set(self.prompt_cache["aux_ref_audio_paths"])
-        if not (len(list(paths)) == len(aux_ref_audio_paths) == len(self.prompt_cache["aux_ref_audio_paths"])):
-            self.prompt_cache["aux_ref_audio_paths"] = aux_ref_audio_paths
-            self.prompt_cache["refer_spec"] = [self.prompt_cache["refer_spec"][0]]
-            for path in aux_ref_audio_paths:
-                if path in [None, ""]:
-                    continue
-                if not os.path.exists(path):
-                    print(i18n("音频文件不存在，跳过："), path)
-                    continue
-                self.prompt_cache["refer_spec"].append(self._get_ref_spec(path))
-
-        if not no_prompt_text:
-            prompt_text = prompt_text.strip("\n")
-            if prompt_text[-1] not in splits:
-                prompt_text += "。" if prompt_lang != "en" else "."
-            print(i18n("实际输入的参考文本:"), prompt_text)
-            if self.prompt_cache["prompt_text"] != prompt_text:
-                phones, bert_features, norm_text = self.text_preprocessor.segment_and_extract_feature_for_text(
-                    prompt_text, prompt_lang, self.configs.version
-                )
-                self.prompt_cache["prompt_text"] = prompt_text
-                self.prompt_cache["prompt_lang"] = prompt_lang
-                self.prompt_cache["phones"] = phones
-                self.prompt_cache["bert_features"] = bert_features
-                self.prompt_cache["norm_text"] = norm_text
+        prompt_text = self._prepare_reference(
+            ref_audio_path, aux_ref_audio_paths, prompt_text, prompt_lang, no_prompt_text
+        )
 
         ###### text preprocessing ########
         t1 = time.perf_counter()
@@ -1187,6 +1535,23 @@ class TTS:
             t_45 = 0.0
             audio = []
             output_sr = self.configs.sampling_rate if not self.configs.use_vocoder else self.vocoder_configs["sr"]
+            if chunk_streaming:
+                zero_wav = np.zeros(int(output_sr * fragment_interval), dtype=np.int16)
+                for batch_texts in data:
+                    item = make_batch(batch_texts)
+                    if item is None:
+                        continue
+                    for i in range(len(item["phones"])):
+                        for chunk in self._stream_segment(
+                            item, i, stream_chunk_size, top_k, top_p, temperature, repetition_penalty
+                        ):
+                            yield output_sr, chunk
+                            if self.stop_flag:
+                                yield 16000, np.zeros(int(16000), dtype=np.int16)
+                                return
+                        yield output_sr, zero_wav
+                return
+
             for item in data:
                 t3 = time.perf_counter()
                 if return_fragment:
@@ -1195,124 +1560,15 @@ class TTS:
                         continue
 
                 batch_phones: List[torch.LongTensor] = item["phones"]
-                # batch_phones:torch.LongTensor = item["phones"]
-                batch_phones_len: torch.LongTensor = item["phones_len"]
-                all_phoneme_ids: torch.LongTensor = item["all_phones"]
-                all_phoneme_lens: torch.LongTensor = item["all_phones_len"]
-                all_bert_features: torch.LongTensor = item["all_bert_features"]
-                norm_text: str = item["norm_text"]
-                max_len = item["max_len"]
-
-                print(i18n("前端处理后的文本(每句):"), norm_text)
-                if no_prompt_text:
-                    prompt = None
-                else:
-                    prompt = (
-                        self.prompt_cache["prompt_semantic"].expand(len(all_phoneme_ids), -1).to(self.configs.device)
-                    )
-
-                print(f"############ {i18n('预测语义Token')} ############")
-                pred_semantic_list, idx_list = self.t2s_model.model.infer_panel(
-                    all_phoneme_ids,
-                    all_phoneme_lens,
-                    prompt,
-                    all_bert_features,
-                    # prompt_phone_len=ph_offset,
-                    top_k=top_k,
-                    top_p=top_p,
-                    temperature=temperature,
-                    early_stop_num=self.configs.hz * self.configs.max_sec,
-                    max_len=max_len,
-                    repetition_penalty=repetition_penalty,
+                pred_semantic_list, idx_list = self._predict_semantic(
+                    item, no_prompt_text, top_k, top_p, temperature, repetition_penalty
                 )
                 t4 = time.perf_counter()
                 t_34 += t4 - t3
 
-                refer_audio_spec = []
-                if self.is_v2pro:
-                    sv_emb = []
-                for spec, audio_tensor in self.prompt_cache["refer_spec"]:
-                    spec = spec.to(dtype=self.precision, device=self.configs.device)
-                    refer_audio_spec.append(spec)
-                    if self.is_v2pro:
-                        sv_emb.append(self.sv_model.compute_embedding3(audio_tensor))
-
-                batch_audio_fragment = []
-
-                # ## vits并行推理 method 1
-                # pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
-                # pred_semantic_len = torch.LongTensor([item.shape[0] for item in pred_semantic_list]).to(self.configs.device)
-                # pred_semantic = self.batch_sequences(pred_semantic_list, axis=0, pad_value=0).unsqueeze(0)
-                # max_len = 0
-                # for i in range(0, len(batch_phones)):
-                #     max_len = max(max_len, batch_phones[i].shape[-1])
-                # batch_phones = self.batch_sequences(batch_phones, axis=0, pad_value=0, max_length=max_len)
-                # batch_phones = batch_phones.to(self.configs.device)
-                # batch_audio_fragment = (self.vits_model.batched_decode(
-                #         pred_semantic, pred_semantic_len, batch_phones, batch_phones_len,refer_audio_spec
-                #     ))
-                print(f"############ {i18n('合成音频')} ############")
-                if not self.configs.use_vocoder:
-                    if speed_factor == 1.0:
-                        print(f"{i18n('并行合成中')}...")
-                        # ## vits并行推理 method 2
-                        pred_semantic_list = [item[-idx:] for item, idx in zip(pred_semantic_list, idx_list)]
-                        upsample_rate = math.prod(self.vits_model.upsample_rates)
-                        audio_frag_idx = [
-                            pred_semantic_list[i].shape[0] * 2 * upsample_rate
-                            for i in range(0, len(pred_semantic_list))
-                        ]
-                        audio_frag_end_idx = [sum(audio_frag_idx[: i + 1]) for i in range(0, len(audio_frag_idx))]
-                        all_pred_semantic = (
-                            torch.cat(pred_semantic_list).unsqueeze(0).unsqueeze(0).to(self.configs.device)
-                        )
-                        _batch_phones = torch.cat(batch_phones).unsqueeze(0).to(self.configs.device)
-                        if self.is_v2pro != True:
-                            _batch_audio_fragment = self.vits_model.decode(
-                                all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor
-                            ).detach()[0, 0, :]
-                        else:
-                            _batch_audio_fragment = self.vits_model.decode(
-                                all_pred_semantic, _batch_phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
-                            ).detach()[0, 0, :]
-                        audio_frag_end_idx.insert(0, 0)
-                        batch_audio_fragment = [
-                            _batch_audio_fragment[audio_frag_end_idx[i - 1] : audio_frag_end_idx[i]]
-                            for i in range(1, len(audio_frag_end_idx))
-                        ]
-                    else:
-                        # ## vits串行推理
-                        for i, idx in enumerate(tqdm(idx_list)):
-                            phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
-                            _pred_semantic = (
-                                pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
-                            )  # .unsqueeze(0)#mq要多unsqueeze一次
-                            if self.is_v2pro != True:
-                                audio_fragment = self.vits_model.decode(
-                                    _pred_semantic, phones, refer_audio_spec, speed=speed_factor
-                                ).detach()[0, 0, :]
-                            else:
-                                audio_fragment = self.vits_model.decode(
-                                    _pred_semantic, phones, refer_audio_spec, speed=speed_factor, sv_emb=sv_emb
-                                ).detach()[0, 0, :]
-                            batch_audio_fragment.append(audio_fragment)  ###试试重建不带上prompt部分
-                else:
-                    if parallel_infer:
-                        print(f"{i18n('并行合成中')}...")
-                        audio_fragments = self.using_vocoder_synthesis_batched_infer(
-                            idx_list, pred_semantic_list, batch_phones, speed=speed_factor, sample_steps=sample_steps
-                        )
-                        batch_audio_fragment.extend(audio_fragments)
-                    else:
-                        for i, idx in enumerate(tqdm(idx_list)):
-                            phones = batch_phones[i].unsqueeze(0).to(self.configs.device)
-                            _pred_semantic = (
-                                pred_semantic_list[i][-idx:].unsqueeze(0).unsqueeze(0)
-                            )  # .unsqueeze(0)#mq要多unsqueeze一次
-                            audio_fragment = self.using_vocoder_synthesis(
-                                _pred_semantic, phones, speed=speed_factor, sample_steps=sample_steps
-                            )
-                            batch_audio_fragment.append(audio_fragment)
+                batch_audio_fragment = self._synthesize_fragments(
+                    batch_phones, pred_semantic_list, idx_list, speed_factor, sample_steps, parallel_infer
+                )
 
                 t5 = time.perf_counter()
                 t_45 += t5 - t4
@@ -1364,6 +1620,317 @@ class TTS:
         finally:
             self.empty_cache()
 
+    def _iter_semantic(
+        self,
+        all_phones: torch.LongTensor,
+        all_bert_features: torch.Tensor,
+        prompt: torch.LongTensor,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+    ):
+        """
+        Decode the semantic tokens of one sequence with the PyTorch T2S model and yield each token
+        as soon as it is sampled (EOS is not yielded). Same decoding loop as export_torch_script.T2SModel.
+        """
+        model = self.t2s_model.model
+        device = self.configs.device
+        early_stop_num = self.configs.hz * self.configs.max_sec
+
+        x = model.ar_text_embedding(all_phones.unsqueeze(0).to(device))
+        bert = all_bert_features.unsqueeze(0).to(dtype=model.bert_proj.weight.dtype, device=device)
+        x = model.ar_text_position(x + model.bert_proj(bert.transpose(1, 2)))
+
+        y = prompt.unsqueeze(0).to(device)
+        y_emb = model.ar_audio_embedding(y)
+        x_len = x.shape[1]
+        y_len = y.shape[1]
+        xy_pos = torch.concat([x, model.ar_audio_position(y_emb)], dim=1)
+
+        src_len = x_len + y_len
+        x_attn_mask = F.pad(torch.zeros((x_len, x_len), dtype=torch.bool), (0, y_len), value=True)
+        y_attn_mask = F.pad(
+            torch.triu(torch.ones(y_len, y_len, dtype=torch.bool), diagonal=1), (x_len, 0), value=False
+        )
+        xy_attn_mask = (
+            torch.concat([x_attn_mask, y_attn_mask], dim=0)
+            .unsqueeze(0)
+            .expand(model.num_head, -1, -1)
+            .view(1, model.num_head, src_len, src_len)
+            .to(device=device, dtype=torch.bool)
+        )
+
+        xy_dec, k_cache, v_cache = model.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+        previous_tokens = prompt.cpu().numpy()
+        tokens = []
+        for idx in range(1500):
+            if idx > 0:
+                xy_dec, k_cache, v_cache = model.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+            logits = model.ar_predict_layer(xy_dec[:, -1])[0].float().cpu().numpy()
+            if idx < MIN_STEPS:
+                logits[model.EOS] = -np.inf
+            token = sample_token(
+                logits,
+                np.concatenate([previous_tokens, np.asarray(tokens, dtype=np.int64)]),
+                top_k,
+                top_p,
+                temperature,
+                repetition_penalty,
+            )
+            if token == model.EOS or int(np.argmax(logits)) == model.EOS:
+                break
+            tokens.append(token)
+            yield token
+            if len(tokens) > early_stop_num:
+                break
+
+            y_emb = model.ar_audio_embedding(torch.LongTensor([[token]]).to(device))
+            position = model.ar_audio_position
+            xy_pos = y_emb * position.x_scale + position.alpha * position.pe[:, y_len + idx].to(
+                dtype=y_emb.dtype, device=y_emb.device
+            )
+
+    def _vits_refer(self):
+        """Reference inputs of _decode_semantic, computed once per segment."""
+        if self._use_onnx_vits(1.0):
+            return self._onnx_ref_audio()
+        refer_audio_spec = []
+        sv_emb = [] if self.is_v2pro else None
+        for spec, audio_tensor in self.prompt_cache["refer_spec"]:
+            refer_audio_spec.append(spec.to(dtype=self.precision, device=self.configs.device))
+            if self.is_v2pro:
+                sv_emb.append(self.sv_model.compute_embedding3(audio_tensor))
+        return refer_audio_spec, sv_emb
+
+    def _decode_semantic(self, pred_semantic: torch.LongTensor, phones: torch.LongTensor, refer) -> torch.Tensor:
+        """VITS decoding of one token window."""
+        if self._use_onnx_vits(1.0):
+            return self.onnx_backend.decode(pred_semantic, phones, refer)
+        refer_audio_spec, sv_emb = refer
+        kwargs = {"sv_emb": sv_emb} if self.is_v2pro else {}
+        return self.vits_model.decode(
+            pred_semantic.view(1, 1, -1).to(self.configs.device),
+            phones.unsqueeze(0).to(self.configs.device),
+            refer_audio_spec,
+            speed=1.0,
+            **kwargs,
+        ).detach()[0, 0, :]
+
+    def _stream_segment(
+        self,
+        item: dict,
+        index: int,
+        chunk_size: int,
+        top_k: int,
+        top_p: float,
+        temperature: float,
+        repetition_penalty: float,
+    ):
+        """
+        Token-chunked synthesis of one text segment of a to_batch() item.
+
+        Every `chunk_size` new semantic tokens (half of it for the first chunk) are vocoded together
+        with STREAM_CONTEXT_TOKENS of left context; consecutive chunks overlap by
+        STREAM_OVERLAP_TOKENS and are joined with sola_algorithm. Yields int16 PCM chunks.
+        """
+        length = int(item["all_phones_len"][index])
+        all_phones = item["all_phones"][index][:length]
+        all_bert_features = item["all_bert_features"][index][:, :length]
+        phones = item["phones"][index]
+        prompt = self.prompt_cache["prompt_semantic"]
+        sampling = (top_k, top_p, temperature, repetition_penalty)
+
+        if self.use_onnx:
+            token_iter = self.onnx_backend.iter_semantic(
+                all_phones,
+                all_bert_features,
+                prompt.cpu(),
+                *sampling,
+                early_stop_num=self.configs.hz * self.configs.max_sec,
+            )
+        else:
+            token_iter = self._iter_semantic(all_phones, all_bert_features, prompt, *sampling)
+
+        refer = self._vits_refer()
+        samples_per_token = 2 * math.prod(self.vits_model.upsample_rates)
+        overlap_len = STREAM_OVERLAP_TOKENS * samples_per_token
+        first_chunk = max(STREAM_OVERLAP_TOKENS + 1, chunk_size // 2)
+
+        tokens: List[int] = []
+        emitted = 0
+        held: torch.Tensor = None
+
+        def to_pcm(audio: torch.Tensor) -> np.ndarray:
+            return (audio.clamp(-1, 1).cpu().numpy() * 32767).astype(np.int16)
+
+        def vocode(final: bool) -> np.ndarray:
+            nonlocal emitted, held
+            # 新块从上一块保留的尾部 (重叠部分) 开始, 另加左侧上文 token 只用于解码
+            start = emitted - (STREAM_OVERLAP_TOKENS if held is not None else 0)
+            context_start = max(0, start - STREAM_CONTEXT_TOKENS)
+            audio = self._decode_semantic(torch.LongTensor(tokens[context_start:]), phones, refer)
+            audio = audio[(start - context_start) * samples_per_token :].float()
+            if held is not None:
+                audio = self.sola_algorithm([held, audio], overlap_len)
+            emitted = len(tokens)
+            if final or audio.shape[0] <= overlap_len:
+                held = None
+                return to_pcm(audio)
+            held = audio[-overlap_len:].clone()
+            return to_pcm(audio[:-overlap_len])
+
+        for token in token_iter:
+            tokens.append(token)
+            if len(tokens) - emitted >= (first_chunk if emitted == 0 else chunk_size):
+                yield vocode(final=False)
+        if len(tokens) > emitted:
+            yield vocode(final=True)
+        elif held is not None:
+            yield to_pcm(held)
+
+    @torch.no_grad()
+    def run_batched(self, requests: List[dict], max_batch_size: int = None) -> List[Tuple[int, np.ndarray]]:
+        """
+        Non-streaming inference for several requests in merged batches.
+
+        All requests must share the reference audio, prompt text and sampling parameters
+        (see batch_scheduler.batch_key). Text segments of every request are merged into one to_batch()
+        pass, so segments from different requests are decoded by the same infer_panel call;
+        the fragments are then routed back and post-processed per request.
+
+        Args:
+            requests (List[dict]): inputs as accepted by run(), without streaming / return_fragment.
+            max_batch_size (int): upper bound of segments per batch. The merged batch size is the
+                sum of the requests' batch_size, capped by this value.
+
+        returns:
+            List[Tuple[int, np.ndarray]]: sampling rate and audio data for each request, in request order.
+        """
+        ########## variables initialization ###########
+        self.stop_flag = False
+        inputs = requests[0]
+        ref_audio_path: str = inputs.get("ref_audio_path", "")
+        aux_ref_audio_paths: list = inputs.get("aux_ref_audio_paths", [])
+        prompt_text: str = inputs.get("prompt_text", "")
+        prompt_lang: str = inputs.get("prompt_lang", "")
+        top_k: int = inputs.get("top_k", 5)
+        top_p: float = inputs.get("top_p", 1)
+        temperature: float = inputs.get("temperature", 1)
+        batch_threshold = inputs.get("batch_threshold", 0.75)
+        speed_factor = inputs.get("speed_factor", 1.0)
+        split_bucket = inputs.get("split_bucket", True)
+        seed = inputs.get("seed", -1)
+        seed = -1 if seed in ["", None] else seed
+        set_seed(seed)
+        parallel_infer = inputs.get("parallel_infer", True)
+        repetition_penalty = inputs.get("repetition_penalty", 1.35)
+        sample_steps = inputs.get("sample_steps", 32)
+        super_sampling = inputs.get("super_sampling", False)
+
+        batch_size = sum(int(req.get("batch_size", 1)) for req in requests)
+        if max_batch_size is not None:
+            batch_size = max(1, min(batch_size, max_batch_size))
+
+        if parallel_infer:
+            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_batch_infer
+        else:
+            self.t2s_model.model.infer_panel = self.t2s_model.model.infer_panel_naive_batched
+
+        if speed_factor != 1.0 or (self.configs.use_vocoder and parallel_infer):
+            split_bucket = False
+
+        no_prompt_text = prompt_text in [None, ""]
+        if not no_prompt_text:
+            assert prompt_lang in self.configs.languages
+        if no_prompt_text and self.configs.use_vocoder:
+            raise NO_PROMPT_ERROR("prompt_text cannot be empty when using SoVITS_V3")
+        if ref_audio_path in [None, ""] and (
+            (self.prompt_cache["prompt_semantic"] is None) or (self.prompt_cache["refer_spec"] in [None, []])
+        ):
+            raise ValueError(
+                "ref_audio_path cannot be empty, when the reference audio is not set using set_ref_audio()"
+            )
+
+        t0 = time.perf_counter()
+        self._prepare_reference(ref_audio_path, aux_ref_audio_paths, prompt_text, prompt_lang, no_prompt_text)
+
+        ###### text preprocessing: merge the segments of every request ########
+        t1 = time.perf_counter()
+        segments: list = []
+        owners: List[int] = []
+        for idx, req in enumerate(requests):
+            text_lang = req.get("text_lang", "")
+            assert text_lang in self.configs.languages
+            data = self.text_preprocessor.preprocess(
+                req.get("text", ""), text_lang, req.get("text_split_method", "cut0"), self.configs.version
+            )
+            segments.extend(data)
+            owners.extend([idx] * len(data))
+
+        results = [(16000, np.zeros(int(16000), dtype=np.int16)) for _ in requests]
+        if len(segments) == 0:
+            return results
+
+        data, batch_index_list = self.to_batch(
+            segments,
+            prompt_data=self.prompt_cache if not no_prompt_text else None,
+            batch_size=batch_size,
+            threshold=batch_threshold,
+            split_bucket=split_bucket,
+            device=self.configs.device,
+            precision=self.precision,
+        )
+
+        t2 = time.perf_counter()
+        try:
+            print(f"############ 合并推理: {len(requests)} 个请求, {len(segments)} 个分段, {len(data)} 个批次 ############")
+            audio = []
+            output_sr = self.configs.sampling_rate if not self.configs.use_vocoder else self.vocoder_configs["sr"]
+            for item in data:
+                pred_semantic_list, idx_list = self._predict_semantic(
+                    item, no_prompt_text, top_k, top_p, temperature, repetition_penalty
+                )
+                audio.append(
+                    self._synthesize_fragments(
+                        item["phones"], pred_semantic_list, idx_list, speed_factor, sample_steps, parallel_infer
+                    )
+                )
+
+            ###### route fragments back to their requests ########
+            fragments = self.recovery_order(audio, batch_index_list)
+            request_fragments: List[list] = [[] for _ in requests]
+            for owner, fragment in zip(owners, fragments):
+                request_fragments[owner].append(fragment)
+
+            for idx, req in enumerate(requests):
+                if len(request_fragments[idx]) == 0:
+                    continue
+                results[idx] = self.audio_postprocess(
+                    [request_fragments[idx]],
+                    output_sr,
+                    None,
+                    speed_factor,
+                    False,
+                    max(req.get("fragment_interval", 0.3), 0.01),
+                    super_sampling if self.configs.use_vocoder and self.configs.version == "v3" else False,
+                )
+            print("%.3f\t%.3f\t%.3f" % (t1 - t0, t2 - t1, time.perf_counter() - t2))
+            return results
+
+        except Exception as e:
+            traceback.print_exc()
+            # 重置模型, 否则会导致显存释放不完全。
+            del self.t2s_model
+            del self.vits_model
+            self.t2s_model = None
+            self.vits_model = None
+            self.init_t2s_weights(self.configs.t2s_weights_path)
+            self.init_vits_weights(self.configs.vits_weights_path)
+            raise e
+        finally:
+            self.empty_cache()
+
     def empty_cache(self):
         try:
             gc.collect()  # 触发gc的垃圾回收。避免内存一直增长。
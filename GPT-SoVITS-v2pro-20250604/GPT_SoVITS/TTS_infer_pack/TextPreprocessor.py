@@ -2,8 +2,6 @@ import os
 import sys
 import threading
 
-from tqdm import tqdm
-
 now_dir = os.getcwd()
 sys.path.append(now_dir)
 
@@ -11,10 +9,11 @@ import re
 import torch
 from text.LangSegmenter import LangSegmenter
 from text import chinese
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
 from text.cleaner import clean_text
 from text import cleaned_text_to_sequence
 from transformers import AutoModelForMaskedLM, AutoTokenizer
+from TTS_infer_pack.prompt_cache import PromptFeatureCache
 from TTS_infer_pack.text_segmentation_method import split_big_text, splits, get_method as get_seg_method
 
 from tools.i18n.i18n import I18nAuto, scan_language_list
@@ -23,6 +22,8 @@ language = os.environ.get("language", "Auto")
 language = sys.argv[-1] if sys.argv[-1] in scan_language_list() else language
 i18n = I18nAuto(language=language)
 punctuation = set(["!", "?", "…", ",", ".", "-"])
+# 一次 BERT 前向计算的最大句段数
+BERT_BATCH_SIZE = 16
 
 
 def get_first(text: str) -> str:
@@ -50,11 +51,23 @@ def merge_short_text_in_array(texts: str, threshold: int) -> list:
 
 
 class TextPreprocessor:
-    def __init__(self, bert_model: AutoModelForMaskedLM, tokenizer: AutoTokenizer, device: torch.device):
+    def __init__(
+        self,
+        bert_model: AutoModelForMaskedLM,
+        tokenizer: AutoTokenizer,
+        device: torch.device,
+        feature_cache_size: int = 1024,
+        feature_cache_max_mb: float = 256,
+    ):
         self.bert_model = bert_model
         self.tokenizer = tokenizer
         self.device = device
         self.bert_lock = threading.RLock()
+        # 相同句段（问候语、重复台词等）的 (phones, bert_features, norm_text) 缓存
+        self.feature_cache = PromptFeatureCache(
+            max_entries=feature_cache_size, max_bytes=int(feature_cache_max_mb * 1024 * 1024)
+        )
+        self.cache_lock = threading.Lock()
 
     def preprocess(self, text: str, lang: str, text_split_method: str, version: str = "v2") -> List[Dict]:
         print(f"############ {i18n('切分文本')} ############")
@@ -62,8 +75,7 @@ class TextPreprocessor:
         texts = self.pre_seg_text(text, lang, text_split_method)
         result = []
         print(f"############ {i18n('提取文本Bert特征')} ############")
-        for text in tqdm(texts):
-            phones, bert_features, norm_text = self.segment_and_extract_feature_for_text(text, lang, version)
+        for phones, bert_features, norm_text in self.get_phones_and_bert_batch(texts, lang, version):
             if phones is None or norm_text == "":
                 continue
             res = {
@@ -120,73 +132,118 @@ class TextPreprocessor:
         return self.get_phones_and_bert(text, language, version)
 
     def get_phones_and_bert(self, text: str, language: str, version: str, final: bool = False):
-        with self.bert_lock:
-            text = re.sub(r' {2,}', ' ', text)
-            textlist = []
-            langlist = []
-            if language == "all_zh":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_yue":
-                for tmp in LangSegmenter.getTexts(text,"zh"):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ja":
-                for tmp in LangSegmenter.getTexts(text,"ja"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "all_ko":
-                for tmp in LangSegmenter.getTexts(text,"ko"):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "en":
-                langlist.append("en")
-                textlist.append(text)
-            elif language == "auto":
-                for tmp in LangSegmenter.getTexts(text):
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
-            elif language == "auto_yue":
-                for tmp in LangSegmenter.getTexts(text):
-                    if tmp["lang"] == "zh":
-                        tmp["lang"] = "yue"
-                    langlist.append(tmp["lang"])
-                    textlist.append(tmp["text"])
+        return self.get_phones_and_bert_batch([text], language, version, final)[0]
+
+    def get_phones_and_bert_batch(
+        self, texts: List[str], language: str, version: str, final: bool = False
+    ) -> List[Tuple[list, torch.Tensor, str]]:
+        """
+        (phones, bert_features, norm_text) of several segments.
+        Cached segments are returned directly; the Chinese pieces of the remaining ones
+        go through the BERT model together in batches of BERT_BATCH_SIZE.
+        """
+        texts = [re.sub(r" {2,}", " ", text) for text in texts]
+        results: List[Optional[tuple]] = [None] * len(texts)
+        missing: Dict[tuple, List[int]] = {}
+        for i, text in enumerate(texts):
+            key = (text, language, version, final)
+            with self.cache_lock:
+                cached = self.feature_cache.get(key)
+            if cached is not None:
+                results[i] = cached
             else:
-                for tmp in LangSegmenter.getTexts(text):
-                    if langlist:
-                        if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
-                            textlist[-1] += tmp["text"]
-                            continue
-                    if tmp["lang"] == "en":
-                        langlist.append(tmp["lang"])
+                missing.setdefault(key, []).append(i)
+
+        if missing:
+            keys = list(missing.keys())
+            with self.bert_lock:
+                pieces_list = [self.clean_text_pieces(text, language, version, final) for text, *_ in keys]
+                zh_pieces = [piece for pieces in pieces_list for piece in pieces if piece[3] == "zh"]
+                zh_features = self.get_bert_feature_batch([(piece[2], piece[1]) for piece in zh_pieces])
+            features = {id(piece): feature for piece, feature in zip(zh_pieces, zh_features)}
+
+            for key, pieces in zip(keys, pieces_list):
+                bert_list = []
+                for piece in pieces:
+                    phones = piece[0]
+                    if id(piece) in features:
+                        bert_list.append(features[id(piece)].to(self.device))
                     else:
-                        # 因无法区别中日韩文汉字,以用户输入为准
-                        langlist.append(language)
-                    textlist.append(tmp["text"])
-            # print(textlist)
-            # print(langlist)
-            phones_list = []
-            bert_list = []
-            norm_text_list = []
-            for i in range(len(textlist)):
-                lang = langlist[i]
-                phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
-                bert = self.get_bert_inf(phones, word2ph, norm_text, lang)
-                phones_list.append(phones)
-                norm_text_list.append(norm_text)
-                bert_list.append(bert)
-            bert = torch.cat(bert_list, dim=1)
-            phones = sum(phones_list, [])
-            norm_text = "".join(norm_text_list)
-
-            if not final and len(phones) < 6:
-                return self.get_phones_and_bert("." + text, language, version, final=True)
-
-            return phones, bert, norm_text
+                        bert_list.append(torch.zeros((1024, len(phones)), dtype=torch.float32).to(self.device))
+                result = (
+                    sum([piece[0] for piece in pieces], []),
+                    torch.cat(bert_list, dim=1),
+                    "".join(piece[2] for piece in pieces),
+                )
+                with self.cache_lock:
+                    self.feature_cache.put(key, result)
+                for i in missing[key]:
+                    results[i] = result
+        return results
+
+    def split_text_by_language(self, text: str, language: str) -> Tuple[List[str], List[str]]:
+        textlist = []
+        langlist = []
+        if language == "all_zh":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_yue":
+            for tmp in LangSegmenter.getTexts(text,"zh"):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ja":
+            for tmp in LangSegmenter.getTexts(text,"ja"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "all_ko":
+            for tmp in LangSegmenter.getTexts(text,"ko"):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "en":
+            langlist.append("en")
+            textlist.append(text)
+        elif language == "auto":
+            for tmp in LangSegmenter.getTexts(text):
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        elif language == "auto_yue":
+            for tmp in LangSegmenter.getTexts(text):
+                if tmp["lang"] == "zh":
+                    tmp["lang"] = "yue"
+                langlist.append(tmp["lang"])
+                textlist.append(tmp["text"])
+        else:
+            for tmp in LangSegmenter.getTexts(text):
+                if langlist:
+                    if (tmp["lang"] == "en" and langlist[-1] == "en") or (tmp["lang"] != "en" and langlist[-1] != "en"):
+                        textlist[-1] += tmp["text"]
+                        continue
+                if tmp["lang"] == "en":
+                    langlist.append(tmp["lang"])
+                else:
+                    # 因无法区别中日韩文汉字,以用户输入为准
+                    langlist.append(language)
+                textlist.append(tmp["text"])
+        return textlist, langlist
+
+    def clean_text_pieces(self, text: str, language: str, version: str, final: bool = False) -> List[tuple]:
+        """
+        Language split + G2P of one segment.
+        Returns [(phones, word2ph, norm_text, lang)], lang without the "all_" prefix.
+        """
+        textlist, langlist = self.split_text_by_language(text, language)
+        pieces = []
+        for i in range(len(textlist)):
+            lang = langlist[i].replace("all_", "")
+            phones, word2ph, norm_text = self.clean_text_inf(textlist[i], lang, version)
+            pieces.append((phones, word2ph, norm_text, lang))
+
+        if not final and sum(len(piece[0]) for piece in pieces) < 6:
+            return self.clean_text_pieces(re.sub(r" {2,}", " ", "." + text), language, version, final=True)
+        return pieces
 
     def get_bert_feature(self, text: str, word2ph: list) -> torch.Tensor:
         with torch.no_grad():
@@ -203,6 +260,37 @@ class TextPreprocessor:
         phone_level_feature = torch.cat(phone_level_feature, dim=0)
         return phone_level_feature.T
 
+    def get_bert_feature_batch(self, items: List[Tuple[str, list]]) -> List[torch.Tensor]:
+        """
+        Phone-level BERT features of several (norm_text, word2ph) pairs.
+        Texts of similar length are padded into one forward pass; the result of each row
+        is the same as get_bert_feature() on that text alone.
+        """
+        features: List[Optional[torch.Tensor]] = [None] * len(items)
+        order = sorted(range(len(items)), key=lambda i: len(items[i][0]))
+        for start in range(0, len(order), BERT_BATCH_SIZE):
+            batch = order[start : start + BERT_BATCH_SIZE]
+            with torch.no_grad():
+                inputs = self.tokenizer([items[i][0] for i in batch], return_tensors="pt", padding=True)
+                for name in inputs:
+                    inputs[name] = inputs[name].to(self.device)
+                res = self.bert_model(**inputs, output_hidden_states=True)
+                hidden = torch.cat(res["hidden_states"][-3:-2], -1).cpu()
+                lengths = inputs["attention_mask"].sum(dim=1).tolist()
+            for row, i in enumerate(batch):
+                text, word2ph = items[i]
+                assert len(word2ph) == len(text)
+                token_features = hidden[row, 1 : int(lengths[row]) - 1]
+                phone_level_feature = torch.repeat_interleave(
+                    token_features, torch.tensor(word2ph, dtype=torch.long), dim=0
+                )
+                features[i] = phone_level_feature.T
+        return features
+
+    def clear_feature_cache(self):
+        with self.cache_lock:
+            self.feature_cache.clear()
+
     def clean_text_inf(self, text: str, language: str, version: str = "v2"):
         language = language.replace("all_", "")
         phones, word2ph, norm_text = clean_text(text, language, version)
@@ -0,0 +1,218 @@
+"""
+Cross-request micro-batching for the api_v2 server.
+
+Concurrent non-streaming /tts requests that share a reference voice and sampling
+parameters are collected for a short window and synthesized together by
+TTS.run_batched(), so their text segments go through the same to_batch() /
+infer_panel pass. All pipeline work runs on one dedicated thread guarded by
+`lock`, which keeps the event loop responsive and the (non thread-safe) TTS
+pipeline single-user.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Deque, List, Optional, Tuple
+
+# 这些参数相同的请求才能合并推理（文本、语言、切分方法、fragment_interval 可不同）
+BATCH_KEY_FIELDS = (
+    "ref_audio_path",
+    "aux_ref_audio_paths",
+    "prompt_text",
+    "prompt_lang",
+    "top_k",
+    "top_p",
+    "temperature",
+    "batch_threshold",
+    "split_bucket",
+    "speed_factor",
+    "seed",
+    "parallel_infer",
+    "repetition_penalty",
+    "sample_steps",
+    "super_sampling",
+)
+
+
+def batch_key(req: dict) -> tuple:
+    """Requests with equal keys can be merged into one run_batched() call."""
+    key = []
+    for field in BATCH_KEY_FIELDS:
+        value = req.get(field)
+        if isinstance(value, list):
+            value = tuple(value)
+        key.append(value)
+    return tuple(key)
+
+
+class _Pending:
+    __slots__ = ("key", "req", "future", "enqueued")
+
+    def __init__(self, key: tuple, req: dict, future: asyncio.Future):
+        self.key = key
+        self.req = req
+        self.future = future
+        self.enqueued = time.perf_counter()
+
+
+class TTSBatchScheduler:
+    """
+    Dynamic micro-batching scheduler.
+
+    The first queued request opens a window of `max_wait_ms`; requests with the same
+    batch_key that arrive within the window (up to `max_batch_requests`) join it.
+    Requests with a different key stay queued for the next round, in arrival order.
+    """
+
+    def __init__(
+        self,
+        pipeline,
+        lock: Optional[threading.Lock] = None,
+        max_batch_requests: int = 8,
+        max_wait_ms: float = 30.0,
+        max_batch_size: Optional[int] = None,
+    ):
+        """
+        Args:
+            pipeline: the TTS instance.
+            lock: lock shared with other users of the pipeline (streaming requests, weight switching).
+            max_batch_requests: maximum number of requests merged into one run_batched() call.
+            max_wait_ms: how long the first request of a round waits for others to join.
+            max_batch_size: cap on segments per inference batch (None: sum of the requests' batch_size).
+        """
+        self.pipeline = pipeline
+        self.lock = lock or threading.Lock()
+        self.max_batch_requests = max(1, int(max_batch_requests))
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_batch_size = max_batch_size
+
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="tts-batch")
+        self._queue: Optional[asyncio.Queue] = None
+        self._pending: Deque[_Pending] = deque()
+        self._worker: Optional[asyncio.Task] = None
+
+        self._stats = {
+            "requests": 0,
+            "rounds": 0,
+            "merged_requests": 0,
+            "max_round_requests": 0,
+            "failed_rounds": 0,
+            "queue_wait": 0.0,
+            "inference_time": 0.0,
+        }
+
+    def start(self):
+        """Start the worker on the running event loop (call from a startup hook)."""
+        if self._worker is None:
+            self._queue = asyncio.Queue()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, req: dict) -> Tuple[int, Any]:
+        """Queue a non-streaming request and wait for (sampling rate, audio)."""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(_Pending(batch_key(req), req, future))
+        return await future
+
+    async def run_exclusive(self, fn: Callable, *args):
+        """Run fn(*args) on the pipeline thread while holding the pipeline lock."""
+
+        def call():
+            with self.lock:
+                return fn(*args)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, call)
+
+    async def _collect(self) -> List[_Pending]:
+        first = self._pending.popleft() if self._pending else await self._queue.get()
+        group = [first]
+
+        # 先合并已在等待的同参数请求
+        for item in list(self._pending):
+            if len(group) >= self.max_batch_requests:
+                break
+            if item.key == first.key:
+                self._pending.remove(item)
+                group.append(item)
+
+        deadline = time.perf_counter() + self.max_wait
+        while len(group) < self.max_batch_requests:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self._queue.get(), remaining)
+            except asyncio.TimeoutError:
+                break
+            if item.key == first.key:
+                group.append(item)
+            else:
+                self._pending.append(item)
+        return group
+
+    def _infer(self, reqs: List[dict]):
+        with self.lock:
+            return self.pipeline.run_batched(reqs, max_batch_size=self.max_batch_size)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            group = await self._collect()
+            group = [item for item in group if not item.future.cancelled()]
+            if not group:
+                continue
+
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self._infer, [item.req for item in group])
+            except Exception as e:
+                self._stats["failed_rounds"] += 1
+                if len(group) == 1:
+                    self._finish(group[0], exception=e)
+                    continue
+                # 合并推理失败时逐个重试，避免一个请求的错误影响其他请求
+                results = []
+                for item in group:
+                    try:
+                        results.append((await loop.run_in_executor(self._executor, self._infer, [item.req]))[0])
+                    except Exception as single_error:
+                        results.append(single_error)
+
+            self._record(group, started)
+            for item, result in zip(group, results):
+                if isinstance(result, Exception):
+                    self._finish(item, exception=result)
+                else:
+                    self._finish(item, result=result)
+
+    @staticmethod
+    def _finish(item: _Pending, result=None, exception: Exception = None):
+        if item.future.done():
+            return
+        if exception is not None:
+            item.future.set_exception(exception)
+        else:
+            item.future.set_result(result)
+
+    def _record(self, group: List[_Pending], started: float):
+        stats = self._stats
+        stats["requests"] += len(group)
+        stats["rounds"] += 1
+        if len(group) > 1:
+            stats["merged_requests"] += len(group)
+        stats["max_round_requests"] = max(stats["max_round_requests"], len(group))
+        stats["queue_wait"] += sum(started - item.enqueued for item in group)
+        stats["inference_time"] += time.perf_counter() - started
+
+    def get_stats(self) -> dict:
+        stats = dict(self._stats)
+        requests, rounds = stats["requests"], stats["rounds"]
+        stats["avg_round_requests"] = round(requests / rounds, 2) if rounds else 0.0
+        stats["avg_queue_wait_ms"] = round(stats.pop("queue_wait") / requests * 1000, 1) if requests else 0.0
+        stats["avg_inference_time"] = round(stats.pop("inference_time") / rounds, 3) if rounds else 0.0
+        stats["queued"] = (self._queue.qsize() if self._queue else 0) + len(self._pending)
+        stats["max_batch_requests"] = self.max_batch_requests
+        stats["max_wait_ms"] = self.max_wait * 1000
+        return stats
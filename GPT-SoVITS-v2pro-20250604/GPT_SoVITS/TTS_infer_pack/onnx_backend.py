@@ -0,0 +1,227 @@
+"""
+ONNX Runtime backend for CPU inference.
+
+Runs the graphs written by GPT_SoVITS/onnx_export.py (<name>_t2s_encoder.onnx,
+<name>_t2s_fsdec.onnx, <name>_t2s_sdec.onnx and <name>_vits.onnx in one directory)
+in place of the PyTorch T2S decoding loop and VITS decoder. The stage decoder takes
+and returns the per-layer k / v caches, so each step only processes the newest token.
+
+Text / BERT features, CNHubert and the prompt semantic tokens are still computed by
+the PyTorch models of TTS (and cached in prompt_cache).
+"""
+
+import os
+from typing import Iterator, List, Tuple
+
+import numpy as np
+import torch
+
+# 前 MIN_STEPS 步不允许预测 EOS（与 PyTorch 推理一致，至少生成约 0.4s）
+MIN_STEPS = 11
+
+
+def _softmax(x: np.ndarray) -> np.ndarray:
+    x = x - np.max(x)
+    e = np.exp(x)
+    return e / e.sum()
+
+
+def sample_token(
+    logits: np.ndarray,
+    previous_tokens: np.ndarray,
+    top_k: int = 15,
+    top_p: float = 1.0,
+    temperature: float = 1.0,
+    repetition_penalty: float = 1.35,
+) -> int:
+    """
+    numpy version of AR.models.utils.sample for one sequence:
+    repetition penalty -> top_p -> temperature -> top_k -> multinomial.
+    """
+    logits = logits.astype(np.float64, copy=True)
+
+    if repetition_penalty != 1.0 and previous_tokens.size > 0:
+        tokens = np.unique(previous_tokens)
+        score = logits[tokens]
+        logits[tokens] = np.where(score < 0, score * repetition_penalty, score / repetition_penalty)
+
+    if top_p is not None and top_p < 1.0:
+        sorted_indices = np.argsort(-logits)
+        cum_probs = np.cumsum(_softmax(logits[sorted_indices]))
+        remove = cum_probs > top_p
+        remove[0] = False
+        logits[sorted_indices[remove]] = -np.inf
+
+    logits = logits / max(temperature, 1e-5)
+
+    if top_k is not None and top_k > 0:
+        k = min(int(top_k), logits.shape[-1])
+        pivot = np.partition(logits, -k)[-k]
+        logits = np.where(logits < pivot, -np.inf, logits)
+
+    probs = _softmax(logits)
+    return int(np.random.choice(probs.shape[-1], p=probs))
+
+
+class ONNXBackend:
+    def __init__(self, model_dir: str, num_threads: int = 0, eos: int = 1024):
+        """
+        Args:
+            model_dir: directory written by onnx_export.py (onnx/<name>/), files are named <name>_*.onnx.
+            num_threads: intra-op threads of each session (0: onnxruntime default).
+            eos: EOS token of the T2S model.
+        """
+        import onnxruntime
+
+        self.model_dir = model_dir
+        self.name = os.path.basename(os.path.normpath(model_dir))
+        self.eos = eos
+
+        sess_options = onnxruntime.SessionOptions()
+        sess_options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        sess_options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+        if num_threads > 0:
+            sess_options.intra_op_num_threads = num_threads
+
+        def load(suffix: str, required: bool = True):
+            path = os.path.join(model_dir, f"{self.name}_{suffix}.onnx")
+            if not os.path.exists(path):
+                if required:
+                    raise FileNotFoundError(f"ONNX model not found: {path}")
+                return None
+            print(f"Loading ONNX model from {path}")
+            return onnxruntime.InferenceSession(path, sess_options=sess_options, providers=["CPUExecutionProvider"])
+
+        self.encoder = load("t2s_encoder")
+        self.first_stage_decoder = load("t2s_fsdec")
+        self.stage_decoder = load("t2s_sdec")
+        self.vits = load("vits", required=False)
+
+        # 编码器同时输出 prompts（由 ssl_content 提取），这里只用其 x 输出，
+        # prompt 语义 token 直接取自 prompt_cache，ssl_content 传最短的占位输入
+        self._dummy_ssl = np.zeros((1, 768, 2), dtype=np.float32)
+
+    @property
+    def has_vits(self) -> bool:
+        return self.vits is not None
+
+    def iter_semantic(
+        self,
+        phones: torch.LongTensor,
+        bert_features: torch.Tensor,
+        prompt: torch.LongTensor,
+        top_k: int = 15,
+        top_p: float = 1.0,
+        temperature: float = 1.0,
+        repetition_penalty: float = 1.35,
+        early_stop_num: int = -1,
+        max_steps: int = 1500,
+    ) -> Iterator[int]:
+        """
+        Autoregressive semantic token prediction for one sequence, yielding each token
+        as soon as it is decoded (EOS is not yielded).
+
+        Args:
+            phones: [N] prompt + target phone ids.
+            bert_features: [1024, N] BERT features of the same phones.
+            prompt: [P] prompt semantic tokens.
+        """
+        phones = phones.detach().cpu().numpy().astype(np.int64)[None, :]
+        bert = bert_features.detach().cpu().float().numpy().T
+        # 编码器在内部按 [ref_seq, text_seq] 拼接后再加位置编码，
+        # 这里从最后一个音素处切开，拼接后与原序列一致
+        x, _ = self.encoder.run(
+            None,
+            {
+                "ref_seq": phones[:, :-1],
+                "text_seq": phones[:, -1:],
+                "ref_bert": bert[:-1],
+                "text_bert": bert[-1:],
+                "ssl_content": self._dummy_ssl,
+            },
+        )
+
+        prompts = prompt.detach().cpu().numpy().astype(np.int64)[None, :]
+        prefix_len = prompts.shape[1]
+        if prefix_len > 1:
+            # 第一阶段解码器在图内按导出时固定的 top_k / 重复惩罚采样第一个 token，且不输出 logits；
+            # 这里只用它处理前 P-1 个 prompt token，最后一个 prompt token 交给 stage decoder，
+            # 得到的 logits 即第一个 token 的 logits，与之后每一步一样按请求的参数采样
+            _, k, v, y_emb, x_example = self.first_stage_decoder.run(None, {"x": x, "prompts": prompts[:, :-1]})
+            y = prompts
+            start = 0
+        else:
+            # 只有一个 prompt token 时无法拆分，沿用图内采样的第一个 token
+            y, k, v, y_emb, x_example = self.first_stage_decoder.run(None, {"x": x, "prompts": prompts})
+            if int(y[0, -1]) == self.eos:
+                return
+            yield int(y[0, -1])
+            start = 1
+
+        for idx in range(start, max_steps):
+            y, k, v, y_emb, logits, _ = self.stage_decoder.run(
+                None, {"iy": y, "ik": k, "iv": v, "iy_emb": y_emb, "ix_example": x_example}
+            )
+            # 图内采样参数在导出时固定，这里按请求的参数对 logits 重新采样
+            step_logits = logits[0]
+            if idx < MIN_STEPS:
+                step_logits = step_logits.copy()
+                step_logits[self.eos] = -np.inf
+            token = sample_token(step_logits, y[0, :-1], top_k, top_p, temperature, repetition_penalty)
+            y[0, -1] = token
+
+            if token == self.eos or (idx >= MIN_STEPS and int(np.argmax(logits[0])) == self.eos):
+                break
+            yield token
+            if early_stop_num != -1 and (y.shape[1] - prefix_len) > early_stop_num:
+                break
+
+    def infer_semantic(self, phones: torch.LongTensor, bert_features: torch.Tensor, prompt: torch.LongTensor, **kwargs):
+        """
+        Same as iter_semantic, but returns all generated tokens.
+
+        Returns:
+            torch.LongTensor: [T] generated tokens (without the prompt and EOS).
+        """
+        tokens = list(self.iter_semantic(phones, bert_features, prompt, **kwargs))
+        return torch.LongTensor(tokens)
+
+    def decode(
+        self, pred_semantic: torch.LongTensor, phones: torch.LongTensor, ref_audio: torch.Tensor
+    ) -> torch.Tensor:
+        """
+        VITS decoding of one segment.
+
+        Args:
+            pred_semantic: [T] semantic tokens.
+            phones: [N] phone ids of the segment.
+            ref_audio: [1, L] mono reference audio at the model sampling rate.
+        """
+        (audio,) = self.vits.run(
+            None,
+            {
+                "text_seq": phones.detach().cpu().numpy().astype(np.int64)[None, :],
+                "pred_semantic": pred_semantic.detach().cpu().numpy().astype(np.int64)[None, None, :],
+                "ref_audio": ref_audio.detach().cpu().float().numpy(),
+            },
+        )
+        return torch.from_numpy(audio).float()
+
+    def infer_batch(
+        self,
+        all_phoneme_ids: List[torch.LongTensor],
+        all_phoneme_lens: torch.LongTensor,
+        prompt: torch.LongTensor,
+        all_bert_features: List[torch.Tensor],
+        **kwargs,
+    ) -> Tuple[List[torch.LongTensor], List[int]]:
+        """Same return format as Text2SemanticDecoder.infer_panel (sequences are decoded one by one)."""
+        pred_semantic_list, idx_list = [], []
+        for i in range(len(all_phoneme_ids)):
+            length = int(all_phoneme_lens[i])
+            tokens = self.infer_semantic(
+                all_phoneme_ids[i][:length], all_bert_features[i][:, :length], prompt[i], **kwargs
+            )
+            pred_semantic_list.append(tokens)
+            idx_list.append(tokens.shape[0])
+        return pred_semantic_list, idx_list
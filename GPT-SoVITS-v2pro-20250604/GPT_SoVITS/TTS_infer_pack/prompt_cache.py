@@ -0,0 +1,235 @@
+"""
+Multi-speaker prompt feature cache.
+
+Keeps the precomputed reference features of several voices (CNHubert semantic
+tokens, reference spectrogram, raw reference audio and prompt-text phones / BERT
+features) in a bounded LRU, so alternating between voices does not recompute them
+on every request. Entries are accounted by tensor size; optionally they are also
+persisted to disk and reloaded after a restart.
+"""
+
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import torch
+
+# 缓存条目包含的 prompt_cache 字段（refer_spec 只保存主参考音频，不含辅助参考音频）
+REF_AUDIO_FIELDS = ("prompt_semantic", "refer_spec", "raw_audio", "raw_sr")
+PROMPT_TEXT_FIELDS = ("prompt_text", "prompt_lang", "phones", "bert_features", "norm_text")
+
+# file_digest 记住的文件数上限（按最近使用淘汰）
+DIGEST_CACHE_SIZE = 1024
+_digest_cache: "OrderedDict[str, tuple]" = OrderedDict()
+_digest_lock = threading.Lock()
+
+
+def file_digest(path: str) -> str:
+    """SHA-1 of a file's content; re-hashed only when its size or mtime changes."""
+    stat = os.stat(path)
+    signature = (stat.st_size, stat.st_mtime_ns)
+    with _digest_lock:
+        cached = _digest_cache.get(path)
+        if cached is not None and cached[0] == signature:
+            _digest_cache.move_to_end(path)
+            return cached[1]
+
+    # 在锁外计算哈希，不阻塞其他线程
+    sha1 = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha1.update(chunk)
+    digest = sha1.hexdigest()
+
+    with _digest_lock:
+        _digest_cache[path] = (signature, digest)
+        _digest_cache.move_to_end(path)
+        while len(_digest_cache) > DIGEST_CACHE_SIZE:
+            _digest_cache.popitem(last=False)
+    return digest
+
+
+def _nbytes(value: Any) -> int:
+    if isinstance(value, torch.Tensor):
+        return value.numel() * value.element_size()
+    if isinstance(value, (list, tuple)):
+        if value and all(isinstance(v, int) for v in value):
+            return len(value) * 8
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    if isinstance(value, str):
+        return len(value.encode("utf-8"))
+    return 0
+
+
+def _to_device(value: Any, device) -> Any:
+    if isinstance(value, torch.Tensor):
+        return value.to(device)
+    if isinstance(value, tuple):
+        return tuple(_to_device(v, device) for v in value)
+    if isinstance(value, list):
+        return [_to_device(v, device) for v in value]
+    if isinstance(value, dict):
+        return {k: _to_device(v, device) for k, v in value.items()}
+    return value
+
+
+class PromptFeatureCache:
+    """
+    Bounded LRU of precomputed features, accounted by tensor size.
+
+    TTS keys it by (reference audio hash, prompt text, prompt language, model signature);
+    TextPreprocessor reuses it for per-segment (phones, bert_features, norm_text).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 64,
+        max_bytes: int = 512 * 1024 * 1024,
+        cache_dir: str = None,
+        max_disk_entries: int = None,
+    ):
+        """
+        Args:
+            max_entries: maximum number of entries kept in memory (0 disables the cache).
+            max_bytes: maximum total tensor size of the cached entries.
+            cache_dir: directory for persisted entries (None: memory only).
+            max_disk_entries: maximum number of persisted files; the least recently used are
+                deleted when exceeded (default: 4 * max_entries).
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.max_bytes = int(max_bytes)
+        self.cache_dir = cache_dir or None
+        if max_disk_entries is None:
+            max_disk_entries = 4 * self.max_entries
+        self.max_disk_entries = max(1, int(max_disk_entries))
+        self._entries: "OrderedDict[tuple, dict]" = OrderedDict()
+        self._sizes: Dict[tuple, int] = {}
+        self.total_bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def _path(self, key: tuple) -> str:
+        name = hashlib.sha1(repr(key).encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.pt")
+
+    def get(self, key: tuple, device=None) -> Optional[dict]:
+        """Return the cached entry (moved to `device` when loaded from disk), or None."""
+        if not self.enabled:
+            return None
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        if self.cache_dir:
+            path = self._path(key)
+            if os.path.exists(path):
+                try:
+                    saved = torch.load(path, map_location="cpu", weights_only=False)
+                    if saved.get("key") == key:
+                        entry = _to_device(saved["entry"], device) if device is not None else saved["entry"]
+                        self._remember(key, entry)
+                        self.disk_hits += 1
+                        self._touch(path)
+                        return entry
+                except Exception as e:
+                    print(f"Failed to load prompt cache {path}: {e}")
+
+        self.misses += 1
+        return None
+
+    def put(self, key: tuple, entry: dict):
+        """Add an entry (evicting least recently used voices) and persist it if enabled."""
+        if not self.enabled:
+            return
+        self._remember(key, entry)
+        if self.cache_dir:
+            path = self._path(key)
+            tmp_path = f"{path}.tmp"
+            try:
+                torch.save({"key": key, "entry": _to_device(entry, "cpu")}, tmp_path)
+                os.replace(tmp_path, path)
+            except Exception as e:
+                print(f"Failed to save prompt cache {path}: {e}")
+            self._prune_disk()
+
+    @staticmethod
+    def _touch(path: str):
+        # 更新修改时间，清理磁盘缓存时按最近使用保留
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+    def _prune_disk(self):
+        """Delete the least recently used persisted files beyond max_disk_entries."""
+        try:
+            files = [
+                os.path.join(self.cache_dir, name) for name in os.listdir(self.cache_dir) if name.endswith(".pt")
+            ]
+            if len(files) <= self.max_disk_entries:
+                return
+            files.sort(key=lambda path: os.stat(path).st_mtime_ns)
+            for path in files[: len(files) - self.max_disk_entries]:
+                os.remove(path)
+        except OSError as e:
+            print(f"Failed to prune prompt cache {self.cache_dir}: {e}")
+
+    def _remember(self, key: tuple, entry: dict):
+        if key in self._entries:
+            self.total_bytes -= self._sizes.pop(key)
+        size = _nbytes(entry)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        self._sizes[key] = size
+        self.total_bytes += size
+
+        # 至少保留刚加入的条目
+        while len(self._entries) > 1 and (
+            len(self._entries) > self.max_entries or self.total_bytes > self.max_bytes
+        ):
+            old_key, _ = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(old_key)
+            self.evictions += 1
+
+    def clear(self, disk: bool = False):
+        """Drop all in-memory entries (and the persisted files when disk=True)."""
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
+        if disk and self.cache_dir and os.path.isdir(self.cache_dir):
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(".pt"):
+                    os.remove(os.path.join(self.cache_dir, name))
+
+    def get_stats(self) -> dict:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_mb": round(self.total_bytes / 1024 / 1024, 2),
+            "max_memory_mb": round(self.max_bytes / 1024 / 1024, 2),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "cache_dir": self.cache_dir,
+            "max_disk_entries": self.max_disk_entries if self.cache_dir else None,
+        }
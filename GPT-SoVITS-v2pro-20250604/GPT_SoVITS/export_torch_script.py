@@ -331,6 +331,34 @@ class T2SBlock:
         )
         return x, k_cache, v_cache
 
+    def decode_next_token_static(self, x: torch.Tensor, k_buf: torch.Tensor, v_buf: torch.Tensor, pos: int):
+        # k_buf / v_buf: [batch, num_heads, max_len, head_dim] 预分配缓存, 新 token 的 k/v 按位置原地写入
+        q, k, v = F.linear(x, self.qkv_w, self.qkv_b).chunk(3, dim=-1)
+
+        batch_size = q.shape[0]
+        q_len = q.shape[1]
+
+        q = q.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        k_buf[:, :, pos : pos + 1] = k.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+        v_buf[:, :, pos : pos + 1] = v.view(batch_size, q_len, self.num_heads, -1).transpose(1, 2)
+
+        attn = F.scaled_dot_product_attention(q, k_buf[:, :, : pos + 1], v_buf[:, :, : pos + 1])
+
+        attn = attn.transpose(1, 2).reshape(batch_size, q_len, -1)
+        attn = F.linear(attn, self.out_w, self.out_b)
+
+        x = x + attn
+        x = F.layer_norm(x, [self.hidden_dim], self.norm_w1, self.norm_b1, self.norm_eps1)
+        x = x + self.mlp.forward(x)
+        x = F.layer_norm(
+            x,
+            [self.hidden_dim],
+            self.norm_w2,
+            self.norm_b2,
+            self.norm_eps2,
+        )
+        return x
+
 
 @torch.jit.script
 class T2STransformer:
@@ -352,6 +380,36 @@ class T2STransformer:
             x, k_cache[i], v_cache[i] = self.blocks[i].decode_next_token(x, k_cache[i], v_cache[i])
         return x, k_cache, v_cache
 
+    def init_static_cache(self, k_cache: list[torch.Tensor], v_cache: list[torch.Tensor], max_len: int):
+        """
+        Copy the prompt k/v caches ([batch, kv_len, hidden]) into preallocated
+        [batch, num_heads, max_len, head_dim] buffers for decode_next_token_static.
+        """
+        k_bufs: list[torch.Tensor] = []
+        v_bufs: list[torch.Tensor] = []
+        for i in range(self.num_blocks):
+            batch_size = k_cache[i].shape[0]
+            kv_len = k_cache[i].shape[1]
+            num_heads = self.blocks[i].num_heads
+            k = k_cache[i].view(batch_size, kv_len, num_heads, -1).transpose(1, 2)
+            v = v_cache[i].view(batch_size, kv_len, num_heads, -1).transpose(1, 2)
+            k_buf = torch.empty(
+                (batch_size, num_heads, max_len, k.shape[-1]), dtype=k.dtype, device=k.device
+            )
+            v_buf = torch.empty_like(k_buf)
+            k_buf[:, :, :kv_len] = k
+            v_buf[:, :, :kv_len] = v
+            k_bufs.append(k_buf)
+            v_bufs.append(v_buf)
+        return k_bufs, v_bufs
+
+    def decode_next_token_static(
+        self, x: torch.Tensor, k_bufs: list[torch.Tensor], v_bufs: list[torch.Tensor], pos: int
+    ):
+        for i in range(self.num_blocks):
+            x = self.blocks[i].decode_next_token_static(x, k_bufs[i], v_bufs[i], pos)
+        return x
+
 
 class VitsModel(nn.Module):
     def __init__(self, vits_path, version=None, is_half=True, device="cpu"):
@@ -403,7 +461,11 @@ class VitsModel(nn.Module):
 
 
 class T2SModel(nn.Module):
-    def __init__(self, raw_t2s: Text2SemanticLightningModule):
+    def __init__(self, raw_t2s: Text2SemanticLightningModule, static_kv_cache: bool = True):
+        """
+        static_kv_cache: 解码时使用预分配的 KV 缓存并按位置原地写入,
+            避免每生成一个 token 就 torch.cat 复制整段缓存 (False 时使用原有的拼接方式)
+        """
         super(T2SModel, self).__init__()
         self.model_dim = raw_t2s.model.model_dim
         self.embedding_dim = raw_t2s.model.embedding_dim
@@ -459,6 +521,8 @@ class T2SModel(nn.Module):
         self.max_sec = raw_t2s.config["data"]["max_sec"]
         self.top_k = int(raw_t2s.config["inference"]["top_k"])
         self.early_stop_num = torch.LongTensor([self.hz * self.max_sec])
+        self.static_kv_cache: bool = static_kv_cache
+        self.max_decode_steps: int = 1500
 
     def forward(
         self,
@@ -521,6 +585,12 @@ class T2SModel(nn.Module):
         top_k = int(top_k)
 
         xy_dec, k_cache, v_cache = self.t2s_transformer.process_prompt(xy_pos, xy_attn_mask, None)
+        k_bufs: list[torch.Tensor] = []
+        v_bufs: list[torch.Tensor] = []
+        if self.static_kv_cache:
+            k_bufs, v_bufs = self.t2s_transformer.init_static_cache(
+                k_cache, v_cache, src_len + self.max_decode_steps
+            )
 
         logits = self.ar_predict_layer(xy_dec[:, -1])
         logits = logits[:, :-1]
@@ -533,10 +603,13 @@ class T2SModel(nn.Module):
 
         stop = False
         # for idx in range(1, 50):
-        for idx in range(1, 1500):
+        for idx in range(1, self.max_decode_steps):
             # [1, N] [N_layer, N, 1, 512] [N_layer, N, 1, 512] [1, N, 512] [1] [1, N, 512] [1, N]
             # y, k, v, y_emb, logits, samples = self.stage_decoder(y, k, v, y_emb, x_example)
-            xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
+            if self.static_kv_cache:
+                xy_dec = self.t2s_transformer.decode_next_token_static(xy_pos, k_bufs, v_bufs, src_len + idx - 1)
+            else:
+                xy_dec, k_cache, v_cache = self.t2s_transformer.decode_next_token(xy_pos, k_cache, v_cache)
             logits = self.ar_predict_layer(xy_dec[:, -1])
 
             if idx < 11:  ###至少预测出10个token不然不给停止（0.4s）
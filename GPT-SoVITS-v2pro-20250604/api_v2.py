@@ -7,6 +7,26 @@
     `-a` - `绑定地址, 默认"127.0.0.1"`
     `-p` - `绑定端口, 默认9880`
     `-c` - `TTS配置文件路径, 默认"GPT_SoVITS/configs/tts_infer.yaml"`
+    `--batch_window_ms` - `合并推理等待窗口(毫秒), 默认30`
+    `--max_batch_requests` - `单次合并推理的最大请求数, 默认8 (设为1即不合并)`
+    `--max_batch_size` - `合并推理时每个批次的最大分段数, 默认不限制 (各请求 batch_size 之和)`
+    `--stream_chunk_size` - `流式合成每块的语义 token 数 (25 token 约 1 秒), 默认24 (设为0即按文本分段返回)`
+
+## 合并推理:
+
+非流式请求由调度器统一排队: 同一窗口内参考音频、提示文本与采样参数相同的请求,
+其文本分段合并到同一次 to_batch / infer_panel 推理中, 结果再按请求拆分返回。
+流式请求只在合成每个音频块时持有推理锁 (客户端读取音频期间不占用模型), 模型切换在推理锁内执行,
+不会与合并推理同时使用模型。
+
+## ONNX Runtime 后端 (CPU):
+
+配置文件 custom 段设置 `inference_backend: onnx` 与 `onnx_model_dir: onnx/<名称>` (onnx_export.py 的导出目录,
+须由当前 GPT / SoVITS 权重导出), 可选 `onnx_num_threads`。T2S 语义 token 解码 (带 KV cache) 与 v1/v2 的 VITS 解码
+由 ONNX Runtime 执行; 无参考文本、语速调整、辅助参考音频等情况仍使用 PyTorch。
+通过 `/set_gpt_weights` 或 `/set_sovits_weights` 切换权重后, 导出的图与新权重不再对应,
+服务会卸载 ONNX 模型并改用 PyTorch 后端 (切换成功的响应中 `inference_backend` 为 `torch`)。
+重新加载当前路径的权重 (包括推理出错后的自动恢复) 不会卸载 ONNX 模型。
 
 ## 调用:
 
@@ -36,6 +56,7 @@ POST:
     "split_bucket": True,         # bool. whether to split the batch into multiple buckets.
     "speed_factor":1.0,           # float. control the speed of the synthesized audio.
     "streaming_mode": False,      # bool. whether to return a streaming response.
+    "stream_chunk_size": None,    # int. semantic tokens per streamed chunk (None: server default, 0: per text segment).
     "seed": -1,                   # int. random seed for reproducibility.
     "parallel_infer": True,       # bool. whether to use parallel inference.
     "repetition_penalty": 1.35,   # float. repetition penalty for T2S model.
@@ -70,6 +91,41 @@ POST:
 RESP: 无
 
 
+### 合并推理统计
+
+endpoint: `/batch_stats`
+
+GET:
+```
+http://127.0.0.1:9880/batch_stats
+```
+RESP: 请求数、合并轮数、平均每轮请求数、平均排队时间等, http code 200
+
+### 流式合成统计
+
+endpoint: `/stream_stats`
+
+GET:
+```
+http://127.0.0.1:9880/stream_stats
+```
+RESP: 最近的流式请求的首包延迟 (ttfb, 从收到请求到第一个音频块)、合成耗时、音频时长、实时率 (rtf)、
+等待推理锁的时间 (lock_wait) 及平均值, http code 200
+
+### 参考音色缓存统计
+
+endpoint: `/prompt_cache_stats`
+
+GET:
+```
+http://127.0.0.1:9880/prompt_cache_stats
+```
+RESP: 已缓存音色数、内存占用、命中/未命中次数、淘汰次数等, http code 200
+
+缓存大小通过配置文件 custom 段的 `prompt_cache_size` (音色数, 0 为关闭)、`prompt_cache_max_mb`
+(内存上限) 与 `prompt_cache_dir` (持久化目录, 留空不持久化) 设置。
+
+
 ### 切换GPT模型
 
 endpoint: `/set_gpt_weights`
@@ -79,7 +135,7 @@ GET:
 http://127.0.0.1:9880/set_gpt_weights?weights_path=GPT_SoVITS/pretrained_models/s1bert25hz-2kh-longer-epoch=68e-step=50232.ckpt
 ```
 RESP:
-成功: 返回"success", http code 200
+成功: 返回"success" 及当前推理后端 (inference_backend), http code 200
 失败: 返回包含错误信息的 json, http code 400
 
 
@@ -93,7 +149,7 @@ http://127.0.0.1:9880/set_sovits_weights?weights_path=GPT_SoVITS/pretrained_mode
 ```
 
 RESP:
-成功: 返回"success", http code 200
+成功: 返回"success" 及当前推理后端 (inference_backend), http code 200
 失败: 返回包含错误信息的 json, http code 400
 
 """
@@ -109,6 +165,8 @@ sys.path.append("%s/GPT_SoVITS" % (now_dir))
 
 import argparse
 import subprocess
+import threading
+import time
 import wave
 import signal
 import numpy as np
@@ -117,9 +175,11 @@ from fastapi import FastAPI, Response
 from fastapi.responses import StreamingResponse, JSONResponse
 import uvicorn
 from io import BytesIO
+from collections import deque
 from tools.i18n.i18n import I18nAuto
 from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
 from GPT_SoVITS.TTS_infer_pack.text_segmentation_method import get_method_names as get_cut_method_names
+from GPT_SoVITS.TTS_infer_pack.batch_scheduler import TTSBatchScheduler
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 # print(sys.path)
@@ -130,6 +190,10 @@ parser = argparse.ArgumentParser(description="GPT-SoVITS api")
 parser.add_argument("-c", "--tts_config", type=str, default="GPT_SoVITS/configs/tts_infer.yaml", help="tts_infer路径")
 parser.add_argument("-a", "--bind_addr", type=str, default="127.0.0.1", help="default: 127.0.0.1")
 parser.add_argument("-p", "--port", type=int, default="9880", help="default: 9880")
+parser.add_argument("--batch_window_ms", type=float, default=30, help="合并推理等待窗口(毫秒), default: 30")
+parser.add_argument("--max_batch_requests", type=int, default=8, help="单次合并推理的最大请求数, default: 8")
+parser.add_argument("--max_batch_size", type=int, default=None, help="合并推理每批次最大分段数, default: 不限制")
+parser.add_argument("--stream_chunk_size", type=int, default=24, help="流式合成每块的语义 token 数, 0 为按分段返回, default: 24")
 args = parser.parse_args()
 config_path = args.tts_config
 # device = args.device
@@ -143,6 +207,15 @@ if config_path in [None, ""]:
 tts_config = TTS_Config(config_path)
 print(tts_config)
 tts_pipeline = TTS(tts_config)
+# 推理锁: TTS pipeline 不是线程安全的, 合并推理/流式推理/模型切换都需持有
+tts_lock = threading.Lock()
+batch_scheduler = TTSBatchScheduler(
+    tts_pipeline,
+    lock=tts_lock,
+    max_batch_requests=args.max_batch_requests,
+    max_wait_ms=args.batch_window_ms,
+    max_batch_size=args.max_batch_size,
+)
 
 APP = FastAPI()
 # 允許所有來源跨域（開發用，正式環境請限制來源）
@@ -154,6 +227,34 @@ APP.add_middleware(
     allow_headers=["*"],
 )
 
+
+# 最近的流式请求指标
+stream_metrics = deque(maxlen=100)
+
+
+def record_stream_metrics(started: float, first_chunk_at: float, audio_samples: int, sr: int, lock_wait: float):
+    elapsed = time.perf_counter() - started
+    audio_seconds = audio_samples / sr if sr else 0.0
+    metrics = {
+        "ttfb": round(first_chunk_at - started, 3) if first_chunk_at else None,
+        "elapsed": round(elapsed, 3),
+        "audio_seconds": round(audio_seconds, 3),
+        "rtf": round(elapsed / audio_seconds, 3) if audio_seconds else None,
+        # 等待推理锁的总时间 (其他请求占用模型), 与合成本身的耗时分开观察
+        "lock_wait": round(lock_wait, 3),
+    }
+    stream_metrics.append(metrics)
+    print(
+        f"流式合成: 首包 {metrics['ttfb']}s, 耗时 {metrics['elapsed']}s, 音频 {metrics['audio_seconds']}s, "
+        f"RTF {metrics['rtf']}, 等锁 {metrics['lock_wait']}s"
+    )
+
+
+@APP.on_event("startup")
+async def start_batch_scheduler():
+    batch_scheduler.start()
+
+
 class TTS_Request(BaseModel):
     text: str = None
     text_lang: str = None
@@ -173,6 +274,7 @@ class TTS_Request(BaseModel):
     seed: int = -1
     media_type: str = "wav"
     streaming_mode: bool = False
+    stream_chunk_size: int = None
     parallel_infer: bool = True
     repetition_penalty: float = 1.35
     sample_steps: int = 32
@@ -329,6 +431,7 @@ async def tts_handle(req: dict):
                 "seed": -1,                   # int. random seed for reproducibility.
                 "media_type": "wav",          # str. media type of the output audio, support "wav", "raw", "ogg", "aac".
                 "streaming_mode": False,      # bool. whether to return a streaming response.
+                "stream_chunk_size": None,    # int. semantic tokens per streamed chunk (None: server default, 0: per text segment).
                 "parallel_infer": True,       # bool.(optional) whether to use parallel inference.
                 "repetition_penalty": 1.35    # float.(optional) repetition penalty for T2S model.
                 "sample_steps": 32,           # int. number of sampling steps for VITS model V3.
@@ -348,32 +451,70 @@ async def tts_handle(req: dict):
 
     if streaming_mode or return_fragment:
         req["return_fragment"] = True
+    if streaming_mode:
+        if req.get("stream_chunk_size") is None:
+            req["stream_chunk_size"] = args.stream_chunk_size
+    else:
+        req["stream_chunk_size"] = 0
 
     try:
-        tts_generator = tts_pipeline.run(req)
-
         if streaming_mode:
-
-            def streaming_generator(tts_generator: Generator, media_type: str):
-                if_frist_chunk = True
-                for sr, chunk in tts_generator:
-                    if if_frist_chunk and media_type == "wav":
-                        yield wave_header_chunk(sample_rate=sr)
-                        media_type = "raw"
-                        if_frist_chunk = False
-                    yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+            started = time.perf_counter()
+
+            def streaming_generator(req: dict, media_type: str):
+                first_chunk_at = None
+                audio_samples, output_sr = 0, 0
+                lock_wait = 0.0
+                # 推理锁只在合成每个音频块时持有, 客户端读取音频期间其他请求可以继续推理;
+                # 其他请求可能切换参考音频, 每次取块前恢复本请求的参考音频状态
+                tts_generator: Generator = tts_pipeline.run(req)
+                prompt_state, models = None, None
+                try:
+                    while True:
+                        wait_started = time.perf_counter()
+                        with tts_lock:
+                            lock_wait += time.perf_counter() - wait_started
+                            if prompt_state is not None:
+                                if models[0] is not tts_pipeline.t2s_model or models[1] is not tts_pipeline.vits_model:
+                                    # 流式输出期间切换了模型权重, 后续音频无法与已输出的部分一致
+                                    print("流式合成中止: 模型权重已切换")
+                                    break
+                                tts_pipeline.restore_prompt_state(prompt_state)
+                            try:
+                                sr, chunk = next(tts_generator)
+                            except StopIteration:
+                                break
+                            prompt_state = tts_pipeline.snapshot_prompt_state()
+                            models = (tts_pipeline.t2s_model, tts_pipeline.vits_model)
+                        if media_type == "wav":
+                            yield wave_header_chunk(sample_rate=sr)
+                            media_type = "raw"
+                        yield pack_audio(BytesIO(), chunk, sr, media_type).getvalue()
+                        if first_chunk_at is None:
+                            first_chunk_at = time.perf_counter()
+                        audio_samples += len(chunk)
+                        output_sr = sr
+                finally:
+                    # 客户端断开时也在锁内结束推理生成器
+                    with tts_lock:
+                        tts_generator.close()
+                record_stream_metrics(started, first_chunk_at, audio_samples, output_sr, lock_wait)
 
             # _media_type = f"audio/{media_type}" if not (streaming_mode and media_type in ["wav", "raw"]) else f"audio/x-{media_type}"
             return StreamingResponse(
                 streaming_generator(
-                    tts_generator,
+                    req,
                     media_type,
                 ),
                 media_type=f"audio/{media_type}",
             )
 
         else:
-            sr, audio_data = next(tts_generator)
+            if return_fragment:
+                sr, audio_data = await batch_scheduler.run_exclusive(lambda: next(tts_pipeline.run(req)))
+            else:
+                # 非流式请求交给调度器, 与同参数的并发请求合并推理
+                sr, audio_data = await batch_scheduler.submit(req)
             audio_data = pack_audio(BytesIO(), audio_data, sr, media_type).getvalue()
             return Response(audio_data, media_type=f"audio/{media_type}")
     except Exception as e:
@@ -387,6 +528,34 @@ async def control(command: str = None):
     handle_control(command)
 
 
+@APP.get("/batch_stats")
+async def batch_stats():
+    return JSONResponse(status_code=200, content=batch_scheduler.get_stats())
+
+
+@APP.get("/prompt_cache_stats")
+async def prompt_cache_stats():
+    return JSONResponse(status_code=200, content=tts_pipeline.get_prompt_cache_stats())
+
+
+@APP.get("/stream_stats")
+async def stream_stats():
+    recent = list(stream_metrics)
+    ttfbs = [m["ttfb"] for m in recent if m["ttfb"] is not None]
+    rtfs = [m["rtf"] for m in recent if m["rtf"] is not None]
+    lock_waits = [m["lock_wait"] for m in recent]
+    return JSONResponse(
+        status_code=200,
+        content={
+            "requests": len(recent),
+            "avg_ttfb": round(sum(ttfbs) / len(ttfbs), 3) if ttfbs else None,
+            "avg_rtf": round(sum(rtfs) / len(rtfs), 3) if rtfs else None,
+            "avg_lock_wait": round(sum(lock_waits) / len(lock_waits), 3) if lock_waits else None,
+            "recent": recent,
+        },
+    )
+
+
 @APP.get("/tts")
 async def tts_get_endpoint(
     text: str = None,
@@ -407,6 +576,7 @@ async def tts_get_endpoint(
     seed: int = -1,
     media_type: str = "wav",
     streaming_mode: bool = False,
+    stream_chunk_size: int = None,
     parallel_infer: bool = True,
     repetition_penalty: float = 1.35,
     sample_steps: int = 32,
@@ -431,6 +601,7 @@ async def tts_get_endpoint(
         "seed": seed,
         "media_type": media_type,
         "streaming_mode": streaming_mode,
+        "stream_chunk_size": stream_chunk_size,
         "parallel_infer": parallel_infer,
         "repetition_penalty": float(repetition_penalty),
         "sample_steps": int(sample_steps),
@@ -448,7 +619,7 @@ async def tts_post_endpoint(request: TTS_Request):
 @APP.get("/set_refer_audio")
 async def set_refer_aduio(refer_audio_path: str = None):
     try:
-        tts_pipeline.set_ref_audio(refer_audio_path)
+        await batch_scheduler.run_exclusive(tts_pipeline.set_ref_audio, refer_audio_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "set refer audio failed", "Exception": str(e)})
     return JSONResponse(status_code=200, content={"message": "success"})
@@ -478,11 +649,13 @@ async def set_gpt_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "gpt weight path is required"})
-        tts_pipeline.init_t2s_weights(weights_path)
+        await batch_scheduler.run_exclusive(tts_pipeline.init_t2s_weights, weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change gpt weight failed", "Exception": str(e)})
 
-    return JSONResponse(status_code=200, content={"message": "success"})
+    return JSONResponse(
+        status_code=200, content={"message": "success", "inference_backend": tts_pipeline.configs.inference_backend}
+    )
 
 
 @APP.get("/set_sovits_weights")
@@ -490,10 +663,12 @@ async def set_sovits_weights(weights_path: str = None):
     try:
         if weights_path in ["", None]:
             return JSONResponse(status_code=400, content={"message": "sovits weight path is required"})
-        tts_pipeline.init_vits_weights(weights_path)
+        await batch_scheduler.run_exclusive(tts_pipeline.init_vits_weights, weights_path)
     except Exception as e:
         return JSONResponse(status_code=400, content={"message": "change sovits weight failed", "Exception": str(e)})
-    return JSONResponse(status_code=200, content={"message": "success"})
+    return JSONResponse(
+        status_code=200, content={"message": "success", "inference_backend": tts_pipeline.configs.inference_backend}
+    )
 
 
 if __name__ == "__main__":
@@ -105,8 +105,10 @@ except ImportError as e:
     print(f"⚠️ 情緒識別模組未載入: {e}")
 
 try:
-    from routes.asr import asr_bp
+    from routes.asr import asr_bp, init_asr_socketio_events
     app.register_blueprint(asr_bp)
+    if socketio:
+        init_asr_socketio_events(socketio)
     optional_modules.append("ASR語音識別")
 except ImportError as e:
     print(f"⚠️ ASR語音識別模組未載入: {e}")
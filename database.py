@@ -1,12 +1,17 @@
 import sqlite3
 import datetime
+import json
 import uuid
 import bcrypt
 from config import DATABASE
+from db_pool import get_connection
+
+# 資料庫結構版本（PRAGMA user_version），升版時於 init_db 執行遷移
+SCHEMA_VERSION = 1
 
 def init_db():
     """初始化資料庫結構"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 建立用戶表
@@ -137,6 +142,53 @@ def init_db():
     )
     ''')
     
+    # 智慧語音關懷索引（待處理排程查詢、關懷記錄查詢）
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_voice_care_schedules_status_time
+    ON voice_care_schedules (status, scheduled_time)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_voice_care_records_schedule
+    ON voice_care_records (schedule_id)
+    ''')
+    cursor.execute('''
+    CREATE INDEX IF NOT EXISTS idx_voice_care_records_sent_at
+    ON voice_care_records (sent_at)
+    ''')
+    
+    # 智慧語音關懷統計彙總表，寫入排程與記錄時增量維護
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_care_status_counts (
+        status TEXT PRIMARY KEY,
+        schedule_count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_care_language_counts (
+        language TEXT PRIMARY KEY,
+        record_count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS voice_care_daily_stats (
+        stat_date TEXT PRIMARY KEY,
+        sent_count INTEGER NOT NULL DEFAULT 0,
+        completed_count INTEGER NOT NULL DEFAULT 0,
+        failed_count INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+    
+    conn.commit()
+    
+    # 結構遷移
+    cursor.execute('PRAGMA user_version')
+    version = cursor.fetchone()[0]
+    if version < 1:
+        # 既有資料回填語音關懷彙總表
+        rebuild_voice_care_stats(cursor)
+    if version < SCHEMA_VERSION:
+        cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+    
     conn.commit()
     
     # 初始化基本角色和權限
@@ -145,6 +197,84 @@ def init_db():
     conn.commit()
     conn.close()
 
+def voice_care_record_language(audio_file_path):
+    """由關懷記錄的音頻文件 JSON（語言 → 路徑）判斷發送語言"""
+    try:
+        languages = set(json.loads(audio_file_path or '{}'))
+    except (ValueError, TypeError):
+        return 'unknown'
+    if {'mandarin', 'minan'} <= languages:
+        return 'both'
+    if len(languages) == 1:
+        return languages.pop()
+    return 'unknown'
+
+def apply_voice_care_status_delta(cursor, old_status, new_status, changed_at=None):
+    """
+    排程狀態改變時更新彙總表（與排程寫入在同一交易中呼叫）
+    
+    Args:
+        old_status: 原狀態（新建排程為 None）
+        new_status: 新狀態
+        changed_at: 改變時間（ISO 格式，預設為現在），決定計入哪一天的完成/失敗數
+    """
+    if old_status == new_status:
+        return
+    if old_status is not None:
+        cursor.execute('''
+        UPDATE voice_care_status_counts SET schedule_count = schedule_count - 1
+        WHERE status = ?
+        ''', (old_status,))
+    cursor.execute('''
+    INSERT INTO voice_care_status_counts (status, schedule_count) VALUES (?, 1)
+    ON CONFLICT(status) DO UPDATE SET schedule_count = schedule_count + 1
+    ''', (new_status,))
+    
+    if new_status in ('completed', 'failed'):
+        stat_date = (changed_at or datetime.datetime.now().isoformat())[:10]
+        column = 'completed_count' if new_status == 'completed' else 'failed_count'
+        cursor.execute(f'''
+        INSERT INTO voice_care_daily_stats (stat_date, {column}) VALUES (?, 1)
+        ON CONFLICT(stat_date) DO UPDATE SET {column} = {column} + 1
+        ''', (stat_date,))
+
+def apply_voice_care_record_delta(cursor, audio_file_path, sent_at):
+    """新增關懷記錄時更新語言分布與每日發送數（與記錄寫入在同一交易中呼叫）"""
+    cursor.execute('''
+    INSERT INTO voice_care_language_counts (language, record_count) VALUES (?, 1)
+    ON CONFLICT(language) DO UPDATE SET record_count = record_count + 1
+    ''', (voice_care_record_language(audio_file_path),))
+    cursor.execute('''
+    INSERT INTO voice_care_daily_stats (stat_date, sent_count) VALUES (?, 1)
+    ON CONFLICT(stat_date) DO UPDATE SET sent_count = sent_count + 1
+    ''', (sent_at[:10],))
+
+def rebuild_voice_care_stats(cursor):
+    """由排程與記錄重新計算語音關懷彙總表（遷移或以 SQL 直接修改資料後使用）"""
+    cursor.execute('DELETE FROM voice_care_status_counts')
+    cursor.execute('DELETE FROM voice_care_language_counts')
+    cursor.execute('DELETE FROM voice_care_daily_stats')
+    
+    cursor.execute('''
+    INSERT INTO voice_care_status_counts (status, schedule_count)
+    SELECT COALESCE(status, 'pending'), COUNT(*) FROM voice_care_schedules
+    GROUP BY COALESCE(status, 'pending')
+    ''')
+    
+    # 完成/失敗日期以排程最後更新時間計
+    cursor.execute('''
+    INSERT INTO voice_care_daily_stats (stat_date, completed_count, failed_count)
+    SELECT substr(updated_at, 1, 10),
+           SUM(status = 'completed'), SUM(status = 'failed')
+    FROM voice_care_schedules
+    WHERE status IN ('completed', 'failed') AND updated_at IS NOT NULL
+    GROUP BY substr(updated_at, 1, 10)
+    ''')
+    
+    cursor.execute('SELECT audio_file_path, sent_at FROM voice_care_records')
+    for audio_file_path, sent_at in cursor.fetchall():
+        apply_voice_care_record_delta(cursor, audio_file_path, sent_at or datetime.datetime.now().isoformat())
+
 def init_default_roles_and_permissions(cursor):
     """初始化預設角色和權限"""
     now = datetime.datetime.now().isoformat()
@@ -235,7 +365,7 @@ def init_default_roles_and_permissions(cursor):
 # 用戶管理相關函數
 def get_user_by_username(username):
     """根據用戶名獲取用戶"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -247,7 +377,7 @@ def get_user_by_username(username):
 
 def get_user_by_id(user_id):
     """根據ID獲取用戶"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -259,7 +389,7 @@ def get_user_by_id(user_id):
 
 def get_user_permissions(user_id):
     """獲取用戶的所有權限"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -278,7 +408,7 @@ def get_user_permissions(user_id):
 
 def get_user_roles(user_id):
     """獲取用戶的所有角色"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -300,7 +430,7 @@ def verify_password(password, password_hash):
 
 def create_user(username, email, password, full_name='', role_name='staff'):
     """創建新用戶"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     try:
@@ -348,7 +478,7 @@ def create_user(username, email, password, full_name='', role_name='staff'):
 
 def get_paginated_results(query, params, page, size):
     """分頁查詢結果輔助函數"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -378,7 +508,7 @@ def get_paginated_results(query, params, page, size):
 # 客服專員資料庫操作
 def get_staff_by_id(staff_id):
     """根據ID獲取客服專員信息"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -391,7 +521,7 @@ def get_staff_by_id(staff_id):
 
 def get_staff_by_code(code):
     """根據代號獲取客服專員信息"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -404,7 +534,7 @@ def get_staff_by_code(code):
 
 def create_staff(name, code, phone='', email='', description=''):
     """創建新客服專員"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 檢查代號是否已存在
@@ -441,7 +571,7 @@ def create_staff(name, code, phone='', email='', description=''):
 
 def update_staff(staff_id, name, code, phone='', email='', status='active', description=''):
     """更新客服專員信息"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 檢查要更新的專員是否存在
@@ -487,7 +617,7 @@ def update_staff(staff_id, name, code, phone='', email='', status='active', desc
 
 def delete_staff(staff_id):
     """刪除客服專員"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 檢查要刪除的專員是否存在
@@ -519,7 +649,7 @@ def delete_staff(staff_id):
 # 音頻記錄資料庫操作
 def get_audio_by_id(audio_id):
     """根據 ID 獲取音頻記錄"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     conn.row_factory = sqlite3.Row
     cursor = conn.cursor()
     
@@ -538,7 +668,7 @@ def get_audio_by_id(audio_id):
 
 def create_audio(name, staff_id, file_path, duration=0, file_size='', description=''):
     """創建音頻記錄"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 生成新 ID 和時間戳
@@ -557,7 +687,7 @@ def create_audio(name, staff_id, file_path, duration=0, file_size='', descriptio
 
 def delete_audio(audio_id):
     """刪除音頻記錄"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 獲取檔案路徑以便刪除實際檔案
@@ -579,7 +709,7 @@ def delete_audio(audio_id):
 
 def update_audio(audio_id, name, staff_id=None, status='active', description=''):
     """更新音頻記錄"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     # 檢查音頻記錄是否存在
@@ -606,7 +736,7 @@ def update_audio(audio_id, name, staff_id=None, status='active', description='')
 
 def update_audio_file_path(audio_id, new_path):
     """更新音頻檔案路徑"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     cursor.execute('UPDATE audio SET file_path = ? WHERE id = ?', [new_path, audio_id])
@@ -618,7 +748,7 @@ def update_audio_file_path(audio_id, new_path):
 def update_audio_file_info(audio_id, duration, file_size):
     """更新音頻文件的時長和大小信息"""
     try:
-        conn = sqlite3.connect(DATABASE)
+        conn = get_connection(DATABASE)
         cursor = conn.cursor()
         
         # 更新時間戳
@@ -640,7 +770,7 @@ def update_audio_file_info(audio_id, duration, file_size):
 # 語音模型相關函數
 def save_voice_model_info(staff_code, original_audio_path, processed_audio_path, reference_text, model_status='processing', quality_score=None):
     """保存語音模型信息"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     try:
@@ -665,7 +795,7 @@ def save_voice_model_info(staff_code, original_audio_path, processed_audio_path,
 
 def get_voice_model_by_staff(staff_code):
     """根據客服代號獲取語音模型"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     try:
@@ -687,7 +817,7 @@ def get_voice_model_by_staff(staff_code):
 
 def get_all_voice_models():
     """獲取所有語音模型"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     try:
@@ -710,7 +840,7 @@ def get_all_voice_models():
 
 def save_voice_generation_record(staff_code, input_text, generated_audio_path, sentiment=None):
     """保存語音生成記錄"""
-    conn = sqlite3.connect(DATABASE)
+    conn = get_connection(DATABASE)
     cursor = conn.cursor()
     
     try:
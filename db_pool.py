@@ -0,0 +1,224 @@
+"""
+SQLite 連線池
+各執行緒共用的連線池：每個資料庫檔案最多保留 POOL_SIZE 條閒置長連線（WAL 模式 + 調校過的 PRAGMA），
+避免每次查詢都重新 connect / close，並讓連線上的 prepared statement 快取得以重用。
+Flask-SocketIO 的 threading 模式每個請求都在新的執行緒處理，連線因此不綁定執行緒：
+借出時取出一條閒置連線，最後一個借用者歸還時放回連線池，同一時間只有一個執行緒使用。
+
+使用方式與 sqlite3.connect 相同：
+
+    conn = get_connection(db_path)
+    conn.row_factory = sqlite3.Row
+    cursor = conn.cursor()
+    ...
+    conn.commit()
+    conn.close()   # 歸還連線，不會真正關閉
+"""
+
+import os
+import queue
+import sqlite3
+import threading
+
+# 是否啟用連線池（效能測試可關閉以比較前後差異）
+POOL_ENABLED = True
+
+# 每條連線的 prepared statement 快取數量（sqlite3 預設 128）
+CACHED_STATEMENTS = 256
+
+# 取得寫入鎖的等待秒數
+BUSY_TIMEOUT = 30.0
+
+# 每個資料庫檔案保留的閒置連線數上限（同時借出超過此數時另開連線，歸還時關閉多餘的連線）
+POOL_SIZE = 8
+
+# 連線建立後套用的 PRAGMA
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',      # 讀寫不互相阻塞
+    'PRAGMA synchronous=NORMAL',    # WAL 模式下安全且大幅減少 fsync
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-16000',     # 約 16MB 頁快取
+    'PRAGMA mmap_size=134217728',   # 128MB 記憶體映射
+)
+
+# 閒置連線：{資料庫路徑: LifoQueue}，後進先出讓最近使用（頁快取較熱）的連線優先被取出
+_idle = {}
+_idle_lock = threading.Lock()
+
+# 各執行緒借出中的連線：{資料庫路徑: _PoolEntry}，同一執行緒巢狀借用時共用
+_local = threading.local()
+
+
+class _PoolEntry:
+    """借出中的一條實體連線與借出計數"""
+
+    __slots__ = ('conn', 'depth', 'key', 'borrowed')
+
+    def __init__(self, conn, key, borrowed):
+        self.conn = conn
+        self.depth = 0
+        self.key = key
+        self.borrowed = borrowed
+
+
+class PooledConnection:
+    """連線池借出的連線代理
+
+    介面與 sqlite3.Connection 相容；row_factory 只作用於此次借出，
+    close() 只歸還連線，最後一個借用者歸還時會回滾未提交的交易。
+
+    同一執行緒巢狀借用（外層尚未 close() 時再次 get_connection）取得的是同一條實體連線，
+    共用同一個交易：內層的寫入會隨外層一起提交或回滾。
+    外層已有未提交的交易時，內層呼叫 commit() / rollback() 會拋出 sqlite3.ProgrammingError，
+    避免提交外層寫到一半的資料或丟棄外層的寫入；此時應由外層提交，或先提交後再呼叫會寫入的函式。
+    """
+
+    def __init__(self, entry):
+        self._entry = entry
+        self._closed = False
+        self.row_factory = None
+        if entry.depth == 0 and entry.conn.in_transaction:
+            entry.conn.rollback()
+        # 巢狀借用時外層是否已有未提交的交易
+        self._outer_transaction = entry.depth > 0 and entry.conn.in_transaction
+        entry.depth += 1
+
+    def _check_outer_transaction(self, action):
+        if self._outer_transaction and self._entry.conn.in_transaction:
+            raise sqlite3.ProgrammingError(f"巢狀借用的連線不可{action}外層未提交的交易")
+
+    def cursor(self):
+        cursor = self._entry.conn.cursor()
+        cursor.row_factory = self.row_factory
+        return cursor
+
+    def execute(self, sql, parameters=()):
+        cursor = self.cursor()
+        cursor.execute(sql, parameters)
+        return cursor
+
+    def executemany(self, sql, seq_of_parameters):
+        cursor = self.cursor()
+        cursor.executemany(sql, seq_of_parameters)
+        return cursor
+
+    def executescript(self, sql_script):
+        cursor = self.cursor()
+        cursor.executescript(sql_script)
+        return cursor
+
+    def commit(self):
+        self._check_outer_transaction('提交')
+        self._entry.conn.commit()
+
+    def rollback(self):
+        self._check_outer_transaction('回滾')
+        self._entry.conn.rollback()
+
+    def close(self):
+        """歸還連線"""
+        if self._closed:
+            return
+        self._closed = True
+        entry = self._entry
+        entry.depth -= 1
+        if entry.depth <= 0:
+            entry.depth = 0
+            _release(entry)
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self._entry.conn, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # 與 sqlite3.Connection 相同：離開 with 區塊時提交或回滾，但不關閉
+        if exc_type is None:
+            self.commit()
+        elif not (self._outer_transaction and self._entry.conn.in_transaction):
+            self.rollback()
+        # 外層的交易由外層決定回滾，保留原本的例外
+        return False
+
+    def __del__(self):
+        # 例外路徑上未呼叫 close() 的連線，在代理被回收時自動歸還
+        try:
+            self.close()
+        except Exception:
+            pass
+
+
+def _idle_queue(key):
+    with _idle_lock:
+        idle = _idle.get(key)
+        if idle is None:
+            idle = _idle[key] = queue.LifoQueue(maxsize=POOL_SIZE)
+        return idle
+
+
+def _release(entry):
+    """最後一個借用者歸還：回滾未提交的交易後放回連線池，連線池已滿時關閉"""
+    if entry.borrowed.get(entry.key) is entry:
+        del entry.borrowed[entry.key]
+    try:
+        if entry.conn.in_transaction:
+            entry.conn.rollback()
+        _idle_queue(entry.key).put_nowait(entry.conn)
+    except (queue.Full, sqlite3.Error):
+        try:
+            entry.conn.close()
+        except sqlite3.Error:
+            pass
+
+
+def _open_connection(db_path):
+    """建立並設定一條新的實體連線（可在不同執行緒間交替使用）"""
+    conn = sqlite3.connect(
+        db_path,
+        timeout=BUSY_TIMEOUT,
+        cached_statements=CACHED_STATEMENTS,
+        check_same_thread=False
+    )
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+
+def get_connection(db_path):
+    """借出資料庫連線（目前執行緒已借出同一資料庫時共用該連線）"""
+    if not POOL_ENABLED:
+        return sqlite3.connect(db_path)
+
+    key = os.path.abspath(db_path) if db_path != ':memory:' else db_path
+    borrowed = getattr(_local, 'borrowed', None)
+    if borrowed is None:
+        borrowed = _local.borrowed = {}
+
+    entry = borrowed.get(key)
+    if entry is None:
+        try:
+            conn = _idle_queue(key).get_nowait()
+        except queue.Empty:
+            conn = _open_connection(db_path)
+        entry = borrowed[key] = _PoolEntry(conn, key, borrowed)
+
+    return PooledConnection(entry)
+
+
+def close_idle_connections():
+    """關閉連線池中所有閒置的連線（借出中的連線歸還後仍會放回連線池）"""
+    with _idle_lock:
+        queues = list(_idle.values())
+    for idle in queues:
+        while True:
+            try:
+                conn = idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
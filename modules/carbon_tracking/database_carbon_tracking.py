@@ -2,18 +2,57 @@
 碳排放追蹤系統 - 資料庫模型
 """
 
+import base64
+import os
 import sqlite3
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timedelta
 from pathlib import Path
 
+from db_pool import get_connection
+
+# 資料庫結構版本（PRAGMA user_version），升版時於 init_database 執行遷移
+SCHEMA_VERSION = 3
+
+# 批次匯入每次寫入的筆數
+BULK_CHUNK_SIZE = 5000
+
+# 訪視記錄必要欄位
+VISIT_REQUIRED_FIELDS = (
+    'visit_date', 'social_worker_id', 'social_worker_name', 'elder_id',
+    'visit_type', 'transport_type', 'distance'
+)
+
+# 訪視記錄查詢回傳的欄位
+VISIT_COLUMNS = [
+    'id', 'visit_date', 'social_worker_id', 'social_worker_name',
+    'elder_id', 'elder_name', 'visit_type', 'transport_type', 'distance',
+    'travel_time', 'start_location', 'end_location', 'carbon_emission', 'notes'
+]
+
+# 關鍵字全文索引（FTS5 trigram）：以三字元為單位索引，中文姓名與工號皆可做子字串搜尋
+# 少於三個字元的關鍵字無法使用 trigram 索引，改以 LIKE 比對
+FTS_MIN_KEYWORD_LENGTH = 3
+
+# 全文索引涵蓋的欄位
+VISIT_SEARCH_COLUMNS = ('social_worker_name', 'social_worker_id', 'elder_id', 'elder_name')
+
+# 排放係數快取：{資料庫絕對路徑: {'version', 'checked_at', 'coefficients'}}
+# 係數表異動時由觸發器遞增 cache_versions 中的版本號，快取每隔一段時間比對一次
+COEFFICIENT_CHECK_INTERVAL = 5.0
+_coefficient_cache = {}
+_coefficient_cache_lock = threading.Lock()
+
 class CarbonTrackingDB:
     def __init__(self, db_path='data/databases/carbon_tracking.db'):
         self.db_path = db_path
+        self.fts_enabled = False
         self.init_database()
     
     def get_connection(self):
-        """取得資料庫連線"""
-        return sqlite3.connect(self.db_path)
+        """取得資料庫連線（由連線池提供）"""
+        return get_connection(self.db_path)
     
     def init_database(self):
         """初始化資料庫表格"""
@@ -112,6 +151,76 @@ class CarbonTrackingDB:
         )
         ''')
         
+        # 7. 每日訪視彙總表（依社工、交通工具），寫入時增量維護
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_visit_rollups (
+            visit_date DATE NOT NULL,
+            social_worker_id TEXT NOT NULL,
+            transport_type TEXT NOT NULL,
+            visit_count INTEGER NOT NULL DEFAULT 0,
+            total_distance REAL NOT NULL DEFAULT 0,
+            total_carbon_emission REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (visit_date, social_worker_id, transport_type)
+        )
+        ''')
+        
+        # 8. 每月長者訪視次數表（用於維護月度服務長者數）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS monthly_elder_visits (
+            year INTEGER NOT NULL,
+            month INTEGER NOT NULL,
+            elder_id TEXT NOT NULL,
+            visit_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (year, month, elder_id)
+        )
+        ''')
+        
+        # 創建索引
+        indexes = [
+            # 訪視列表：ORDER BY visit_date DESC, id DESC 與日期範圍篩選
+            "CREATE INDEX IF NOT EXISTS idx_visit_records_visit_date ON visit_records(visit_date)",
+            # 依社工 / 交通工具篩選後按日期排序
+            "CREATE INDEX IF NOT EXISTS idx_visit_records_worker_date ON visit_records(social_worker_id, visit_date)",
+            "CREATE INDEX IF NOT EXISTS idx_visit_records_transport_date ON visit_records(transport_type, visit_date)",
+            # 依工號查詢最近使用的社工姓名
+            "CREATE INDEX IF NOT EXISTS idx_visit_records_worker_created ON visit_records(social_worker_id, created_at)",
+            "CREATE INDEX IF NOT EXISTS idx_ai_care_records_care_date ON ai_care_records(care_date)",
+            # 分頁總筆數：依社工 / 交通工具加總每日彙總
+            "CREATE INDEX IF NOT EXISTS idx_daily_visit_rollups_worker ON daily_visit_rollups(social_worker_id, visit_date)",
+            "CREATE INDEX IF NOT EXISTS idx_daily_visit_rollups_transport ON daily_visit_rollups(transport_type, visit_date)"
+        ]
+        
+        for index_sql in indexes:
+            cursor.execute(index_sql)
+        
+        # 9. 快取版本表（由觸發器維護）
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cache_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO cache_versions (name, version) VALUES ('emission_coefficients', 0)
+        ''')
+        
+        # 排放係數異動時遞增版本號，使各行程的係數快取失效
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS trg_emission_coefficients_{event.lower()}
+            AFTER {event} ON emission_coefficients
+            BEGIN
+                UPDATE cache_versions SET version = version + 1
+                WHERE name = 'emission_coefficients';
+            END
+            ''')
+        
+        # 10. 訪視記錄關鍵字全文索引
+        self.fts_enabled = self._init_visit_search_index(cursor)
+        
+        # 11. 彙總表同步觸發器
+        self._init_rollup_triggers(cursor)
+        
         # 插入預設排放係數
         cursor.execute('''
         INSERT OR IGNORE INTO emission_coefficients 
@@ -121,13 +230,210 @@ class CarbonTrackingDB:
         ('大眾運輸', 0.0295, 'kg CO2e/km', '環保署排放係數管理表6.0.4版')
         ''')
         
+        conn.commit()
+        
+        # 結構遷移
+        cursor.execute('PRAGMA user_version')
+        version = cursor.fetchone()[0]
+        if version < 3:
+            # 既有資料回填彙總表（v3 前彙總表只由 Python 寫入路徑維護，以 SQL 直接寫入的資料未計入）
+            self._rebuild_rollups(cursor)
+        if version < 2:
+            # 新索引建立後更新查詢規劃統計
+            cursor.execute('ANALYZE')
+        if version < SCHEMA_VERSION:
+            cursor.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        
         conn.commit()
         conn.close()
         
         print("✓ 資料庫初始化完成")
     
+    def _init_visit_search_index(self, cursor):
+        """建立訪視記錄的 FTS5 trigram 索引與同步觸發器，回傳是否可用
+        
+        索引為外部內容表（content=visit_records），只存索引不重複存放資料；
+        首次建立時由既有記錄回填。SQLite 未編譯 FTS5 或版本過舊（< 3.34）時回傳 False。
+        """
+        cursor.execute('''
+        SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'visit_records_fts'
+        ''')
+        exists = cursor.fetchone() is not None
+        
+        columns = ', '.join(VISIT_SEARCH_COLUMNS)
+        new_values = ', '.join(f'new.{column}' for column in VISIT_SEARCH_COLUMNS)
+        old_values = ', '.join(f'old.{column}' for column in VISIT_SEARCH_COLUMNS)
+        
+        try:
+            cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS visit_records_fts USING fts5(
+                {columns},
+                content='visit_records', content_rowid='id', tokenize='trigram'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            print(f"⚠️  全文索引不可用，關鍵字搜尋改用 LIKE: {e}")
+            return False
+        
+        # 批次匯入時於同一交易內暫停逐筆同步，寫入後再整批補建索引
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS search_index_state (
+            name TEXT PRIMARY KEY,
+            deferred INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO search_index_state (name, deferred) VALUES ('visit_records_fts', 0)
+        ''')
+        
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_visit_records_fts_insert
+        AFTER INSERT ON visit_records
+        WHEN (SELECT deferred FROM search_index_state WHERE name = 'visit_records_fts') = 0
+        BEGIN
+            INSERT INTO visit_records_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_visit_records_fts_delete
+        AFTER DELETE ON visit_records
+        BEGIN
+            INSERT INTO visit_records_fts (visit_records_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS trg_visit_records_fts_update
+        AFTER UPDATE OF {columns} ON visit_records
+        BEGIN
+            INSERT INTO visit_records_fts (visit_records_fts, rowid, {columns})
+            VALUES ('delete', old.id, {old_values});
+            INSERT INTO visit_records_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+        ''')
+        
+        if not exists:
+            cursor.execute("INSERT INTO visit_records_fts (visit_records_fts) VALUES ('rebuild')")
+        
+        return True
+    
+    def _init_rollup_triggers(self, cursor):
+        """建立彙總表同步觸發器
+        
+        visit_records / ai_care_records 的新增、修改、刪除由觸發器更新每日彙總、月度長者訪視次數與月度統計，
+        腳本直接以 SQL 寫入原始記錄時彙總表也保持一致。批次匯入時於同一交易內暫停，寫入後整批合併更新。
+        """
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            deferred INTEGER NOT NULL DEFAULT 0
+        )
+        ''')
+        cursor.execute('''
+        INSERT OR IGNORE INTO rollup_state (name, deferred) VALUES ('visit_rollups', 0)
+        ''')
+        
+        active = "(SELECT deferred FROM rollup_state WHERE name = 'visit_rollups') = 0"
+        rollup_columns = 'visit_date, social_worker_id, transport_type, elder_id, distance, carbon_emission'
+        triggers = [
+            ('trg_visit_records_rollup_insert', f'AFTER INSERT ON visit_records WHEN {active}',
+             self._visit_rollup_sql('new', 1)),
+            ('trg_visit_records_rollup_delete', f'AFTER DELETE ON visit_records WHEN {active}',
+             self._visit_rollup_sql('old', -1)),
+            ('trg_visit_records_rollup_update', f'AFTER UPDATE OF {rollup_columns} ON visit_records WHEN {active}',
+             self._visit_rollup_sql('old', -1) + self._visit_rollup_sql('new', 1)),
+            ('trg_ai_care_records_rollup_insert', 'AFTER INSERT ON ai_care_records',
+             self._ai_care_rollup_sql('new', 1)),
+            ('trg_ai_care_records_rollup_delete', 'AFTER DELETE ON ai_care_records',
+             self._ai_care_rollup_sql('old', -1)),
+            ('trg_ai_care_records_rollup_update', 'AFTER UPDATE OF care_date ON ai_care_records',
+             self._ai_care_rollup_sql('old', -1) + self._ai_care_rollup_sql('new', 1)),
+        ]
+        for name, event, body in triggers:
+            cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {name}
+            {event}
+            BEGIN
+            {body}
+            END
+            ''')
+    
+    @staticmethod
+    def _visit_rollup_sql(row, sign):
+        """觸發器內將一筆訪視記錄（row 為 new / old）加入（sign=1）或移除（sign=-1）彙總表的 SQL"""
+        year = f'CAST(substr({row}.visit_date, 1, 4) AS INTEGER)'
+        month = f'CAST(substr({row}.visit_date, 6, 2) AS INTEGER)'
+        distance = f'{sign} * COALESCE({row}.distance, 0)'
+        carbon_emission = f'{sign} * COALESCE({row}.carbon_emission, 0)'
+        # 長者當月訪視次數由 0 變 1（新增）或變為 0（移除）時調整服務長者數
+        elder_changed = 'visit_count = 1' if sign > 0 else 'visit_count <= 0'
+        
+        sql = f'''
+            INSERT INTO daily_visit_rollups
+            (visit_date, social_worker_id, transport_type, visit_count, total_distance, total_carbon_emission)
+            VALUES ({row}.visit_date, {row}.social_worker_id, {row}.transport_type, {sign},
+                    {distance}, {carbon_emission})
+            ON CONFLICT(visit_date, social_worker_id, transport_type) DO UPDATE SET
+                visit_count = visit_count + excluded.visit_count,
+                total_distance = total_distance + excluded.total_distance,
+                total_carbon_emission = total_carbon_emission + excluded.total_carbon_emission;
+            
+            INSERT INTO monthly_elder_visits (year, month, elder_id, visit_count)
+            VALUES ({year}, {month}, {row}.elder_id, {sign})
+            ON CONFLICT(year, month, elder_id) DO UPDATE SET
+                visit_count = visit_count + excluded.visit_count;
+            
+            INSERT INTO monthly_statistics
+            (year, month, total_elders, physical_visits, ai_care_count, total_distance, total_carbon_emission)
+            VALUES ({year}, {month},
+                    COALESCE((SELECT {sign} FROM monthly_elder_visits
+                              WHERE year = {year} AND month = {month} AND elder_id = {row}.elder_id
+                              AND {elder_changed}), 0),
+                    {sign}, 0, {distance}, {carbon_emission})
+            ON CONFLICT(year, month) DO UPDATE SET
+                total_elders = COALESCE(total_elders, 0) + excluded.total_elders,
+                physical_visits = COALESCE(physical_visits, 0) + excluded.physical_visits,
+                total_distance = COALESCE(total_distance, 0) + excluded.total_distance,
+                total_carbon_emission = COALESCE(total_carbon_emission, 0) + excluded.total_carbon_emission;
+        '''
+        if sign < 0:
+            sql += f'''
+            DELETE FROM daily_visit_rollups
+            WHERE visit_date = {row}.visit_date AND social_worker_id = {row}.social_worker_id
+            AND transport_type = {row}.transport_type AND visit_count <= 0;
+            
+            DELETE FROM monthly_elder_visits
+            WHERE year = {year} AND month = {month} AND elder_id = {row}.elder_id AND visit_count <= 0;
+        '''
+        return sql
+    
+    @staticmethod
+    def _ai_care_rollup_sql(row, sign):
+        """觸發器內將一筆AI關懷記錄加入（sign=1）或移除（sign=-1）月度統計的 SQL"""
+        return f'''
+            INSERT INTO monthly_statistics
+            (year, month, total_elders, physical_visits, ai_care_count, total_distance, total_carbon_emission)
+            VALUES (CAST(substr({row}.care_date, 1, 4) AS INTEGER), CAST(substr({row}.care_date, 6, 2) AS INTEGER),
+                    0, 0, {sign}, 0, 0)
+            ON CONFLICT(year, month) DO UPDATE SET
+                ai_care_count = COALESCE(ai_care_count, 0) + excluded.ai_care_count;
+        '''
+    
+    def rebuild_visit_search_index(self):
+        """由訪視記錄重建關鍵字全文索引"""
+        if not self.fts_enabled:
+            return
+        
+        conn = self.get_connection()
+        conn.execute("INSERT INTO visit_records_fts (visit_records_fts) VALUES ('rebuild')")
+        conn.commit()
+        conn.close()
+    
     def add_visit_record(self, data):
         """新增訪視記錄"""
+        # 寫入前驗證並補零（2024-3-5 → 2024-03-05），彙總表與日期區間查詢皆依此格式
+        visit_date = self._normalize_date(data['visit_date'])
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -144,7 +450,7 @@ class CarbonTrackingDB:
          end_location, carbon_emission, notes)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         ''', (
-            data['visit_date'],
+            visit_date,
             data['social_worker_id'],
             data['social_worker_name'],
             data['elder_id'],
@@ -158,13 +464,154 @@ class CarbonTrackingDB:
             carbon_emission,
             data.get('notes', '')
         ))
+        record_id = cursor.lastrowid
         
         conn.commit()
-        record_id = cursor.lastrowid
         conn.close()
         
         return record_id
     
+    def add_visit_records_bulk(self, records, chunk_size=BULK_CHUNK_SIZE):
+        """批次新增訪視記錄
+        
+        records 可為任意可疊代的字典序列（JSON 陣列或 csv.DictReader），逐筆驗證，
+        每 chunk_size 筆一次計算碳排放並以 executemany 寫入，全部在同一交易中提交。
+        回傳 {'inserted', 'failed', 'errors': [{'row', 'error'}]}，row 從 1 起算。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        inserted = 0
+        errors = []
+        chunk = []
+        
+        try:
+            # 逐筆觸發彙總表更新成本高，改為每批合併更新（暫停狀態在同一交易內，其他連線不受影響）
+            cursor.execute('''
+            UPDATE rollup_state SET deferred = 1 WHERE name = 'visit_rollups'
+            ''')
+            
+            # 逐筆觸發全文索引同步成本高，改為全部寫入後一次補建
+            if self.fts_enabled:
+                cursor.execute('SELECT COALESCE(MAX(id), 0) FROM visit_records')
+                last_id = cursor.fetchone()[0]
+                cursor.execute('''
+                UPDATE search_index_state SET deferred = 1 WHERE name = 'visit_records_fts'
+                ''')
+            
+            for row_number, data in enumerate(records, 1):
+                try:
+                    chunk.append(self._validate_visit_row(data))
+                except ValueError as e:
+                    errors.append({'row': row_number, 'error': str(e)})
+                    continue
+                
+                if len(chunk) >= chunk_size:
+                    inserted += self._insert_visit_chunk(cursor, chunk)
+                    chunk = []
+            
+            if chunk:
+                inserted += self._insert_visit_chunk(cursor, chunk)
+            
+            if self.fts_enabled:
+                columns = ', '.join(VISIT_SEARCH_COLUMNS)
+                cursor.execute(f'''
+                INSERT INTO visit_records_fts (rowid, {columns})
+                SELECT id, {columns} FROM visit_records WHERE id > ?
+                ''', (last_id,))
+                cursor.execute('''
+                UPDATE search_index_state SET deferred = 0 WHERE name = 'visit_records_fts'
+                ''')
+            
+            cursor.execute('''
+            UPDATE rollup_state SET deferred = 0 WHERE name = 'visit_rollups'
+            ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+        
+        return {
+            'inserted': inserted,
+            'failed': len(errors),
+            'errors': errors
+        }
+    
+    @staticmethod
+    def _normalize_date(value):
+        """驗證日期並轉為補零的 YYYY-MM-DD（接受 2024-3-5），格式錯誤時拋出 ValueError"""
+        try:
+            return datetime.strptime(str(value).strip(), '%Y-%m-%d').strftime('%Y-%m-%d')
+        except ValueError:
+            raise ValueError(f"日期格式錯誤: {value}")
+    
+    @staticmethod
+    def _validate_visit_row(data):
+        """驗證並正規化一筆訪視資料，回傳 INSERT 用的欄位值（不含碳排放）"""
+        if not isinstance(data, dict):
+            raise ValueError('資料格式錯誤')
+        
+        values = {}
+        for field in VISIT_REQUIRED_FIELDS:
+            value = data.get(field)
+            if value is None or str(value).strip() == '':
+                raise ValueError(f'缺少必要欄位: {field}')
+            values[field] = str(value).strip()
+        
+        values['visit_date'] = CarbonTrackingDB._normalize_date(values['visit_date'])
+        
+        try:
+            distance = float(values['distance'])
+        except ValueError:
+            raise ValueError(f"里程格式錯誤: {values['distance']}")
+        if distance < 0:
+            raise ValueError(f'里程不可為負數: {distance}')
+        
+        travel_time = data.get('travel_time')
+        if travel_time is None or str(travel_time).strip() == '':
+            travel_time = None
+        else:
+            try:
+                travel_time = int(float(travel_time))
+            except ValueError:
+                raise ValueError(f'行駛時間格式錯誤: {travel_time}')
+        
+        return (
+            values['visit_date'],
+            values['social_worker_id'],
+            values['social_worker_name'],
+            values['elder_id'],
+            str(data.get('elder_name') or '').strip(),
+            values['visit_type'],
+            values['transport_type'],
+            distance,
+            travel_time,
+            str(data.get('start_location') or '').strip(),
+            str(data.get('end_location') or '').strip(),
+            str(data.get('notes') or '').strip()
+        )
+    
+    def _insert_visit_chunk(self, cursor, chunk):
+        """計算一批資料的碳排放、寫入並更新彙總表（不提交）"""
+        emissions = self.calculate_carbon_emission_batch(
+            [row[6] for row in chunk],
+            [row[7] for row in chunk]
+        )
+        
+        rows = [row[:11] + (emission, row[11]) for row, emission in zip(chunk, emissions)]
+        cursor.executemany('''
+        INSERT INTO visit_records 
+        (visit_date, social_worker_id, social_worker_name, elder_id, elder_name,
+         visit_type, transport_type, distance, travel_time, start_location, 
+         end_location, carbon_emission, notes)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+        
+        self._apply_visit_deltas_bulk(cursor, rows)
+        return len(rows)
+    
     def get_visit_record_by_id(self, record_id):
         """取得單筆訪視記錄"""
         conn = self.get_connection()
@@ -190,6 +637,8 @@ class CarbonTrackingDB:
     
     def update_visit_record(self, record_id, data):
         """更新訪視記錄"""
+        visit_date = self._normalize_date(data['visit_date'])
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -207,7 +656,7 @@ class CarbonTrackingDB:
             carbon_emission = ?, notes = ?
         WHERE id = ?
         ''', (
-            data['visit_date'],
+            visit_date,
             data['social_worker_id'],
             data['social_worker_name'],
             data['elder_id'],
@@ -222,9 +671,9 @@ class CarbonTrackingDB:
             data.get('notes', ''),
             record_id
         ))
+        affected_rows = cursor.rowcount
         
         conn.commit()
-        affected_rows = cursor.rowcount
         conn.close()
         
         return affected_rows > 0
@@ -235,77 +684,192 @@ class CarbonTrackingDB:
         cursor = conn.cursor()
         
         cursor.execute('DELETE FROM visit_records WHERE id = ?', (record_id,))
+        affected_rows = cursor.rowcount
         
         conn.commit()
-        affected_rows = cursor.rowcount
         conn.close()
         
         return affected_rows > 0
     
-    def search_visit_records(self, keyword='', worker_id='', start_date='', end_date='', transport_type='', limit=1000):
-        """搜尋和篩選訪視記錄"""
+    def search_visit_records(self, keyword='', worker_id='', start_date='', end_date='', transport_type='', limit=1000,
+                             after=None):
+        """搜尋和篩選訪視記錄
+        
+        after 為上一頁最後一筆記錄的分頁游標（encode_visit_cursor），
+        以 (visit_date, id) 鍵集分頁，翻頁成本不隨頁數增加。
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # 建立 SQL 查詢
-        query = '''
-        SELECT id, visit_date, social_worker_id, social_worker_name, 
-               elder_id, elder_name, visit_type, transport_type, distance,
-               travel_time, start_location, end_location, carbon_emission, notes
+        where_clause, params = self._build_visit_filter(
+            keyword, worker_id, start_date, end_date, transport_type
+        )
+        
+        # 鍵集分頁：排序為 visit_date DESC, id DESC，下一頁即小於游標的記錄
+        if after:
+            cursor_date, cursor_id = self.decode_visit_cursor(after)
+            where_clause += ' AND (visit_date, id) < (?, ?)'
+            params.extend([cursor_date, cursor_id])
+        
+        # 排序和限制
+        query = f'''
+        SELECT {', '.join(VISIT_COLUMNS)}
         FROM visit_records
-        WHERE 1=1
+        WHERE {where_clause}
+        ORDER BY visit_date DESC, id DESC LIMIT ?
         '''
+        params.append(limit)
+        
+        cursor.execute(query, params)
+        
+        results = [dict(zip(VISIT_COLUMNS, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        
+        return results
+    
+    def count_visit_records(self, keyword='', worker_id='', start_date='', end_date='', transport_type=''):
+        """由每日彙總表計算符合條件的記錄數，回傳 (筆數, 是否為估計值)
+        
+        彙總表不含關鍵字資訊，有關鍵字時回傳的是不含關鍵字條件的上限估計。
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
+        # 無篩選條件時直接加總月度統計
+        if not (worker_id or start_date or end_date or transport_type):
+            cursor.execute('SELECT SUM(physical_visits) FROM monthly_statistics')
+            total = cursor.fetchone()[0] or 0
+            conn.close()
+            return total, bool(keyword)
+        
+        conditions = ['1=1']
         params = []
+        if worker_id:
+            conditions.append('social_worker_id = ?')
+            params.append(worker_id)
+        if start_date:
+            conditions.append('visit_date >= ?')
+            params.append(start_date)
+        if end_date:
+            conditions.append('visit_date <= ?')
+            params.append(end_date)
+        if transport_type:
+            conditions.append('transport_type = ?')
+            params.append(transport_type)
         
-        # 關鍵字搜尋（社工姓名、工號、長者編號）
-        if keyword:
-            query += ''' AND (
-                social_worker_name LIKE ? OR 
-                social_worker_id LIKE ? OR 
-                elder_id LIKE ? OR
-                elder_name LIKE ?
-            )'''
-            keyword_param = f'%{keyword}%'
-            params.extend([keyword_param, keyword_param, keyword_param, keyword_param])
+        cursor.execute(f'''
+        SELECT SUM(visit_count) FROM daily_visit_rollups
+        WHERE {' AND '.join(conditions)}
+        ''', params)
+        total = cursor.fetchone()[0] or 0
+        
+        conn.close()
+        return total, bool(keyword)
+    
+    @staticmethod
+    def encode_visit_cursor(record):
+        """由記錄的 (visit_date, id) 產生分頁游標"""
+        raw = f"{record['visit_date']}|{record['id']}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_visit_cursor(token):
+        """解析分頁游標，格式錯誤時拋出 ValueError"""
+        try:
+            raw = base64.urlsafe_b64decode(token.encode('ascii')).decode('utf-8')
+            visit_date, record_id = raw.rsplit('|', 1)
+            return visit_date, int(record_id)
+        except (ValueError, UnicodeError) as e:
+            raise ValueError(f'分頁游標格式錯誤: {token}') from e
+    
+    def iter_visit_records(self, keyword='', worker_id='', start_date='', end_date='', transport_type='',
+                           batch_size=1000):
+        """逐批讀取符合條件的所有訪視記錄（不限筆數，供串流匯出使用）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        where_clause, params = self._build_visit_filter(
+            keyword, worker_id, start_date, end_date, transport_type
+        )
+        
+        try:
+            cursor.execute(f'''
+            SELECT {', '.join(VISIT_COLUMNS)}
+            FROM visit_records
+            WHERE {where_clause}
+            ORDER BY visit_date DESC, id DESC
+            ''', params)
+            
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                for row in rows:
+                    yield dict(zip(VISIT_COLUMNS, row))
+        finally:
+            cursor.close()
+            conn.close()
+    
+    def _build_visit_filter(self, keyword='', worker_id='', start_date='', end_date='', transport_type=''):
+        """建立訪視記錄篩選條件，回傳 (WHERE 子句, 參數列表)"""
+        conditions = ['1=1']
+        params = []
+        
+        # 關鍵字搜尋（社工姓名、工號、長者編號、長者姓名）
+        if keyword and self.fts_enabled and len(keyword) >= FTS_MIN_KEYWORD_LENGTH:
+            # 以片語查詢做子字串比對，雙引號需跳脫
+            conditions.append('id IN (SELECT rowid FROM visit_records_fts WHERE visit_records_fts MATCH ?)')
+            params.append('"' + keyword.replace('"', '""') + '"')
+        elif keyword:
+            conditions.append('(' + ' OR '.join(
+                f'{column} LIKE ?' for column in VISIT_SEARCH_COLUMNS
+            ) + ')')
+            params.extend([f'%{keyword}%'] * len(VISIT_SEARCH_COLUMNS))
         
         # 社工篩選
         if worker_id:
-            query += ' AND social_worker_id = ?'
+            conditions.append('social_worker_id = ?')
             params.append(worker_id)
         
         # 日期範圍篩選
         if start_date:
-            query += ' AND visit_date >= ?'
+            conditions.append('visit_date >= ?')
             params.append(start_date)
         
         if end_date:
-            query += ' AND visit_date <= ?'
+            conditions.append('visit_date <= ?')
             params.append(end_date)
         
         # 交通工具篩選
         if transport_type:
-            query += ' AND transport_type = ?'
+            conditions.append('transport_type = ?')
             params.append(transport_type)
         
-        # 排序和限制
-        query += ' ORDER BY visit_date DESC, id DESC LIMIT ?'
-        params.append(limit)
-        
-        cursor.execute(query, params)
-        
-        columns = ['id', 'visit_date', 'social_worker_id', 'social_worker_name',
-                  'elder_id', 'elder_name', 'visit_type', 'transport_type', 'distance',
-                  'travel_time', 'start_location', 'end_location', 'carbon_emission', 'notes']
+        return ' AND '.join(conditions), params
+    
+    def get_social_worker_name(self, worker_id):
+        """取得工號最近使用的社工姓名"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        cursor.execute('''
+        SELECT social_worker_name
+        FROM visit_records
+        WHERE social_worker_id = ?
+        ORDER BY created_at DESC
+        LIMIT 1
+        ''', (worker_id,))
         
+        row = cursor.fetchone()
         conn.close()
         
-        return results
+        return row[0] if row else None
     
     def add_ai_care_record(self, data):
         """新增AI關懷記錄"""
+        care_date = self._normalize_date(data['care_date'])
+        
         conn = self.get_connection()
         cursor = conn.cursor()
         
@@ -314,76 +878,162 @@ class CarbonTrackingDB:
         (care_date, elder_id, care_type, duration, result, notes)
         VALUES (?, ?, ?, ?, ?, ?)
         ''', (
-            data['care_date'],
+            care_date,
             data['elder_id'],
             data['care_type'],
             data.get('duration'),
             data.get('result', ''),
             data.get('notes', '')
         ))
+        record_id = cursor.lastrowid
         
         conn.commit()
-        record_id = cursor.lastrowid
         conn.close()
         
         return record_id
     
     def calculate_carbon_emission(self, transport_type, distance):
         """計算碳排放量"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        coefficient = self.get_emission_coefficients().get(transport_type)
         
-        cursor.execute(
-            'SELECT coefficient FROM emission_coefficients WHERE transport_type = ?',
-            (transport_type,)
-        )
-        result = cursor.fetchone()
-        conn.close()
-        
-        if result:
-            coefficient = result[0]
+        if coefficient is not None:
             return distance * coefficient
         return 0
     
-    def get_monthly_statistics(self, year, month):
-        """取得月度統計"""
+    def calculate_carbon_emission_batch(self, transport_types, distances):
+        """批次計算碳排放量，回傳與輸入等長的列表"""
+        coefficients = self.get_emission_coefficients()
+        
+        return [
+            distance * coefficients[transport_type] if transport_type in coefficients else 0
+            for transport_type, distance in zip(transport_types, distances)
+        ]
+    
+    def get_emission_coefficients(self):
+        """取得排放係數 {交通工具: 係數}（快取，請勿修改回傳的字典）"""
+        key = os.path.abspath(self.db_path)
+        now = time.monotonic()
+        
+        entry = _coefficient_cache.get(key)
+        if entry and now - entry['checked_at'] < COEFFICIENT_CHECK_INTERVAL:
+            return entry['coefficients']
+        
+        with _coefficient_cache_lock:
+            entry = _coefficient_cache.get(key)
+            if entry and now - entry['checked_at'] < COEFFICIENT_CHECK_INTERVAL:
+                return entry['coefficients']
+            
+            conn = self.get_connection()
+            cursor = conn.cursor()
+            
+            cursor.execute(
+                "SELECT version FROM cache_versions WHERE name = 'emission_coefficients'"
+            )
+            version = cursor.fetchone()[0]
+            
+            if entry and entry['version'] == version:
+                coefficients = entry['coefficients']
+            else:
+                cursor.execute('SELECT transport_type, coefficient FROM emission_coefficients')
+                coefficients = dict(cursor.fetchall())
+            
+            conn.close()
+            
+            _coefficient_cache[key] = {
+                'version': version,
+                'checked_at': now,
+                'coefficients': coefficients
+            }
+            return coefficients
+    
+    def invalidate_emission_coefficients(self):
+        """清除排放係數快取，下次使用時重新載入"""
+        with _coefficient_cache_lock:
+            _coefficient_cache.pop(os.path.abspath(self.db_path), None)
+    
+    def update_emission_coefficient(self, transport_type, coefficient, unit='kg CO2e/km', source=None):
+        """新增或更新排放係數"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        # 訪視統計
         cursor.execute('''
-        SELECT 
-            COUNT(*) as visit_count,
-            SUM(distance) as total_distance,
-            SUM(carbon_emission) as total_emission
-        FROM visit_records
-        WHERE strftime('%Y', visit_date) = ? 
-        AND strftime('%m', visit_date) = ?
-        ''', (str(year), f'{month:02d}'))
+        INSERT INTO emission_coefficients (transport_type, coefficient, unit, source, updated_at)
+        VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+        ON CONFLICT(transport_type) DO UPDATE SET
+            coefficient = excluded.coefficient,
+            unit = excluded.unit,
+            source = COALESCE(excluded.source, source),
+            updated_at = excluded.updated_at
+        ''', (transport_type, coefficient, unit, source))
         
-        visit_stats = cursor.fetchone()
+        conn.commit()
+        conn.close()
         
-        # AI關懷統計
-        cursor.execute('''
-        SELECT COUNT(*) as ai_care_count
-        FROM ai_care_records
-        WHERE strftime('%Y', care_date) = ? 
-        AND strftime('%m', care_date) = ?
-        ''', (str(year), f'{month:02d}'))
+        self.invalidate_emission_coefficients()
+    
+    def get_monthly_statistics(self, year, month):
+        """取得月度統計（讀取增量維護的月度彙總表）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
-        ai_stats = cursor.fetchone()
+        cursor.execute('''
+        SELECT physical_visits, total_distance, total_carbon_emission, ai_care_count
+        FROM monthly_statistics
+        WHERE year = ? AND month = ?
+        ''', (year, month))
         
+        row = cursor.fetchone() or (0, 0, 0, 0)
         conn.close()
         
         return {
             'year': year,
             'month': month,
-            'physical_visits': visit_stats[0] or 0,
-            'total_distance': visit_stats[1] or 0,
-            'total_carbon_emission': visit_stats[2] or 0,
-            'ai_care_count': ai_stats[0] or 0
+            'physical_visits': row[0] or 0,
+            'total_distance': row[1] or 0,
+            'total_carbon_emission': row[2] or 0,
+            'ai_care_count': row[3] or 0
         }
     
+    def get_period_statistics(self, start_date, end_date):
+        """取得期間內逐月統計（一次讀取月度彙總表）"""
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT year, month, physical_visits, total_distance,
+               total_carbon_emission, ai_care_count
+        FROM monthly_statistics
+        WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+        ''', (start.year, start.month, end.year, end.month))
+        
+        rows = {(row[0], row[1]): row for row in cursor.fetchall()}
+        conn.close()
+        
+        # 依月份補齊沒有資料的月份
+        monthly_data = []
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            row = rows.get((year, month), (year, month, 0, 0, 0, 0))
+            monthly_data.append({
+                'year': year,
+                'month': month,
+                'physical_visits': row[2] or 0,
+                'total_distance': row[3] or 0,
+                'total_carbon_emission': row[4] or 0,
+                'ai_care_count': row[5] or 0
+            })
+            
+            # 移到下個月
+            if month == 12:
+                year, month = year + 1, 1
+            else:
+                month += 1
+        
+        return monthly_data
+    
     def get_all_visit_records(self, limit=100):
         """取得所有訪視記錄"""
         conn = self.get_connection()
@@ -391,7 +1041,7 @@ class CarbonTrackingDB:
         
         cursor.execute('''
         SELECT * FROM visit_records 
-        ORDER BY visit_date DESC 
+        ORDER BY visit_date DESC, id DESC 
         LIMIT ?
         ''', (limit,))
         
@@ -402,31 +1052,224 @@ class CarbonTrackingDB:
         return records
     
     def get_statistics_summary(self, start_date, end_date):
-        """取得統計摘要"""
+        """取得統計摘要（讀取每日彙總表）"""
         conn = self.get_connection()
         cursor = conn.cursor()
         
         cursor.execute('''
         SELECT 
-            COUNT(*) as total_visits,
-            COUNT(DISTINCT elder_id) as unique_elders,
-            SUM(distance) as total_distance,
-            SUM(carbon_emission) as total_emission,
-            AVG(distance) as avg_distance
-        FROM visit_records
+            SUM(visit_count) as total_visits,
+            SUM(total_distance) as total_distance,
+            SUM(total_carbon_emission) as total_emission
+        FROM daily_visit_rollups
         WHERE visit_date BETWEEN ? AND ?
         ''', (start_date, end_date))
         
         result = cursor.fetchone()
+        total_visits = result[0] or 0
+        total_distance = result[1] or 0
+        
+        # 服務長者數：整月區間可由月度長者表計算，否則回到原始記錄
+        month_range = self._month_range(start_date, end_date)
+        if month_range:
+            cursor.execute('''
+            SELECT COUNT(DISTINCT elder_id)
+            FROM monthly_elder_visits
+            WHERE (year, month) BETWEEN (?, ?) AND (?, ?)
+            ''', month_range)
+        else:
+            cursor.execute('''
+            SELECT COUNT(DISTINCT elder_id)
+            FROM visit_records
+            WHERE visit_date BETWEEN ? AND ?
+            ''', (start_date, end_date))
+        unique_elders = cursor.fetchone()[0]
+        
         conn.close()
         
         return {
-            'total_visits': result[0] or 0,
-            'unique_elders': result[1] or 0,
-            'total_distance': result[2] or 0,
-            'total_emission': result[3] or 0,
-            'avg_distance': result[4] or 0
+            'total_visits': total_visits,
+            'unique_elders': unique_elders or 0,
+            'total_distance': total_distance,
+            'total_emission': result[2] or 0,
+            'avg_distance': total_distance / total_visits if total_visits else 0
         }
+    
+    def get_transport_distribution(self, start_date, end_date):
+        """取得交通工具分布（讀取每日彙總表）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        SELECT 
+            transport_type,
+            SUM(visit_count) as count,
+            SUM(total_distance) as total_distance,
+            SUM(total_carbon_emission) as total_emission
+        FROM daily_visit_rollups
+        WHERE visit_date BETWEEN ? AND ?
+        GROUP BY transport_type
+        HAVING SUM(visit_count) > 0
+        ''', (start_date, end_date))
+        
+        columns = ['transport_type', 'count', 'total_distance', 'total_emission']
+        results = [dict(zip(columns, row)) for row in cursor.fetchall()]
+        
+        conn.close()
+        return results
+    
+    # ==================== 彙總表維護 ====================
+    
+    @staticmethod
+    def _year_month(date_str):
+        """從 YYYY-MM-DD 取出 (年, 月)；修正前寫入、未補零的舊資料（2024-3-5）也可解析"""
+        year, month = date_str.split('-')[:2]
+        return int(year), int(month)
+    
+    @staticmethod
+    def _month_range(start_date, end_date):
+        """若區間恰為整月（月初到月底），回傳 (起始年, 起始月, 結束年, 結束月)，否則回傳 None"""
+        try:
+            start = datetime.strptime(start_date, '%Y-%m-%d')
+            end = datetime.strptime(end_date, '%Y-%m-%d')
+        except (TypeError, ValueError):
+            return None
+        
+        if start.day != 1 or (end + timedelta(days=1)).day != 1 or start > end:
+            return None
+        return start.year, start.month, end.year, end.month
+    
+    def _apply_visit_deltas_bulk(self, cursor, rows):
+        """將一批新增的訪視記錄（visit_records 欄位順序）合併後套用到彙總表（寫入時須暫停彙總表觸發器）"""
+        daily = {}
+        monthly = {}
+        elders = {}
+        
+        for row in rows:
+            visit_date, worker_id, elder_id = row[0], row[1], row[3]
+            transport_type, distance, carbon_emission = row[6], row[7] or 0, row[11] or 0
+            year_month = self._year_month(visit_date)
+            
+            totals = daily.setdefault((visit_date, worker_id, transport_type), [0, 0, 0])
+            totals[0] += 1
+            totals[1] += distance
+            totals[2] += carbon_emission
+            
+            totals = monthly.setdefault(year_month, [0, 0, 0])
+            totals[0] += 1
+            totals[1] += distance
+            totals[2] += carbon_emission
+            
+            elder_key = year_month + (elder_id,)
+            elders[elder_key] = elders.get(elder_key, 0) + 1
+        
+        cursor.executemany('''
+        INSERT INTO daily_visit_rollups
+        (visit_date, social_worker_id, transport_type, visit_count, total_distance, total_carbon_emission)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(visit_date, social_worker_id, transport_type) DO UPDATE SET
+            visit_count = visit_count + excluded.visit_count,
+            total_distance = total_distance + excluded.total_distance,
+            total_carbon_emission = total_carbon_emission + excluded.total_carbon_emission
+        ''', [key + tuple(totals) for key, totals in daily.items()])
+        
+        cursor.executemany('''
+        INSERT INTO monthly_elder_visits (year, month, elder_id, visit_count)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(year, month, elder_id) DO UPDATE SET
+            visit_count = visit_count + excluded.visit_count
+        ''', [key + (count,) for key, count in elders.items()])
+        
+        for (year, month), (visits, distance, carbon_emission) in monthly.items():
+            self._upsert_monthly_statistics(
+                cursor, year, month,
+                physical_visits=visits,
+                total_distance=distance,
+                total_carbon_emission=carbon_emission
+            )
+            # 服務長者數直接由月度長者表重新計算
+            cursor.execute('''
+            UPDATE monthly_statistics
+            SET total_elders = (
+                SELECT COUNT(*) FROM monthly_elder_visits WHERE year = ? AND month = ?
+            )
+            WHERE year = ? AND month = ?
+            ''', (year, month, year, month))
+    
+    def _upsert_monthly_statistics(self, cursor, year, month, total_elders=0, physical_visits=0,
+                                   ai_care_count=0, total_distance=0, total_carbon_emission=0):
+        """累加月度統計"""
+        cursor.execute('''
+        INSERT INTO monthly_statistics
+        (year, month, total_elders, physical_visits, ai_care_count, total_distance, total_carbon_emission)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(year, month) DO UPDATE SET
+            total_elders = COALESCE(total_elders, 0) + excluded.total_elders,
+            physical_visits = COALESCE(physical_visits, 0) + excluded.physical_visits,
+            ai_care_count = COALESCE(ai_care_count, 0) + excluded.ai_care_count,
+            total_distance = COALESCE(total_distance, 0) + excluded.total_distance,
+            total_carbon_emission = COALESCE(total_carbon_emission, 0) + excluded.total_carbon_emission
+        ''', (year, month, total_elders, physical_visits, ai_care_count,
+              total_distance, total_carbon_emission))
+    
+    def _rebuild_rollups(self, cursor):
+        """由原始記錄重新計算所有彙總表"""
+        cursor.execute('DELETE FROM daily_visit_rollups')
+        cursor.execute('DELETE FROM monthly_elder_visits')
+        cursor.execute('DELETE FROM monthly_statistics')
+        
+        cursor.execute('''
+        INSERT INTO daily_visit_rollups
+        (visit_date, social_worker_id, transport_type, visit_count, total_distance, total_carbon_emission)
+        SELECT visit_date, social_worker_id, transport_type,
+               COUNT(*), SUM(distance), SUM(COALESCE(carbon_emission, 0))
+        FROM visit_records
+        GROUP BY visit_date, social_worker_id, transport_type
+        ''')
+        
+        cursor.execute('''
+        INSERT INTO monthly_elder_visits (year, month, elder_id, visit_count)
+        SELECT CAST(substr(visit_date, 1, 4) AS INTEGER),
+               CAST(substr(visit_date, 6, 2) AS INTEGER),
+               elder_id, COUNT(*)
+        FROM visit_records
+        GROUP BY 1, 2, elder_id
+        ''')
+        
+        cursor.execute('''
+        INSERT INTO monthly_statistics
+        (year, month, total_elders, physical_visits, ai_care_count, total_distance, total_carbon_emission)
+        SELECT year, month, SUM(elders), SUM(visits), SUM(ai_care), SUM(distance), SUM(emission)
+        FROM (
+            SELECT CAST(substr(visit_date, 1, 4) AS INTEGER) AS year,
+                   CAST(substr(visit_date, 6, 2) AS INTEGER) AS month,
+                   0 AS elders, SUM(visit_count) AS visits, 0 AS ai_care,
+                   SUM(total_distance) AS distance, SUM(total_carbon_emission) AS emission
+            FROM daily_visit_rollups
+            GROUP BY 1, 2
+            UNION ALL
+            SELECT year, month, COUNT(*), 0, 0, 0, 0
+            FROM monthly_elder_visits
+            GROUP BY year, month
+            UNION ALL
+            SELECT CAST(substr(care_date, 1, 4) AS INTEGER),
+                   CAST(substr(care_date, 6, 2) AS INTEGER),
+                   0, 0, COUNT(*), 0, 0
+            FROM ai_care_records
+            GROUP BY 1, 2
+        )
+        GROUP BY year, month
+        ''')
+    
+    def rebuild_rollups(self):
+        """重新計算所有彙總表（彙總表由觸發器維護，用於暫停觸發器大量寫入後或修復資料）"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        self._rebuild_rollups(cursor)
+        
+        conn.commit()
+        conn.close()
 
 if __name__ == '__main__':
     # 測試資料庫
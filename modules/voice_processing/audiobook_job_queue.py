@@ -0,0 +1,304 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+AI廣播劇章節預先生成佇列
+以 SQLite 保存待生成的章節（每個書籍、章節、方言只有一筆工作），
+背景工作執行緒依優先順序生成；服務重新啟動後未完成的工作會繼續執行
+"""
+
+import datetime
+import json
+import os
+import threading
+from typing import Dict, List, Optional
+
+from db_pool import get_connection
+
+DEFAULT_DB_PATH = os.path.join('data', 'databases', 'audiobook_jobs.db')
+
+# 播放章節時預先生成的後續章節數
+PREFETCH_CHAPTERS = int(os.getenv('AUDIOBOOK_PREFETCH_CHAPTERS', '2'))
+
+# 同時生成的章節數（每個章節內部另以多個分段並行合成）
+JOB_WORKERS = int(os.getenv('AUDIOBOOK_JOB_WORKERS', '1'))
+
+# 執行中的工作超過此分鐘數未完成（程序中斷），視為可重新執行
+JOB_LEASE_MINUTES = 30
+
+# 每個工作最多嘗試次數
+MAX_ATTEMPTS = 3
+
+# 優先順序：正在收聽的章節先於預先生成的章節
+PRIORITY_PLAY = 10
+PRIORITY_PREFETCH = 0
+
+# 方言對應的語音角色（Ethan=普通話, Roy=閩南語）
+DEFAULT_VOICE = 'Roy'
+DIALECT_VOICES = {'mandarin': 'Ethan', 'minan': 'Roy'}
+
+
+class AudiobookJobQueue:
+    """
+    章節生成工作佇列
+
+    特點:
+    - (book_id, chapter_id, dialect) 為主鍵，同一章節重複加入只會提高優先順序，不會重複生成
+    - 工作狀態保存在 SQLite，多個程序共用同一佇列時以 BEGIN IMMEDIATE 認領，同一工作只有一個執行者
+    - 失敗的工作重新排隊，超過 MAX_ATTEMPTS 次後標記為 failed（再次收聽時重新加入）
+    """
+
+    def __init__(self, service, db_path: str = DEFAULT_DB_PATH, workers: int = JOB_WORKERS):
+        """
+        初始化佇列
+
+        Args:
+            service: QwenAudiobookService 實例（各工作執行緒共用，分段限流狀態也一併共用）
+            db_path: 佇列資料庫路徑
+            workers: 工作執行緒數量
+        """
+        self.service = service
+        self.db_path = db_path
+        self.workers = max(1, int(workers))
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        self._threads: List[threading.Thread] = []
+        self._initialized = False
+
+    # ==================== 資料庫 ====================
+
+    def _init_db(self):
+        with self._lock:
+            if self._initialized:
+                return
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = get_connection(self.db_path)
+            try:
+                conn.execute('''
+                CREATE TABLE IF NOT EXISTS audiobook_jobs (
+                    book_id TEXT NOT NULL,
+                    chapter_id TEXT NOT NULL,
+                    dialect TEXT NOT NULL,
+                    output_file TEXT NOT NULL,
+                    status TEXT NOT NULL DEFAULT 'queued',
+                    priority INTEGER NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    error TEXT,
+                    lease_until TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (book_id, chapter_id, dialect)
+                )
+                ''')
+                conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_audiobook_jobs_claim
+                ON audiobook_jobs (status, priority DESC, created_at)
+                ''')
+                conn.commit()
+            finally:
+                conn.close()
+            self._initialized = True
+
+    def start(self):
+        """啟動背景工作執行緒（重複呼叫無作用）"""
+        self._init_db()
+        with self._lock:
+            if self._threads:
+                return
+            self._stopped.clear()
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"audiobook-job-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        """停止背景工作執行緒（執行中的章節生成完成後結束）"""
+        self._stopped.set()
+        self._wakeup.set()
+        with self._lock:
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+    # ==================== 加入工作 ====================
+
+    def enqueue(self, book_id: str, chapter_id: str, dialect: str, output_file: str,
+                priority: int = PRIORITY_PREFETCH) -> str:
+        """
+        加入章節生成工作（已在佇列中的工作只提高優先順序）
+
+        Returns:
+            str: 工作狀態（queued / running / done）
+        """
+        self.start()
+        now = datetime.datetime.now().isoformat()
+        conn = get_connection(self.db_path)
+        try:
+            # 已完成但音頻文件不存在（被刪除）或先前失敗的工作重新排隊
+            requeue = not os.path.exists(output_file)
+            conn.execute('''
+            INSERT INTO audiobook_jobs
+            (book_id, chapter_id, dialect, output_file, status, priority, created_at, updated_at)
+            VALUES (?, ?, ?, ?, 'queued', ?, ?, ?)
+            ON CONFLICT(book_id, chapter_id, dialect) DO UPDATE SET
+                priority = MAX(priority, excluded.priority),
+                output_file = excluded.output_file,
+                status = CASE
+                    WHEN status = 'failed' OR (status = 'done' AND ?) THEN 'queued'
+                    ELSE status END,
+                attempts = CASE
+                    WHEN status = 'failed' OR (status = 'done' AND ?) THEN 0
+                    ELSE attempts END,
+                updated_at = excluded.updated_at
+            ''', (book_id, chapter_id, dialect, output_file, priority, now, now, requeue, requeue))
+            conn.commit()
+            row = conn.execute('''
+            SELECT status FROM audiobook_jobs WHERE book_id = ? AND chapter_id = ? AND dialect = ?
+            ''', (book_id, chapter_id, dialect)).fetchone()
+        finally:
+            conn.close()
+
+        self._wakeup.set()
+        return row[0]
+
+    def prefetch_next(self, book_id: str, chapter_id: str, dialect: str, audiobooks_dir: str,
+                      count: int = PREFETCH_CHAPTERS) -> List[str]:
+        """
+        依書籍元數據的章節順序，預先生成 chapter_id 之後的 count 個章節
+
+        Returns:
+            List[str]: 加入佇列的章節ID
+        """
+        if count <= 0 or not self.service.is_available():
+            return []
+
+        metadata_file = os.path.join(audiobooks_dir, book_id, 'metadata.json')
+        try:
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                chapter_ids = [chapter['id'] for chapter in json.load(f).get('chapters', [])]
+        except (OSError, ValueError, KeyError):
+            return []
+        if chapter_id not in chapter_ids:
+            return []
+
+        index = chapter_ids.index(chapter_id)
+        queued = []
+        for next_id in chapter_ids[index + 1:index + 1 + count]:
+            output_file = os.path.join(audiobooks_dir, book_id, 'audio', dialect, f"{next_id}.wav")
+            if not os.path.exists(output_file):
+                self.enqueue(book_id, next_id, dialect, output_file, PRIORITY_PREFETCH)
+                queued.append(next_id)
+        return queued
+
+    # ==================== 查詢 ====================
+
+    def get_job(self, book_id: str, chapter_id: str, dialect: str) -> Optional[Dict]:
+        """取得工作資訊"""
+        self._init_db()
+        conn = get_connection(self.db_path)
+        try:
+            cursor = conn.execute('''
+            SELECT * FROM audiobook_jobs WHERE book_id = ? AND chapter_id = ? AND dialect = ?
+            ''', (book_id, chapter_id, dialect))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([column[0] for column in cursor.description], row))
+        finally:
+            conn.close()
+
+    def is_pending(self, book_id: str, chapter_id: str, dialect: str) -> bool:
+        """工作是否仍在排隊或執行中"""
+        job = self.get_job(book_id, chapter_id, dialect)
+        return job is not None and job['status'] in ('queued', 'running')
+
+    def get_stats(self) -> Dict:
+        """各狀態的工作數量"""
+        self._init_db()
+        conn = get_connection(self.db_path)
+        try:
+            rows = conn.execute('SELECT status, COUNT(*) FROM audiobook_jobs GROUP BY status').fetchall()
+        finally:
+            conn.close()
+        stats = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        stats.update({status: count for status, count in rows})
+        stats['workers'] = self.workers
+        return stats
+
+    # ==================== 工作執行緒 ====================
+
+    def _claim(self) -> Optional[Dict]:
+        """認領優先順序最高的工作（含租約逾時的執行中工作）"""
+        now = datetime.datetime.now()
+        conn = get_connection(self.db_path)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            cursor = conn.execute('''
+            SELECT book_id, chapter_id, dialect, output_file, attempts
+            FROM audiobook_jobs
+            WHERE status = 'queued' OR (status = 'running' AND lease_until < ?)
+            ORDER BY priority DESC, created_at
+            LIMIT 1
+            ''', (now.isoformat(),))
+            row = cursor.fetchone()
+            if row is None:
+                conn.rollback()
+                return None
+
+            job = dict(zip([column[0] for column in cursor.description], row))
+            job['attempts'] += 1
+            lease_until = now + datetime.timedelta(minutes=JOB_LEASE_MINUTES)
+            conn.execute('''
+            UPDATE audiobook_jobs
+            SET status = 'running', attempts = ?, lease_until = ?, updated_at = ?
+            WHERE book_id = ? AND chapter_id = ? AND dialect = ?
+            ''', (job['attempts'], lease_until.isoformat(), now.isoformat(),
+                  job['book_id'], job['chapter_id'], job['dialect']))
+            conn.commit()
+            return job
+        finally:
+            conn.close()
+
+    def _finish(self, job: Dict, error: Optional[Exception] = None):
+        if error is None:
+            status = 'done'
+        else:
+            status = 'failed' if job['attempts'] >= MAX_ATTEMPTS else 'queued'
+        conn = get_connection(self.db_path)
+        try:
+            conn.execute('''
+            UPDATE audiobook_jobs
+            SET status = ?, error = ?, lease_until = NULL, updated_at = ?
+            WHERE book_id = ? AND chapter_id = ? AND dialect = ?
+            ''', (status, str(error) if error else None, datetime.datetime.now().isoformat(),
+                  job['book_id'], job['chapter_id'], job['dialect']))
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                job = self._claim()
+            except Exception as e:
+                print(f"⚠️ 讀取廣播劇生成佇列失敗: {e}")
+                job = None
+
+            if job is None:
+                # 其他程序加入的工作以輪詢發現
+                self._wakeup.wait(timeout=5)
+                self._wakeup.clear()
+                continue
+
+            voice = DIALECT_VOICES.get(job['dialect'], DEFAULT_VOICE)
+            print(f"生成廣播劇章節: {job['book_id']}/{job['chapter_id']} ({job['dialect']})")
+            try:
+                os.makedirs(os.path.dirname(job['output_file']), exist_ok=True)
+                self.service.generate_chapter_audio(job['book_id'], job['chapter_id'], voice, job['output_file'])
+                self._finish(job)
+            except Exception as e:
+                print(f"⚠️ 廣播劇章節生成失敗（第 {job['attempts']} 次）: {e}")
+                try:
+                    self._finish(job, e)
+                except Exception as db_error:
+                    print(f"⚠️ 更新廣播劇生成佇列失敗: {db_error}")
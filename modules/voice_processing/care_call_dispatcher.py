@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+語音關懷分段派送模組
+將待處理排程依「天氣查詢 → LLM 訊息 → TTS 語音」三個階段交給各自的工作執行緒處理，
+階段之間以有界佇列銜接：下游忙碌時上游自動等待，不會一次認領過多排程
+"""
+
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+# 通知工作執行緒結束的標記
+_STOP = object()
+
+
+class _Stage:
+    """派送階段：固定數量的工作執行緒從輸入佇列取出工作，處理後交給下一階段"""
+
+    def __init__(self, name: str, handler: Callable[[Dict], None], workers: int, queue_size: int):
+        self.name = name
+        self.handler = handler
+        self.workers = max(1, int(workers))
+        self.queue = queue.Queue(maxsize=max(1, int(queue_size)))
+
+        # 統計
+        self.finished_workers = 0
+        self.processed = 0
+        self.failed = 0
+        self.busy_time = 0.0
+        self.max_queued = 0
+
+    def put(self, item):
+        """放入工作（佇列已滿時阻塞，形成背壓）"""
+        self.queue.put(item)
+        self.max_queued = max(self.max_queued, self.queue.qsize())
+
+    def get_stats(self) -> Dict:
+        done = self.processed + self.failed
+        return {
+            'workers': self.workers,
+            'processed': self.processed,
+            'failed': self.failed,
+            'busy_seconds': round(self.busy_time, 3),
+            'avg_seconds': round(self.busy_time / done, 3) if done else 0.0,
+            'max_queued': self.max_queued
+        }
+
+
+class CareCallDispatcher:
+    """
+    語音關懷分段並行派送器
+
+    特點:
+    - 天氣、LLM、TTS 各自有獨立的工作執行緒數量，互不佔用
+    - 排程在進入管線前才以 VoiceCareService.claim_schedule 原子認領，
+      認領失敗（已被其他派送程序處理）的排程直接略過，同一通關懷不會重複發送
+    - 每個階段開始時以 refresh_claim 延長認領，排隊較久的排程不會逾時被重新認領；
+      排程已不在處理中（被取消或已由其他派送程序完成）時略過
+    - 任一階段失敗時排程標記為 failed，不影響其他排程
+    """
+
+    def __init__(self, service, weather_workers: int = 4, llm_workers: int = 8,
+                 tts_workers: int = 2, queue_size: int = 16):
+        """
+        初始化派送器
+
+        Args:
+            service: VoiceCareService 實例
+            weather_workers: 天氣查詢工作執行緒數量
+            llm_workers: LLM 訊息生成工作執行緒數量
+            tts_workers: TTS 語音合成工作執行緒數量
+            queue_size: 每個階段輸入佇列的容量
+        """
+        self.service = service
+        self.weather_workers = weather_workers
+        self.llm_workers = llm_workers
+        self.tts_workers = tts_workers
+        self.queue_size = queue_size
+
+    # ==================== 階段處理 ====================
+
+    def _weather_stage(self, job: Dict):
+        job['weather_info'] = self.service.get_schedule_weather(job['schedule'])
+
+    def _llm_stage(self, job: Dict):
+        job['message'] = self.service.generate_care_message(job['schedule'], job['weather_info'])
+
+    def _tts_stage(self, job: Dict):
+        schedule_id = job['schedule']['id']
+        audio_files = self.service.synthesize_care_audio(schedule_id, job['message'], job['language'])
+        job['record_id'] = self.service.complete_care_call(
+            schedule_id, job['message'], job['weather_info'], audio_files
+        )
+
+    # ==================== 派送 ====================
+
+    def dispatch(self, schedules: List[Dict], language: str = 'mandarin') -> Dict:
+        """
+        派送一批排程並等待全部完成
+
+        Args:
+            schedules (List[Dict]): 待處理排程
+            language (str): 'mandarin', 'minan', 或 'both'
+
+        Returns:
+            Dict: 處理結果與各階段統計
+        """
+        stages = [
+            _Stage('weather', self._weather_stage, self.weather_workers, self.queue_size),
+            _Stage('llm', self._llm_stage, self.llm_workers, self.queue_size),
+            _Stage('tts', self._tts_stage, self.tts_workers, self.queue_size)
+        ]
+        results = {
+            'total': len(schedules),
+            'claimed': 0,
+            'skipped': 0,
+            'success': 0,
+            'failed': 0,
+            'details': []
+        }
+        lock = threading.Lock()
+        start_time = time.perf_counter()
+
+        threads = []
+        for index, stage in enumerate(stages):
+            for i in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._work,
+                    args=(stages, index, results, lock),
+                    name=f"care-{stage.name}-{i}",
+                    daemon=True
+                )
+                thread.start()
+                threads.append(thread)
+
+        try:
+            for schedule in schedules:
+                try:
+                    claimed = self.service.claim_schedule(schedule['id'])
+                except Exception as e:
+                    logger.error(f"認領排程失敗 {schedule['id']}: {e}")
+                    claimed = False
+                if not claimed:
+                    with lock:
+                        results['skipped'] += 1
+                        results['details'].append({
+                            'schedule_id': schedule['id'],
+                            'status': 'skipped'
+                        })
+                    continue
+                with lock:
+                    results['claimed'] += 1
+                stages[0].put({'schedule': schedule, 'language': language})
+        finally:
+            for _ in range(stages[0].workers):
+                stages[0].put(_STOP)
+            for thread in threads:
+                thread.join()
+
+        elapsed = time.perf_counter() - start_time
+        results['elapsed_seconds'] = round(elapsed, 3)
+        results['throughput_per_minute'] = round(results['success'] / elapsed * 60, 2) if elapsed > 0 else 0.0
+        results['stages'] = {stage.name: stage.get_stats() for stage in stages}
+        logger.info(
+            f"語音關懷派送完成: 成功 {results['success']}, 失敗 {results['failed']}, "
+            f"略過 {results['skipped']}, 耗時 {elapsed:.1f}s, "
+            f"每分鐘 {results['throughput_per_minute']} 通"
+        )
+        return results
+
+    def _work(self, stages: List[_Stage], index: int, results: Dict, lock: threading.Lock):
+        """工作執行緒：處理本階段工作，成功後交給下一階段"""
+        stage = stages[index]
+        next_stage = stages[index + 1] if index + 1 < len(stages) else None
+
+        while True:
+            job = stage.queue.get()
+            if job is _STOP:
+                break
+
+            if not self._refresh_claim(job, stage.name, results, lock):
+                continue
+
+            started = time.perf_counter()
+            try:
+                stage.handler(job)
+                error = None
+            except Exception as e:
+                error = e
+            with lock:
+                stage.busy_time += time.perf_counter() - started
+                if error is None:
+                    stage.processed += 1
+                else:
+                    stage.failed += 1
+
+            if error is not None:
+                self._fail(job, stage.name, error, results, lock)
+            elif next_stage is not None:
+                next_stage.put(job)
+            else:
+                with lock:
+                    results['success'] += 1
+                    results['details'].append({
+                        'schedule_id': job['schedule']['id'],
+                        'status': 'success',
+                        'record_id': job['record_id']
+                    })
+
+        # 本階段最後一個結束的工作執行緒負責通知下一階段結束
+        with lock:
+            stage.finished_workers += 1
+            last = stage.finished_workers == stage.workers
+        if last and next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.put(_STOP)
+
+    def _refresh_claim(self, job: Dict, stage_name: str, results: Dict, lock: threading.Lock) -> bool:
+        """階段開始前延長認領；排程已不在處理中時記為略過並返回 False"""
+        schedule_id = job['schedule']['id']
+        try:
+            if self.service.refresh_claim(schedule_id):
+                return True
+        except Exception as e:
+            # 無法延長認領時仍繼續處理，最多只是逾時後可能被重新認領
+            logger.error(f"延長排程認領失敗 {schedule_id}: {e}")
+            return True
+
+        logger.warning(f"語音關懷 {schedule_id} 在 {stage_name} 階段前已不在處理中，略過")
+        with lock:
+            results['skipped'] += 1
+            results['details'].append({
+                'schedule_id': schedule_id,
+                'status': 'skipped',
+                'stage': stage_name
+            })
+        return False
+
+    def _fail(self, job: Dict, stage_name: str, error: Exception, results: Dict, lock: threading.Lock):
+        schedule_id = job['schedule']['id']
+        logger.error(f"語音關懷 {schedule_id} 在 {stage_name} 階段失敗: {error}")
+        try:
+            self.service.update_schedule_status(schedule_id, 'failed')
+        except Exception as e:
+            logger.error(f"更新排程狀態失敗 {schedule_id}: {e}")
+        with lock:
+            results['failed'] += 1
+            results['details'].append({
+                'schedule_id': schedule_id,
+                'status': 'failed',
+                'stage': stage_name,
+                'error': str(error)
+            })
@@ -7,8 +7,15 @@ Qwen AI廣播劇服務 - Flask-AICares集成版本
 
 import os
 import base64
+import hashlib
+import random
+import struct
+import threading
+import time
 import uuid
-from typing import List, Dict, Optional, Any
+import wave
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, List, Dict, Optional, Any, Tuple
 from bs4 import BeautifulSoup
 import re
 
@@ -28,6 +35,45 @@ except ImportError:
     dashscope = None
     DASHSCOPE_AVAILABLE = False
 
+# 章節分段合成的並行請求數（依 DashScope 帳號的並發限制調整）
+SEGMENT_CONCURRENCY = int(os.getenv('QWEN_TTS_CONCURRENCY', '4'))
+
+# 每段最大字符數（Qwen TTS API 單次請求的文本長度限制）
+SEGMENT_MAX_LENGTH = 200
+
+# 分段合成失敗的重試次數與退避秒數（遇到限流時退避較久，且所有執行緒一起暫停）
+SEGMENT_MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0
+RATE_LIMIT_BASE_DELAY = 5.0
+RETRY_MAX_DELAY = 60.0
+
+# qwen3-tts-flash 串流輸出的 PCM 格式（16-bit, 24000Hz, mono）
+PCM_SAMPLE_RATE = 24000
+PCM_SAMPLE_WIDTH = 2
+PCM_CHANNELS = 1
+
+# 串流背景生成中的章節時，等待下一個分段的輪詢間隔與最長等待時間（秒）
+STREAM_POLL_INTERVAL = 0.5
+STREAM_TIMEOUT = 300
+
+
+class QwenTTSError(Exception):
+    """Qwen TTS API 回傳的錯誤"""
+    
+    def __init__(self, status_code: Optional[int], code: str, message: str = ""):
+        super().__init__(f"API 錯誤: {code} - {message}")
+        self.status_code = status_code
+        self.code = code or ""
+    
+    @property
+    def rate_limited(self) -> bool:
+        return self.status_code == 429 or 'Throttling' in self.code
+    
+    @property
+    def retryable(self) -> bool:
+        return self.rate_limited or self.status_code is None or self.status_code >= 500
+
+
 class QwenAudiobookService:
     """Qwen AI廣播劇服務類 - Flask-AICares集成版本"""
     
@@ -41,6 +87,11 @@ class QwenAudiobookService:
         self.api_key = api_key or os.getenv("DASHSCOPE_API_KEY")
         self.output_dir = os.path.join("static", "audiobooks")
         self.book_dir = os.path.join("TTS-API-Sample", "Epub")
+        self.max_concurrency = max(1, SEGMENT_CONCURRENCY)
+        
+        # 遇到限流時，所有分段合成執行緒暫停到此時間（time.monotonic）
+        self._throttle_lock = threading.Lock()
+        self._throttle_until = 0.0
         
         # 確保輸出目錄存在
         os.makedirs(self.output_dir, exist_ok=True)
@@ -280,76 +331,104 @@ class QwenAudiobookService:
         
         try:
             # 讀取章節文本
-            book_dir = os.path.join(self.output_dir, book_id)
-            chapter_file = os.path.join(book_dir, f"{chapter_id}.txt")
+            text = self._read_chapter_text(book_id, chapter_id)
             
-            if not os.path.exists(chapter_file):
-                raise FileNotFoundError(f"找不到章節文件: {chapter_id}")
-            
-            with open(chapter_file, 'r', encoding='utf-8') as f:
-                text = f.read()
+            print(f"處理文本長度: {len(text)} 字符")
             
-            # 限制文本長度（Qwen TTS API 限制 600 字符，但可能按 bytes 計算）
-            # 中文字符在 UTF-8 中通常佔 3 bytes，所以 200 個中文字符 = 600 bytes
-            if len(text) > 200:
-                text = text[:200]
+            # 分段並行合成後合併為單一音頻文件
+            self._synthesize_chapter_file(text, output_file, voice, language_type)
+                
+        except Exception as e:
+            raise Exception(f"生成音頻失敗: {str(e)}")
+    
+    def iter_chapter_audio(self, book_id: str, chapter_id: str, voice: str, output_file: str,
+                           is_pending: Callable[[], bool], language_type: str = "Chinese",
+                           poll_interval: float = STREAM_POLL_INTERVAL,
+                           timeout: float = STREAM_TIMEOUT):
+        """
+        串流正在背景生成的章節音頻
+        
+        先送出未指定長度的 WAV 標頭，再依序送出已完成的分段檢查點；
+        背景工作合併完成後（檢查點已刪除）改由正式 WAV 文件接續已送出的位置。
+        章節文本在呼叫時立即讀取並分段，章節不存在或沒有文本時直接拋出例外，不會等到開始串流才失敗
+        
+        Args:
+            book_id (str): 書籍ID
+            chapter_id (str): 章節ID
+            voice (str): 語音角色（須與背景工作相同，檢查點文件名才會一致）
+            output_file (str): 背景工作的輸出文件路徑
+            is_pending (Callable[[], bool]): 背景工作是否仍在排隊或執行中
+            language_type (str): 語言類型
+            poll_interval (float): 等待下一個分段的輪詢間隔（秒）
+            timeout (float): 單一分段最長等待時間（秒）
             
-            print(f"處理文本長度: {len(text)} 字符")
-            print(f"處理文本 bytes: {len(text.encode('utf-8'))} bytes")
-            print(f"文本內容: {text[:50]}...")
+        Returns:
+            Iterator[bytes]: WAV 音頻數據流
             
-            # 收集所有 PCM 音頻數據
-            pcm_data = []
+        Raises:
+            FileNotFoundError: 章節文件不存在
+            ValueError: 章節沒有可合成的文本
+        """
+        text = self._read_chapter_text(book_id, chapter_id)
+        segment_files = [pcm_file for _, pcm_file in self._segment_files(text, output_file, voice, language_type)]
+        if not segment_files:
+            raise ValueError(f"章節沒有可合成的文本: {chapter_id}")
+        return self._stream_chapter_segments(segment_files, output_file, is_pending, poll_interval, timeout)
+    
+    def _stream_chapter_segments(self, segment_files: List[str], output_file: str,
+                                 is_pending: Callable[[], bool], poll_interval: float, timeout: float):
+        """依序送出 WAV 標頭與分段檢查點，合併完成後改讀正式文件"""
+        frame_size = PCM_SAMPLE_WIDTH * PCM_CHANNELS
+        
+        yield self._stream_wav_header()
+        
+        sent = 0
+        index = 0
+        waited = 0.0
+        while index < len(segment_files):
+            if os.path.exists(output_file):
+                # 已合併完成，從正式文件接續未送出的部分
+                with wave.open(output_file, 'rb') as wav_file:
+                    wav_file.setpos(sent // frame_size)
+                    for block in iter(lambda: wav_file.readframes((1 << 20) // frame_size), b''):
+                        yield block
+                return
             
-            # 使用流式 API（參考官方範例）
             try:
-                response = dashscope.MultiModalConversation.call(
-                    api_key=self.api_key,
-                    model="qwen3-tts-flash",
-                    text=text,
-                    voice=voice,
-                    language_type=language_type,
-                    speech_rate=0.8,  # 語速：0.5-2.0，預設1.0，0.8較慢適合長者
-                    stream=True
-                )
-                
-                chunk_count = 0
-                for chunk in response:
-                    chunk_count += 1
-                    if chunk.output is not None:
-                        audio = chunk.output.audio
-                        if audio.data is not None:
-                            # 解碼 Base64 音頻數據
-                            wav_bytes = base64.b64decode(audio.data)
-                            pcm_data.append(wav_bytes)
-                    else:
-                        # 檢查是否有錯誤
-                        if hasattr(chunk, 'code') and chunk.code:
-                            raise Exception(f"API 錯誤: {chunk.code} - {chunk.message if hasattr(chunk, 'message') else ''}")
-                
-                print(f"收到 {chunk_count} 個數據塊，生成 {len(pcm_data)} 個音頻片段")
-                
-            except Exception as api_error:
-                raise Exception(f"API 調用失敗: {str(api_error)}")
+                with open(segment_files[index], 'rb') as f:
+                    data = f.read()
+            except OSError:
+                if os.path.exists(output_file):
+                    continue
+                # 分段尚未完成：背景工作已結束（失敗）或等待逾時則停止串流
+                if waited >= timeout or not is_pending():
+                    return
+                time.sleep(poll_interval)
+                waited += poll_interval
+                continue
             
-            # 合併所有 PCM 數據並添加 WAV 文件頭
-            if pcm_data:
-                complete_pcm = b''.join(pcm_data)
-                
-                # 添加 WAV 文件頭（16-bit PCM, 24000Hz, mono）
-                import struct
-                import wave
-                
-                with wave.open(output_file, 'wb') as wav_file:
-                    wav_file.setnchannels(1)  # mono
-                    wav_file.setsampwidth(2)  # 16-bit
-                    wav_file.setframerate(24000)  # 24kHz
-                    wav_file.writeframes(complete_pcm)
-            else:
-                raise Exception("未生成任何音頻數據")
-                
-        except Exception as e:
-            raise Exception(f"生成音頻失敗: {str(e)}")
+            yield data
+            sent += len(data)
+            index += 1
+            waited = 0.0
+    
+    def _stream_wav_header(self) -> bytes:
+        """未知長度的 WAV 標頭（RIFF 與 data 長度填最大值，播放器會讀到串流結束）"""
+        byte_rate = PCM_SAMPLE_RATE * PCM_SAMPLE_WIDTH * PCM_CHANNELS
+        return (b'RIFF' + struct.pack('<I', 0xFFFFFFFF) + b'WAVE'
+                + b'fmt ' + struct.pack('<IHHIIHH', 16, 1, PCM_CHANNELS, PCM_SAMPLE_RATE, byte_rate,
+                                        PCM_SAMPLE_WIDTH * PCM_CHANNELS, PCM_SAMPLE_WIDTH * 8)
+                + b'data' + struct.pack('<I', 0xFFFFFFFF))
+    
+    def _read_chapter_text(self, book_id: str, chapter_id: str) -> str:
+        """讀取章節文本"""
+        chapter_file = os.path.join(self.output_dir, book_id, f"{chapter_id}.txt")
+        
+        if not os.path.exists(chapter_file):
+            raise FileNotFoundError(f"找不到章節文件: {chapter_id}")
+        
+        with open(chapter_file, 'r', encoding='utf-8') as f:
+            return f.read()
     
     def synthesize_chapter_stream(self, book_id: str, chapter_id: str, voice: str, language_type: str = "Chinese"):
         """
@@ -369,14 +448,7 @@ class QwenAudiobookService:
         
         try:
             # 讀取章節文本
-            book_dir = os.path.join(self.output_dir, book_id)
-            chapter_file = os.path.join(book_dir, f"{chapter_id}.txt")
-            
-            if not os.path.exists(chapter_file):
-                raise FileNotFoundError(f"找不到章節文件: {chapter_id}")
-            
-            with open(chapter_file, 'r', encoding='utf-8') as f:
-                text = f.read()
+            text = self._read_chapter_text(book_id, chapter_id)
             
             # 分段處理長文本
             segments = self._split_text_into_segments(text, max_length=1000)
@@ -434,23 +506,34 @@ class QwenAudiobookService:
             book_output_dir = os.path.join(self.output_dir, f"{book_id}_{dialect}")
             os.makedirs(book_output_dir, exist_ok=True)
             
-            # 生成各章節音頻
+            # 生成各章節音頻：所有章節的分段共用同一個有界執行緒池，
+            # 依章節順序等待分段完成並合併
             chapter_files = []
-            for i, chapter in enumerate(chapters):
-                chapter_id = f"chapter_{i+1:03d}"
-                audio_file = self._generate_chapter_audio(
-                    chapter['content'], 
-                    chapter_id, 
-                    book_output_dir,
-                    voice,
-                    language_type,
-                    chapter.get('title', f'第{i+1}章')
-                )
-                chapter_files.append({
-                    'id': chapter_id,
-                    'title': chapter.get('title', f'第{i+1}章'),
-                    'audio_file': audio_file
-                })
+            with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                    thread_name_prefix="qwen-tts") as executor:
+                pending = []
+                for i, chapter in enumerate(chapters):
+                    chapter_id = f"chapter_{i+1:03d}"
+                    audio_file = os.path.join(book_output_dir, f"{chapter_id}.wav")
+                    futures = self._submit_chapter_segments(
+                        executor, chapter['content'], audio_file, voice, language_type
+                    )
+                    pending.append((chapter_id, chapter.get('title', f'第{i+1}章'), audio_file, futures))
+                
+                try:
+                    for chapter_id, title, audio_file, futures in pending:
+                        self._concat_segments(futures, audio_file)
+                        chapter_files.append({
+                            'id': chapter_id,
+                            'title': title,
+                            'audio_file': audio_file
+                        })
+                except Exception:
+                    # 已完成的分段保留為檢查點，重新生成同一本書時不會重做
+                    for _, _, _, futures in pending:
+                        for future in futures:
+                            future.cancel()
+                    raise
             
             # 生成書籍信息
             book_info = {
@@ -501,96 +584,194 @@ class QwenAudiobookService:
         Returns:
             str: 音頻文件路徑
         """
-        if not DASHSCOPE_AVAILABLE:
-            raise ImportError("dashscope 庫未安裝，無法使用Qwen TTS API")
-        
         try:
-            # 分段處理長文本（DashScope API有文本長度限制）
-            segments = self._split_text_into_segments(text, max_length=1000)
-            
-            # 生成各段落音頻
-            audio_files = []
-            for i, segment in enumerate(segments):
-                segment_id = f"{chapter_id}_part_{i+1:03d}"
-                audio_file = os.path.join(output_dir, f"{segment_id}.wav")
-                
-                # 使用Qwen TTS API生成音頻
-                self._tts_synthesize(
-                    text=segment,
-                    output_file=audio_file,
-                    voice=voice,
-                    language_type=language_type
-                )
-                audio_files.append(audio_file)
-            
-            # 合併音頻文件（簡化處理，實際應用中可能需要音頻合併）
             final_audio_file = os.path.join(output_dir, f"{chapter_id}.wav")
-            
-            # 如果只有一個音頻文件，直接使用
-            if len(audio_files) == 1:
-                os.rename(audio_files[0], final_audio_file)
-            else:
-                # 這裡簡化處理，實際應用中需要合併多個音頻文件
-                # 在這個示例中，我們只保留第一個文件
-                os.rename(audio_files[0], final_audio_file)
-                
-                # 清理臨時文件（除了第一個）
-                for audio_file in audio_files[1:]:
-                    if os.path.exists(audio_file):
-                        os.remove(audio_file)
-            
-            return final_audio_file
+            return self._synthesize_chapter_file(text, final_audio_file, voice, language_type)
             
         except Exception as e:
             raise Exception(f"生成章節音頻時出錯: {str(e)}")
     
-    def _tts_synthesize(self, text: str, output_file: str, voice: str, language_type: str):
+    def _synthesize_chapter_file(self, text: str, output_file: str, voice: str, language_type: str) -> str:
+        """
+        分段並行合成章節文本並合併為單一 WAV 文件
+        
+        Args:
+            text (str): 章節文本
+            output_file (str): 輸出 WAV 文件路徑
+            voice (str): 語音角色
+            language_type (str): 語言類型
+            
+        Returns:
+            str: 音頻文件路徑
+        """
+        if not DASHSCOPE_AVAILABLE:
+            raise ImportError("dashscope 庫未安裝，無法使用Qwen TTS API")
+        
+        with ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                thread_name_prefix="qwen-tts") as executor:
+            futures = self._submit_chapter_segments(executor, text, output_file, voice, language_type)
+            try:
+                return self._concat_segments(futures, output_file)
+            except Exception:
+                for future in futures:
+                    future.cancel()
+                raise
+    
+    def _submit_chapter_segments(self, executor: ThreadPoolExecutor, text: str, output_file: str,
+                                 voice: str, language_type: str) -> List[Future]:
+        """
+        將章節分段交給執行緒池合成
+        
+        每段輸出為與章節文件同目錄的 PCM 檢查點，文件名含分段內容與語音參數的雜湊，
+        已存在的檢查點直接沿用（中斷後重新生成時不重做已完成的分段）
+        
+        Returns:
+            List[Future]: 依分段順序排列，結果為 PCM 檢查點路徑
+        """
+        if os.path.exists(output_file):
+            # 章節已合併完成
+            return []
+        
+        os.makedirs(os.path.dirname(output_file) or ".", exist_ok=True)
+        
+        futures = []
+        for segment, pcm_file in self._segment_files(text, output_file, voice, language_type):
+            if os.path.exists(pcm_file):
+                future = Future()
+                future.set_result(pcm_file)
+            else:
+                future = executor.submit(self._tts_synthesize, segment, pcm_file, voice, language_type)
+            futures.append(future)
+        return futures
+    
+    def _segment_files(self, text: str, output_file: str, voice: str, language_type: str) -> List[Tuple[str, str]]:
+        """
+        計算章節各分段的 PCM 檢查點路徑
+        
+        Returns:
+            List[Tuple[str, str]]: 依分段順序排列的 (分段文本, PCM 檢查點路徑)
+        """
+        output_dir = os.path.dirname(output_file) or "."
+        base_name = os.path.splitext(os.path.basename(output_file))[0]
+        
+        files = []
+        for i, segment in enumerate(self._split_text_into_segments(text)):
+            digest = hashlib.sha1(f"{voice}|{language_type}|{segment}".encode('utf-8')).hexdigest()[:12]
+            files.append((segment, os.path.join(output_dir, f"{base_name}_part_{i+1:03d}_{digest}.pcm")))
+        return files
+    
+    def _concat_segments(self, futures: List[Future], output_file: str) -> str:
         """
-        使用Qwen TTS API合成語音（基於官方範例代碼）
+        依序等待分段完成，逐塊寫入 WAV 文件（不把整章音頻載入記憶體），
+        全部完成後才替換為正式文件並刪除分段檢查點
+        """
+        if not futures:
+            if os.path.exists(output_file):
+                return output_file
+            raise Exception("章節沒有可合成的文本")
+        
+        tmp_file = f"{output_file}.part"
+        pcm_files = []
+        with wave.open(tmp_file, 'wb') as wav_file:
+            wav_file.setnchannels(PCM_CHANNELS)
+            wav_file.setsampwidth(PCM_SAMPLE_WIDTH)
+            wav_file.setframerate(PCM_SAMPLE_RATE)
+            for future in futures:
+                pcm_file = future.result()
+                pcm_files.append(pcm_file)
+                with open(pcm_file, 'rb') as f:
+                    for block in iter(lambda: f.read(1 << 20), b''):
+                        wav_file.writeframes(block)
+        os.replace(tmp_file, output_file)
+        
+        for pcm_file in pcm_files:
+            try:
+                os.remove(pcm_file)
+            except OSError:
+                pass
+        return output_file
+    
+    def _tts_synthesize(self, text: str, output_file: str, voice: str, language_type: str) -> str:
+        """
+        使用Qwen TTS API合成一段語音並寫入 PCM 檢查點（失敗時退避重試）
         
         Args:
             text (str): 要合成的文字
-            output_file (str): 輸出文件路徑
+            output_file (str): 輸出 PCM 文件路徑
             voice (str): 語音角色（Ethan=普通話, Roy=閩南語）
             language_type (str): 語言類型（Chinese）
+            
+        Returns:
+            str: PCM 文件路徑
         """
         if not DASHSCOPE_AVAILABLE:
             raise ImportError("dashscope 庫未安裝，無法使用Qwen TTS API")
         
-        try:
-            # 使用流式模式調用 API（參考官方範例）
-            response = dashscope.MultiModalConversation.call(
-                api_key=self.api_key,
-                model="qwen3-tts-flash",
-                text=text,
-                voice=voice,
-                language_type=language_type,
-                speech_rate=0.8,  # 語速：0.5-2.0，預設1.0，0.8較慢適合長者
-                stream=True  # 使用流式模式
-            )
-            
-            # 收集所有音頻數據
-            audio_chunks = []
+        for attempt in range(SEGMENT_MAX_RETRIES + 1):
+            self._wait_for_throttle()
+            try:
+                self._tts_synthesize_once(text, output_file, voice, language_type)
+                return output_file
+            except Exception as e:
+                rate_limited = isinstance(e, QwenTTSError) and e.rate_limited
+                retryable = not isinstance(e, QwenTTSError) or e.retryable
+                if not retryable or attempt >= SEGMENT_MAX_RETRIES:
+                    raise Exception(f"語音合成失敗: {str(e)}")
+                
+                base_delay = RATE_LIMIT_BASE_DELAY if rate_limited else RETRY_BASE_DELAY
+                delay = min(RETRY_MAX_DELAY, base_delay * (2 ** attempt)) * random.uniform(0.5, 1.0)
+                if rate_limited:
+                    self._throttle(delay)
+                print(f"⚠️ 語音合成失敗（第 {attempt + 1} 次），{delay:.1f} 秒後重試: {e}")
+                time.sleep(delay)
+    
+    def _tts_synthesize_once(self, text: str, output_file: str, voice: str, language_type: str):
+        """呼叫一次 API，串流寫入暫存文件，成功後才替換為正式 PCM 文件"""
+        # 使用流式模式調用 API（參考官方範例）
+        response = dashscope.MultiModalConversation.call(
+            api_key=self.api_key,
+            model="qwen3-tts-flash",
+            text=text,
+            voice=voice,
+            language_type=language_type,
+            speech_rate=0.8,  # 語速：0.5-2.0，預設1.0，0.8較慢適合長者
+            stream=True  # 使用流式模式
+        )
+        
+        tmp_file = f"{output_file}.part"
+        size = 0
+        with open(tmp_file, 'wb') as f:
             for chunk in response:
+                status_code = getattr(chunk, 'status_code', None)
+                if status_code is not None and status_code != 200:
+                    raise QwenTTSError(status_code, getattr(chunk, 'code', ''), getattr(chunk, 'message', ''))
                 if chunk.output is not None:
                     audio = chunk.output.audio
                     if audio.data is not None:
                         # 解碼音頻數據
-                        wav_bytes = base64.b64decode(audio.data)
-                        audio_chunks.append(wav_bytes)
-            
-            # 合併所有音頻數據並保存
-            if audio_chunks:
-                complete_audio = b''.join(audio_chunks)
-                with open(output_file, 'wb') as f:
-                    f.write(complete_audio)
-            else:
-                raise Exception("TTS API返回無效的音頻數據")
-                
-        except Exception as e:
-            raise Exception(f"語音合成失敗: {str(e)}")
+                        pcm_bytes = base64.b64decode(audio.data)
+                        f.write(pcm_bytes)
+                        size += len(pcm_bytes)
+                elif getattr(chunk, 'code', None):
+                    raise QwenTTSError(status_code, chunk.code, getattr(chunk, 'message', ''))
+        
+        if size == 0:
+            os.remove(tmp_file)
+            raise Exception("TTS API返回無效的音頻數據")
+        os.replace(tmp_file, output_file)
+    
+    def _wait_for_throttle(self):
+        with self._throttle_lock:
+            delay = self._throttle_until - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
     
-    def _split_text_into_segments(self, text: str, max_length: int = 1000) -> List[str]:
+    def _throttle(self, delay: float):
+        """遇到限流時讓所有分段合成執行緒暫停 delay 秒"""
+        with self._throttle_lock:
+            self._throttle_until = max(self._throttle_until, time.monotonic() + delay)
+    
+    def _split_text_into_segments(self, text: str, max_length: int = SEGMENT_MAX_LENGTH) -> List[str]:
         """
         將長文本分割成段落
         
@@ -601,18 +782,26 @@ class QwenAudiobookService:
         Returns:
             List[str]: 分割後的文本段落
         """
-        # 按句子分割
-        sentences = re.split(r'[。！？]', text)
+        # 按句子分割（保留句末標點），超過長度的單句再按長度切開
+        sentences = []
+        for sentence in re.split(r'(?<=[。！？])', text):
+            sentence = sentence.strip()
+            while len(sentence) > max_length:
+                sentences.append(sentence[:max_length])
+                sentence = sentence[max_length:]
+            if sentence:
+                sentences.append(sentence)
+        
         segments = []
         current_segment = ""
         
         for sentence in sentences:
             if len(current_segment) + len(sentence) <= max_length:
-                current_segment += sentence + "。"
+                current_segment += sentence
             else:
                 if current_segment:
                     segments.append(current_segment)
-                current_segment = sentence + "。"
+                current_segment = sentence
         
         if current_segment:
             segments.append(current_segment)
@@ -620,11 +809,27 @@ class QwenAudiobookService:
         return segments
 
 # Flask路由整合
-from flask import Blueprint, request, jsonify, current_app, send_file
+from flask import Blueprint, Response, request, jsonify, current_app, send_file, stream_with_context
 import os
+from modules.voice_processing.audiobook_job_queue import (
+    AudiobookJobQueue, DIALECT_VOICES, DEFAULT_VOICE, PRIORITY_PLAY
+)
 
 qwen_audiobook_bp = Blueprint('qwen_audiobook', __name__, url_prefix='/api/audiobook')
 
+# 章節生成佇列（共用同一個服務實例，於第一次使用時建立）
+_job_queue: Optional[AudiobookJobQueue] = None
+_job_queue_lock = threading.Lock()
+
+
+def get_job_queue() -> AudiobookJobQueue:
+    """取得章節生成佇列"""
+    global _job_queue
+    with _job_queue_lock:
+        if _job_queue is None:
+            _job_queue = AudiobookJobQueue(QwenAudiobookService())
+        return _job_queue
+
 @qwen_audiobook_bp.route('/generate', methods=['POST'])
 def generate_audiobook():
     """
@@ -927,7 +1132,9 @@ def get_bilingual_chapters(book_id):
 @qwen_audiobook_bp.route('/book/<book_id>/chapter/<chapter_id>/audio/<dialect>', methods=['GET'])
 def get_or_generate_chapter_audio(book_id, chapter_id, dialect):
     """
-    獲取章節音頻（如果不存在則生成）
+    獲取章節音頻（如果不存在則加入生成佇列，並串流已生成的部分）
+    
+    同時預先生成後續章節，同一章節多人收聽只會生成一次
     
     Args:
         book_id (str): 書籍ID
@@ -935,37 +1142,56 @@ def get_or_generate_chapter_audio(book_id, chapter_id, dialect):
         dialect (str): 方言類型 (mandarin|minan)
         
     Returns:
-        File: 音頻文件
+        File: 音頻文件（生成中則為 WAV 串流）
     """
     try:
         audiobooks_dir = os.path.join(current_app.root_path, 'static', 'audiobooks')
         audio_dir = os.path.join(audiobooks_dir, book_id, 'audio', dialect)
         audio_file = os.path.join(audio_dir, f"{chapter_id}.wav")
         
+        job_queue = get_job_queue()
+        service = job_queue.service
+        
         # 如果音頻文件已存在，直接返回
         if os.path.exists(audio_file):
+            job_queue.prefetch_next(book_id, chapter_id, dialect, audiobooks_dir)
             return send_file(audio_file, mimetype='audio/wav')
         
-        # 音頻不存在，需要生成
-        os.makedirs(audio_dir, exist_ok=True)
-        
-        # 初始化服務
-        service = QwenAudiobookService()
-        
         if not service.is_available():
             return jsonify({'error': 'Qwen TTS服務不可用'}), 400
         
-        # 設置語音參數
-        voice = "Ethan" if dialect == "mandarin" else "Roy"
+        # 先讀取章節文本並分段，章節不存在時不加入佇列也不開始串流
+        voice = DIALECT_VOICES.get(dialect, DEFAULT_VOICE)
+        try:
+            audio_stream = service.iter_chapter_audio(
+                book_id, chapter_id, voice, audio_file,
+                is_pending=lambda: job_queue.is_pending(book_id, chapter_id, dialect)
+            )
+        except FileNotFoundError as e:
+            return jsonify({'error': str(e)}), 404
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # 生成音頻文件
-        service.generate_chapter_audio(book_id, chapter_id, voice, audio_file)
+        # 音頻不存在，加入生成佇列（優先於預先生成的章節）
+        job_queue.enqueue(book_id, chapter_id, dialect, audio_file, PRIORITY_PLAY)
+        job_queue.prefetch_next(book_id, chapter_id, dialect, audiobooks_dir)
         
-        # 返回生成的音頻
-        return send_file(audio_file, mimetype='audio/wav')
+        # 串流已生成的分段，直到背景工作完成
+        return Response(stream_with_context(audio_stream), mimetype='audio/wav')
         
     except Exception as e:
         current_app.logger.error(f"獲取音頻時出錯: {str(e)}")
         import traceback
         traceback.print_exc()
-        return jsonify({'error': f'獲取音頻時發生錯誤: {str(e)}'}), 500
\ No newline at end of file
+        return jsonify({'error': f'獲取音頻時發生錯誤: {str(e)}'}), 500
+
+
+@qwen_audiobook_bp.route('/jobs/stats', methods=['GET'])
+def get_job_stats():
+    """
+    獲取章節生成佇列狀態
+    
+    Returns:
+        JSON: 各狀態的工作數量
+    """
+    return jsonify({'success': True, 'stats': get_job_queue().get_stats()}), 200
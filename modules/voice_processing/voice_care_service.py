@@ -13,8 +13,18 @@ import json
 import os
 from typing import Dict, List, Optional, Union
 from config import DATABASE
+from database import apply_voice_care_record_delta, apply_voice_care_status_delta, voice_care_record_language
 from services.ai import generate_care_message
 from modules.voice_processing.qwen_tts_service import QwenTTSService
+from modules.voice_processing.care_call_dispatcher import CareCallDispatcher
+
+# 排程認領（或派送階段開始時延長認領）後超過此分鐘數仍未更新（派送程序中斷），視為可重新認領
+CLAIM_TIMEOUT_MINUTES = 30
+
+# 分段派送各階段的工作執行緒數量
+DISPATCH_WEATHER_WORKERS = int(os.getenv('VOICE_CARE_WEATHER_WORKERS', '4'))
+DISPATCH_LLM_WORKERS = int(os.getenv('VOICE_CARE_LLM_WORKERS', '8'))
+DISPATCH_TTS_WORKERS = int(os.getenv('VOICE_CARE_TTS_WORKERS', '2'))
 
 class VoiceCareService:
     """智慧語音關懷服務類"""
@@ -67,6 +77,7 @@ class VoiceCareService:
                 (id, user_id, staff_id, title, description, scheduled_time, address, latitude, longitude, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', [schedule_id, user_id, staff_id, title, description, scheduled_time, address, latitude, longitude, now, now])
+            apply_voice_care_status_delta(cursor, None, 'pending')
             
             conn.commit()
             return schedule_id
@@ -155,19 +166,101 @@ class VoiceCareService:
         Returns:
             bool: 是否更新成功
         """
-        conn = sqlite3.connect(DATABASE)
+        # 與認領相同的鎖等待時間：派送管線的工作執行緒會同時寫入
+        conn = sqlite3.connect(DATABASE, timeout=30)
         cursor = conn.cursor()
         
         try:
             now = datetime.datetime.now().isoformat()
+            
+            # 讀取原狀態與更新在同一寫入交易中，彙總表才不會因並行更新而失準
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT status FROM voice_care_schedules WHERE id = ?', [schedule_id])
+            row = cursor.fetchone()
+            if not row:
+                conn.rollback()
+                return False
+            
             cursor.execute('''
                 UPDATE voice_care_schedules 
                 SET status = ?, updated_at = ?
                 WHERE id = ?
             ''', [status, now, schedule_id])
+            apply_voice_care_status_delta(cursor, row[0], status, now)
+            
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
+    def claim_schedule(self, schedule_id: str) -> bool:
+        """
+        原子認領排程（pending → processing）
+        
+        以條件式 UPDATE 認領，同一排程只有一個派送程序能認領成功；
+        認領逾時（派送中斷）的排程可重新認領
+        
+        Args:
+            schedule_id (str): 排程ID
+            
+        Returns:
+            bool: 是否認領成功
+        """
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        cursor = conn.cursor()
+        
+        try:
+            now = datetime.datetime.now()
+            stale_before = (now - datetime.timedelta(minutes=CLAIM_TIMEOUT_MINUTES)).isoformat()
+            
+            cursor.execute('BEGIN IMMEDIATE')
+            cursor.execute('SELECT status FROM voice_care_schedules WHERE id = ?', [schedule_id])
+            row = cursor.fetchone()
+            cursor.execute('''
+                UPDATE voice_care_schedules 
+                SET status = 'processing', updated_at = ?
+                WHERE id = ?
+                AND (status = 'pending' OR (status = 'processing' AND updated_at < ?))
+            ''', [now.isoformat(), schedule_id, stale_before])
+            claimed = cursor.rowcount == 1
+            if claimed:
+                apply_voice_care_status_delta(cursor, row[0], 'processing')
+            
+            conn.commit()
+            return claimed
+        except Exception as e:
+            conn.rollback()
+            raise e
+        finally:
+            conn.close()
+    
+    def refresh_claim(self, schedule_id: str) -> bool:
+        """
+        延長排程認領（更新處理中排程的 updated_at）
+        
+        派送管線每個階段開始時呼叫，在佇列中等待下游的排程不會因超過認領逾時
+        而被其他派送程序重新認領、重複發送
+        
+        Args:
+            schedule_id (str): 排程ID
             
+        Returns:
+            bool: 排程是否仍在處理中
+        """
+        conn = sqlite3.connect(DATABASE, timeout=30)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('''
+                UPDATE voice_care_schedules 
+                SET updated_at = ?
+                WHERE id = ? AND status = 'processing'
+            ''', [datetime.datetime.now().isoformat(), schedule_id])
             conn.commit()
-            return cursor.rowcount > 0
+            return cursor.rowcount == 1
         except Exception as e:
             conn.rollback()
             raise e
@@ -221,6 +314,34 @@ class VoiceCareService:
                 "forecast": "今天天氣晴朗，適合外出活動"
             }
     
+    def prefetch_weather(self, schedules: List[Dict]) -> Dict:
+        """
+        批次預先查詢一批排程的天氣（每個縣市只查詢一次 API）
+        
+        Args:
+            schedules (List[Dict]): 排程列表
+            
+        Returns:
+            Dict: 縣市 → 天氣資料
+        """
+        locations = set()
+        for schedule in schedules:
+            address = schedule.get('address', '')
+            if address:
+                locations.add(address)
+            elif schedule.get('latitude') and schedule.get('longitude'):
+                # 與 get_weather_info 相同，未提供地址時使用預設縣市
+                locations.add('臺北市')
+        if not locations:
+            return {}
+        
+        try:
+            from services.weather_service import weather_service
+            return weather_service.prefetch(locations)
+        except Exception as e:
+            print(f"⚠️ 天氣預先查詢失敗: {e}")
+            return {}
+    
     def get_user_profile(self, user_id: str) -> Dict:
         """
         獲取用戶資料
@@ -242,28 +363,41 @@ class VoiceCareService:
         finally:
             conn.close()
     
-    def generate_care_message(self, schedule: Dict) -> str:
+    def get_schedule_weather(self, schedule: Dict) -> Dict:
         """
-        生成關懷訊息（使用 DeepSeek LLM）
+        獲取排程地點的天氣資訊（優先使用地址，未設定地點時回傳空字典）
         
         Args:
             schedule (Dict): 排程資訊
             
         Returns:
-            str: 關懷訊息
+            Dict: 天氣資訊
         """
-        # 獲取用戶資料
-        user_profile = self.get_user_profile(schedule['user_id'])
-        
-        # 獲取天氣資訊（優先使用地址）
-        weather_info = {}
         address = schedule.get('address', '')
         if address or (schedule.get('latitude') and schedule.get('longitude')):
-            weather_info = self.get_weather_info(
+            return self.get_weather_info(
                 schedule.get('latitude', 0.0),
                 schedule.get('longitude', 0.0),
                 address
             )
+        return {}
+    
+    def generate_care_message(self, schedule: Dict, weather_info: Optional[Dict] = None) -> str:
+        """
+        生成關懷訊息（使用 DeepSeek LLM）
+        
+        Args:
+            schedule (Dict): 排程資訊
+            weather_info (Dict): 天氣資訊（未提供時自動查詢）
+            
+        Returns:
+            str: 關懷訊息
+        """
+        # 獲取用戶資料
+        user_profile = self.get_user_profile(schedule['user_id'])
+        
+        if weather_info is None:
+            weather_info = self.get_schedule_weather(schedule)
         
         # 使用 DeepSeek LLM 生成訊息
         try:
@@ -317,63 +451,17 @@ class VoiceCareService:
         if not schedule:
             raise ValueError("排程不存在")
         
-        if schedule['status'] != 'pending':
+        # 認領排程，避免與排程派送重複發送
+        if schedule['status'] != 'pending' or not self.claim_schedule(schedule_id):
             raise ValueError("排程狀態不正確")
         
-        # 生成關懷訊息（使用 DeepSeek LLM）
-        message = self.generate_care_message(schedule)
-        
-        # 獲取天氣資訊（優先使用地址）
-        weather_info = {}
-        address = schedule.get('address', '')
-        if address or (schedule.get('latitude') and schedule.get('longitude')):
-            weather_info = self.get_weather_info(
-                schedule.get('latitude', 0.0),
-                schedule.get('longitude', 0.0),
-                address
-            )
-        
-        # 生成語音文件
-        audio_dir = os.path.join(
-            self.audio_output_dir,
-            f"care_{schedule_id}_{int(datetime.datetime.now().timestamp())}"
-        )
-        os.makedirs(audio_dir, exist_ok=True)
-        
-        audio_files = {}
-        
         try:
-            # 使用 Qwen TTS 生成語音
-            if self.use_qwen_tts and self.qwen_tts:
-                print(f"使用 Qwen TTS 生成語音：{language}")
-                
-                if language == 'both':
-                    audio_files = self.qwen_tts.synthesize_bilingual(message, audio_dir)
-                else:
-                    audio_file = os.path.join(audio_dir, f"{language}.wav")
-                    result = self.qwen_tts.synthesize(message, language, audio_file)
-                    audio_files[language] = result
-            else:
-                # 降級：使用 F5-TTS
-                print("使用 F5-TTS 生成語音（降級方案）")
-                from services.tts import f5_tts
-                audio_data = f5_tts(message)
-                if audio_data:
-                    audio_file = os.path.join(audio_dir, "mandarin.wav")
-                    with open(audio_file, 'wb') as f:
-                        f.write(audio_data)
-                    audio_files['mandarin'] = audio_file
-            
-            # 創建關懷記錄
-            record_id = self.create_care_record(
-                schedule_id=schedule_id,
-                audio_file_path=json.dumps(audio_files),
-                message=message,
-                weather_info=json.dumps(weather_info) if weather_info else None
-            )
+            # 獲取天氣資訊並生成關懷訊息（使用 DeepSeek LLM）
+            weather_info = self.get_schedule_weather(schedule)
+            message = self.generate_care_message(schedule, weather_info)
             
-            # 更新排程狀態
-            self.update_schedule_status(schedule_id, 'completed')
+            audio_files = self.synthesize_care_audio(schedule_id, message, language)
+            record_id = self.complete_care_call(schedule_id, message, weather_info, audio_files)
             
             return {
                 'success': True,
@@ -386,6 +474,74 @@ class VoiceCareService:
             self.update_schedule_status(schedule_id, 'failed')
             raise e
     
+    def synthesize_care_audio(self, schedule_id: str, message: str, language: str = 'mandarin') -> Dict:
+        """
+        生成關懷語音文件
+        
+        Args:
+            schedule_id (str): 排程ID
+            message (str): 關懷訊息
+            language (str): 'mandarin', 'minan', 或 'both'
+            
+        Returns:
+            Dict: 語言 → 音頻文件路徑
+        """
+        audio_dir = os.path.join(
+            self.audio_output_dir,
+            f"care_{schedule_id}_{int(datetime.datetime.now().timestamp())}"
+        )
+        os.makedirs(audio_dir, exist_ok=True)
+        
+        audio_files = {}
+        
+        # 使用 Qwen TTS 生成語音
+        if self.use_qwen_tts and self.qwen_tts:
+            print(f"使用 Qwen TTS 生成語音：{language}")
+            
+            if language == 'both':
+                audio_files = self.qwen_tts.synthesize_bilingual(message, audio_dir)
+            else:
+                audio_file = os.path.join(audio_dir, f"{language}.wav")
+                result = self.qwen_tts.synthesize(message, language, audio_file)
+                audio_files[language] = result
+        else:
+            # 降級：使用 F5-TTS
+            print("使用 F5-TTS 生成語音（降級方案）")
+            from services.tts import f5_tts
+            audio_data = f5_tts(message)
+            if audio_data:
+                audio_file = os.path.join(audio_dir, "mandarin.wav")
+                with open(audio_file, 'wb') as f:
+                    f.write(audio_data)
+                audio_files['mandarin'] = audio_file
+        
+        return audio_files
+    
+    def complete_care_call(self, schedule_id: str, message: str, weather_info: Dict,
+                           audio_files: Dict) -> str:
+        """
+        創建關懷記錄並將排程標記為完成
+        
+        Args:
+            schedule_id (str): 排程ID
+            message (str): 關懷訊息
+            weather_info (Dict): 天氣資訊
+            audio_files (Dict): 語言 → 音頻文件路徑
+            
+        Returns:
+            str: 記錄ID
+        """
+        record_id = self.create_care_record(
+            schedule_id=schedule_id,
+            audio_file_path=json.dumps(audio_files),
+            message=message,
+            weather_info=json.dumps(weather_info) if weather_info else None
+        )
+        
+        # 更新排程狀態
+        self.update_schedule_status(schedule_id, 'completed')
+        return record_id
+    
     def create_care_record(self, schedule_id: str, audio_file_path: str, 
                           message: str, weather_info: Union[str, None] = None) -> str:
         """
@@ -412,6 +568,7 @@ class VoiceCareService:
                 (id, schedule_id, audio_file_path, message, weather_info, sent_at, created_at)
                 VALUES (?, ?, ?, ?, ?, ?, ?)
             ''', [record_id, schedule_id, audio_file_path, message, weather_info, now, now])
+            apply_voice_care_record_delta(cursor, audio_file_path, now)
             
             conn.commit()
             return record_id
@@ -457,6 +614,87 @@ class VoiceCareService:
         finally:
             conn.close()
     
+    def get_statistics(self, days: int = 7, recent_limit: int = 10) -> Dict:
+        """
+        獲取統計數據（讀取增量維護的彙總表，不掃描排程與記錄）
+        
+        Args:
+            days (int): 每日統計的天數
+            recent_limit (int): 最近記錄筆數
+            
+        Returns:
+            Dict: 統計數據
+        """
+        conn = sqlite3.connect(DATABASE)
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute('SELECT status, schedule_count FROM voice_care_status_counts')
+            status_counts = {row['status']: row['schedule_count'] for row in cursor.fetchall()}
+            
+            cursor.execute('SELECT language, record_count FROM voice_care_language_counts')
+            language_distribution = {
+                row['language']: row['record_count'] for row in cursor.fetchall() if row['record_count']
+            }
+            
+            today = datetime.date.today()
+            start_date = today - datetime.timedelta(days=days - 1)
+            cursor.execute('''
+                SELECT stat_date, sent_count, completed_count, failed_count
+                FROM voice_care_daily_stats
+                WHERE stat_date BETWEEN ? AND ?
+            ''', [start_date.isoformat(), today.isoformat()])
+            daily_rows = {row['stat_date']: row for row in cursor.fetchall()}
+            
+            # 依 sent_at 索引倒序讀取最近記錄
+            cursor.execute('''
+                SELECT vcr.id, vcr.schedule_id, vcr.audio_file_path, vcr.sent_at,
+                       vcs.title as schedule_title, vcs.status, u.full_name as user_name
+                FROM voice_care_records vcr
+                JOIN voice_care_schedules vcs ON vcr.schedule_id = vcs.id
+                LEFT JOIN users u ON vcs.user_id = u.id
+                ORDER BY vcr.sent_at DESC
+                LIMIT ?
+            ''', [recent_limit])
+            recent_records = []
+            for row in cursor.fetchall():
+                record = dict(row)
+                record['language'] = voice_care_record_language(record.pop('audio_file_path'))
+                recent_records.append(record)
+        finally:
+            conn.close()
+        
+        daily_stats = []
+        for offset in range(days):
+            stat_date = (start_date + datetime.timedelta(days=offset)).isoformat()
+            row = daily_rows.get(stat_date)
+            completed = row['completed_count'] if row else 0
+            failed = row['failed_count'] if row else 0
+            daily_stats.append({
+                'date': stat_date,
+                'sent': row['sent_count'] if row else 0,
+                'total': completed + failed,
+                'completed': completed,
+                'failed': failed,
+                'answered': completed
+            })
+        
+        completed = status_counts.get('completed', 0)
+        failed = status_counts.get('failed', 0)
+        return {
+            'total_calls': sum(language_distribution.values()),
+            # 尚無接聽回報，以發送成功比例計
+            'answer_rate': completed / (completed + failed) if completed + failed else 0.0,
+            # 尚無滿意度回饋資料
+            'satisfaction_score': None,
+            'pending_schedules': status_counts.get('pending', 0),
+            'status_counts': status_counts,
+            'language_distribution': language_distribution,
+            'recent_records': recent_records,
+            'daily_stats': daily_stats
+        }
+    
     def get_pending_schedules(self) -> List[Dict]:
         """
         獲取所有待處理的排程
@@ -474,51 +712,50 @@ class VoiceCareService:
             start_time = (now - datetime.timedelta(minutes=5)).isoformat()
             end_time = (now + datetime.timedelta(minutes=5)).isoformat()
             
+            # 包含認領逾時（派送中斷）的排程
+            stale_before = (now - datetime.timedelta(minutes=CLAIM_TIMEOUT_MINUTES)).isoformat()
+            
+            # status IN + scheduled_time 範圍可使用 (status, scheduled_time) 索引
             cursor.execute('''
                 SELECT *
                 FROM voice_care_schedules
-                WHERE status = 'pending'
+                WHERE status IN ('pending', 'processing')
                 AND scheduled_time BETWEEN ? AND ?
+                AND (status = 'pending' OR updated_at < ?)
                 ORDER BY scheduled_time
-            ''', [start_time, end_time])
+            ''', [start_time, end_time, stale_before])
             
             rows = cursor.fetchall()
             return [dict(row) for row in rows]
         finally:
             conn.close()
     
-    def process_pending_schedules(self) -> Dict:
+    def process_pending_schedules(self, language: str = 'mandarin') -> Dict:
         """
         處理所有待處理的排程
         
+        天氣、LLM、TTS 分段並行處理（見 CareCallDispatcher），
+        每個排程先原子認領，多個派送程序同時執行也不會重複發送
+        
+        Args:
+            language (str): 'mandarin', 'minan', 或 'both'
+        
         Returns:
-            Dict: 處理結果
+            Dict: 處理結果（含每分鐘完成數與各階段統計）
         """
         pending_schedules = self.get_pending_schedules()
-        results = {
-            'total': len(pending_schedules),
-            'success': 0,
-            'failed': 0,
-            'details': []
-        }
         
-        for schedule in pending_schedules:
-            try:
-                result = self.send_voice_care(schedule['id'])
-                results['success'] += 1
-                results['details'].append({
-                    'schedule_id': schedule['id'],
-                    'status': 'success',
-                    'record_id': result['record_id']
-                })
-            except Exception as e:
-                results['failed'] += 1
-                results['details'].append({
-                    'schedule_id': schedule['id'],
-                    'status': 'failed',
-                    'error': str(e)
-                })
+        # 派送前先依縣市批次查詢天氣，天氣階段直接由快取取得
+        prefetched = self.prefetch_weather(pending_schedules)
         
+        dispatcher = CareCallDispatcher(
+            self,
+            weather_workers=DISPATCH_WEATHER_WORKERS,
+            llm_workers=DISPATCH_LLM_WORKERS,
+            tts_workers=DISPATCH_TTS_WORKERS
+        )
+        results = dispatcher.dispatch(pending_schedules, language)
+        results['weather_cities'] = len(prefetched)
         return results
 
 # 創建服務實例
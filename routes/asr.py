@@ -5,10 +5,15 @@ ASR API 路由
 
 import asyncio
 import logging
+import threading
+import base64
 from flask import Blueprint, request, jsonify, render_template
+from flask_jwt_extended import decode_token
 from werkzeug.utils import secure_filename
 from auth import token_required
 from services.asr.coordinator import ASRCoordinator
+from services.asr.streaming import StreamingRecognizer
+from services.asr.whisper_engine import parse_target_rtf
 
 logger = logging.getLogger(__name__)
 
@@ -17,22 +22,61 @@ asr_bp = Blueprint('asr', __name__, url_prefix='/api/asr')
 
 # 全局 ASR Coordinator 實例（單例模式）
 _asr_coordinator = None
+_asr_coordinator_lock = threading.Lock()
+
+# 長駐事件迴圈（背景執行緒），所有 ASR 請求共用
+_event_loop = None
+_event_loop_lock = threading.Lock()
 
 
 def get_asr_coordinator():
     """獲取 ASR Coordinator 單例"""
     global _asr_coordinator
-    if _asr_coordinator is None:
-        logger.info("初始化 ASR Coordinator...")
-        _asr_coordinator = ASRCoordinator(
-            whisper_model_size="base",  # 可從配置讀取
-            enable_funasr=False,  # FunASR 暫時未啟用
-            device="cuda"  # 自動檢測
-        )
-        logger.info("ASR Coordinator 初始化完成")
+    with _asr_coordinator_lock:
+        if _asr_coordinator is None:
+            logger.info("初始化 ASR Coordinator...")
+            _asr_coordinator = ASRCoordinator(
+                whisper_model_size="base",  # 可從配置讀取
+                enable_funasr=False,  # FunASR 暫時未啟用
+                device="cuda"  # 自動檢測
+            )
+            logger.info("ASR Coordinator 初始化完成")
     return _asr_coordinator
 
 
+def get_event_loop():
+    """獲取長駐事件迴圈（首次呼叫時在背景執行緒啟動）"""
+    global _event_loop
+    with _event_loop_lock:
+        if _event_loop is None or _event_loop.is_closed():
+            loop = asyncio.new_event_loop()
+            threading.Thread(
+                target=loop.run_forever,
+                name='asr-event-loop',
+                daemon=True
+            ).start()
+            _event_loop = loop
+    return _event_loop
+
+
+def run_async(coro):
+    """在長駐事件迴圈上執行協程並等待結果（異步轉同步）"""
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    return future.result()
+
+
+def apply_target_rtf(options):
+    """將表單的目標即時率加入識別選項；格式錯誤時返回 400 響應，否則返回 None"""
+    try:
+        options['target_rtf'] = parse_target_rtf(request.form.get('target_rtf'))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'target_rtf 必須為有限的正數'
+        }), 400
+    return None
+
+
 @asr_bp.route('/recognize', methods=['POST'])
 @token_required
 def recognize_audio():
@@ -44,6 +88,8 @@ def recognize_audio():
         - language_hint: 語言提示（可選，zh/zh-TW/minnan）
         - return_details: 是否返回詳細信息（可選，true/false）
         - enable_minnan_optimization: 是否啟用閩南語優化（可選，true/false）
+        - use_cache: 是否使用識別結果快取（可選，true/false，預設 true）
+        - target_rtf: 目標即時率（可選，例如 0.5；先 greedy 解碼，品質不足才在預算內以較寬 beam 重新解碼）
     
     響應:
         {
@@ -53,6 +99,7 @@ def recognize_audio():
             "language": "zh",
             "audio_duration": 5.2,
             "processing_time": 1.5,
+            "from_cache": true,  // 結果來自快取時
             "details": {...}  // 如果 return_details=true
         }
     """
@@ -78,19 +125,19 @@ def recognize_audio():
         options = {
             'language_hint': request.form.get('language_hint', 'zh'),
             'return_details': request.form.get('return_details', 'false').lower() == 'true',
-            'enable_minnan_optimization': request.form.get('enable_minnan_optimization', 'true').lower() == 'true'
+            'enable_minnan_optimization': request.form.get('enable_minnan_optimization', 'true').lower() == 'true',
+            'use_cache': request.form.get('use_cache', 'true').lower() == 'true'
         }
         
+        error_response = apply_target_rtf(options)
+        if error_response:
+            return error_response
+        
         logger.info(f"收到識別請求: {file.filename}, 大小: {len(audio_data)} bytes")
         
         # 執行識別（異步轉同步）
         coordinator = get_asr_coordinator()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
-            coordinator.recognize(audio_data, options)
-        )
-        loop.close()
+        result = run_async(coordinator.recognize(audio_data, options))
         
         logger.info(f"識別完成: {result.get('text', '')[:50]}...")
         
@@ -114,6 +161,9 @@ def batch_recognize_audio():
         - files: 多個音頻文件（multipart/form-data）
         - language_hint: 語言提示（可選）
         - return_details: 是否返回詳細信息（可選）
+        - batched: 是否使用批次解碼（可選，true/false，預設 true）
+        - use_cache: 是否使用識別結果快取（可選，true/false，預設 true）
+        - target_rtf: 目標即時率（可選，例如 0.5；先 greedy 解碼，品質不足才在預算內以較寬 beam 重新解碼）
     
     響應:
         {
@@ -162,19 +212,20 @@ def batch_recognize_audio():
         # 獲取選項
         options = {
             'language_hint': request.form.get('language_hint', 'zh'),
-            'return_details': request.form.get('return_details', 'false').lower() == 'true'
+            'return_details': request.form.get('return_details', 'false').lower() == 'true',
+            'use_cache': request.form.get('use_cache', 'true').lower() == 'true'
         }
         
+        error_response = apply_target_rtf(options)
+        if error_response:
+            return error_response
+        
         logger.info(f"收到批次識別請求: {len(audio_data_list)} 個文件")
         
         # 執行批次識別
         coordinator = get_asr_coordinator()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        results = loop.run_until_complete(
-            coordinator.recognize_batch(audio_data_list, options)
-        )
-        loop.close()
+        batched = request.form.get('batched', 'true').lower() == 'true'
+        results = run_async(coordinator.recognize_batch(audio_data_list, options, batched=batched))
         
         # 統計結果
         successful = sum(1 for r in results if r.get('success', False))
@@ -232,7 +283,7 @@ def get_status():
 @token_required
 def clear_cache():
     """
-    清理系統快取
+    清理系統快取（引擎快取與識別結果快取）
     
     響應:
         {
@@ -307,6 +358,8 @@ def recognize_audio_test():
         - language_hint: 語言提示（可選，zh/zh-TW/minnan）
         - return_details: 是否返回詳細信息（可選，true/false）
         - enable_minnan_optimization: 是否啟用閩南語優化（可選，true/false）
+        - use_cache: 是否使用識別結果快取（可選，true/false，預設 true）
+        - target_rtf: 目標即時率（可選，例如 0.5；先 greedy 解碼，品質不足才在預算內以較寬 beam 重新解碼）
     
     響應:
         {
@@ -316,6 +369,7 @@ def recognize_audio_test():
             "language": "zh",
             "audio_duration": 5.2,
             "processing_time": 1.5,
+            "from_cache": true,  // 結果來自快取時
             "details": {...}  // 如果 return_details=true
         }
     """
@@ -341,19 +395,19 @@ def recognize_audio_test():
         options = {
             'language_hint': request.form.get('language_hint', 'zh'),
             'return_details': request.form.get('return_details', 'false').lower() == 'true',
-            'enable_minnan_optimization': request.form.get('enable_minnan_optimization', 'true').lower() == 'true'
+            'enable_minnan_optimization': request.form.get('enable_minnan_optimization', 'true').lower() == 'true',
+            'use_cache': request.form.get('use_cache', 'true').lower() == 'true'
         }
         
+        error_response = apply_target_rtf(options)
+        if error_response:
+            return error_response
+        
         logger.info(f"收到測試識別請求: {file.filename}, 大小: {len(audio_data)} bytes")
         
         # 執行識別（異步轉同步）
         coordinator = get_asr_coordinator()
-        loop = asyncio.new_event_loop()
-        asyncio.set_event_loop(loop)
-        result = loop.run_until_complete(
-            coordinator.recognize(audio_data, options)
-        )
-        loop.close()
+        result = run_async(coordinator.recognize(audio_data, options))
         
         logger.info(f"測試識別完成: {result.get('text', '')[:50]}...")
         
@@ -365,3 +419,140 @@ def recognize_audio_test():
             'success': False,
             'error': str(e)
         }), 500
+
+
+# ==================== 串流識別（SocketIO） ====================
+
+ASR_STREAM_NAMESPACE = '/asr_stream'
+
+# 串流識別會話 {sid: StreamingRecognizer}
+_stream_sessions = {}
+_stream_sessions_lock = threading.Lock()
+
+# 識別結果類型對應的 SocketIO 事件名稱
+_STREAM_EVENTS = {
+    'partial': 'transcript_partial',
+    'final': 'transcript_final',
+    'end': 'stream_ended',
+    'error': 'error'
+}
+
+
+def init_asr_socketio_events(socketio):
+    """
+    初始化串流識別 SocketIO 事件（需要在 app.py 中初始化 SocketIO）
+    
+    事件流程（namespace: /asr_stream）:
+        connect        auth={'token': JWT}（或查詢參數 token）
+        start_stream   {sample_rate, language_hint, partial_interval}  -> stream_started
+        audio_chunk    {audio: PCM16 mono bytes 或 base64 字串}        -> transcript_partial / transcript_final
+        end_stream                                                     -> stream_ended（完整轉錄與各語音段）
+    
+    音頻以能量 VAD 切分語音段，每段結束即解碼並輸出 transcript_final；
+    進行中的語音段每隔 partial_interval 秒輸出一次 transcript_partial。
+    """
+    from flask_socketio import emit
+    
+    def _pop_session(sid):
+        with _stream_sessions_lock:
+            return _stream_sessions.pop(sid, None)
+    
+    @socketio.on('connect', namespace=ASR_STREAM_NAMESPACE)
+    def handle_stream_connect(auth=None):
+        """客戶端連接（驗證 JWT）"""
+        token = (auth or {}).get('token') or request.args.get('token')
+        try:
+            decode_token(token)
+        except Exception:
+            logger.warning(f"串流識別連線認證失敗: {request.sid}")
+            return False
+        emit('connected', {'status': 'success'})
+    
+    @socketio.on('disconnect', namespace=ASR_STREAM_NAMESPACE)
+    def handle_stream_disconnect():
+        """客戶端斷開，中止未完成的串流"""
+        recognizer = _pop_session(request.sid)
+        if recognizer:
+            recognizer.close()
+    
+    @socketio.on('start_stream', namespace=ASR_STREAM_NAMESPACE)
+    def handle_start_stream(data=None):
+        """開始串流識別"""
+        data = data or {}
+        sid = request.sid
+        
+        try:
+            sample_rate = int(data.get('sample_rate', 16000))
+            partial_interval = float(data.get('partial_interval', 1.0))
+        except (TypeError, ValueError):
+            emit('error', {'error': 'sample_rate 或 partial_interval 格式錯誤'})
+            return
+        
+        options = {
+            'language_hint': data.get('language_hint', 'zh'),
+            'enable_minnan_optimization': str(data.get('enable_minnan_optimization', 'true')).lower() == 'true'
+        }
+        
+        def on_event(event):
+            socketio.emit(
+                _STREAM_EVENTS.get(event['type'], 'error'), event,
+                room=sid, namespace=ASR_STREAM_NAMESPACE
+            )
+        
+        try:
+            recognizer = StreamingRecognizer(
+                get_asr_coordinator(),
+                get_event_loop(),
+                on_event,
+                sample_rate=sample_rate,
+                options=options,
+                partial_interval_s=partial_interval
+            )
+        except Exception as e:
+            logger.error(f"串流識別啟動失敗: {e}", exc_info=True)
+            emit('error', {'error': str(e)})
+            return
+        
+        previous = _pop_session(sid)
+        if previous:
+            previous.close()
+        with _stream_sessions_lock:
+            _stream_sessions[sid] = recognizer
+        
+        logger.info(f"串流識別開始: {sid} ({sample_rate}Hz)")
+        emit('stream_started', {'sample_rate': sample_rate, 'partial_interval': partial_interval})
+    
+    @socketio.on('audio_chunk', namespace=ASR_STREAM_NAMESPACE)
+    def handle_audio_chunk(data):
+        """接收 PCM 音頻片段"""
+        with _stream_sessions_lock:
+            recognizer = _stream_sessions.get(request.sid)
+        if recognizer is None:
+            emit('error', {'error': '串流尚未開始'})
+            return
+        
+        audio = data.get('audio') if isinstance(data, dict) else data
+        if isinstance(audio, str):
+            try:
+                audio = base64.b64decode(audio)
+            except ValueError:
+                emit('error', {'error': '音頻格式錯誤'})
+                return
+        if not audio:
+            return
+        
+        try:
+            recognizer.feed(audio)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"串流音頻格式錯誤: {request.sid}: {e}")
+            emit('error', {'error': '音頻格式錯誤'})
+    
+    @socketio.on('end_stream', namespace=ASR_STREAM_NAMESPACE)
+    def handle_end_stream(data=None):
+        """結束串流，輸出剩餘結果與完整轉錄"""
+        recognizer = _pop_session(request.sid)
+        if recognizer is None:
+            emit('error', {'error': '串流尚未開始'})
+            return
+        recognizer.finish()
+        logger.info(f"串流識別結束: {request.sid}")
@@ -49,7 +49,11 @@ def test_pwa():
 
 @carbon_bp.route('/api/visit-records', methods=['GET'])
 def get_visit_records():
-    """取得訪視記錄列表（支援搜尋和篩選）"""
+    """取得訪視記錄列表（支援搜尋、篩選與游標分頁）
+    
+    回應的 next_cursor 可作為下一頁的 cursor 參數；total 由彙總表計算，
+    有關鍵字時為估計值（total_is_estimate）。
+    """
     # 取得參數
     limit = request.args.get('limit', 100, type=int)
     keyword = request.args.get('keyword', '').strip()
@@ -57,21 +61,39 @@ def get_visit_records():
     start_date = request.args.get('start_date', '').strip()
     end_date = request.args.get('end_date', '').strip()
     transport_type = request.args.get('transport_type', '').strip()
+    cursor = request.args.get('cursor', '').strip()
     
-    # 如果有任何篩選條件，使用篩選查詢
-    if keyword or worker_id or start_date or end_date or transport_type:
-        records = db.search_visit_records(
-            keyword=keyword,
-            worker_id=worker_id,
-            start_date=start_date,
-            end_date=end_date,
-            transport_type=transport_type,
-            limit=limit
-        )
-    else:
-        records = db.get_all_visit_records(limit)
+    filters = {
+        'keyword': keyword,
+        'worker_id': worker_id,
+        'start_date': start_date,
+        'end_date': end_date,
+        'transport_type': transport_type
+    }
     
-    return jsonify({'success': True, 'data': records})
+    try:
+        # 多取一筆以判斷是否還有下一頁
+        if cursor or any(filters.values()):
+            records = db.search_visit_records(limit=limit + 1, after=cursor or None, **filters)
+        else:
+            records = db.get_all_visit_records(limit + 1)
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    next_cursor = None
+    if len(records) > limit:
+        records = records[:limit]
+        next_cursor = db.encode_visit_cursor(records[-1]) if records else None
+    
+    total, total_is_estimate = db.count_visit_records(**filters)
+    
+    return jsonify({
+        'success': True,
+        'data': records,
+        'next_cursor': next_cursor,
+        'total': total,
+        'total_is_estimate': total_is_estimate
+    })
 
 @carbon_bp.route('/api/visit-records', methods=['POST'])
 def create_visit_record():
@@ -83,6 +105,69 @@ def create_visit_record():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+# 匯出欄位：(標題, 欄位名稱, Excel 欄寬)
+EXPORT_COLUMNS = [
+    ('日期', 'visit_date', 12),
+    ('社工編號', 'social_worker_id', 12),
+    ('社工姓名', 'social_worker_name', 12),
+    ('長者編號', 'elder_id', 12),
+    ('長者姓名', 'elder_name', 12),
+    ('訪視類型', 'visit_type', 12),
+    ('交通工具', 'transport_type', 12),
+    ('里程(km)', 'distance', 10),
+    ('行駛時間(分)', 'travel_time', 12),
+    ('碳排放(kg)', 'carbon_emission', 12),
+    ('出發地點', 'start_location', 15),
+    ('目的地點', 'end_location', 15),
+    ('備註', 'notes', 20)
+]
+
+# Excel 單一工作表的列數上限（含標題列），超過時接續寫入新的工作表
+EXCEL_SHEET_MAX_ROWS = 1048576
+
+# 匯入 CSV 時接受的中文欄位名稱（與匯出檔相同，碳排放由系統重新計算）
+CSV_HEADER_ALIASES = {
+    header: field for header, field, _ in EXPORT_COLUMNS if field != 'carbon_emission'
+}
+
+def _iter_csv_records(text_stream):
+    """逐列讀取 CSV，欄位名稱轉為資料庫欄位"""
+    import csv
+    
+    reader = csv.reader(text_stream)
+    header = next(reader, None)
+    if not header:
+        return
+    fields = [CSV_HEADER_ALIASES.get(name.strip(), name.strip()) for name in header]
+    
+    for row in reader:
+        if not any(cell.strip() for cell in row):
+            continue
+        yield dict(zip(fields, row))
+
+@carbon_bp.route('/api/visit-records/bulk', methods=['POST'])
+def bulk_create_visit_records():
+    """批次匯入訪視記錄（JSON 陣列或 CSV 檔案）"""
+    try:
+        import io
+        
+        if request.is_json:
+            payload = request.get_json()
+            records = payload.get('records') if isinstance(payload, dict) else payload
+            if not isinstance(records, list):
+                return jsonify({'success': False, 'error': '請提供 records 陣列'}), 400
+        else:
+            # CSV 可用 multipart 上傳（欄位 file）或直接以 text/csv 作為請求內容
+            upload = request.files.get('file')
+            stream = upload.stream if upload else request.stream
+            text_stream = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+            records = _iter_csv_records(text_stream)
+        
+        result = db.add_visit_records_bulk(records)
+        return jsonify({'success': True, **result})
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+
 @carbon_bp.route('/api/visit-records/<int:record_id>', methods=['GET'])
 def get_visit_record(record_id):
     """取得單筆訪視記錄"""
@@ -154,23 +239,8 @@ def get_period_statistics():
     start_date = request.args.get('start_date', '2024-06-01')
     end_date = request.args.get('end_date', '2024-09-30')
     
-    # 解析日期
-    start = datetime.strptime(start_date, '%Y-%m-%d')
-    end = datetime.strptime(end_date, '%Y-%m-%d')
-    
-    # 按月統計
-    monthly_data = []
-    current = start
-    
-    while current <= end:
-        stats = db.get_monthly_statistics(current.year, current.month)
-        monthly_data.append(stats)
-        
-        # 移到下個月
-        if current.month == 12:
-            current = datetime(current.year + 1, 1, 1)
-        else:
-            current = datetime(current.year, current.month + 1, 1)
+    # 按月統計（讀取月度彙總表）
+    monthly_data = db.get_period_statistics(start_date, end_date)
     
     return jsonify({'success': True, 'data': monthly_data})
 
@@ -180,24 +250,7 @@ def get_transport_distribution():
     start_date = request.args.get('start_date', '2024-06-01')
     end_date = request.args.get('end_date', '2024-09-30')
     
-    conn = db.get_connection()
-    cursor = conn.cursor()
-    
-    cursor.execute('''
-    SELECT 
-        transport_type,
-        COUNT(*) as count,
-        SUM(distance) as total_distance,
-        SUM(carbon_emission) as total_emission
-    FROM visit_records
-    WHERE visit_date BETWEEN ? AND ?
-    GROUP BY transport_type
-    ''', (start_date, end_date))
-    
-    columns = ['transport_type', 'count', 'total_distance', 'total_emission']
-    results = [dict(zip(columns, row)) for row in cursor.fetchall()]
-    
-    conn.close()
+    results = db.get_transport_distribution(start_date, end_date)
     
     return jsonify({'success': True, 'data': results})
 
@@ -205,23 +258,11 @@ def get_transport_distribution():
 def get_social_worker(worker_id):
     """根據工號查詢社工姓名"""
     try:
-        conn = db.get_connection()
-        cursor = conn.cursor()
-        
         # 從訪視記錄中查詢該工號最近使用的姓名
-        cursor.execute('''
-        SELECT social_worker_name
-        FROM visit_records
-        WHERE social_worker_id = ?
-        ORDER BY created_at DESC
-        LIMIT 1
-        ''', (worker_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
+        name = db.get_social_worker_name(worker_id)
         
-        if row:
-            return jsonify({'success': True, 'name': row[0]})
+        if name:
+            return jsonify({'success': True, 'name': name})
         else:
             return jsonify({'success': False, 'error': '查無此工號'})
     except Exception as e:
@@ -254,164 +295,166 @@ def get_all_social_workers():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
+def _export_records():
+    """依查詢參數逐批讀取要匯出的訪視記錄"""
+    return db.iter_visit_records(
+        keyword=request.args.get('keyword', '').strip(),
+        worker_id=request.args.get('worker_id', '').strip(),
+        start_date=request.args.get('start_date', '').strip(),
+        end_date=request.args.get('end_date', '').strip(),
+        transport_type=request.args.get('transport_type', '').strip()
+    )
+
+def _export_row(record):
+    """將一筆記錄轉為匯出欄位順序的值"""
+    row = []
+    for _, field, _ in EXPORT_COLUMNS:
+        value = record.get(field)
+        row.append('' if value is None else value)
+    return row
+
+def _attachment_header(filename):
+    """產生支援中文檔名的 Content-Disposition"""
+    from urllib.parse import quote
+    
+    ascii_name = filename.encode('ascii', 'ignore').decode('ascii') or 'export'
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(filename)}"
+
+def _export_sheet(wb, index):
+    """建立匯出工作表並寫入欄寬與標題列（第 2 個起的工作表名稱加上序號）"""
+    from openpyxl.cell import WriteOnlyCell
+    from openpyxl.styles import Font, PatternFill, Alignment
+    from openpyxl.utils import get_column_letter
+    
+    title = "訪視記錄" if index == 1 else f"訪視記錄 ({index})"
+    ws = wb.create_sheet(title=title)
+    
+    # 調整欄寬（write-only 模式須在寫入資料前設定）
+    for col, (_, _, width) in enumerate(EXPORT_COLUMNS, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+    
+    # 設定標題樣式
+    header_fill = PatternFill(start_color="689F38", end_color="689F38", fill_type="solid")
+    header_font = Font(bold=True, color="FFFFFF")
+    header_alignment = Alignment(horizontal="center", vertical="center")
+    
+    # 標題列
+    header_cells = []
+    for header, _, _ in EXPORT_COLUMNS:
+        cell = WriteOnlyCell(ws, value=header)
+        cell.fill = header_fill
+        cell.font = header_font
+        cell.alignment = header_alignment
+        header_cells.append(cell)
+    ws.append(header_cells)
+    return ws
+
 @carbon_bp.route('/api/export/excel')
 def export_excel():
-    """匯出訪視記錄為 Excel"""
+    """
+    匯出訪視記錄為 Excel（write-only 模式，記憶體用量不隨筆數增加）
+    
+    超過 Excel 單一工作表列數上限時，分成多個工作表（每個工作表都有標題列）
+    """
     try:
-        from flask import send_file
+        from flask import Response
         from openpyxl import Workbook
-        from openpyxl.styles import Font, PatternFill, Alignment
-        from datetime import datetime
-        import io
+        import os
+        import tempfile
         
-        # 取得篩選參數
-        keyword = request.args.get('keyword', '').strip()
-        worker_id = request.args.get('worker_id', '').strip()
-        start_date = request.args.get('start_date', '').strip()
-        end_date = request.args.get('end_date', '').strip()
-        transport_type = request.args.get('transport_type', '').strip()
+        wb = Workbook(write_only=True)
+        sheet_index = 1
+        ws = _export_sheet(wb, sheet_index)
+        rows_per_sheet = EXCEL_SHEET_MAX_ROWS - 1
         
-        # 查詢資料
-        if keyword or worker_id or start_date or end_date or transport_type:
-            records = db.search_visit_records(
-                keyword=keyword,
-                worker_id=worker_id,
-                start_date=start_date,
-                end_date=end_date,
-                transport_type=transport_type,
-                limit=10000
-            )
-        else:
-            records = db.get_all_visit_records(10000)
+        # 資料列（逐批從資料庫讀取，直接寫入暫存檔）
+        for count, record in enumerate(_export_records()):
+            if count and count % rows_per_sheet == 0:
+                sheet_index += 1
+                ws = _export_sheet(wb, sheet_index)
+            ws.append(_export_row(record))
         
-        # 建立 Excel
-        wb = Workbook()
-        ws = wb.active
-        ws.title = "訪視記錄"
+        # 儲存到暫存檔，回應結束（傳送完畢或用戶端中斷）後刪除
+        fd, temp_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
         
-        # 設定標題樣式
-        header_fill = PatternFill(start_color="689F38", end_color="689F38", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF")
-        header_alignment = Alignment(horizontal="center", vertical="center")
-        
-        # 標題列
-        headers = ['日期', '社工編號', '社工姓名', '長者編號', '長者姓名', 
-                  '訪視類型', '交通工具', '里程(km)', '行駛時間(分)', 
-                  '碳排放(kg)', '出發地點', '目的地點', '備註']
-        
-        for col, header in enumerate(headers, 1):
-            cell = ws.cell(row=1, column=col, value=header)
-            cell.fill = header_fill
-            cell.font = header_font
-            cell.alignment = header_alignment
-        
-        # 資料列
-        for row_idx, record in enumerate(records, 2):
-            ws.cell(row=row_idx, column=1, value=record['visit_date'])
-            ws.cell(row=row_idx, column=2, value=record['social_worker_id'])
-            ws.cell(row=row_idx, column=3, value=record['social_worker_name'])
-            ws.cell(row=row_idx, column=4, value=record['elder_id'])
-            ws.cell(row=row_idx, column=5, value=record.get('elder_name', ''))
-            ws.cell(row=row_idx, column=6, value=record['visit_type'])
-            ws.cell(row=row_idx, column=7, value=record['transport_type'])
-            ws.cell(row=row_idx, column=8, value=record['distance'])
-            ws.cell(row=row_idx, column=9, value=record.get('travel_time', ''))
-            ws.cell(row=row_idx, column=10, value=record.get('carbon_emission', ''))
-            ws.cell(row=row_idx, column=11, value=record.get('start_location', ''))
-            ws.cell(row=row_idx, column=12, value=record.get('end_location', ''))
-            ws.cell(row=row_idx, column=13, value=record.get('notes', ''))
-        
-        # 調整欄寬
-        column_widths = [12, 12, 12, 12, 12, 12, 12, 10, 12, 12, 15, 15, 20]
-        for col, width in enumerate(column_widths, 1):
-            ws.column_dimensions[chr(64 + col)].width = width
-        
-        # 儲存到記憶體
-        output = io.BytesIO()
-        wb.save(output)
-        output.seek(0)
+        def cleanup():
+            try:
+                os.remove(temp_path)
+            except FileNotFoundError:
+                pass
         
         # 產生檔名
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'訪視記錄_{timestamp}.xlsx'
         
-        return send_file(
-            output,
-            mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
-            as_attachment=True,
-            download_name=filename
-        )
+        def generate(chunk_size=64 * 1024):
+            try:
+                with open(temp_path, 'rb') as f:
+                    while True:
+                        chunk = f.read(chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+            finally:
+                cleanup()
+        
+        try:
+            wb.save(temp_path)
+            response = Response(
+                generate(),
+                mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+                headers={
+                    'Content-Disposition': _attachment_header(filename),
+                    'Content-Length': str(os.path.getsize(temp_path))
+                }
+            )
+        except Exception:
+            cleanup()
+            raise
+        
+        # 產生器未開始迭代就關閉時不會執行 finally，由 call_on_close 確保刪除
+        response.call_on_close(cleanup)
+        return response
         
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 400
 
 @carbon_bp.route('/api/export/csv')
 def export_csv():
-    """匯出訪視記錄為 CSV"""
+    """匯出訪視記錄為 CSV（串流輸出）"""
     try:
-        from flask import Response
-        from datetime import datetime
+        from flask import Response, stream_with_context
         import csv
         import io
         
-        # 取得篩選參數
-        keyword = request.args.get('keyword', '').strip()
-        worker_id = request.args.get('worker_id', '').strip()
-        start_date = request.args.get('start_date', '').strip()
-        end_date = request.args.get('end_date', '').strip()
-        transport_type = request.args.get('transport_type', '').strip()
-        
-        # 查詢資料
-        if keyword or worker_id or start_date or end_date or transport_type:
-            records = db.search_visit_records(
-                keyword=keyword,
-                worker_id=worker_id,
-                start_date=start_date,
-                end_date=end_date,
-                transport_type=transport_type,
-                limit=10000
-            )
-        else:
-            records = db.get_all_visit_records(10000)
-        
-        # 建立 CSV
-        output = io.StringIO()
-        writer = csv.writer(output)
+        records = _export_records()
         
-        # 標題列
-        writer.writerow(['日期', '社工編號', '社工姓名', '長者編號', '長者姓名', 
-                        '訪視類型', '交通工具', '里程(km)', '行駛時間(分)', 
-                        '碳排放(kg)', '出發地點', '目的地點', '備註'])
-        
-        # 資料列
-        for record in records:
-            writer.writerow([
-                record['visit_date'],
-                record['social_worker_id'],
-                record['social_worker_name'],
-                record['elder_id'],
-                record.get('elder_name', ''),
-                record['visit_type'],
-                record['transport_type'],
-                record['distance'],
-                record.get('travel_time', ''),
-                record.get('carbon_emission', ''),
-                record.get('start_location', ''),
-                record.get('end_location', ''),
-                record.get('notes', '')
-            ])
+        def generate(batch_size=1000):
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            
+            # 使用 UTF-8 BOM 以支援 Excel 開啟中文
+            buffer.write('\ufeff')
+            writer.writerow([header for header, _, _ in EXPORT_COLUMNS])
+            
+            for count, record in enumerate(records, 1):
+                writer.writerow(_export_row(record))
+                if count % batch_size == 0:
+                    yield buffer.getvalue().encode('utf-8')
+                    buffer.seek(0)
+                    buffer.truncate()
+            
+            yield buffer.getvalue().encode('utf-8')
         
         # 產生檔名
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f'訪視記錄_{timestamp}.csv'
         
-        # 返回 CSV（使用 UTF-8 BOM 以支援 Excel 開啟中文）
-        output_bytes = '\ufeff' + output.getvalue()
-        
         return Response(
-            output_bytes,
-            mimetype='text/csv',
-            headers={'Content-Disposition': f'attachment; filename={filename}'}
+            stream_with_context(generate()),
+            mimetype='text/csv; charset=utf-8',
+            headers={'Content-Disposition': _attachment_header(filename)}
         )
         
     except Exception as e:
@@ -407,24 +407,15 @@ def get_statistics():
     """
     獲取統計數據
     
+    Query Parameters:
+        days (int, optional): 每日統計天數，預設 7
+    
     Returns:
         JSON: 統計數據
     """
     try:
-        # 模擬統計數據（實際應從數據庫查詢）
-        statistics = {
-            'total_calls': 1250,
-            'answer_rate': 0.85,
-            'satisfaction_score': 4.5,
-            'pending_schedules': 15,
-            'language_distribution': {
-                'mandarin': 750,
-                'minan': 400,
-                'both': 100
-            },
-            'recent_records': [],
-            'daily_stats': []
-        }
+        days = min(max(request.args.get('days', 7, type=int), 1), 90)
+        statistics = voice_care_service.get_statistics(days=days)
         
         return jsonify({
             'success': True,
@@ -72,6 +72,7 @@ def generate_mock_data():
         # 每月每位長者平均訪視2次（導入AI後）
         monthly_visits = 0
         monthly_ai_care = 0
+        visit_batch = []
         
         # 生成該月的訪視記錄
         days_in_month = (datetime(year, month + 1, 1) - timedelta(days=1)).day if month < 12 else 31
@@ -117,8 +118,7 @@ def generate_mock_data():
                         'notes': random.choice(['順利完成', '長者狀況良好', '需要後續追蹤', ''])
                     }
                     
-                    db.add_visit_record(visit_data)
-                    monthly_visits += 1
+                    visit_batch.append(visit_data)
                 
                 # 生成AI關懷記錄（每天約440次，是訪視的2倍）
                 daily_ai_care = random.randint(400, 480)
@@ -138,6 +138,10 @@ def generate_mock_data():
                     db.add_ai_care_record(ai_care_data)
                     monthly_ai_care += 1
         
+        # 整月訪視記錄一次批次寫入
+        result = db.add_visit_records_bulk(visit_batch)
+        monthly_visits = result['inserted']
+        
         total_visits += monthly_visits
         total_ai_care += monthly_ai_care
         
@@ -10,6 +10,10 @@ import sqlite3
 import random
 from datetime import datetime, timedelta
 
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+DB_PATH = 'carbon_tracking.db'
+
 # 原有的姓名
 EXISTING_NAMES = [
     "陳冠宇",
@@ -53,7 +57,9 @@ NEW_NAMES = MALE_NAMES + FEMALE_NAMES
 def add_new_social_workers():
     """增加新的社工記錄"""
     
-    conn = sqlite3.connect('carbon_tracking.db')
+    # 建立資料表與彙總表觸發器（舊版資料庫會先重建彙總表），之後直接寫入的記錄由觸發器同步彙總表
+    CarbonTrackingDB(DB_PATH)
+    conn = sqlite3.connect(DB_PATH)
     cursor = conn.cursor()
     
     try:
@@ -0,0 +1,90 @@
+"""
+Acoustic Features - 語音片段聲學特徵
+同一段音頻的 F0、RMS、零交叉率等特徵只計算一次，供閩南語與高齡語音檢測器共用
+"""
+
+import logging
+import numpy as np
+from functools import cached_property
+
+logger = logging.getLogger(__name__)
+
+
+class AcousticFeatures:
+    """
+    單一語音片段的聲學特徵（延遲計算）
+
+    每個特徵在第一次讀取時才計算，之後直接回傳快取結果。
+    幀參數與 librosa 預設一致（frame_length=2048, hop_length=512），
+    各檢測器原本各自計算的結果與此處完全相同。
+    """
+
+    def __init__(self,
+                 audio: np.ndarray,
+                 sample_rate: int = 16000,
+                 frame_length: int = 2048,
+                 hop_length: int = 512):
+        """
+        Args:
+            audio: 音頻數組 (numpy array)
+            sample_rate: 採樣率
+            frame_length: 分析幀長度
+            hop_length: 幀移
+        """
+        self.audio = audio
+        self.sample_rate = sample_rate
+        self.frame_length = frame_length
+        self.hop_length = hop_length
+
+    @property
+    def duration(self) -> float:
+        """音頻長度（秒）"""
+        return len(self.audio) / self.sample_rate
+
+    @cached_property
+    def f0(self) -> np.ndarray:
+        """基頻（YIN，C2-C7）"""
+        import librosa
+        return librosa.yin(
+            self.audio,
+            fmin=librosa.note_to_hz('C2'),
+            fmax=librosa.note_to_hz('C7'),
+            sr=self.sample_rate,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length
+        )
+
+    @cached_property
+    def voiced_mask(self) -> np.ndarray:
+        """有聲幀遮罩（F0 > 0）"""
+        return self.f0 > 0
+
+    @cached_property
+    def f0_voiced(self) -> np.ndarray:
+        """有聲幀的基頻"""
+        return self.f0[self.voiced_mask]
+
+    @cached_property
+    def rms_frames(self) -> np.ndarray:
+        """逐幀 RMS 能量"""
+        import librosa
+        return librosa.feature.rms(
+            y=self.audio,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length
+        )[0]
+
+    @cached_property
+    def zcr(self) -> np.ndarray:
+        """逐幀零交叉率"""
+        import librosa
+        return librosa.feature.zero_crossing_rate(
+            self.audio,
+            frame_length=self.frame_length,
+            hop_length=self.hop_length
+        )[0]
+
+    @cached_property
+    def rms(self) -> float:
+        """整段音頻的 RMS 能量"""
+        return float(np.sqrt(np.mean(self.audio ** 2)))
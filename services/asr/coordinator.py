@@ -4,6 +4,7 @@ ASR Coordinator - 協調雙引擎 ASR 工作流程
 """
 
 import asyncio
+import os
 import time
 import logging
 from typing import Dict, Any, Optional, Tuple
@@ -16,11 +17,16 @@ from .funasr_engine import FunASREngine
 from .fusion import ConfidenceFusion
 from .minnan_detector import MinnanLanguageDetector
 from .elderly_detector import ElderlyVoiceDetector
+from .acoustic_features import AcousticFeatures
+from .result_cache import ASRResultCache
 
 # 配置日誌
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# 識別結果磁碟快取預設目錄
+DEFAULT_RESULT_CACHE_DIR = os.path.join('data', 'cache', 'asr_results')
+
 
 class ASRCoordinator:
     """
@@ -38,7 +44,11 @@ class ASRCoordinator:
                  whisper_model_size: str = "base",
                  enable_funasr: bool = False,
                  funasr_model_path: str = None,
-                 device: str = "cuda"):
+                 device: str = "cuda",
+                 inference_workers: int = 2,
+                 target_rtf: Optional[float] = None,
+                 result_cache_size: int = 256,
+                 result_cache_dir: Optional[str] = DEFAULT_RESULT_CACHE_DIR):
         """
         初始化 ASR Coordinator
         
@@ -47,13 +57,19 @@ class ASRCoordinator:
             enable_funasr: 是否啟用 FunASR 引擎
             funasr_model_path: FunASR 本地模型路徑（可選）
             device: 運算設備 (cuda/cpu)
+            inference_workers: 每個引擎的推理工作執行緒數量（每個執行緒一份模型副本）
+            target_rtf: Whisper 預設目標即時率（設定後先 greedy 解碼，未達品質門檻才在預算內升級 beam）
+            result_cache_size: 識別結果記憶體快取筆數（0 表示停用結果快取）
+            result_cache_dir: 識別結果磁碟快取目錄（None 表示只使用記憶體快取）
         """
         logger.info("初始化 ASR Coordinator...")
         
         # 初始化 Whisper 引擎
         self.whisper_engine = WhisperEngine(
             model_size=whisper_model_size,
-            device=device
+            device=device,
+            num_workers=inference_workers,
+            target_rtf=target_rtf
         )
         logger.info(f"✓ Whisper 引擎已載入 (模型: {whisper_model_size}, 設備: {device})")
         
@@ -64,7 +80,8 @@ class ASRCoordinator:
             try:
                 self.funasr_engine = FunASREngine(
                     device=device,
-                    local_model_path=funasr_model_path
+                    local_model_path=funasr_model_path,
+                    num_workers=inference_workers
                 )
                 logger.info(f"✓ FunASR 引擎已載入 (設備: {device})")
             except Exception as e:
@@ -87,6 +104,12 @@ class ASRCoordinator:
         self.target_sample_rate = 16000  # 目標採樣率
         self.max_audio_length = 60  # 最大音頻長度（秒）
         
+        # 識別結果快取（相同音頻 + 相同設定直接返回先前結果）
+        self.result_cache = ASRResultCache(
+            max_entries=result_cache_size,
+            cache_dir=result_cache_dir
+        )
+        
         # 優化模型推理
         self.whisper_engine.optimize_for_inference()
         
@@ -104,6 +127,8 @@ class ASRCoordinator:
                 - language_hint: 語言提示 (zh/zh-TW/minnan)
                 - return_details: 是否返回詳細信息
                 - enable_minnan_optimization: 是否啟用閩南語優化
+                - use_cache: 是否使用識別結果快取（預設 True）
+                - target_rtf: 目標即時率（解碼時間 / 音頻長度），啟用延遲預算解碼
         
         Returns:
             識別結果字典
@@ -112,50 +137,76 @@ class ASRCoordinator:
         options = options or {}
         
         try:
+            # 預處理與特徵檢測為 CPU 運算，移出事件迴圈以便批次中的音頻同時進行
+            loop = asyncio.get_running_loop()
+            
+            # 0. 結果快取
+            cache_key, cached = await loop.run_in_executor(
+                None, self._lookup_cached, audio_data, options
+            )
+            if cached is not None:
+                return self._cached_output(cached, start_time)
+            
             # 1. 音頻預處理
             logger.info("步驟 1: 音頻預處理...")
-            processed_audio, audio_info = self.preprocess_audio(audio_data)
+            processed_audio, audio_info = await loop.run_in_executor(
+                None, self.preprocess_audio, audio_data
+            )
             
-            # 2. 特徵檢測
-            logger.info("步驟 2: 特徵檢測...")
-            features = self.detect_features(processed_audio, audio_info, options)
+            output = await self._recognize_processed(processed_audio, audio_info, options, start_time)
+            if cache_key:
+                await loop.run_in_executor(None, self.result_cache.set, cache_key, output)
+            return output
             
-            # 3. 並行調用引擎
-            logger.info("步驟 3: 並行調用 ASR 引擎...")
-            if self.enable_funasr and self.funasr_engine:
-                # 雙引擎模式
-                whisper_result, funasr_result = await asyncio.gather(
-                    self._call_whisper(processed_audio, features, options),
-                    self._call_funasr(processed_audio, features, options)
+        except Exception as e:
+            logger.error(f"識別過程發生錯誤: {e}", exc_info=True)
+            return {
+                'success': False,
+                'error': str(e),
+                'processing_time': time.time() - start_time
+            }
+    
+    async def recognize_array(self,
+                              audio: np.ndarray,
+                              sample_rate: int,
+                              options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        識別已解碼的單聲道音頻數組（串流識別的語音段使用）
+        
+        與 recognize 不同，不做長度截斷；語音段各自正規化。
+        
+        Args:
+            audio: 單聲道音頻數組
+            sample_rate: 採樣率
+            options: 可選參數（同 recognize）
+        
+        Returns:
+            識別結果字典
+        """
+        start_time = time.time()
+        options = options or {}
+        
+        try:
+            audio = np.asarray(audio, dtype=np.float32)
+            if sample_rate != self.target_sample_rate:
+                loop = asyncio.get_running_loop()
+                audio = await loop.run_in_executor(
+                    None,
+                    lambda: librosa.resample(audio, orig_sr=sample_rate, target_sr=self.target_sample_rate)
                 )
-            else:
-                # 單引擎模式（僅 Whisper）
-                whisper_result = await self._call_whisper(processed_audio, features, options)
-                funasr_result = None
             
-            # 4. 結果融合
-            logger.info("步驟 4: 結果融合...")
-            final_result = self.fusion_algorithm.fuse(
-                whisper_result,
-                funasr_result,
-                features
-            )
-            
-            # 5. 後處理
-            logger.info("步驟 5: 後處理...")
-            output = self.postprocess_result(
-                final_result,
-                features,
-                audio_info,
-                options
-            )
+            peak = np.max(np.abs(audio)) if len(audio) else 0
+            if peak > 0:
+                audio = audio / peak
             
-            # 添加處理時間
-            processing_time = time.time() - start_time
-            output['processing_time'] = round(processing_time, 3)
+            audio_info = {
+                'sample_rate': self.target_sample_rate,
+                'duration': len(audio) / self.target_sample_rate,
+                'samples': len(audio),
+                'channels': 1
+            }
             
-            logger.info(f"✓ 識別完成 (耗時: {processing_time:.3f}秒)")
-            return output
+            return await self._recognize_processed(audio, audio_info, options, start_time)
             
         except Exception as e:
             logger.error(f"識別過程發生錯誤: {e}", exc_info=True)
@@ -165,6 +216,86 @@ class ASRCoordinator:
                 'processing_time': time.time() - start_time
             }
     
+    async def _recognize_processed(self,
+                                   processed_audio: np.ndarray,
+                                   audio_info: Dict[str, Any],
+                                   options: Dict[str, Any],
+                                   start_time: float) -> Dict[str, Any]:
+        """特徵檢測、引擎調用、融合與後處理（音頻已完成預處理）"""
+        # 2. 特徵檢測
+        logger.info("步驟 2: 特徵檢測...")
+        loop = asyncio.get_running_loop()
+        features = await loop.run_in_executor(
+            None, self.detect_features, processed_audio, audio_info, options
+        )
+        
+        # 3. 並行調用引擎
+        logger.info("步驟 3: 並行調用 ASR 引擎...")
+        if self.enable_funasr and self.funasr_engine:
+            # 雙引擎模式
+            whisper_result, funasr_result = await asyncio.gather(
+                self._call_whisper(processed_audio, features, options),
+                self._call_funasr(processed_audio, features, options)
+            )
+        else:
+            # 單引擎模式（僅 Whisper）
+            whisper_result = await self._call_whisper(processed_audio, features, options)
+            funasr_result = None
+        
+        # 4. 結果融合
+        logger.info("步驟 4: 結果融合...")
+        final_result = self.fusion_algorithm.fuse(
+            whisper_result,
+            funasr_result,
+            features
+        )
+        
+        # 5. 後處理
+        logger.info("步驟 5: 後處理...")
+        output = self.postprocess_result(
+            final_result,
+            features,
+            audio_info,
+            options
+        )
+        
+        # 添加處理時間
+        processing_time = time.time() - start_time
+        output['processing_time'] = round(processing_time, 3)
+        
+        logger.info(f"✓ 識別完成 (耗時: {processing_time:.3f}秒)")
+        return output
+    
+    def _model_config(self) -> Dict[str, Any]:
+        """影響識別結果的模型設定（計入結果快取鍵）"""
+        return {
+            'version': '1.0.0',
+            'whisper_model': self.whisper_engine.model_size,
+            'target_rtf': self.whisper_engine.target_rtf,
+            'funasr_model': self.funasr_engine.model_name if self.enable_funasr and self.funasr_engine else None
+        }
+    
+    def _lookup_cached(self,
+                       audio_data: bytes,
+                       options: Dict[str, Any]) -> Tuple[Optional[str], Optional[Dict[str, Any]]]:
+        """
+        查詢識別結果快取
+        
+        Returns:
+            (快取鍵, 快取結果)；停用快取時兩者皆為 None
+        """
+        if not self.result_cache.enabled or not options.get('use_cache', True):
+            return None, None
+        key = ASRResultCache.make_key(audio_data, self._model_config(), options)
+        return key, self.result_cache.get(key)
+    
+    @staticmethod
+    def _cached_output(cached: Dict[str, Any], start_time: float) -> Dict[str, Any]:
+        """標記快取命中的結果"""
+        cached['from_cache'] = True
+        cached['processing_time'] = round(time.time() - start_time, 3)
+        return cached
+    
     def preprocess_audio(self, audio_data: bytes) -> Tuple[np.ndarray, Dict[str, Any]]:
         """
         音頻預處理
@@ -245,9 +376,12 @@ class ASRCoordinator:
         }
         
         try:
+            # 聲學特徵（F0、RMS、零交叉率）只計算一次，兩個檢測器共用
+            acoustic_features = AcousticFeatures(audio, audio_info['sample_rate'])
+            
             # 計算 SNR（信噪比）
             # 簡化版本：使用 RMS 能量估計
-            rms_energy = np.sqrt(np.mean(audio**2))
+            rms_energy = acoustic_features.rms
             features['snr_db'] = 20 * np.log10(rms_energy + 1e-10)
             
             # 低 SNR 檢測
@@ -261,7 +395,8 @@ class ASRCoordinator:
                 minnan_result = self.minnan_detector.detect(
                     audio=audio,
                     text_hint=None,  # 第一次檢測沒有文本提示
-                    sample_rate=audio_info['sample_rate']
+                    sample_rate=audio_info['sample_rate'],
+                    acoustic_features=acoustic_features
                 )
                 
                 features['is_minnan'] = minnan_result['is_minnan']
@@ -281,7 +416,8 @@ class ASRCoordinator:
                 # 使用高齡語音檢測器
                 elderly_result = self.elderly_detector.detect(
                     audio=audio,
-                    sample_rate=audio_info['sample_rate']
+                    sample_rate=audio_info['sample_rate'],
+                    acoustic_features=acoustic_features
                 )
                 
                 features['is_elderly'] = elderly_result['is_elderly']
@@ -351,6 +487,15 @@ class ASRCoordinator:
             'audio_duration': audio_info.get('duration', 0.0)
         }
         
+        # 引擎錯誤（如 OOM、解碼失敗）：沒有可用文本時視為識別失敗；
+        # 有 FunASR 文本時仍返回結果，但標記引擎錯誤（結果快取不保存）
+        whisper_error = (final_result.get('whisper_result') or {}).get('error')
+        if whisper_error:
+            output['engine_errors'] = {'whisper': whisper_error}
+            if not output['text']:
+                output['success'] = False
+                output['error'] = f"Whisper 引擎錯誤: {whisper_error}"
+        
         # 如果需要詳細信息
         if options.get('return_details', False):
             output['details'] = {
@@ -368,26 +513,31 @@ class ASRCoordinator:
     
     async def recognize_batch(self,
                             audio_data_list: list,
-                            options: Optional[Dict[str, Any]] = None) -> list:
+                            options: Optional[Dict[str, Any]] = None,
+                            batched: bool = True) -> list:
         """
         批次識別多個音頻
         
         Args:
             audio_data_list: 音頻數據列表
             options: 可選參數
+            batched: 是否使用批次解碼（依特徵分組後單次前向傳遞多個音頻）；
+                     False 時每個音頻各自呼叫 recognize
         
         Returns:
             識別結果列表
         """
         logger.info(f"開始批次識別 {len(audio_data_list)} 個音頻...")
         
-        # 並行處理所有音頻
-        tasks = [
-            self.recognize(audio_data, options)
-            for audio_data in audio_data_list
-        ]
-        
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        if batched:
+            results = await self._recognize_batched_cached(audio_data_list, options or {})
+        else:
+            # 並行處理所有音頻
+            tasks = [
+                self.recognize(audio_data, options)
+                for audio_data in audio_data_list
+            ]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
         
         # 處理異常
         processed_results = []
@@ -406,6 +556,103 @@ class ASRCoordinator:
         logger.info(f"✓ 批次識別完成")
         return processed_results
     
+    async def _recognize_batched_cached(self,
+                                        audio_data_list: list,
+                                        options: Dict[str, Any]) -> list:
+        """批次解碼前先查詢結果快取，只解碼未命中的音頻"""
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        
+        lookups = await asyncio.gather(*[
+            loop.run_in_executor(None, self._lookup_cached, audio_data, options)
+            for audio_data in audio_data_list
+        ])
+        results = [
+            self._cached_output(cached, start_time) if cached is not None else None
+            for _, cached in lookups
+        ]
+        
+        misses = [i for i, result in enumerate(results) if result is None]
+        if len(misses) < len(audio_data_list):
+            logger.info(f"結果快取命中 {len(audio_data_list) - len(misses)}/{len(audio_data_list)}")
+        if not misses:
+            return results
+        
+        decoded = await self._recognize_batched([audio_data_list[i] for i in misses], options)
+        for i, result in zip(misses, decoded):
+            results[i] = result
+            cache_key = lookups[i][0]
+            if cache_key and not isinstance(result, Exception):
+                await loop.run_in_executor(None, self.result_cache.set, cache_key, result)
+        
+        return results
+    
+    async def _recognize_batched(self,
+                                 audio_data_list: list,
+                                 options: Dict[str, Any]) -> list:
+        """
+        批次解碼流程
+        
+        1. 各音頻並行預處理與特徵檢測
+        2. Whisper 依特徵分組批次解碼；FunASR（如啟用）同時逐筆識別
+        3. 逐筆融合與後處理
+        
+        預處理失敗的音頻在結果中以 Exception 表示，由 recognize_batch 轉為錯誤結果
+        """
+        start_time = time.time()
+        loop = asyncio.get_running_loop()
+        
+        async def prepare(audio_data):
+            audio, audio_info = await loop.run_in_executor(None, self.preprocess_audio, audio_data)
+            features = await loop.run_in_executor(
+                None, self.detect_features, audio, audio_info, options
+            )
+            return audio, audio_info, features
+        
+        prepared = await asyncio.gather(
+            *[prepare(audio_data) for audio_data in audio_data_list],
+            return_exceptions=True
+        )
+        valid = [i for i, item in enumerate(prepared) if not isinstance(item, Exception)]
+        audios = [prepared[i][0] for i in valid]
+        features_list = [prepared[i][2] for i in valid]
+        
+        async def call_whisper_batch():
+            try:
+                return await self.whisper_engine.recognize_batch(audios, features_list, options)
+            except Exception as e:
+                logger.error(f"Whisper 批次解碼錯誤: {e}")
+                return [{'text': '', 'confidence': 0.0, 'error': str(e)} for _ in audios]
+        
+        async def call_funasr_all():
+            if not (self.enable_funasr and self.funasr_engine):
+                return [None] * len(audios)
+            return await asyncio.gather(*[
+                self._call_funasr(audio, features, options)
+                for audio, features in zip(audios, features_list)
+            ])
+        
+        whisper_results, funasr_results = await asyncio.gather(
+            call_whisper_batch(), call_funasr_all()
+        )
+        
+        results = list(prepared)
+        for k, i in enumerate(valid):
+            audio, audio_info, features = prepared[i]
+            try:
+                final_result = self.fusion_algorithm.fuse(
+                    whisper_results[k],
+                    funasr_results[k],
+                    features
+                )
+                output = self.postprocess_result(final_result, features, audio_info, options)
+                output['processing_time'] = round(time.time() - start_time, 3)
+                results[i] = output
+            except Exception as e:
+                results[i] = e
+        
+        return results
+    
     def get_system_info(self) -> Dict[str, Any]:
         """
         獲取系統信息
@@ -415,9 +662,11 @@ class ASRCoordinator:
                 'version': '1.0.0',
                 'enable_funasr': self.enable_funasr,
                 'target_sample_rate': self.target_sample_rate,
-                'max_audio_length': self.max_audio_length
+                'max_audio_length': self.max_audio_length,
+                'inference_workers': self.whisper_engine.inference_pool.max_workers
             },
-            'whisper_engine': self.whisper_engine.get_model_info()
+            'whisper_engine': self.whisper_engine.get_model_info(),
+            'result_cache': self.result_cache.get_stats()
         }
         
         if self.funasr_engine:
@@ -430,4 +679,5 @@ class ASRCoordinator:
         self.whisper_engine.clear_cache()
         if self.funasr_engine:
             self.funasr_engine.clear_cache()
+        self.result_cache.clear()
         logger.info("✓ 系統快取已清理")
@@ -5,8 +5,9 @@ Elderly Voice Detector - 高齡語音檢測器
 
 import logging
 import numpy as np
-from typing import Dict, Any
-import librosa
+from typing import Dict, Any, Optional
+
+from .acoustic_features import AcousticFeatures
 
 logger = logging.getLogger(__name__)
 
@@ -50,32 +51,37 @@ class ElderlyVoiceDetector:
     
     def detect(self, 
                audio: np.ndarray,
-               sample_rate: int = 16000) -> Dict[str, Any]:
+               sample_rate: int = 16000,
+               acoustic_features: Optional[AcousticFeatures] = None) -> Dict[str, Any]:
         """
         檢測音頻中的高齡語音特徵
         
         Args:
             audio: 音頻數組 (numpy array)
             sample_rate: 採樣率
+            acoustic_features: 與其他檢測器共用的聲學特徵（可選）
         
         Returns:
             檢測結果字典
         """
         try:
+            if acoustic_features is None:
+                acoustic_features = AcousticFeatures(audio, sample_rate)
+            
             # 1. 語速檢測
-            speech_rate, speech_rate_score = self._detect_speech_rate(audio, sample_rate)
+            speech_rate, speech_rate_score = self._detect_speech_rate(acoustic_features)
             
             # 2. 音量檢測
-            volume_mean, volume_std, volume_score = self._detect_volume(audio)
+            volume_mean, volume_std, volume_score = self._detect_volume(acoustic_features)
             
             # 3. 顫抖檢測
-            tremor_detected, tremor_score = self._detect_tremor(audio, sample_rate)
+            tremor_detected, tremor_score = self._detect_tremor(acoustic_features)
             
             # 4. 停頓檢測
-            pause_ratio, pause_score = self._detect_pauses(audio, sample_rate)
+            pause_ratio, pause_score = self._detect_pauses(acoustic_features)
             
             # 5. 音調範圍檢測
-            pitch_range, pitch_score = self._detect_pitch_range(audio, sample_rate)
+            pitch_range, pitch_score = self._detect_pitch_range(acoustic_features)
             
             # 6. 綜合判斷
             # 計算總分（各項特徵加權）
@@ -124,7 +130,7 @@ class ElderlyVoiceDetector:
                 "error": str(e)
             }
     
-    def _detect_speech_rate(self, audio: np.ndarray, sample_rate: int) -> tuple:
+    def _detect_speech_rate(self, features: AcousticFeatures) -> tuple:
         """
         檢測語速
         
@@ -135,16 +141,8 @@ class ElderlyVoiceDetector:
             (語速, 分數)
         """
         try:
-            # 計算能量包絡
-            hop_length = 512
-            frame_length = 2048
-            
-            # RMS 能量
-            rms = librosa.feature.rms(
-                y=audio,
-                frame_length=frame_length,
-                hop_length=hop_length
-            )[0]
+            # 能量包絡（RMS 能量）
+            rms = features.rms_frames
             
             # 檢測語音段（能量高於閾值）
             threshold = np.mean(rms) * 0.5
@@ -160,7 +158,7 @@ class ElderlyVoiceDetector:
             speech_onsets = np.where(diff == 1)[0]
             
             # 估算語速（每秒音節數）
-            duration = len(audio) / sample_rate
+            duration = features.duration
             syllable_count = len(speech_onsets)
             speech_rate = syllable_count / duration if duration > 0 else 0
             
@@ -181,7 +179,7 @@ class ElderlyVoiceDetector:
             logger.warning(f"語速檢測失敗: {e}")
             return 0.0, 0.0
     
-    def _detect_volume(self, audio: np.ndarray) -> tuple:
+    def _detect_volume(self, features: AcousticFeatures) -> tuple:
         """
         檢測音量特徵
         
@@ -191,18 +189,11 @@ class ElderlyVoiceDetector:
             (平均音量, 音量標準差, 分數)
         """
         try:
-            # 計算 RMS 能量（音量）
-            rms = np.sqrt(np.mean(audio**2))
+            # RMS 能量（音量）
+            rms = features.rms
             
             # 計算音量變化（標準差）
-            frame_length = 2048
-            hop_length = 512
-            rms_frames = librosa.feature.rms(
-                y=audio,
-                frame_length=frame_length,
-                hop_length=hop_length
-            )[0]
-            rms_std = np.std(rms_frames)
+            rms_std = np.std(features.rms_frames)
             
             # 計算分數
             volume_score = 0.0
@@ -221,7 +212,7 @@ class ElderlyVoiceDetector:
             logger.warning(f"音量檢測失敗: {e}")
             return 0.0, 0.0, 0.0
     
-    def _detect_tremor(self, audio: np.ndarray, sample_rate: int) -> tuple:
+    def _detect_tremor(self, features: AcousticFeatures) -> tuple:
         """
         檢測聲音顫抖
         
@@ -231,16 +222,8 @@ class ElderlyVoiceDetector:
             (是否檢測到顫抖, 分數)
         """
         try:
-            # 提取基頻（F0）
-            f0 = librosa.yin(
-                audio,
-                fmin=librosa.note_to_hz('C2'),
-                fmax=librosa.note_to_hz('C7'),
-                sr=sample_rate
-            )
-            
-            # 移除無聲部分
-            f0_voiced = f0[f0 > 0]
+            # 基頻（F0），已移除無聲部分
+            f0_voiced = features.f0_voiced
             
             if len(f0_voiced) < 20:
                 return False, 0.0
@@ -250,8 +233,7 @@ class ElderlyVoiceDetector:
             f0_power = np.abs(f0_fft[:len(f0_fft)//2])**2
             
             # 頻率軸
-            hop_length = 512
-            frame_rate = sample_rate / hop_length
+            frame_rate = features.sample_rate / features.hop_length
             freqs = np.fft.fftfreq(len(f0_voiced), 1/frame_rate)[:len(f0_fft)//2]
             
             # 檢測 4-8 Hz 範圍的能量
@@ -277,7 +259,7 @@ class ElderlyVoiceDetector:
             logger.warning(f"顫抖檢測失敗: {e}")
             return False, 0.0
     
-    def _detect_pauses(self, audio: np.ndarray, sample_rate: int) -> tuple:
+    def _detect_pauses(self, features: AcousticFeatures) -> tuple:
         """
         檢測停頓特徵
         
@@ -287,14 +269,8 @@ class ElderlyVoiceDetector:
             (停頓比例, 分數)
         """
         try:
-            # 計算能量
-            hop_length = 512
-            frame_length = 2048
-            rms = librosa.feature.rms(
-                y=audio,
-                frame_length=frame_length,
-                hop_length=hop_length
-            )[0]
+            # 能量
+            rms = features.rms_frames
             
             # 檢測靜音段（能量低於閾值）
             threshold = np.mean(rms) * 0.3
@@ -316,7 +292,7 @@ class ElderlyVoiceDetector:
             logger.warning(f"停頓檢測失敗: {e}")
             return 0.0, 0.0
     
-    def _detect_pitch_range(self, audio: np.ndarray, sample_rate: int) -> tuple:
+    def _detect_pitch_range(self, features: AcousticFeatures) -> tuple:
         """
         檢測音調範圍
         
@@ -326,16 +302,8 @@ class ElderlyVoiceDetector:
             (音調範圍, 分數)
         """
         try:
-            # 提取基頻
-            f0 = librosa.yin(
-                audio,
-                fmin=librosa.note_to_hz('C2'),
-                fmax=librosa.note_to_hz('C7'),
-                sr=sample_rate
-            )
-            
-            # 移除無聲部分
-            f0_voiced = f0[f0 > 0]
+            # 基頻，已移除無聲部分
+            f0_voiced = features.f0_voiced
             
             if len(f0_voiced) < 10:
                 return 0.0, 0.0
@@ -6,8 +6,10 @@ FunASR Engine - FunASR Paraformer 語音識別引擎
 import logging
 import numpy as np
 import torch
+import threading
 from typing import Dict, Any, Optional
-import asyncio
+
+from .inference_pool import InferencePool
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +24,8 @@ class FunASREngine:
     - 內建 VAD、標點、說話人識別
     """
     
-    def __init__(self, model_name: str = "paraformer-zh", device: str = "cuda", local_model_path: str = None):
+    def __init__(self, model_name: str = "paraformer-zh", device: str = "cuda", local_model_path: str = None,
+                 num_workers: int = 2):
         """
         初始化 FunASR 引擎
         
@@ -30,6 +33,7 @@ class FunASREngine:
             model_name: 模型名稱 (paraformer-zh) 或 ModelScope ID
             device: 運算設備 (cuda/cpu)
             local_model_path: 本地模型路徑（如果已手動下載）
+            num_workers: 推理工作執行緒數量（每個執行緒一份模型副本）
         """
         self.model_name = model_name
         self.local_model_path = local_model_path
@@ -46,9 +50,19 @@ class FunASREngine:
         self._load_model()
         logger.info(f"✓ FunASR 模型已載入到 {self.device}")
         
-        # 閩南語微調模型（如果存在）
+        # 推理池：第一個工作執行緒沿用已載入的模型，其餘重新載入一份
+        self._primary_assigned = False
+        self._replica_lock = threading.Lock()
+        self.inference_pool = InferencePool(
+            self._create_replica,
+            max_workers=num_workers,
+            name="funasr"
+        )
+        
+        # 閩南語微調模型（如果存在，僅一份，以鎖保護）
         self.minnan_model = None
         self.minnan_model_loaded = False
+        self._minnan_lock = threading.Lock()
         
         # 預設配置
         self.default_config = {
@@ -59,6 +73,10 @@ class FunASREngine:
     
     def _load_model(self):
         """載入 FunASR 模型"""
+        self.model = self._create_model()
+    
+    def _create_model(self):
+        """建立 FunASR 模型實例（主模型與推理池副本共用）"""
         try:
             from funasr import AutoModel
             import os
@@ -74,7 +92,7 @@ class FunASREngine:
             # 嘗試載入完整模型（包含 VAD 和標點）
             try:
                 logger.info("  嘗試載入完整模型（含 VAD 和標點）...")
-                self.model = AutoModel(
+                model = AutoModel(
                     model=model_path,
                     vad_model="fsmn-vad",
                     punc_model="ct-punc",
@@ -88,7 +106,7 @@ class FunASREngine:
                 
                 # 降級：只載入基礎 ASR 模型
                 try:
-                    self.model = AutoModel(
+                    model = AutoModel(
                         model=model_path,
                         device=self.device
                     )
@@ -98,6 +116,8 @@ class FunASREngine:
                     logger.error(f"  基礎模型載入也失敗: {e2}")
                     raise Exception(f"FunASR 模型載入失敗: {e2}")
             
+            return model
+            
         except ImportError:
             logger.error("FunASR 未安裝，請執行: pip install funasr")
             raise
@@ -129,16 +149,14 @@ class FunASREngine:
             funasr_options = self._prepare_options(features, options)
             
             # 選擇模型（閩南語或標準）
-            model_to_use = self._select_model(features)
+            use_minnan = self._select_model(features) is self.minnan_model
             
-            # 執行識別（在線程池中運行以避免阻塞）
-            loop = asyncio.get_event_loop()
-            result = await loop.run_in_executor(
-                None,
+            # 執行識別（在推理池中運行，不阻塞事件迴圈）
+            result = await self.inference_pool.run(
                 self._run_inference,
-                model_to_use,
                 audio,
-                funasr_options
+                funasr_options,
+                use_minnan
             )
             
             # 計算置信度
@@ -164,16 +182,30 @@ class FunASREngine:
                 'engine': 'funasr'
             }
     
-    def _run_inference(self, model, audio: np.ndarray, options: Dict[str, Any]):
+    def _run_inference(self, model, audio: np.ndarray, options: Dict[str, Any], use_minnan: bool = False):
         """
-        執行推理（同步方法，在線程池中運行）
+        執行推理（同步方法，在推理池的工作執行緒中運行）
+        
+        model 為工作執行緒自己的模型副本；閩南語微調模型只有一份，需取得鎖
         """
+        if use_minnan:
+            with self._minnan_lock:
+                return self.minnan_model.generate(input=audio, **options)
+        
         result = model.generate(
             input=audio,
             **options
         )
         return result
     
+    def _create_replica(self):
+        """建立工作執行緒使用的模型副本"""
+        with self._replica_lock:
+            if not self._primary_assigned:
+                self._primary_assigned = True
+                return self.model
+        return self._create_model()
+    
     def _select_model(self, features: Dict[str, Any]):
         """
         根據特徵選擇模型
@@ -370,7 +402,8 @@ class FunASREngine:
             'device': self.device,
             'cuda_available': torch.cuda.is_available(),
             'model_loaded': self.model is not None,
-            'minnan_model_loaded': self.minnan_model_loaded
+            'minnan_model_loaded': self.minnan_model_loaded,
+            'inference_pool': self.inference_pool.get_stats()
         }
         
         # 添加記憶體信息
@@ -0,0 +1,110 @@
+"""
+Inference Pool - ASR 模型推理執行緒池
+將同步的模型推理移出事件迴圈，並讓每個工作執行緒持有自己的模型副本
+"""
+
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List
+
+logger = logging.getLogger(__name__)
+
+
+class InferencePool:
+    """
+    有界推理執行緒池
+
+    特點:
+    - 工作執行緒數量固定，同時進行的推理不超過 max_workers
+    - 每個工作執行緒第一次執行任務時由 model_factory 建立模型副本，
+      之後只使用自己的副本（Whisper 解碼時會在模型上掛 KV cache hook，
+      同一模型不可被多個執行緒同時使用）
+    - PyTorch 運算期間會釋放 GIL，執行緒之間可真正並行
+    """
+
+    def __init__(self,
+                 model_factory: Callable[[], Any],
+                 max_workers: int = 2,
+                 name: str = "asr"):
+        """
+        初始化推理池
+
+        Args:
+            model_factory: 建立模型副本的函數（每個工作執行緒呼叫一次）
+            max_workers: 工作執行緒數量（即模型副本數量上限）
+            name: 執行緒名稱前綴
+        """
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self._model_factory = model_factory
+        self._local = threading.local()
+        self._replicas: List[Any] = []
+        self._lock = threading.Lock()
+
+        # 統計
+        self._active = 0
+        self._completed = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_workers,
+            thread_name_prefix=f"{name}-inference"
+        )
+
+    def _get_replica(self) -> Any:
+        """取得目前工作執行緒的模型副本（必要時建立）"""
+        model = getattr(self._local, 'model', None)
+        if model is None:
+            logger.info(f"[{self.name}] 建立模型副本 ({threading.current_thread().name})")
+            model = self._model_factory()
+            self._local.model = model
+            with self._lock:
+                self._replicas.append(model)
+        return model
+
+    def _invoke(self, fn: Callable, args: tuple, kwargs: dict) -> Any:
+        """在工作執行緒中以模型副本執行 fn(model, *args, **kwargs)"""
+        model = self._get_replica()
+        with self._lock:
+            self._active += 1
+        try:
+            return fn(model, *args, **kwargs)
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """
+        在推理池中執行 fn(model, *args, **kwargs) 並等待結果
+
+        Args:
+            fn: 第一個參數為模型副本的同步函數
+
+        Returns:
+            fn 的回傳值
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, self._invoke, fn, args, kwargs
+        )
+
+    def replicas(self) -> List[Any]:
+        """目前已建立的模型副本"""
+        with self._lock:
+            return list(self._replicas)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """推理池狀態"""
+        with self._lock:
+            return {
+                'max_workers': self.max_workers,
+                'replicas': len(self._replicas),
+                'active': self._active,
+                'completed': self._completed
+            }
+
+    def shutdown(self, wait: bool = True):
+        """關閉推理池"""
+        self._executor.shutdown(wait=wait)
@@ -8,6 +8,8 @@ import numpy as np
 from typing import Dict, Any, Optional
 import re
 
+from .acoustic_features import AcousticFeatures
+
 logger = logging.getLogger(__name__)
 
 
@@ -58,7 +60,8 @@ class MinnanLanguageDetector:
     def detect(self, 
                audio: np.ndarray,
                text_hint: Optional[str] = None,
-               sample_rate: int = 16000) -> Dict[str, Any]:
+               sample_rate: int = 16000,
+               acoustic_features: Optional[AcousticFeatures] = None) -> Dict[str, Any]:
         """
         檢測音頻中的閩南語成分
         
@@ -66,13 +69,17 @@ class MinnanLanguageDetector:
             audio: 音頻數組 (numpy array)
             text_hint: 文本提示（如果有初步轉錄）
             sample_rate: 採樣率
+            acoustic_features: 與其他檢測器共用的聲學特徵（可選）
         
         Returns:
             檢測結果字典
         """
         try:
+            if acoustic_features is None:
+                acoustic_features = AcousticFeatures(audio, sample_rate)
+            
             # 1. 音頻特徵檢測
-            audio_score = self._detect_audio_features(audio, sample_rate)
+            audio_score = self._detect_audio_features(acoustic_features)
             
             # 2. 文本特徵檢測
             text_score = 0.0
@@ -114,7 +121,7 @@ class MinnanLanguageDetector:
                 "error": str(e)
             }
     
-    def _detect_audio_features(self, audio: np.ndarray, sample_rate: int) -> float:
+    def _detect_audio_features(self, features: AcousticFeatures) -> float:
         """
         基於音頻特徵檢測閩南語
         
@@ -124,25 +131,14 @@ class MinnanLanguageDetector:
         3. 能量分布
         
         Args:
-            audio: 音頻數組
-            sample_rate: 採樣率
+            features: 聲學特徵
         
         Returns:
             音頻特徵分數 (0-1)
         """
         try:
-            import librosa
-            
-            # 提取基頻（F0）- 用於分析音調
-            f0 = librosa.yin(
-                audio,
-                fmin=librosa.note_to_hz('C2'),
-                fmax=librosa.note_to_hz('C7'),
-                sr=sample_rate
-            )
-            
-            # 移除無聲部分（F0 = 0）
-            f0_voiced = f0[f0 > 0]
+            # 基頻（F0）- 用於分析音調，已移除無聲部分（F0 = 0）
+            f0_voiced = features.f0_voiced
             
             if len(f0_voiced) < 10:
                 # 音頻太短或無聲，無法判斷
@@ -165,8 +161,7 @@ class MinnanLanguageDetector:
                 tone_variation_score += 0.2
             
             # 計算語速特徵（零交叉率）
-            zcr = librosa.feature.zero_crossing_rate(audio)[0]
-            zcr_mean = np.mean(zcr)
+            zcr_mean = np.mean(features.zcr)
             
             # 閩南語可能有特定的語速特徵
             # 這裡使用簡化規則
@@ -0,0 +1,268 @@
+"""
+ASR Result Cache - 識別結果快取
+以音頻內容雜湊 + 模型設定 + 有效解碼選項為鍵，
+記憶體 LRU 與磁碟兩層快取，重複送出的錄音不需再次解碼
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 影響識別結果的選項及其預設值（未提供的選項以預設值計入快取鍵）
+DEFAULT_RECOGNITION_OPTIONS = {
+    'language_hint': 'zh',
+    'return_details': False,
+    'enable_minnan_optimization': True,
+    'enable_minnan_detection': True,
+    'enable_elderly_detection': True
+}
+
+# 不影響識別結果、不計入快取鍵的選項
+NON_KEY_OPTIONS = {'use_cache'}
+
+
+def _json_default(value):
+    """將 numpy 型別轉為可序列化的 Python 型別"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+class ASRResultCache:
+    """
+    識別結果兩層快取
+
+    - 記憶體層: 有界 LRU（OrderedDict），命中時移至尾端
+    - 磁碟層: 每筆結果一個 JSON 檔（依鍵前兩碼分目錄），跨程序重啟保留；
+      超過 max_disk_entries 時依修改時間刪除最舊的檔案
+    - 只快取成功的識別結果
+    """
+
+    def __init__(self,
+                 max_entries: int = 256,
+                 cache_dir: Optional[str] = None,
+                 max_disk_entries: int = 5000):
+        """
+        Args:
+            max_entries: 記憶體層最多保留的結果數（0 表示停用快取）
+            cache_dir: 磁碟層目錄（None 表示只使用記憶體層）
+            max_disk_entries: 磁碟層最多保留的結果數
+        """
+        self.max_entries = max(0, int(max_entries))
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # 統計
+        self._memory_hits = 0
+        self._disk_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+        self._disk_entries = 0
+        if self.enabled and self.cache_dir:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            self._disk_entries = sum(1 for _ in self._iter_disk_files())
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(audio_data: bytes,
+                 model_config: Dict[str, Any],
+                 options: Optional[Dict[str, Any]] = None) -> str:
+        """
+        計算快取鍵
+
+        Args:
+            audio_data: 原始音頻數據（bytes）
+            model_config: 影響結果的模型設定（模型大小、是否啟用 FunASR 等）
+            options: 識別選項
+
+        Returns:
+            SHA-256 十六進位字串
+        """
+        effective = dict(DEFAULT_RECOGNITION_OPTIONS)
+        for name, value in (options or {}).items():
+            if name not in NON_KEY_OPTIONS and value is not None:
+                effective[name] = value
+
+        digest = hashlib.sha256(audio_data)
+        digest.update(json.dumps(
+            {'model': model_config, 'options': effective},
+            sort_keys=True, default=_json_default
+        ).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+
+    def _iter_disk_files(self):
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.json'):
+                    yield os.path.join(root, name)
+
+    def _remember(self, key: str, result: Dict[str, Any]):
+        """寫入記憶體層（呼叫端須持有鎖）"""
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """
+        取得快取結果（回傳副本，呼叫端可自由修改）
+
+        Returns:
+            識別結果，未命中時返回 None
+        """
+        if not self.enabled:
+            return None
+
+        with self._lock:
+            result = self._entries.get(key)
+            if result is not None:
+                self._entries.move_to_end(key)
+                self._memory_hits += 1
+                return copy.deepcopy(result)
+
+        if self.cache_dir:
+            try:
+                with open(self._path(key), 'r', encoding='utf-8') as f:
+                    result = json.load(f)
+            except FileNotFoundError:
+                result = None
+            except (OSError, ValueError) as e:
+                logger.warning(f"讀取 ASR 結果快取失敗 ({key[:12]}): {e}")
+                result = None
+
+            if result is not None:
+                with self._lock:
+                    self._remember(key, result)
+                    self._disk_hits += 1
+                return copy.deepcopy(result)
+
+        with self._lock:
+            self._misses += 1
+        return None
+
+    def set(self, key: str, result: Dict[str, Any]):
+        """
+        寫入快取（只保存成功且沒有引擎錯誤的結果，暫時性錯誤在重試時重新識別）
+
+        Args:
+            key: make_key 計算的快取鍵
+            result: 識別結果
+        """
+        if not self.enabled or not result.get('success', False):
+            return
+        if result.get('error') or result.get('engine_errors'):
+            return
+
+        # 經 JSON 來回轉換：去除 numpy 型別，記憶體層與磁碟層內容一致
+        payload = json.dumps(
+            {k: v for k, v in result.items() if k not in ('index', 'from_cache')},
+            ensure_ascii=False, default=_json_default
+        )
+        stored = json.loads(payload)
+
+        with self._lock:
+            self._remember(key, stored)
+            self._stores += 1
+
+        if self.cache_dir:
+            self._write_disk(key, payload)
+
+    def _write_disk(self, key: str, payload: str):
+        path = self._path(key)
+        existed = os.path.exists(path)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(payload)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"寫入 ASR 結果快取失敗 ({key[:12]}): {e}")
+            return
+
+        if not existed:
+            with self._lock:
+                self._disk_entries += 1
+                over = self._disk_entries > self.max_disk_entries
+            if over:
+                self._prune_disk()
+
+    def _prune_disk(self):
+        """刪除最舊的檔案，保留 max_disk_entries 的 90%"""
+        files = []
+        for path in self._iter_disk_files():
+            try:
+                files.append((os.path.getmtime(path), path))
+            except OSError:
+                pass
+        files.sort()
+
+        keep = int(self.max_disk_entries * 0.9)
+        removed = 0
+        for _, path in files[:max(0, len(files) - keep)]:
+            try:
+                os.remove(path)
+                removed += 1
+            except OSError:
+                pass
+
+        with self._lock:
+            self._disk_entries = len(files) - removed
+        logger.info(f"ASR 結果快取已清除 {removed} 個舊檔案")
+
+    def clear(self):
+        """清除記憶體層與磁碟層"""
+        with self._lock:
+            self._entries.clear()
+
+        if self.cache_dir and os.path.isdir(self.cache_dir):
+            for path in list(self._iter_disk_files()):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._disk_entries = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """快取命中統計"""
+        with self._lock:
+            hits = self._memory_hits + self._disk_hits
+            lookups = hits + self._misses
+            return {
+                'enabled': self.enabled,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'disk_entries': self._disk_entries if self.cache_dir else 0,
+                'disk_dir': self.cache_dir,
+                'hits': hits,
+                'memory_hits': self._memory_hits,
+                'disk_hits': self._disk_hits,
+                'misses': self._misses,
+                'hit_rate': round(hits / lookups, 3) if lookups else 0.0,
+                'stores': self._stores,
+                'evictions': self._evictions
+            }
@@ -0,0 +1,364 @@
+"""
+Streaming ASR - 串流語音識別
+接收即時 PCM 音頻片段，以能量 VAD 切分語音段並逐段增量解碼，
+輸出部分（partial）與最終（final）轉錄結果。延遲取決於語音段長度而非通話長度，
+長時間錄音也不會被截斷。
+VAD 以輸入採樣率運作，語音段整段重採樣後才解碼，避免逐片段重採樣在片段邊界產生失真。
+"""
+
+import asyncio
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EnergyVADSegmenter:
+    """
+    能量式 VAD 語音段切分器
+
+    以固定長度的幀計算能量（dBFS），並追蹤自適應噪音底：
+    - 連續 start_frames 幀高於噪音底 + start_margin_db，開始語音段（含 pre_roll 前導音）
+    - 語音段中連續 min_silence_ms 低於噪音底 + end_margin_db，結束語音段
+    - 語音段超過 max_segment_s 時強制切分（Whisper 單次解碼上限 30 秒）
+    """
+
+    def __init__(self,
+                 sample_rate: int = 16000,
+                 frame_ms: int = 30,
+                 start_frames: int = 3,
+                 min_silence_ms: int = 600,
+                 pre_roll_ms: int = 300,
+                 min_segment_ms: int = 300,
+                 max_segment_s: float = 15.0,
+                 start_margin_db: float = 12.0,
+                 end_margin_db: float = 8.0,
+                 min_threshold_db: float = -50.0):
+        """
+        Args:
+            sample_rate: 採樣率
+            frame_ms: 能量計算的幀長度（毫秒）
+            start_frames: 判定語音開始所需的連續語音幀數
+            min_silence_ms: 判定語音結束所需的靜音長度（毫秒）
+            pre_roll_ms: 語音段開始前保留的前導音長度（毫秒）
+            min_segment_ms: 短於此長度的語音段視為雜音並丟棄（毫秒）
+            max_segment_s: 語音段最大長度（秒）
+            start_margin_db: 語音開始門檻（高於噪音底的 dB）
+            end_margin_db: 語音結束門檻（高於噪音底的 dB）
+            min_threshold_db: 門檻下限（避免全靜音時門檻過低）
+        """
+        self.sample_rate = sample_rate
+        self.frame_size = int(sample_rate * frame_ms / 1000)
+        self.start_frames = start_frames
+        self.end_frames = max(1, int(min_silence_ms / frame_ms))
+        self.pre_roll_frames = max(0, int(pre_roll_ms / frame_ms))
+        self.min_segment_samples = int(sample_rate * min_segment_ms / 1000)
+        self.max_segment_samples = int(sample_rate * max_segment_s)
+        self.start_margin_db = start_margin_db
+        self.end_margin_db = end_margin_db
+        self.min_threshold_db = min_threshold_db
+
+        self.noise_floor_db = -60.0
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._position = 0  # 已處理的完整幀樣本數
+        self._pre_roll: List[np.ndarray] = []
+        self._segment: List[np.ndarray] = []
+        self._segment_samples = 0
+        self._segment_start = 0
+        self._speech_run = 0
+        self._silence_run = 0
+        self.in_speech = False
+
+    @staticmethod
+    def _frame_db(frame: np.ndarray) -> float:
+        rms = np.sqrt(np.mean(frame.astype(np.float64) ** 2))
+        return 20 * np.log10(rms + 1e-10)
+
+    def _update_noise_floor(self, db: float):
+        # 下降快、上升慢：靜音時迅速貼近，語音時緩慢跟隨
+        if db < self.noise_floor_db:
+            self.noise_floor_db = 0.7 * self.noise_floor_db + 0.3 * db
+        else:
+            self.noise_floor_db = 0.995 * self.noise_floor_db + 0.005 * db
+
+    @property
+    def segment_samples(self) -> int:
+        """進行中語音段的樣本數（不含尚未滿一幀的部分）"""
+        return self._segment_samples if self.in_speech else 0
+
+    def current_segment(self) -> Optional[np.ndarray]:
+        """進行中語音段的音頻（不含尚未滿一幀的部分）"""
+        if not self.in_speech or not self._segment:
+            return None
+        return np.concatenate(self._segment)
+
+    def _close_segment(self, segments: List[Tuple[int, np.ndarray]]):
+        audio = np.concatenate(self._segment) if self._segment else np.zeros(0, dtype=np.float32)
+        if len(audio) >= self.min_segment_samples:
+            segments.append((self._segment_start, audio))
+        self._segment = []
+        self._segment_samples = 0
+        self._silence_run = 0
+        self._speech_run = 0
+        self.in_speech = False
+
+    def push(self, audio: np.ndarray) -> List[Tuple[int, np.ndarray]]:
+        """
+        加入音頻並回傳已完成的語音段
+
+        Args:
+            audio: float32 音頻（-1 ~ 1）
+
+        Returns:
+            已結束的語音段列表 [(起始樣本位置, 音頻)]
+        """
+        segments: List[Tuple[int, np.ndarray]] = []
+        buffer = np.concatenate([self._pending, audio.astype(np.float32)])
+        n_frames = len(buffer) // self.frame_size
+        self._pending = buffer[n_frames * self.frame_size:]
+
+        for i in range(n_frames):
+            frame = buffer[i * self.frame_size:(i + 1) * self.frame_size]
+            db = self._frame_db(frame)
+            self._position += self.frame_size
+
+            if not self.in_speech:
+                threshold = max(self.noise_floor_db + self.start_margin_db, self.min_threshold_db)
+                self._pre_roll.append(frame)
+                if len(self._pre_roll) > self.pre_roll_frames + self.start_frames:
+                    self._pre_roll.pop(0)
+
+                if db > threshold:
+                    self._speech_run += 1
+                    if self._speech_run >= self.start_frames:
+                        self.in_speech = True
+                        self._segment = list(self._pre_roll)
+                        self._segment_samples = sum(len(f) for f in self._segment)
+                        self._segment_start = self._position - self._segment_samples
+                        self._pre_roll = []
+                        self._silence_run = 0
+                else:
+                    self._speech_run = 0
+                    self._update_noise_floor(db)
+                continue
+
+            self._segment.append(frame)
+            self._segment_samples += len(frame)
+
+            threshold = max(self.noise_floor_db + self.end_margin_db, self.min_threshold_db)
+            if db < threshold:
+                self._silence_run += 1
+            else:
+                self._silence_run = 0
+
+            if self._silence_run >= self.end_frames or self._segment_samples >= self.max_segment_samples:
+                self._close_segment(segments)
+
+        return segments
+
+    def flush(self) -> List[Tuple[int, np.ndarray]]:
+        """結束串流，回傳剩餘的語音段 [(起始樣本位置, 音頻)]"""
+        segments: List[Tuple[int, np.ndarray]] = []
+        if self.in_speech:
+            if len(self._pending):
+                self._segment.append(self._pending)
+            self._close_segment(segments)
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._pre_roll = []
+        return segments
+
+
+class StreamingRecognizer:
+    """
+    串流識別會話
+
+    使用方式（feed 可從任意執行緒呼叫，解碼在 ASR 長駐事件迴圈上進行）:
+
+        recognizer = StreamingRecognizer(coordinator, loop, on_event)
+        recognizer.feed(pcm_bytes)   # 多次
+        recognizer.finish()          # 結束並輸出剩餘結果
+
+    on_event 會收到:
+        {'type': 'partial', 'segment_id', 'text', ...}
+        {'type': 'final', 'segment_id', 'text', 'confidence', 'start', 'end', ...}
+        {'type': 'end', 'text', 'segments', 'duration'}
+    """
+
+    def __init__(self,
+                 coordinator,
+                 loop: asyncio.AbstractEventLoop,
+                 on_event: Callable[[Dict[str, Any]], None],
+                 sample_rate: int = 16000,
+                 options: Optional[Dict[str, Any]] = None,
+                 partial_interval_s: float = 1.0,
+                 context_chars: int = 120):
+        """
+        Args:
+            coordinator: ASRCoordinator 實例
+            loop: 執行解碼的事件迴圈
+            on_event: 結果回呼（在事件迴圈執行緒中呼叫）
+            sample_rate: 輸入 PCM 的採樣率
+            options: 識別選項（language_hint 等）
+            partial_interval_s: 進行中語音段每增加多少秒輸出一次部分結果（0 表示不輸出）
+            context_chars: 作為下一段 initial_prompt 的前文字數
+        """
+        self.coordinator = coordinator
+        self.loop = loop
+        self.on_event = on_event
+        self.input_sample_rate = sample_rate
+        self.options = options or {}
+        self.partial_interval_samples = int(partial_interval_s * self.input_sample_rate)
+        self.context_chars = context_chars
+
+        # 語音段以輸入採樣率切分，解碼時由 coordinator 整段重採樣
+        self.segmenter = EnergyVADSegmenter(sample_rate=self.input_sample_rate)
+
+        self._lock = threading.Lock()
+        self._odd_byte = b''  # 上一片段結尾不成對的位元組（PCM16 樣本可能跨片段）
+        self._decode_lock: Optional[asyncio.Lock] = None
+        self._received_samples = 0
+        self._next_segment_id = 0
+        self._last_partial_samples = 0
+        self._partial_version = 0
+        self._finals: List[Dict[str, Any]] = []
+        self._futures: List[asyncio.Future] = []
+        self.finished = False
+
+    # ---------- 輸入 ----------
+
+    def _to_float(self, pcm) -> np.ndarray:
+        """PCM16 bytes 或數值陣列轉為 float32（奇數長度的 bytes 結尾保留到下一片段）"""
+        if isinstance(pcm, (bytes, bytearray, memoryview)):
+            data = self._odd_byte + bytes(pcm)
+            usable = len(data) - len(data) % 2
+            self._odd_byte = data[usable:]
+            return np.frombuffer(data[:usable], dtype=np.int16).astype(np.float32) / 32768.0
+        return np.asarray(pcm, dtype=np.float32).reshape(-1)
+
+    def feed(self, pcm) -> None:
+        """加入一段 PCM 音頻（非阻塞），完成的語音段會排入解碼"""
+        with self._lock:
+            if self.finished:
+                return
+            audio = self._to_float(pcm)
+            self._received_samples += len(audio)
+
+            for start, segment in self.segmenter.push(audio):
+                self._schedule_final(start, segment)
+
+            # 只在需要輸出部分結果時才合併進行中的語音段
+            samples = self.segmenter.segment_samples
+            if (self.partial_interval_samples and samples
+                    and samples - self._last_partial_samples >= self.partial_interval_samples):
+                current = self.segmenter.current_segment()
+                self._last_partial_samples = samples
+                self._partial_version += 1
+                self._submit(self._decode_partial(self._next_segment_id, self._partial_version, current))
+
+    def finish(self) -> None:
+        """結束串流：解碼剩餘語音段並輸出 end 事件"""
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+            for start, segment in self.segmenter.flush():
+                self._schedule_final(start, segment)
+            self._submit(self._emit_end())
+
+    def close(self) -> None:
+        """中止串流（連線中斷時），捨棄尚未解碼的音頻"""
+        with self._lock:
+            self.finished = True
+            self._partial_version += 1
+            for future in self._futures:
+                future.cancel()
+            self._futures = []
+
+    def _schedule_final(self, start: int, segment: np.ndarray):
+        segment_id = self._next_segment_id
+        self._next_segment_id += 1
+        self._partial_version += 1  # 使尚未解碼的部分結果失效
+        self._last_partial_samples = 0
+        self._submit(self._decode_final(segment_id, segment, start, start + len(segment)))
+
+    def _submit(self, coro):
+        future = asyncio.run_coroutine_threadsafe(self._serialized(coro), self.loop)
+        self._futures.append(future)
+        self._futures = [f for f in self._futures if not f.done()]
+
+    async def _serialized(self, coro):
+        # 同一會話的解碼依提交順序逐一執行，結果依序輸出
+        if self._decode_lock is None:
+            self._decode_lock = asyncio.Lock()
+        async with self._decode_lock:
+            try:
+                await coro
+            except Exception as e:
+                logger.error(f"串流解碼失敗: {e}", exc_info=True)
+                self.on_event({'type': 'error', 'error': str(e)})
+
+    # ---------- 解碼 ----------
+
+    def _context_prompt(self) -> Optional[str]:
+        text = ''.join(item['text'] for item in self._finals)[-self.context_chars:]
+        return text or None
+
+    def _segment_options(self, fast: bool) -> Dict[str, Any]:
+        options = dict(self.options)
+        prompt = self._context_prompt()
+        if prompt and 'initial_prompt' not in options:
+            options['initial_prompt'] = prompt
+        if fast:
+            # 部分結果只求快速：略過閩南語 / 高齡語音檢測
+            options['enable_minnan_detection'] = False
+            options['enable_elderly_detection'] = False
+        return options
+
+    async def _decode_partial(self, segment_id: int, version: int, audio: np.ndarray):
+        if version != self._partial_version:
+            return  # 已有較新的部分結果或語音段已結束
+        result = await self.coordinator.recognize_array(
+            audio, self.input_sample_rate, self._segment_options(fast=True)
+        )
+        if version != self._partial_version or not result.get('success', False):
+            return
+        self.on_event({
+            'type': 'partial',
+            'segment_id': segment_id,
+            'text': result.get('text', ''),
+            'duration': round(len(audio) / self.input_sample_rate, 3)
+        })
+
+    async def _decode_final(self, segment_id: int, audio: np.ndarray, start: int, end: int):
+        result = await self.coordinator.recognize_array(
+            audio, self.input_sample_rate, self._segment_options(fast=False)
+        )
+        if not result.get('success', False):
+            self.on_event({'type': 'error', 'segment_id': segment_id, 'error': result.get('error', '')})
+            return
+
+        item = {
+            'type': 'final',
+            'segment_id': segment_id,
+            'text': result.get('text', ''),
+            'confidence': result.get('confidence', 0.0),
+            'start': round(start / self.input_sample_rate, 3),
+            'end': round(end / self.input_sample_rate, 3),
+            'processing_time': result.get('processing_time')
+        }
+        self._finals.append(item)
+        self.on_event(item)
+
+    async def _emit_end(self):
+        self.on_event({
+            'type': 'end',
+            'text': ''.join(item['text'] for item in self._finals),
+            'segments': [
+                {key: item[key] for key in ('segment_id', 'text', 'start', 'end', 'confidence')}
+                for item in self._finals
+            ],
+            'duration': round(self._received_samples / self.input_sample_rate, 3)
+        })
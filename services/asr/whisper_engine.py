@@ -3,15 +3,32 @@ Whisper Engine - OpenAI Whisper 語音識別引擎
 提供高品質的多語言語音識別
 """
 
+import asyncio
+import copy
 import logging
+import math
+import threading
+import time
 import numpy as np
 import torch
 import whisper
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
+
+from .inference_pool import InferencePool
 
 logger = logging.getLogger(__name__)
 
 
+def parse_target_rtf(value) -> Optional[float]:
+    """解析目標即時率（空值返回 None；非數值、NaN、無限大或非正數拋出 ValueError）"""
+    if value is None or (isinstance(value, str) and value.strip() == ''):
+        return None
+    target_rtf = float(value)
+    if not math.isfinite(target_rtf) or target_rtf <= 0:
+        raise ValueError(f"target_rtf 必須為正數: {value!r}")
+    return target_rtf
+
+
 class WhisperEngine:
     """
     Whisper 引擎封裝
@@ -20,17 +37,29 @@ class WhisperEngine:
     - 支援多語言識別
     - 魯棒性強，處理噪音能力好
     - 可針對閩南語和高齡語音優化參數
+    - 推理在有界執行緒池中執行，每個工作執行緒使用自己的模型副本
+    - 延遲預算模式：先以 greedy 解碼，品質未達門檻且預算足夠時才以較寬的 beam 重新解碼
     """
     
-    def __init__(self, model_size: str = "base", device: str = "cuda"):
+    # 延遲預算模式下可選用的 beam 寬度（不超過特徵優化參數的 beam_size）
+    BUDGET_BEAM_SIZES = (2, 3, 5)
+    
+    def __init__(self, model_size: str = "base", device: str = "cuda", num_workers: int = 2,
+                 batch_size: int = 8, target_rtf: Optional[float] = None):
         """
         初始化 Whisper 引擎
         
         Args:
             model_size: 模型大小 (tiny/base/small/medium/large-v3)
             device: 運算設備 (cuda/cpu)
+            num_workers: 推理工作執行緒數量（每個執行緒一份模型副本）
+            batch_size: 批次解碼時每次前向傳遞的音頻數量上限
+            target_rtf: 預設的目標即時率（解碼時間 / 音頻長度）；設定後啟用延遲預算模式，
+                        None 表示依特徵優化參數直接解碼
         """
         self.model_size = model_size
+        self.batch_size = max(1, int(batch_size))
+        self.target_rtf = target_rtf
         self.device = device if torch.cuda.is_available() else "cpu"
         
         if self.device == "cpu" and device == "cuda":
@@ -40,6 +69,15 @@ class WhisperEngine:
         self.model = whisper.load_model(model_size, device=self.device)
         logger.info(f"✓ Whisper 模型已載入到 {self.device}")
         
+        # 推理池：第一個工作執行緒沿用已載入的模型，其餘複製一份
+        self._primary_assigned = False
+        self._replica_lock = threading.Lock()
+        self.inference_pool = InferencePool(
+            self._create_replica,
+            max_workers=num_workers,
+            name="whisper"
+        )
+        
         # 預設配置
         self.default_config = {
             "language": "zh",
@@ -51,6 +89,19 @@ class WhisperEngine:
             "logprob_threshold": -1.0,
             "no_speech_threshold": 0.6
         }
+        
+        # 延遲預算模式統計
+        self._budget_lock = threading.Lock()
+        self._beam_cost: Dict[int, float] = {}  # beam 解碼時間 / greedy 解碼時間（指數移動平均）
+        self._budget_stats = {
+            'requests': 0,
+            'greedy_accepted': 0,
+            'escalated': 0,
+            'escalation_skipped': 0,
+            'over_budget': 0,
+            'escalated_by_beam': {},
+            'total_rtf': 0.0
+        }
     
     async def recognize(self,
                        audio: np.ndarray,
@@ -75,26 +126,20 @@ class WhisperEngine:
             # 準備 Whisper 配置
             whisper_options = self._prepare_options(features, options)
             
-            # 執行識別
-            result = self.model.transcribe(
+            # 延遲預算模式
+            target_rtf = self._budget_target(options)
+            if target_rtf:
+                return await self._recognize_with_budget(audio, whisper_options, target_rtf)
+            
+            # 執行識別（在推理池中運行，不阻塞事件迴圈）
+            result = await self.inference_pool.run(
+                self._transcribe,
                 audio,
-                **whisper_options
+                whisper_options
             )
             
-            # 計算置信度
-            confidence = self._calculate_confidence(result)
-            
-            # 格式化結果
-            output = {
-                'text': result.get('text', '').strip(),
-                'confidence': confidence,
-                'language': result.get('language', 'zh'),
-                'segments': result.get('segments', []),
-                'engine': 'whisper',
-                'model_size': self.model_size
-            }
-            
-            return output
+            # 計算置信度並格式化結果
+            return self._format_result(result)
             
         except Exception as e:
             logger.error(f"Whisper 識別失敗: {e}", exc_info=True)
@@ -105,6 +150,375 @@ class WhisperEngine:
                 'engine': 'whisper'
             }
     
+    async def recognize_batch(self,
+                              audios: List[np.ndarray],
+                              features_list: List[Dict[str, Any]],
+                              options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        批次識別多個音頻
+        
+        依特徵產生的解碼選項分組（相同選項的音頻放在同一批），每批補齊到 30 秒後
+        一次送入模型批次解碼。超過 30 秒的音頻，以及批次解碼結果未達品質門檻
+        （壓縮比過高或平均 log prob 過低）的音頻，改走單筆 recognize（含溫度回退）。
+        延遲預算模式下批次以 greedy 解碼，未達門檻者在預算內以較寬的 beam 重新解碼。
+        
+        Args:
+            audios: 音頻數組列表 (16kHz)
+            features_list: 每個音頻檢測到的特徵
+            options: 選項（所有音頻共用）
+        
+        Returns:
+            與輸入順序相同的識別結果列表
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(audios)
+        groups: Dict[tuple, List[int]] = {}
+        group_options: Dict[tuple, Dict[str, Any]] = {}
+        profiles: Dict[int, Dict[str, Any]] = {}
+        target_rtf = self._budget_target(options)
+        tasks = []
+        
+        for i, (audio, features) in enumerate(zip(audios, features_list)):
+            if len(audio) > whisper.audio.N_SAMPLES:
+                tasks.append(self._recognize_indexed(i, audio, features, options))
+                continue
+            whisper_options = self._prepare_options(features, options)
+            if target_rtf:
+                profiles[i] = whisper_options
+                whisper_options = self._greedy_options(whisper_options)
+            key = self._options_key(whisper_options)
+            groups.setdefault(key, []).append(i)
+            group_options[key] = whisper_options
+        
+        for key, indices in groups.items():
+            for start in range(0, len(indices), self.batch_size):
+                tasks.append(self._recognize_chunk(
+                    indices[start:start + self.batch_size],
+                    audios, features_list, group_options[key], options,
+                    profiles, target_rtf
+                ))
+        
+        logger.info(f"  Whisper 批次解碼: {len(audios)} 個音頻, {len(groups)} 組解碼選項")
+        
+        for outputs in await asyncio.gather(*tasks):
+            for i, output in outputs:
+                results[i] = output
+        
+        return results
+    
+    async def _recognize_indexed(self, index, audio, features, options):
+        """單筆識別，回傳 [(index, 結果)]"""
+        return [(index, await self.recognize(audio, features, options))]
+    
+    async def _recognize_chunk(self, indices, audios, features_list, whisper_options, options,
+                               profiles=None, target_rtf=None):
+        """批次解碼一組音頻，品質未達門檻者改走單筆識別（延遲預算模式下改為預算內升級解碼）"""
+        batch = [audios[i].astype(np.float32) for i in indices]
+        start = time.perf_counter()
+        try:
+            decoded = await self.inference_pool.run(self._decode_batch, batch, whisper_options)
+        except Exception as e:
+            logger.warning(f"Whisper 批次解碼失敗，改為逐筆識別: {e}")
+            decoded = [None] * len(indices)
+        # 批次解碼時間平均分攤到每個音頻
+        greedy_time = (time.perf_counter() - start) / len(indices)
+        
+        outputs = []
+        fallback = []
+        escalated = []
+        for i, audio, result in zip(indices, batch, decoded):
+            if result is None:
+                fallback.append(i)
+            elif target_rtf:
+                escalated.append((i, self._recognize_with_budget(
+                    audio, profiles[i], target_rtf, greedy=result, greedy_time=greedy_time
+                )))
+            elif self._needs_fallback(result, whisper_options):
+                fallback.append(i)
+            else:
+                outputs.append((i, self._format_result(result)))
+        
+        if escalated:
+            budgeted = await asyncio.gather(*[coro for _, coro in escalated])
+            outputs.extend(zip([i for i, _ in escalated], budgeted))
+        
+        if fallback:
+            logger.debug(f"  {len(fallback)} 個音頻改走單筆識別")
+            for single in await asyncio.gather(*[
+                self._recognize_indexed(i, audios[i], features_list[i], options) for i in fallback
+            ]):
+                outputs.extend(single)
+        
+        return outputs
+    
+    @staticmethod
+    def _decode_batch(model, batch: List[np.ndarray], whisper_options: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        批次解碼（同步方法，在推理池的工作執行緒中運行）
+        
+        每個音頻補齊到 30 秒並計算 log-mel（各自正規化），堆疊後單次解碼。
+        回傳與 transcribe 相同格式的結果（單一 segment）。
+        """
+        mel = torch.stack([
+            whisper.log_mel_spectrogram(
+                whisper.pad_or_trim(audio), model.dims.n_mels, device=model.device
+            )
+            for audio in batch
+        ])
+        
+        with torch.inference_mode():
+            decoded = whisper.decode(model, mel, WhisperEngine._decoding_options(whisper_options, model.device))
+        
+        no_speech_threshold = whisper_options.get('no_speech_threshold')
+        logprob_threshold = whisper_options.get('logprob_threshold')
+        
+        results = []
+        for audio, result in zip(batch, decoded):
+            # 與 transcribe 相同：判定為無語音時不輸出 segment
+            if (no_speech_threshold is not None and result.no_speech_prob > no_speech_threshold
+                    and (logprob_threshold is None or result.avg_logprob < logprob_threshold)):
+                results.append({'text': '', 'language': result.language, 'segments': []})
+                continue
+            
+            results.append({
+                'text': result.text,
+                'language': result.language,
+                'segments': [{
+                    'id': 0,
+                    'start': 0.0,
+                    'end': len(audio) / whisper.audio.SAMPLE_RATE,
+                    'text': result.text,
+                    'tokens': result.tokens,
+                    'temperature': result.temperature,
+                    'avg_logprob': result.avg_logprob,
+                    'compression_ratio': result.compression_ratio,
+                    'no_speech_prob': result.no_speech_prob
+                }]
+            })
+        
+        return results
+    
+    @staticmethod
+    def _decoding_options(whisper_options: Dict[str, Any], device) -> "whisper.DecodingOptions":
+        """
+        由 transcribe 選項產生批次解碼用的 DecodingOptions
+        
+        批次解碼只使用第一個溫度；溫度為 0 時用 beam search，否則取樣 best_of 次
+        """
+        temperature = whisper_options.get('temperature', 0.0)
+        if isinstance(temperature, (list, tuple)):
+            temperature = temperature[0]
+        
+        decode_options = {
+            'task': whisper_options.get('task', 'transcribe'),
+            'language': whisper_options.get('language'),
+            'temperature': temperature,
+            'prompt': whisper_options.get('initial_prompt'),
+            'without_timestamps': True,
+            'fp16': str(device) != 'cpu'
+        }
+        if temperature > 0:
+            decode_options['best_of'] = whisper_options.get('best_of')
+        else:
+            decode_options['beam_size'] = whisper_options.get('beam_size')
+            decode_options['patience'] = whisper_options.get('patience')
+        
+        return whisper.DecodingOptions(**decode_options)
+    
+    @staticmethod
+    def _needs_fallback(result: Dict[str, Any], whisper_options: Dict[str, Any]) -> bool:
+        """批次解碼結果是否需要以 transcribe 的溫度回退重新識別"""
+        temperature = whisper_options.get('temperature', 0.0)
+        if not isinstance(temperature, (list, tuple)) or len(temperature) < 2:
+            return False
+        return WhisperEngine._fails_thresholds(result, whisper_options)
+    
+    @staticmethod
+    def _fails_thresholds(result: Dict[str, Any], whisper_options: Dict[str, Any]) -> bool:
+        """任一 segment 的壓縮比過高或平均 log prob 過低"""
+        for segment in result.get('segments', []):
+            compression_ratio_threshold = whisper_options.get('compression_ratio_threshold')
+            if compression_ratio_threshold is not None and segment['compression_ratio'] > compression_ratio_threshold:
+                return True
+            logprob_threshold = whisper_options.get('logprob_threshold')
+            if logprob_threshold is not None and segment['avg_logprob'] < logprob_threshold:
+                return True
+        return False
+    
+    def _budget_target(self, options: Dict[str, Any]) -> Optional[float]:
+        """目標即時率（options['target_rtf'] 優先於引擎預設）；未設定或無效時返回 None"""
+        target_rtf = options.get('target_rtf') or self.target_rtf
+        try:
+            return parse_target_rtf(target_rtf)
+        except (TypeError, ValueError):
+            # 批次識別在逐筆錯誤處理之外取得預算，無效值改為一般解碼而非讓整批失敗
+            logger.warning(f"忽略無效的目標即時率: {target_rtf!r}")
+            return None
+    
+    @staticmethod
+    def _greedy_options(whisper_options: Dict[str, Any]) -> Dict[str, Any]:
+        """保留特徵優化的門檻與提示詞，改為單次 greedy 解碼（無溫度回退）"""
+        greedy = dict(whisper_options)
+        greedy.update({'temperature': 0.0, 'beam_size': None, 'best_of': None, 'patience': None})
+        return greedy
+    
+    def _beam_options(self, whisper_options: Dict[str, Any], beam_size: int) -> Dict[str, Any]:
+        """升級解碼選項：temperature 0 的 beam search；使用完整 beam 寬度時才套用 patience"""
+        beam = self._greedy_options(whisper_options)
+        beam['beam_size'] = beam_size
+        if beam_size == whisper_options.get('beam_size'):
+            beam['patience'] = whisper_options.get('patience')
+        return beam
+    
+    def _choose_beam(self, whisper_options: Dict[str, Any], greedy_time: float, remaining: float) -> Optional[int]:
+        """
+        選擇預算內最寬的 beam
+        
+        beam 解碼時間以 greedy 解碼時間 × 成本倍數估計；倍數取實測的移動平均，
+        尚無實測時保守假設與 beam 寬度成正比。
+        """
+        max_beam = whisper_options.get('beam_size') or self.default_config['beam_size']
+        candidates = sorted({b for b in self.BUDGET_BEAM_SIZES + (max_beam,) if b <= max_beam}, reverse=True)
+        with self._budget_lock:
+            for beam_size in candidates:
+                if greedy_time * self._beam_cost.get(beam_size, float(beam_size)) <= remaining:
+                    return beam_size
+        return None
+    
+    @staticmethod
+    def _avg_logprob(result: Dict[str, Any]) -> float:
+        """依 token 數加權的平均 log prob"""
+        total, tokens = 0.0, 0
+        for segment in result.get('segments', []):
+            n = max(len(segment.get('tokens', [])), 1)
+            total += segment.get('avg_logprob', -1.0) * n
+            tokens += n
+        return total / tokens if tokens else -1.0
+    
+    async def _recognize_with_budget(self,
+                                     audio: np.ndarray,
+                                     whisper_options: Dict[str, Any],
+                                     target_rtf: float,
+                                     greedy: Optional[Dict[str, Any]] = None,
+                                     greedy_time: Optional[float] = None) -> Dict[str, Any]:
+        """
+        延遲預算解碼
+        
+        1. greedy 解碼（批次識別時由呼叫端傳入批次 greedy 結果）
+        2. 壓縮比與平均 log prob 通過特徵優化參數的門檻時直接採用
+        3. 否則在剩餘預算（target_rtf × 音頻長度 − 已用時間）內以最寬的 beam 重新解碼，
+           取平均 log prob 較高的結果
+        """
+        duration = max(len(audio) / whisper.audio.SAMPLE_RATE, 1e-3)
+        budget = target_rtf * duration
+        
+        if greedy is None:
+            start = time.perf_counter()
+            greedy = await self.inference_pool.run(
+                self._transcribe, audio, self._greedy_options(whisper_options)
+            )
+            greedy_time = time.perf_counter() - start
+        
+        result, elapsed, beam_size = greedy, greedy_time, None
+        failed = self._fails_thresholds(greedy, whisper_options)
+        if failed:
+            beam_size = self._choose_beam(whisper_options, greedy_time, budget - greedy_time)
+        
+        if beam_size:
+            start = time.perf_counter()
+            wide = await self.inference_pool.run(
+                self._transcribe, audio, self._beam_options(whisper_options, beam_size)
+            )
+            wide_time = time.perf_counter() - start
+            elapsed += wide_time
+            self._record_beam_cost(beam_size, wide_time / max(greedy_time, 1e-6))
+            if self._avg_logprob(wide) >= self._avg_logprob(greedy):
+                result = wide
+        
+        rtf = elapsed / duration
+        self._record_budget(failed, beam_size, rtf, target_rtf)
+        
+        output = self._format_result(result)
+        output['decode_profile'] = {
+            'mode': 'latency_budget',
+            'target_rtf': target_rtf,
+            'rtf': round(rtf, 3),
+            'escalated': beam_size is not None,
+            'beam_size': beam_size
+        }
+        return output
+    
+    def _record_beam_cost(self, beam_size: int, ratio: float):
+        with self._budget_lock:
+            previous = self._beam_cost.get(beam_size)
+            self._beam_cost[beam_size] = ratio if previous is None else 0.8 * previous + 0.2 * ratio
+    
+    def _record_budget(self, failed: bool, beam_size: Optional[int], rtf: float, target_rtf: float):
+        with self._budget_lock:
+            stats = self._budget_stats
+            stats['requests'] += 1
+            stats['total_rtf'] += rtf
+            if not failed:
+                stats['greedy_accepted'] += 1
+            elif beam_size:
+                stats['escalated'] += 1
+                stats['escalated_by_beam'][beam_size] = stats['escalated_by_beam'].get(beam_size, 0) + 1
+            else:
+                stats['escalation_skipped'] += 1
+            if rtf > target_rtf:
+                stats['over_budget'] += 1
+    
+    def get_budget_stats(self) -> Dict[str, Any]:
+        """延遲預算模式統計（greedy 直接採用、升級解碼、預算不足略過升級的次數）"""
+        with self._budget_lock:
+            stats = dict(self._budget_stats)
+            stats['escalated_by_beam'] = dict(stats['escalated_by_beam'])
+            requests = stats['requests']
+            stats['escalation_rate'] = round(stats['escalated'] / requests, 3) if requests else 0.0
+            stats['avg_rtf'] = round(stats.pop('total_rtf') / requests, 3) if requests else 0.0
+            stats['beam_cost'] = {b: round(c, 2) for b, c in self._beam_cost.items()}
+            stats['default_target_rtf'] = self.target_rtf
+            return stats
+    
+    @staticmethod
+    def _options_key(whisper_options: Dict[str, Any]) -> tuple:
+        """解碼選項的分組鍵"""
+        return tuple(sorted(
+            (name, tuple(value) if isinstance(value, list) else value)
+            for name, value in whisper_options.items()
+        ))
+    
+    def _format_result(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """將 transcribe 格式的結果轉為引擎輸出"""
+        return {
+            'text': result.get('text', '').strip(),
+            'confidence': self._calculate_confidence(result),
+            'language': result.get('language', 'zh'),
+            'segments': result.get('segments', []),
+            'engine': 'whisper',
+            'model_size': self.model_size
+        }
+    
+    @staticmethod
+    def _transcribe(model, audio: np.ndarray, whisper_options: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        執行推理（同步方法，在推理池的工作執行緒中運行）
+        """
+        with torch.inference_mode():
+            return model.transcribe(audio, **whisper_options)
+    
+    def _create_replica(self):
+        """建立工作執行緒使用的模型副本"""
+        with self._replica_lock:
+            if not self._primary_assigned:
+                self._primary_assigned = True
+                return self.model
+        
+        replica = copy.deepcopy(self.model)
+        replica.eval()
+        for param in replica.parameters():
+            param.requires_grad = False
+        return replica
+    
     def _prepare_options(self,
                         features: Dict[str, Any],
                         options: Dict[str, Any]) -> Dict[str, Any]:
@@ -288,9 +702,10 @@ class WhisperEngine:
         - 使用 torch.inference_mode
         """
         if self.model is not None:
-            self.model.eval()
-            for param in self.model.parameters():
-                param.requires_grad = False
+            for model in [self.model] + self.inference_pool.replicas():
+                model.eval()
+                for param in model.parameters():
+                    param.requires_grad = False
             logger.info("✓ 模型已優化為推理模式")
     
     def get_memory_usage(self) -> Dict[str, Any]:
@@ -326,7 +741,9 @@ class WhisperEngine:
             'model_size': self.model_size,
             'device': self.device,
             'cuda_available': torch.cuda.is_available(),
-            'model_loaded': self.model is not None
+            'model_loaded': self.model is not None,
+            'inference_pool': self.inference_pool.get_stats(),
+            'latency_budget': self.get_budget_stats()
         }
         
         # 添加記憶體信息
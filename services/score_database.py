@@ -8,6 +8,8 @@ from datetime import datetime
 import json
 import uuid
 
+from db_pool import get_connection
+
 class ScoreDatabase:
     def __init__(self, db_path='data/databases/emotion_analysis.db'):
         self.db_path = db_path
@@ -23,7 +25,7 @@ class ScoreDatabase:
     
     def _init_database(self):
         """初始化資料庫表"""
-        conn = sqlite3.connect(self.db_path)
+        conn = get_connection(self.db_path)
         cursor = conn.cursor()
         
         # 1. users 表
@@ -159,8 +161,8 @@ class ScoreDatabase:
         print("✅ 資料庫初始化完成")
     
     def get_connection(self):
-        """獲取資料庫連接"""
-        conn = sqlite3.connect(self.db_path)
+        """獲取資料庫連接（由連線池提供）"""
+        conn = get_connection(self.db_path)
         conn.row_factory = sqlite3.Row  # 使用 Row 工廠，可以通過列名訪問
         return conn
     
@@ -17,25 +17,80 @@
     advice = weather_service.get_weather_advice(weather)
 """
 
-import requests
+import json
+import os
 import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
-from typing import Dict, Optional, Tuple
+from typing import Dict, Iterable, Optional, Tuple
+
+import requests
+
 from config import CWA_API_KEY, CWA_API_ENABLED
+from db_pool import get_connection
+
+# 多個工作程序共用的天氣快取檔案
+DEFAULT_SHARED_CACHE_PATH = os.path.join('data', 'cache', 'weather_cache.db')
+
+# 查詢租約秒數（API timeout 為 10 秒）；未取得租約的程序最多等待這麼久
+FETCH_LEASE_SECONDS = 15
+
+# API 失敗後，該縣市在此秒數內直接使用模擬資料，不再重試
+FAILURE_BACKOFF_SECONDS = 60
 
 
 class WeatherCache:
-    """天氣資料快取類別"""
+    """
+    天氣資料快取類別
+
+    記憶體快取之外，可再以 SQLite 檔案共用快取：多個工作程序讀寫同一個檔案，
+    任一程序查詢過的縣市，其他程序在有效時間內直接使用。
+    同一檔案也記錄「查詢中」租約，讓多個程序同時查詢同一縣市時只有一個呼叫 API
+    """
     
-    def __init__(self, cache_duration_minutes: int = 60):
+    def __init__(self, cache_duration_minutes: int = 60, db_path: Optional[str] = None):
         """
         初始化快取
         
         Args:
             cache_duration_minutes: 快取有效時間（分鐘）
+            db_path: 共用快取 SQLite 檔案路徑（None 則只使用記憶體快取）
         """
         self.cache = {}
         self.cache_duration = timedelta(minutes=cache_duration_minutes)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        
+        if db_path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+                conn = get_connection(db_path)
+                try:
+                    conn.executescript('''
+                        CREATE TABLE IF NOT EXISTS weather_cache (
+                            city TEXT PRIMARY KEY,
+                            data TEXT NOT NULL,
+                            fetched_at REAL NOT NULL
+                        );
+                        CREATE TABLE IF NOT EXISTS weather_fetch_leases (
+                            city TEXT PRIMARY KEY,
+                            owner TEXT NOT NULL,
+                            expires_at REAL NOT NULL
+                        );
+                    ''')
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ 天氣共用快取無法使用，改用記憶體快取: {e}")
+                self.db_path = None
+    
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return time.time() - fetched_at < self.cache_duration.total_seconds()
     
     def get(self, city: str) -> Optional[Dict]:
         """
@@ -45,12 +100,30 @@ class WeatherCache:
             city: 縣市名稱
             
         Returns:
-            快取的天氣資料，如果過期或不存在則返回 None
+            快取的天氣資料（副本），如果過期或不存在則返回 None
         """
-        if city in self.cache:
-            data, timestamp = self.cache[city]
-            if datetime.now() - timestamp < self.cache_duration:
-                return data
+        with self._lock:
+            cached = self.cache.get(city)
+        if cached and self._is_fresh(cached[1]):
+            return dict(cached[0])
+        
+        if self.db_path:
+            try:
+                conn = get_connection(self.db_path)
+                try:
+                    row = conn.execute(
+                        'SELECT data, fetched_at FROM weather_cache WHERE city = ?', (city,)
+                    ).fetchone()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ 讀取天氣共用快取失敗: {e}")
+                row = None
+            if row and self._is_fresh(row[1]):
+                data = json.loads(row[0])
+                with self._lock:
+                    self.cache[city] = (data, row[1])
+                return dict(data)
         return None
     
     def set(self, city: str, data: Dict):
@@ -61,18 +134,93 @@ class WeatherCache:
             city: 縣市名稱
             data: 天氣資料
         """
-        self.cache[city] = (data, datetime.now())
+        fetched_at = time.time()
+        with self._lock:
+            self.cache[city] = (dict(data), fetched_at)
+        
+        if self.db_path:
+            try:
+                conn = get_connection(self.db_path)
+                try:
+                    conn.execute(
+                        'INSERT OR REPLACE INTO weather_cache (city, data, fetched_at) VALUES (?, ?, ?)',
+                        (city, json.dumps(data, ensure_ascii=False), fetched_at)
+                    )
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ 寫入天氣共用快取失敗: {e}")
+    
+    def acquire_fetch(self, city: str, owner: str, lease_seconds: float) -> bool:
+        """
+        取得縣市的查詢租約（跨程序）
+        
+        Args:
+            city: 縣市名稱
+            owner: 租約持有者識別
+            lease_seconds: 租約有效秒數（持有者中斷時逾時釋放）
+            
+        Returns:
+            是否取得租約（未使用共用快取時一律為 True）
+        """
+        if not self.db_path:
+            return True
+        now = time.time()
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                cursor = conn.execute('''
+                    INSERT INTO weather_fetch_leases (city, owner, expires_at) VALUES (?, ?, ?)
+                    ON CONFLICT(city) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at
+                    WHERE weather_fetch_leases.expires_at < ?
+                ''', (city, owner, now + lease_seconds, now))
+                conn.commit()
+                return cursor.rowcount == 1
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ 取得天氣查詢租約失敗: {e}")
+            return True
+    
+    def release_fetch(self, city: str, owner: str):
+        """釋放縣市的查詢租約"""
+        if not self.db_path:
+            return
+        try:
+            conn = get_connection(self.db_path)
+            try:
+                conn.execute('DELETE FROM weather_fetch_leases WHERE city = ? AND owner = ?', (city, owner))
+                conn.commit()
+            finally:
+                conn.close()
+        except sqlite3.Error as e:
+            print(f"⚠️ 釋放天氣查詢租約失敗: {e}")
     
     def clear(self):
         """清除所有快取"""
-        self.cache.clear()
+        with self._lock:
+            self.cache.clear()
+        if self.db_path:
+            try:
+                conn = get_connection(self.db_path)
+                try:
+                    conn.execute('DELETE FROM weather_cache')
+                    conn.commit()
+                finally:
+                    conn.close()
+            except sqlite3.Error as e:
+                print(f"⚠️ 清除天氣共用快取失敗: {e}")
     
     def get_cache_info(self) -> Dict:
         """取得快取資訊"""
+        with self._lock:
+            cities = list(self.cache.keys())
         return {
-            'total_cached': len(self.cache),
-            'cities': list(self.cache.keys()),
-            'cache_duration_minutes': self.cache_duration.total_seconds() / 60
+            'total_cached': len(cities),
+            'cities': cities,
+            'cache_duration_minutes': self.cache_duration.total_seconds() / 60,
+            'shared_cache': self.db_path
         }
 
 
@@ -119,19 +267,28 @@ class CWAWeatherService:
         '颱風': '颱風天氣，請待在室內，注意安全',
     }
     
-    def __init__(self, api_key: str = CWA_API_KEY, cache_duration: int = 60):
+    def __init__(self, api_key: str = CWA_API_KEY, cache_duration: int = 60,
+                 shared_cache_path: Optional[str] = DEFAULT_SHARED_CACHE_PATH):
         """
         初始化天氣服務
         
         Args:
             api_key: 中央氣象署 API 金鑰
             cache_duration: 快取有效時間（分鐘）
+            shared_cache_path: 跨程序共用快取的 SQLite 檔案（None 則只使用記憶體快取）
         """
         self.api_key = api_key
         self.base_url = "https://opendata.cwa.gov.tw/api/v1/rest/datastore"
         self.dataset_id = "F-C0032-001"  # 36小時天氣預報
         self.enabled = bool(api_key)
-        self.cache = WeatherCache(cache_duration)
+        self.cache = WeatherCache(cache_duration, shared_cache_path if self.enabled else None)
+        
+        # 同一程序內每個縣市同時只有一個執行緒查詢 API
+        self._owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._city_locks: Dict[str, threading.Lock] = {}
+        self._city_locks_guard = threading.Lock()
+        self._failed_at: Dict[str, float] = {}
+        self.api_calls = 0
         
         if not self.enabled:
             print("⚠️ 天氣服務未啟用：缺少 API Key")
@@ -178,20 +335,67 @@ class CWAWeatherService:
         if not self.enabled:
             return self._get_mock_weather(standard_city)
         
+        if not use_cache:
+            return self._fetch_weather(standard_city, use_cache=False)
+        
+        with self._city_lock(standard_city):
+            # 等待期間其他執行緒可能已查詢完成
+            cached_data = self.cache.get(standard_city)
+            if cached_data:
+                cached_data['from_cache'] = True
+                return cached_data
+            
+            if not self.cache.acquire_fetch(standard_city, self._owner, FETCH_LEASE_SECONDS):
+                # 其他程序正在查詢，等待其寫入共用快取
+                cached_data = self._wait_for_cache(standard_city, FETCH_LEASE_SECONDS)
+                if cached_data:
+                    cached_data['from_cache'] = True
+                    return cached_data
+            try:
+                return self._fetch_weather(standard_city, use_cache=True)
+            finally:
+                self.cache.release_fetch(standard_city, self._owner)
+    
+    def _city_lock(self, city: str) -> threading.Lock:
+        with self._city_locks_guard:
+            lock = self._city_locks.get(city)
+            if lock is None:
+                lock = self._city_locks[city] = threading.Lock()
+            return lock
+    
+    def _wait_for_cache(self, city: str, timeout: float) -> Optional[Dict]:
+        """輪詢共用快取直到其他程序寫入結果或逾時"""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            time.sleep(0.1)
+            cached_data = self.cache.get(city)
+            if cached_data:
+                return cached_data
+        return None
+    
+    def _fetch_weather(self, city: str, use_cache: bool) -> Dict:
+        """調用 API 並寫入快取；失敗時返回模擬數據"""
+        failed_at = self._failed_at.get(city)
+        if failed_at and time.time() - failed_at < FAILURE_BACKOFF_SECONDS:
+            return self._get_mock_weather(city)
+        
         try:
             # 調用 API
-            weather_data = self._call_weather_api(standard_city)
+            self.api_calls += 1
+            weather_data = self._call_weather_api(city)
+            self._failed_at.pop(city, None)
             
             # 快取結果
             if use_cache:
-                self.cache.set(standard_city, weather_data)
+                self.cache.set(city, weather_data)
             
             weather_data['from_cache'] = False
             return weather_data
             
         except Exception as e:
             print(f"天氣 API 調用失敗: {e}")
-            return self._get_mock_weather(standard_city)
+            self._failed_at[city] = time.time()
+            return self._get_mock_weather(city)
     
     def get_weather_by_address(self, address: str, use_cache: bool = True) -> Dict:
         """
@@ -207,6 +411,27 @@ class CWAWeatherService:
         city = self.extract_city_from_address(address)
         return self.get_weather_by_city(city, use_cache)
     
+    def prefetch(self, locations: Iterable[str], max_workers: int = 4) -> Dict[str, Dict]:
+        """
+        批次預先查詢多個地址或縣市的天氣（每個縣市只查詢一次）
+        
+        排程批次派送前呼叫，之後逐筆查詢都由快取取得
+        
+        Args:
+            locations: 地址或縣市名稱
+            max_workers: 同時查詢的縣市數量
+            
+        Returns:
+            縣市 → 天氣資料
+        """
+        cities = sorted({self.extract_city_from_address(location) for location in locations if location})
+        if not cities:
+            return {}
+        
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(cities)))) as executor:
+            results = list(executor.map(self.get_weather_by_city, cities))
+        return dict(zip(cities, results))
+    
     def _call_weather_api(self, city: str) -> Dict:
         """
         調用中央氣象署 API
@@ -374,7 +599,9 @@ class CWAWeatherService:
     
     def get_cache_info(self) -> Dict:
         """取得快取資訊"""
-        return self.cache.get_cache_info()
+        info = self.cache.get_cache_info()
+        info['api_calls'] = self.api_calls
+        return info
     
     def clear_cache(self):
         """清除快取"""
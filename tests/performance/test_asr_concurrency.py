@@ -0,0 +1,133 @@
+"""
+ASR 推理池吞吐量測試
+比較不同推理工作執行緒數量下，批次識別與雙引擎模式的吞吐量
+"""
+
+import asyncio
+import io
+import os
+import sys
+import time
+
+import numpy as np
+import soundfile as sf
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.coordinator import ASRCoordinator
+
+WORKER_COUNTS = [1, 2, 4]
+BATCH_SIZE = 8
+CLIP_SECONDS = 5
+
+
+def _make_clips(count, duration=CLIP_SECONDS, sr=16000):
+    """產生測試音頻（不同頻率的正弦波加少量噪音）"""
+    rng = np.random.default_rng(0)
+    clips = []
+    for i in range(count):
+        t = np.linspace(0, duration, sr * duration)
+        audio = 0.5 * np.sin(2 * np.pi * (220 + 40 * i) * t) + 0.05 * rng.standard_normal(len(t))
+        buffer = io.BytesIO()
+        sf.write(buffer, audio.astype(np.float32), sr, format='WAV')
+        clips.append(buffer.getvalue())
+    return clips
+
+
+async def _measure_batch(coordinator, clips):
+    """執行一次批次識別，回傳 (耗時, 成功數)"""
+    start = time.time()
+    results = await coordinator.recognize_batch(clips)
+    elapsed = time.time() - start
+    return elapsed, sum(1 for r in results if r.get('success', False))
+
+
+async def test_batch_throughput():
+    """測試不同工作執行緒數量下的批次識別吞吐量"""
+    print("=" * 60)
+    print("ASR 推理池吞吐量測試")
+    print("=" * 60)
+    print()
+
+    clips = _make_clips(BATCH_SIZE)
+
+    print(f"批次: {BATCH_SIZE} 個 {CLIP_SECONDS} 秒音頻")
+    print(f"{'工作執行緒':>10} | {'總時間':>8} | {'音頻/秒':>8} | {'加速':>6}")
+    print("-" * 44)
+
+    baseline = None
+    for workers in WORKER_COUNTS:
+        coordinator = ASRCoordinator(
+            whisper_model_size="base",
+            enable_funasr=False,
+            device="cuda",
+            inference_workers=workers
+        )
+
+        # 預熱：讓每個工作執行緒建立模型副本
+        await coordinator.recognize_batch(clips[:workers])
+
+        elapsed, successful = await _measure_batch(coordinator, clips)
+        assert successful == BATCH_SIZE, f"成功 {successful}/{BATCH_SIZE}"
+
+        baseline = baseline or elapsed
+        print(f"{workers:>10} | {elapsed:7.2f}s | {BATCH_SIZE * CLIP_SECONDS / elapsed:8.1f} | "
+              f"{baseline / elapsed:5.2f}x")
+
+        coordinator.whisper_engine.inference_pool.shutdown()
+
+    print()
+
+
+async def test_dual_engine_overlap():
+    """測試雙引擎模式下兩個引擎是否並行（需安裝 FunASR）"""
+    print("=" * 60)
+    print("雙引擎並行測試")
+    print("=" * 60)
+    print()
+
+    coordinator = ASRCoordinator(
+        whisper_model_size="base",
+        enable_funasr=True,
+        device="cuda"
+    )
+    if not coordinator.enable_funasr:
+        print("FunASR 未啟用，略過")
+        print()
+        return
+
+    audio_bytes = _make_clips(1)[0]
+    audio, audio_info = coordinator.preprocess_audio(audio_bytes)
+    features = coordinator.detect_features(audio, audio_info, {})
+
+    # 預熱
+    await coordinator.recognize(audio_bytes)
+
+    start = time.time()
+    await coordinator._call_whisper(audio, features, {})
+    whisper_time = time.time() - start
+
+    start = time.time()
+    await coordinator._call_funasr(audio, features, {})
+    funasr_time = time.time() - start
+
+    start = time.time()
+    await asyncio.gather(
+        coordinator._call_whisper(audio, features, {}),
+        coordinator._call_funasr(audio, features, {})
+    )
+    dual_time = time.time() - start
+
+    print(f"Whisper: {whisper_time:.3f}秒, FunASR: {funasr_time:.3f}秒")
+    print(f"雙引擎並行: {dual_time:.3f}秒（依序執行約 {whisper_time + funasr_time:.3f}秒）")
+    print()
+
+
+async def main():
+    await test_batch_throughput()
+    await test_dual_engine_overlap()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,82 @@
+"""
+ASR 特徵檢測效能測試
+比較閩南語與高齡語音檢測器各自計算聲學特徵、與共用同一份 AcousticFeatures 的延遲，
+以每秒音頻所需的檢測時間（毫秒）表示
+"""
+
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.acoustic_features import AcousticFeatures
+from services.asr.elderly_detector import ElderlyVoiceDetector
+from services.asr.minnan_detector import MinnanLanguageDetector
+
+DURATIONS = [2, 5, 10, 20]
+REPEATS = 3
+SAMPLE_RATE = 16000
+
+
+def _make_speech_like(duration, sr=SAMPLE_RATE):
+    """產生音調起伏、有停頓的類語音訊號"""
+    rng = np.random.default_rng(duration)
+    t = np.linspace(0, duration, sr * duration, endpoint=False)
+    pitch = 180 + 60 * np.sin(2 * np.pi * 0.7 * t)
+    phase = 2 * np.pi * np.cumsum(pitch) / sr
+    envelope = (np.sin(2 * np.pi * 2.5 * t) > -0.3).astype(np.float64)
+    audio = envelope * (np.sin(phase) + 0.3 * np.sin(2 * phase)) + 0.01 * rng.standard_normal(len(t))
+    return (audio / np.max(np.abs(audio))).astype(np.float32)
+
+
+def _detect(minnan, elderly, audio, shared):
+    """執行兩個檢測器；shared 時共用同一份聲學特徵"""
+    features = AcousticFeatures(audio, SAMPLE_RATE) if shared else None
+    minnan_result = minnan.detect(audio=audio, sample_rate=SAMPLE_RATE, acoustic_features=features)
+    elderly_result = elderly.detect(audio=audio, sample_rate=SAMPLE_RATE, acoustic_features=features)
+    return minnan_result, elderly_result
+
+
+def _best_time(fn):
+    times = []
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_shared_feature_latency():
+    """共用聲學特徵應得到相同結果，且延遲較低"""
+    print("=" * 60)
+    print("特徵檢測延遲（毫秒 / 每秒音頻）")
+    print("=" * 60)
+    print()
+
+    minnan = MinnanLanguageDetector()
+    elderly = ElderlyVoiceDetector()
+
+    print(f"{'音頻長度':>8} | {'各自計算':>10} | {'共用特徵':>10} | {'加速':>6}")
+    print("-" * 46)
+
+    for duration in DURATIONS:
+        audio = _make_speech_like(duration)
+
+        # 共用特徵不應改變檢測結果
+        assert _detect(minnan, elderly, audio, shared=False) == _detect(minnan, elderly, audio, shared=True)
+
+        separate = _best_time(lambda: _detect(minnan, elderly, audio, shared=False))
+        shared = _best_time(lambda: _detect(minnan, elderly, audio, shared=True))
+
+        print(f"{duration:>7}s | {separate * 1000 / duration:10.1f} | "
+              f"{shared * 1000 / duration:10.1f} | {separate / shared:5.2f}x")
+
+    print()
+
+
+if __name__ == "__main__":
+    test_shared_feature_latency()
@@ -0,0 +1,107 @@
+"""
+Whisper 延遲預算解碼測試
+比較特徵優化參數直接解碼（高齡/閩南語 beam 8-10）與延遲預算模式
+（先 greedy，未達門檻才升級 beam）的即時率與升級比例
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.whisper_engine import WhisperEngine
+
+CLIP_SECONDS = 8
+CLIP_COUNT = 6
+TARGET_RTF = 0.5
+
+# 觸發最寬 beam 的特徵組合
+PROFILES = {
+    '一般': {},
+    '高齡': {'is_elderly': True},
+    '閩南語': {'is_minnan': True, 'minnan_confidence': 0.8},
+    '高齡+低SNR': {'is_elderly': True, 'is_low_snr': True, 'snr_db': -25},
+}
+
+
+def _make_clips(count, duration=CLIP_SECONDS, sr=16000):
+    """產生測試音頻（調幅正弦波加噪音）"""
+    rng = np.random.default_rng(0)
+    t = np.linspace(0, duration, sr * duration, endpoint=False)
+    clips = []
+    for i in range(count):
+        envelope = 0.5 + 0.5 * np.sin(2 * np.pi * 3 * t)
+        audio = 0.4 * envelope * np.sin(2 * np.pi * (180 + 30 * i) * t) + 0.03 * rng.standard_normal(len(t))
+        clips.append(audio.astype(np.float32))
+    return clips
+
+
+async def _measure(engine, clips, features, options):
+    """逐筆識別，回傳平均即時率"""
+    start = time.perf_counter()
+    for audio in clips:
+        await engine.recognize(audio, features, options)
+    return (time.perf_counter() - start) / (len(clips) * CLIP_SECONDS)
+
+
+async def test_latency_budget():
+    """各特徵組合下，直接解碼與延遲預算模式的即時率比較"""
+    print("=" * 60)
+    print(f"Whisper 延遲預算解碼測試（目標 RTF {TARGET_RTF}）")
+    print("=" * 60)
+    print()
+
+    engine = WhisperEngine(model_size="base", device="cpu", num_workers=1)
+    clips = _make_clips(CLIP_COUNT)
+
+    # 預熱
+    await engine.recognize(clips[0], {}, {})
+
+    print(f"{'特徵':>10} | {'直接解碼 RTF':>12} | {'預算模式 RTF':>12}")
+    print("-" * 44)
+    for name, features in PROFILES.items():
+        baseline_rtf = await _measure(engine, clips, features, {})
+        budget_rtf = await _measure(engine, clips, features, {'target_rtf': TARGET_RTF})
+        print(f"{name:>10} | {baseline_rtf:12.3f} | {budget_rtf:12.3f}")
+
+    stats = engine.get_budget_stats()
+    print()
+    print(f"預算模式請求: {stats['requests']}, greedy 直接採用: {stats['greedy_accepted']}, "
+          f"升級: {stats['escalated']} ({stats['escalation_rate']:.0%}), "
+          f"預算不足略過: {stats['escalation_skipped']}, 超出預算: {stats['over_budget']}")
+    print(f"各 beam 升級次數: {stats['escalated_by_beam']}, beam 成本倍數: {stats['beam_cost']}")
+    print()
+
+    assert stats['requests'] == CLIP_COUNT * len(PROFILES)
+    assert stats['greedy_accepted'] + stats['escalated'] + stats['escalation_skipped'] == stats['requests']
+
+
+async def test_batch_budget():
+    """批次識別在延遲預算模式下以 greedy 批次解碼，只有未達門檻者升級"""
+    engine = WhisperEngine(model_size="base", device="cpu", num_workers=1)
+    clips = _make_clips(CLIP_COUNT)
+    features_list = [{'is_elderly': True}] * CLIP_COUNT
+
+    start = time.perf_counter()
+    results = await engine.recognize_batch(clips, features_list, {'target_rtf': TARGET_RTF})
+    elapsed = time.perf_counter() - start
+
+    assert all(r.get('decode_profile', {}).get('mode') == 'latency_budget' for r in results)
+    escalated = sum(1 for r in results if r['decode_profile']['escalated'])
+    print(f"批次預算模式: {CLIP_COUNT} 個音頻 {elapsed:.2f}秒 (RTF {elapsed / (CLIP_COUNT * CLIP_SECONDS):.3f}), "
+          f"升級 {escalated} 個")
+    print()
+
+
+async def main():
+    await test_latency_budget()
+    await test_batch_budget()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
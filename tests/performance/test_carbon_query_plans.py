@@ -0,0 +1,143 @@
+"""
+碳排放儀表板查詢計畫測試
+在大量資料（預設 100 萬筆訪視記錄）上執行儀表板使用的查詢，
+以 EXPLAIN QUERY PLAN 檢查沒有任何查詢退化為全表掃描
+"""
+
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+FIXTURE_ROWS = int(os.environ.get('CARBON_PLAN_ROWS', 1000000))
+
+
+def _build_fixture(db, rows):
+    """以 executemany 直接寫入大量訪視記錄（暫停觸發器），再重建彙總表與全文索引"""
+    rng = random.Random(0)
+    first_day = date(2023, 1, 1)
+    transports = ['機車', '汽車', '大眾運輸']
+
+    def generate():
+        for _ in range(rows):
+            visit_date = first_day + timedelta(days=rng.randint(0, 729))
+            worker = rng.randint(1, 50)
+            distance = round(rng.uniform(1, 35), 1)
+            yield (
+                visit_date.isoformat(), f'SW{worker:03d}', f'社工{worker}',
+                f'E{rng.randint(10000, 13300):05d}', '定期關懷',
+                rng.choice(transports), distance, distance * 0.1
+            )
+
+    conn = db.get_connection()
+    conn.execute("UPDATE rollup_state SET deferred = 1 WHERE name = 'visit_rollups'")
+    conn.execute("UPDATE search_index_state SET deferred = 1 WHERE name = 'visit_records_fts'")
+    conn.executemany('''
+    INSERT INTO visit_records
+    (visit_date, social_worker_id, social_worker_name, elder_id,
+     visit_type, transport_type, distance, carbon_emission)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''', generate())
+    conn.execute("UPDATE search_index_state SET deferred = 0 WHERE name = 'visit_records_fts'")
+    conn.execute("UPDATE rollup_state SET deferred = 0 WHERE name = 'visit_rollups'")
+    conn.commit()
+    conn.execute('ANALYZE')
+    conn.close()
+
+    db.rebuild_rollups()
+    db.rebuild_visit_search_index()
+
+
+def _dashboard_calls(db):
+    """儀表板與訪視記錄頁使用的查詢"""
+    return [
+        lambda: db.get_all_visit_records(100),
+        lambda: db.get_visit_record_by_id(12345),
+        lambda: db.search_visit_records(worker_id='SW007', limit=100),
+        lambda: db.search_visit_records(start_date='2024-03-01', end_date='2024-03-31', limit=100),
+        lambda: db.search_visit_records(transport_type='汽車', start_date='2024-01-01', limit=100),
+        lambda: db.search_visit_records(worker_id='SW007', transport_type='機車',
+                                        start_date='2024-01-01', end_date='2024-06-30', limit=100),
+        lambda: db.search_visit_records(
+            worker_id='SW007', limit=100,
+            after=db.encode_visit_cursor({'visit_date': '2024-03-15', 'id': 500000})
+        ),
+        lambda: db.search_visit_records(
+            limit=100, after=db.encode_visit_cursor({'visit_date': '2023-05-01', 'id': 1000})
+        ),
+        lambda: db.search_visit_records(keyword='E10123', limit=100),
+        lambda: db.search_visit_records(keyword='社工17', start_date='2024-01-01', limit=100),
+        lambda: db.count_visit_records(),
+        lambda: db.count_visit_records(worker_id='SW007'),
+        lambda: db.count_visit_records(transport_type='汽車'),
+        lambda: db.count_visit_records(worker_id='SW007', start_date='2024-01-01', end_date='2024-12-31'),
+        lambda: db.get_social_worker_name('SW007'),
+        lambda: db.get_monthly_statistics(2024, 3),
+        lambda: db.get_period_statistics('2023-06-01', '2024-09-30'),
+        lambda: db.get_statistics_summary('2024-06-01', '2024-09-30'),
+        lambda: db.get_statistics_summary('2024-06-15', '2024-07-14'),
+        lambda: db.get_transport_distribution('2024-06-01', '2024-09-30'),
+    ]
+
+
+def test_dashboard_queries_use_indexes():
+    """所有儀表板查詢都不應出現 SCAN（全表或全索引掃描）"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon_tracking.db'))
+
+        start = time.time()
+        _build_fixture(db, FIXTURE_ROWS)
+        print(f"建立 {FIXTURE_ROWS:,} 筆測試資料: {time.time() - start:.1f}秒")
+
+        # 追蹤查詢方法實際執行的 SQL（已帶入參數）
+        statements = []
+        conn = db.get_connection()
+        conn.set_trace_callback(statements.append)
+        timings = []
+        try:
+            for call in _dashboard_calls(db):
+                call_start = time.time()
+                call()
+                timings.append(time.time() - call_start)
+        finally:
+            conn.set_trace_callback(None)
+
+        failures = []
+        for sql in statements:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            plan = [row[3] for row in conn.execute(f'EXPLAIN QUERY PLAN {sql}')]
+            # 依索引順序讀取且有 LIMIT 時，讀到足夠筆數即停止，不視為全表掃描
+            ordered_limit = ' LIMIT ' in sql.upper() and not any(
+                'TEMP B-TREE FOR ORDER BY' in step for step in plan
+            )
+            # monthly_statistics 每月一列，讀取整表仍是 O(月數)；
+            # 全文索引的 MATCH 查詢（VIRTUAL TABLE INDEX n:M）為索引查找
+            scans = [
+                step for step in plan
+                if step.startswith('SCAN') and 'CONSTANT ROW' not in step
+                and not step.startswith('SCAN monthly_statistics')
+                and not ('VIRTUAL TABLE INDEX' in step and ':M' in step)
+                and not (ordered_limit and ' INDEX ' in step)
+            ]
+            if scans:
+                failures.append((' '.join(sql.split()), scans))
+        conn.close()
+
+        for sql, scans in failures:
+            print(f"✗ {sql}\n    {scans}")
+        print(f"查詢數: {len(timings)}, 最慢: {max(timings) * 1000:.1f}ms")
+
+        assert not failures, f"{len(failures)} 個查詢使用全表掃描"
+
+
+if __name__ == "__main__":
+    test_dashboard_queries_use_indexes()
+    print("✓ 所有儀表板查詢皆使用索引")
@@ -0,0 +1,127 @@
+"""
+SQLite 連線池效能測試
+比較啟用 / 停用連線池時，訪視記錄 API 與評分 API 的每秒請求數
+每個請求在新建的短暫執行緒中處理，與 Flask-SocketIO threading 模式每個請求一個執行緒相同
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from flask import Flask
+
+import db_pool
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+from services.score_database import ScoreDatabase
+
+REQUESTS_PER_CLIENT = 200
+CLIENT_THREADS = 4
+
+
+def _create_app(tmp_dir):
+    """建立只含碳排放與評分路由、使用暫存資料庫的 Flask 應用"""
+    import routes.carbon_tracking as carbon_routes
+    import services.score_database as score_module
+    from routes.main import main
+
+    carbon_db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon_tracking.db'))
+    score_db = ScoreDatabase(os.path.join(tmp_dir, 'emotion_analysis.db'))
+    carbon_routes.db = carbon_db
+    score_module.score_db = score_db
+
+    # 準備測試資料
+    for i in range(500):
+        carbon_db.add_visit_record({
+            'visit_date': f'2024-{(i % 12) + 1:02d}-{(i % 28) + 1:02d}',
+            'social_worker_id': f'SW{i % 20:03d}',
+            'social_worker_name': f'社工{i % 20}',
+            'elder_id': f'E{i % 100:04d}',
+            'elder_name': f'長者{i % 100}',
+            'visit_type': '定期訪視',
+            'transport_type': ['機車', '汽車', '大眾運輸'][i % 3],
+            'distance': 5.0 + i % 10
+        })
+
+    score_db.create_or_get_user('default')
+    for i in range(50):
+        session_id = score_db.create_session('default')
+        score_db.save_score_record(
+            session_id, 'default',
+            {'emotion': 80, 'voice': 75, 'content': 85, 'overall': 80},
+            {'conversation_count': 5, 'total_words': 120, 'duration': 60}
+        )
+
+    app = Flask(__name__)
+    app.register_blueprint(carbon_routes.carbon_bp)
+    app.register_blueprint(main)
+    return app
+
+
+def _measure_rps(app, url):
+    """多個用戶端同時請求、每個請求一個新執行緒，回傳每秒請求數"""
+    errors = []
+
+    def handle_request():
+        response = app.test_client().get(url)
+        if response.status_code != 200:
+            errors.append(response.status_code)
+
+    def client():
+        for _ in range(REQUESTS_PER_CLIENT):
+            request_thread = threading.Thread(target=handle_request)
+            request_thread.start()
+            request_thread.join()
+
+    threads = [threading.Thread(target=client) for _ in range(CLIENT_THREADS)]
+    start = time.time()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.time() - start
+
+    assert not errors, f"請求失敗: {errors[:5]}"
+    return REQUESTS_PER_CLIENT * CLIENT_THREADS / elapsed
+
+
+def test_pool_throughput():
+    """測試連線池啟用前後的吞吐量"""
+    print("=" * 60)
+    print("SQLite 連線池吞吐量測試")
+    print("=" * 60)
+    print()
+
+    endpoints = [
+        '/carbon/api/visit-records?limit=100',
+        '/carbon/api/visit-records?worker_id=SW001&start_date=2024-03-01&end_date=2024-09-30',
+        '/api/score-history?user_id=default&limit=20',
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = _create_app(tmp_dir)
+
+        print(f"{'端點':<60} | {'停用 req/s':>10} | {'啟用 req/s':>10}")
+        print("-" * 88)
+
+        try:
+            for url in endpoints:
+                db_pool.POOL_ENABLED = False
+                before = _measure_rps(app, url)
+                db_pool.POOL_ENABLED = True
+                after = _measure_rps(app, url)
+                print(f"{url:<60} | {before:10.1f} | {after:10.1f}")
+        finally:
+            db_pool.POOL_ENABLED = True
+            # 關閉閒置連線，以免暫存資料庫刪除時仍被開啟
+            db_pool.close_idle_connections()
+
+    print()
+
+
+if __name__ == "__main__":
+    test_pool_throughput()
@@ -0,0 +1,98 @@
+"""
+GPT-SoVITS T2S 靜態 KV 快取微基準測試（CPU）
+比較 export_torch_script 中逐 token torch.cat 擴充快取與預先配置、依位置原地寫入的靜態快取，
+在短句與長句解碼下的每秒 token 數，並確認兩種方式的輸出一致
+
+使用隨機權重的 T2SBlock（維度與 GPT-SoVITS T2S 模型相同），不需載入預訓練權重；
+匯入 export_torch_script 仍需 GPT-SoVITS 的執行環境
+"""
+
+import os
+import sys
+import time
+
+import torch
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+GPT_SOVITS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../GPT-SoVITS-v2pro-20250604'))
+
+NUM_LAYERS = 24
+HIDDEN_DIM = 512
+NUM_HEADS = 16
+FFN_DIM = 2048
+PROMPT_LEN = 200
+# (名稱, 解碼 token 數)
+CASES = [('短句', 100), ('長句', 1500)]
+
+
+def _load_module():
+    """GPT-SoVITS 以工作目錄為基準解析模型路徑，匯入前切換到其根目錄"""
+    os.chdir(GPT_SOVITS_ROOT)
+    sys.path.append(GPT_SOVITS_ROOT)
+    sys.path.append(os.path.join(GPT_SOVITS_ROOT, 'GPT_SoVITS'))
+    import export_torch_script
+    return export_torch_script
+
+
+def _build_transformer(ets):
+    torch.manual_seed(0)
+    blocks = []
+    for _ in range(NUM_LAYERS):
+        mlp = ets.T2SMLP(
+            torch.randn(FFN_DIM, HIDDEN_DIM) * 0.02, torch.zeros(FFN_DIM),
+            torch.randn(HIDDEN_DIM, FFN_DIM) * 0.02, torch.zeros(HIDDEN_DIM)
+        )
+        blocks.append(ets.T2SBlock(
+            NUM_HEADS, HIDDEN_DIM, mlp,
+            torch.randn(3 * HIDDEN_DIM, HIDDEN_DIM) * 0.02, torch.zeros(3 * HIDDEN_DIM),
+            torch.randn(HIDDEN_DIM, HIDDEN_DIM) * 0.02, torch.zeros(HIDDEN_DIM),
+            torch.ones(HIDDEN_DIM), torch.zeros(HIDDEN_DIM), 1e-5,
+            torch.ones(HIDDEN_DIM), torch.zeros(HIDDEN_DIM), 1e-5,
+        ))
+    return ets.T2STransformer(NUM_LAYERS, blocks)
+
+
+@torch.no_grad()
+def _decode(transformer, steps, static):
+    """回傳 (耗時, 最後一步輸出)"""
+    torch.manual_seed(1)
+    prompt = torch.randn(1, PROMPT_LEN, HIDDEN_DIM)
+    attn_mask = torch.zeros(1, NUM_HEADS, PROMPT_LEN, PROMPT_LEN, dtype=torch.bool)
+    inputs = torch.randn(steps, 1, 1, HIDDEN_DIM)
+
+    start = time.perf_counter()
+    _, k_cache, v_cache = transformer.process_prompt(prompt, attn_mask, None)
+    if static:
+        k_bufs, v_bufs = transformer.init_static_cache(k_cache, v_cache, PROMPT_LEN + steps)
+    for idx in range(steps):
+        if static:
+            out = transformer.decode_next_token_static(inputs[idx], k_bufs, v_bufs, PROMPT_LEN + idx)
+        else:
+            out, k_cache, v_cache = transformer.decode_next_token(inputs[idx], k_cache, v_cache)
+    return time.perf_counter() - start, out
+
+
+def test_static_kv_cache_tokens_per_second():
+    """torch.cat 快取與靜態快取的解碼速度比較"""
+    print("=" * 70)
+    print("T2S 靜態 KV 快取微基準測試（CPU）")
+    print("=" * 70)
+    ets = _load_module()
+    transformer = _build_transformer(ets)
+    _decode(transformer, 10, True)  # 預熱
+
+    print(f"{'案例':>4} | {'tokens':>6} | {'cat tok/s':>10} | {'static tok/s':>12} | {'加速':>6}")
+    print("-" * 52)
+    for name, steps in CASES:
+        cat_time, cat_out = _decode(transformer, steps, False)
+        static_time, static_out = _decode(transformer, steps, True)
+        assert torch.allclose(cat_out, static_out, atol=1e-4), "靜態快取輸出與 torch.cat 快取不一致"
+        print(f"{name:>4} | {steps:>6} | {steps / cat_time:10.1f} | {steps / static_time:12.1f} | "
+              f"{cat_time / static_time:5.2f}x")
+    print()
+
+
+if __name__ == "__main__":
+    test_static_kv_cache_tokens_per_second()
@@ -0,0 +1,112 @@
+"""
+GPT-SoVITS api_v2 合併推理吞吐量測試
+以 N 個並發客戶端對 /tts 送出非串流請求（相同參考音頻），統計每秒請求數與合成音頻秒數
+
+比較方式：分別以下列參數啟動 api_v2 後執行本測試
+    python api_v2.py --max_batch_requests 1    # 不合併（逐一推理）
+    python api_v2.py                           # 合併推理（預設 8 個請求、30ms 窗口）
+"""
+
+import io
+import os
+import sys
+import time
+import wave
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+API_URL = os.environ.get('TTS_API_URL', 'http://127.0.0.1:9880')
+REF_AUDIO = os.environ.get('TTS_REF_AUDIO', 'TTS/vc.wav')
+PROMPT_TEXT = os.environ.get(
+    'TTS_PROMPT_TEXT',
+    '使用軟件者、傳播軟件導出的聲音者自負全責。如不認可該條款，則不能使用或引用軟件'
+)
+
+CLIENT_COUNTS = [1, 2, 4, 8]
+REQUESTS_PER_CLIENT = 4
+
+TEXTS = [
+    '阿嬤早安，今天天氣很好，記得多喝水。',
+    '您今天有按時吃藥嗎？',
+    '下午社工會來家裡看您，請在家等候。',
+    '最近睡得好不好？有沒有哪裡不舒服？',
+    '明天可能會下雨，出門記得帶雨傘。',
+    '晚餐要吃清淡一點，對身體比較好。',
+]
+
+
+def _payload(i):
+    return {
+        'text': TEXTS[i % len(TEXTS)],
+        'text_lang': 'zh',
+        'ref_audio_path': REF_AUDIO,
+        'prompt_text': PROMPT_TEXT,
+        'prompt_lang': 'zh',
+        'text_split_method': 'cut5',
+        'batch_size': 1,
+        'media_type': 'wav',
+        'streaming_mode': False
+    }
+
+
+def _wav_seconds(content):
+    with wave.open(io.BytesIO(content), 'rb') as wav:
+        return wav.getnframes() / wav.getframerate()
+
+
+def _client(client_id):
+    """依序送出 REQUESTS_PER_CLIENT 個請求，回傳 (成功數, 合成音頻秒數, 各請求延遲)"""
+    ok, audio_seconds, latencies = 0, 0.0, []
+    with requests.Session() as session:
+        for i in range(REQUESTS_PER_CLIENT):
+            start = time.perf_counter()
+            response = session.post(f'{API_URL}/tts', json=_payload(client_id + i), timeout=300)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code == 200:
+                ok += 1
+                audio_seconds += _wav_seconds(response.content)
+    return ok, audio_seconds, latencies
+
+
+def test_concurrent_throughput():
+    """不同並發客戶端數下的吞吐量"""
+    print("=" * 70)
+    print("GPT-SoVITS 合併推理吞吐量測試")
+    print("=" * 70)
+    print(f"API: {API_URL}, 參考音頻: {REF_AUDIO}")
+    print()
+
+    # 預熱（載入參考音頻與提示文本特徵）
+    _client(0)
+
+    print(f"{'客戶端':>6} | {'請求/秒':>8} | {'音頻秒/秒':>9} | {'平均延遲':>8} | {'P95 延遲':>8}")
+    print("-" * 56)
+    for clients in CLIENT_COUNTS:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as executor:
+            results = list(executor.map(_client, range(clients)))
+        elapsed = time.perf_counter() - start
+
+        ok = sum(r[0] for r in results)
+        audio_seconds = sum(r[1] for r in results)
+        latencies = sorted(l for r in results for l in r[2])
+        assert ok == clients * REQUESTS_PER_CLIENT, f"成功 {ok}/{clients * REQUESTS_PER_CLIENT}"
+
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        print(f"{clients:>6} | {ok / elapsed:8.2f} | {audio_seconds / elapsed:9.2f} | "
+              f"{sum(latencies) / len(latencies):7.2f}s | {p95:7.2f}s")
+
+    print()
+    stats = requests.get(f'{API_URL}/batch_stats', timeout=10).json()
+    print(f"合併推理統計: 請求 {stats['requests']}, 輪數 {stats['rounds']}, "
+          f"平均每輪 {stats['avg_round_requests']} 個請求, 最多 {stats['max_round_requests']} 個, "
+          f"平均排隊 {stats['avg_queue_wait_ms']}ms")
+    print()
+
+
+if __name__ == "__main__":
+    test_concurrent_throughput()
@@ -0,0 +1,171 @@
+"""
+GPT-SoVITS ONNX Runtime 後端效能與一致性測試（CPU）
+同一個 TTS 實例分別以 PyTorch 與 ONNX Runtime 後端合成相同文本，比較即時率（RTF），
+並以 top_k=1（貪婪解碼）比對兩個後端預測的語意 token
+
+事前準備：以 GPT_SoVITS/onnx_export.py 由相同的 GPT / SoVITS 權重匯出 onnx/<名稱>/ 目錄
+    TTS_ONNX_DIR=onnx/<名稱> python tests/performance/test_tts_onnx_backend.py
+
+每一步（含第一個語意 token）都依請求的 top_k 重新取樣，top_k=1 時兩個後端皆為貪婪解碼，
+一致率只受浮點誤差影響
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+GPT_SOVITS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../GPT-SoVITS-v2pro-20250604'))
+TTS_CONFIG = os.environ.get('TTS_CONFIG', 'GPT_SoVITS/configs/tts_infer.yaml')
+ONNX_DIR = os.environ.get('TTS_ONNX_DIR', 'onnx/nahida')
+REF_AUDIO = os.environ.get('TTS_REF_AUDIO', os.path.abspath('TTS/vc.wav'))
+PROMPT_TEXT = os.environ.get(
+    'TTS_PROMPT_TEXT',
+    '使用軟件者、傳播軟件導出的聲音者自負全責。如不認可該條款，則不能使用或引用軟件'
+)
+
+TEXTS = [
+    '阿嬤早安，今天天氣很好，記得多喝水。',
+    '您今天有按時吃藥嗎？下午社工會來家裡看您，請在家等候。',
+    '最近睡得好不好？有沒有哪裡不舒服？明天可能會下雨，出門記得帶雨傘。',
+]
+ROUNDS = 3
+
+
+def _load_pipeline():
+    """GPT-SoVITS 以工作目錄為基準解析模型路徑，載入前切換到其根目錄"""
+    os.chdir(GPT_SOVITS_ROOT)
+    sys.path.append(GPT_SOVITS_ROOT)
+    sys.path.append(os.path.join(GPT_SOVITS_ROOT, 'GPT_SoVITS'))
+    from GPT_SoVITS.TTS_infer_pack.TTS import TTS, TTS_Config
+
+    config = TTS_Config(TTS_CONFIG)
+    config.device = 'cpu'
+    config.is_half = False
+    pipeline = TTS(config)
+    pipeline.init_onnx_backend(ONNX_DIR)
+    return pipeline
+
+
+def _request(text, top_k=15):
+    return {
+        'text': text,
+        'text_lang': 'zh',
+        'ref_audio_path': REF_AUDIO,
+        'prompt_text': PROMPT_TEXT,
+        'prompt_lang': 'zh',
+        'text_split_method': 'cut5',
+        'batch_size': 1,
+        'top_k': top_k,
+        'seed': 1234,
+    }
+
+
+def _synthesize(pipeline, backend):
+    """回傳 (合成耗時, 音頻秒數)"""
+    pipeline.configs.inference_backend = backend
+    elapsed, audio_seconds = 0.0, 0.0
+    for _ in range(ROUNDS):
+        for text in TEXTS:
+            start = time.perf_counter()
+            sr, audio = next(pipeline.run(_request(text)))
+            elapsed += time.perf_counter() - start
+            audio_seconds += len(audio) / sr
+    return elapsed, audio_seconds
+
+
+def _semantic_tokens(pipeline, backend, text):
+    """以貪婪解碼預測單一文本的語意 token"""
+    pipeline.configs.inference_backend = backend
+    prompt_text = pipeline._prepare_reference(REF_AUDIO, [], PROMPT_TEXT, 'zh', False)
+    assert prompt_text
+    data = pipeline.text_preprocessor.preprocess(text, 'zh', 'cut0', pipeline.configs.version)
+    batches, _ = pipeline.to_batch(
+        data,
+        prompt_data=pipeline.prompt_cache,
+        batch_size=1,
+        threshold=0.75,
+        split_bucket=False,
+        device=pipeline.configs.device,
+        precision=pipeline.precision,
+    )
+    pred_semantic_list, idx_list = pipeline._predict_semantic(batches[0], False, 1, 1.0, 1.0, 1.35)
+    return [int(t) for t in pred_semantic_list[0][-idx_list[0]:]] if idx_list[0] else []
+
+
+def test_onnx_backend_rtf():
+    """PyTorch 與 ONNX Runtime 後端的 CPU 即時率比較"""
+    print("=" * 70)
+    print("GPT-SoVITS ONNX Runtime 後端測試（CPU）")
+    print("=" * 70)
+    pipeline = _load_pipeline()
+
+    # 預熱（載入參考音頻特徵與 ONNX Runtime 初始化）
+    for backend in ('torch', 'onnx'):
+        pipeline.configs.inference_backend = backend
+        next(pipeline.run(_request(TEXTS[0])))
+
+    print(f"{'後端':>6} | {'合成耗時':>8} | {'音頻秒數':>8} | {'RTF':>6}")
+    print("-" * 40)
+    rtf = {}
+    for backend in ('torch', 'onnx'):
+        elapsed, audio_seconds = _synthesize(pipeline, backend)
+        rtf[backend] = elapsed / audio_seconds
+        print(f"{backend:>6} | {elapsed:7.2f}s | {audio_seconds:7.2f}s | {rtf[backend]:6.3f}")
+    print(f"\nONNX Runtime 加速: {rtf['torch'] / rtf['onnx']:.2f}x")
+
+    print("\n語意 token 一致性（top_k=1）:")
+    for text in TEXTS:
+        torch_tokens = _semantic_tokens(pipeline, 'torch', text)
+        onnx_tokens = _semantic_tokens(pipeline, 'onnx', text)
+        length = min(len(torch_tokens), len(onnx_tokens))
+        same = sum(a == b for a, b in zip(torch_tokens, onnx_tokens))
+        match = same / length if length else 0.0
+        print(f"  {text[:16]:<16} torch {len(torch_tokens):>4} / onnx {len(onnx_tokens):>4} tokens, 一致率 {match:.1%}")
+        assert abs(len(torch_tokens) - len(onnx_tokens)) <= max(5, 0.1 * len(torch_tokens))
+        assert match >= 0.9
+    print()
+
+
+def test_onnx_backend_survives_failed_request():
+    """推理出錯後以相同權重重新載入模型，ONNX 後端與設定檔中的後端不變"""
+    import yaml
+
+    pipeline = _load_pipeline()
+    predict_semantic = pipeline._predict_semantic
+
+    def broken_predict_semantic(*args, **kwargs):
+        raise RuntimeError('模擬推理失敗')
+
+    pipeline._predict_semantic = broken_predict_semantic
+    try:
+        results = pipeline.run(_request(TEXTS[0]))
+        next(results)  # 出錯時先回傳 1 秒靜音，重新載入模型後拋出原本的錯誤
+        try:
+            next(results)
+            assert False, '應拋出推理錯誤'
+        except RuntimeError:
+            pass
+    finally:
+        pipeline._predict_semantic = predict_semantic
+
+    assert pipeline.use_onnx
+    assert pipeline.configs.inference_backend == 'onnx'
+    assert pipeline.configs.onnx_model_dir == ONNX_DIR
+    with open(pipeline.configs.configs_path, 'r', encoding='utf-8') as f:
+        assert yaml.safe_load(f)['custom']['inference_backend'] == 'onnx'
+
+    # 恢復後仍以 ONNX 後端正常合成
+    sr, audio = next(pipeline.run(_request(TEXTS[0])))
+    assert len(audio) > sr * 0.5
+
+    # 以絕對路徑重新載入同一權重檔也不卸載 ONNX 模型
+    pipeline.init_t2s_weights(os.path.abspath(pipeline.configs.t2s_weights_path))
+    assert pipeline.use_onnx
+
+
+if __name__ == "__main__":
+    test_onnx_backend_rtf()
+    test_onnx_backend_survives_failed_request()
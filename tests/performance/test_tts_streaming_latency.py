@@ -0,0 +1,97 @@
+"""
+GPT-SoVITS api_v2 串流合成首包延遲測試
+以 streaming_mode 對 /tts 送出請求，量測不同 stream_chunk_size 下的首包延遲（TTFB）與即時率（RTF）
+
+stream_chunk_size=0 為原本按文本分段回傳；需先啟動 api_v2
+    python api_v2.py
+"""
+
+import os
+import sys
+import time
+
+import requests
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+API_URL = os.environ.get('TTS_API_URL', 'http://127.0.0.1:9880')
+REF_AUDIO = os.environ.get('TTS_REF_AUDIO', 'TTS/vc.wav')
+PROMPT_TEXT = os.environ.get(
+    'TTS_PROMPT_TEXT',
+    '使用軟件者、傳播軟件導出的聲音者自負全責。如不認可該條款，則不能使用或引用軟件'
+)
+
+CHUNK_SIZES = [0, 48, 24, 12]
+TEXTS = [
+    '阿嬤早安，今天天氣很好，記得多喝水。',
+    '您今天有按時吃藥嗎？下午社工會來家裡看您，請在家等候。',
+    '最近睡得好不好？有沒有哪裡不舒服？明天可能會下雨，出門記得帶雨傘。晚餐要吃清淡一點，對身體比較好。',
+]
+
+
+def _payload(text, chunk_size):
+    return {
+        'text': text,
+        'text_lang': 'zh',
+        'ref_audio_path': REF_AUDIO,
+        'prompt_text': PROMPT_TEXT,
+        'prompt_lang': 'zh',
+        'text_split_method': 'cut5',
+        'batch_size': 1,
+        'media_type': 'raw',
+        'streaming_mode': True,
+        'stream_chunk_size': chunk_size,
+    }
+
+
+def _stream(session, text, chunk_size):
+    """回傳 (首包延遲, 總耗時, 音頻位元組數)"""
+    start = time.perf_counter()
+    ttfb, size = None, 0
+    with session.post(f'{API_URL}/tts', json=_payload(text, chunk_size), stream=True, timeout=300) as response:
+        assert response.status_code == 200, response.text
+        for chunk in response.iter_content(chunk_size=None):
+            if chunk and ttfb is None:
+                ttfb = time.perf_counter() - start
+            size += len(chunk)
+    return ttfb, time.perf_counter() - start, size
+
+
+def test_streaming_first_audio_latency():
+    """不同串流區塊大小的首包延遲與即時率"""
+    print("=" * 70)
+    print("GPT-SoVITS 串流合成首包延遲測試")
+    print("=" * 70)
+    print(f"API: {API_URL}, 參考音頻: {REF_AUDIO}")
+    print()
+
+    with requests.Session() as session:
+        # 預熱（載入參考音頻與提示文本特徵）
+        _stream(session, TEXTS[0], 0)
+
+        print(f"{'區塊 token':>10} | {'平均首包':>8} | {'最大首包':>8} | {'RTF':>6}")
+        print("-" * 44)
+        for chunk_size in CHUNK_SIZES:
+            ttfbs, elapsed, size = [], 0.0, 0
+            for text in TEXTS:
+                ttfb, total, nbytes = _stream(session, text, chunk_size)
+                ttfbs.append(ttfb)
+                elapsed += total
+                size += nbytes
+            # 音頻秒數取自伺服器記錄的最近請求
+            recent = requests.get(f'{API_URL}/stream_stats', timeout=10).json()['recent'][-len(TEXTS):]
+            audio_seconds = sum(m['audio_seconds'] for m in recent)
+            assert size > 0 and len(recent) == len(TEXTS)
+            rtf = elapsed / audio_seconds if audio_seconds else float('nan')
+            print(f"{chunk_size:>10} | {sum(ttfbs) / len(ttfbs):7.2f}s | {max(ttfbs):7.2f}s | {rtf:6.3f}")
+
+    print()
+    stats = requests.get(f'{API_URL}/stream_stats', timeout=10).json()
+    print(f"伺服器統計: 請求 {stats['requests']}, 平均首包 {stats['avg_ttfb']}s, 平均 RTF {stats['avg_rtf']}, "
+          f"平均等鎖 {stats['avg_lock_wait']}s")
+    print()
+
+
+if __name__ == "__main__":
+    test_streaming_first_audio_latency()
@@ -0,0 +1,182 @@
+"""
+測試 ASR 識別結果快取
+"""
+
+import asyncio
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.coordinator import ASRCoordinator
+from services.asr.fusion import ConfidenceFusion
+from services.asr.result_cache import ASRResultCache
+
+MODEL = {'version': '1.0.0', 'whisper_model': 'base', 'funasr_model': None}
+
+
+def _result(text):
+    return {
+        'success': True,
+        'text': text,
+        'confidence': np.float32(0.875),
+        'language': 'zh',
+        'audio_duration': 3.2,
+        'processing_time': 1.4
+    }
+
+
+def test_key_uses_effective_options():
+    """未提供的選項以預設值計入快取鍵；音頻、模型或選項不同則鍵不同"""
+    audio = b'RIFF' + bytes(range(256)) * 10
+    key = ASRResultCache.make_key(audio, MODEL, {})
+
+    assert key == ASRResultCache.make_key(audio, MODEL, {'language_hint': 'zh', 'return_details': False})
+    assert key == ASRResultCache.make_key(audio, MODEL, {'use_cache': True})
+    assert key != ASRResultCache.make_key(audio, MODEL, {'language_hint': 'minnan'})
+    assert key != ASRResultCache.make_key(audio + b'\x00', MODEL, {})
+    assert key != ASRResultCache.make_key(audio, dict(MODEL, whisper_model='small'), {})
+    print("✓ 快取鍵包含音頻內容、模型設定與有效選項")
+
+
+def test_memory_lru_eviction():
+    """記憶體層超過上限時淘汰最久未使用的結果"""
+    cache = ASRResultCache(max_entries=2)
+    cache.set('a', _result('一'))
+    cache.set('b', _result('二'))
+    assert cache.get('a')['text'] == '一'  # a 成為最近使用
+    cache.set('c', _result('三'))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 2 and stats['evictions'] == 1
+    assert stats['memory_hits'] == 3 and stats['misses'] == 1
+    print(f"✓ LRU 淘汰正確: {stats}")
+
+
+def test_returns_copies_and_skips_failures():
+    """回傳副本（呼叫端修改不影響快取），失敗結果不快取"""
+    cache = ASRResultCache(max_entries=4)
+    cache.set('k', _result('你好'))
+    first = cache.get('k')
+    first['index'] = 3
+    first['text'] = '改過'
+    assert cache.get('k')['text'] == '你好'
+    assert 'index' not in cache.get('k')
+
+    cache.set('bad', {'success': False, 'error': 'decode failed'})
+    assert cache.get('bad') is None
+    print("✓ 快取結果為副本，失敗結果不快取")
+
+
+def test_disk_tier_survives_restart_and_clear():
+    """磁碟層在新實例中可命中；clear 同時清除兩層"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ASRResultCache(max_entries=4, cache_dir=tmp_dir)
+        key = ASRResultCache.make_key(b'audio-bytes', MODEL, {})
+        cache.set(key, _result('早安'))
+
+        restarted = ASRResultCache(max_entries=4, cache_dir=tmp_dir)
+        assert restarted.get_stats()['disk_entries'] == 1
+        result = restarted.get(key)
+        assert result['text'] == '早安' and result['confidence'] == 0.875
+        assert restarted.get_stats()['disk_hits'] == 1
+
+        restarted.clear()
+        assert restarted.get(key) is None
+        assert ASRResultCache(max_entries=4, cache_dir=tmp_dir).get(key) is None
+        print("✓ 磁碟快取跨實例命中，clear 後清除")
+
+
+def test_disk_pruning():
+    """磁碟層超過上限時刪除最舊的檔案"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = ASRResultCache(max_entries=2, cache_dir=tmp_dir, max_disk_entries=10)
+        for i in range(25):
+            cache.set(f'{i:064x}', _result(str(i)))
+        assert cache.get_stats()['disk_entries'] <= 10
+        print(f"✓ 磁碟快取上限維持: {cache.get_stats()['disk_entries']} 筆")
+
+
+def test_disabled_cache():
+    """max_entries=0 時停用快取"""
+    cache = ASRResultCache(max_entries=0)
+    cache.set('k', _result('x'))
+    assert cache.get('k') is None
+    assert cache.get_stats()['misses'] == 0
+    print("✓ 停用時不快取也不計數")
+
+
+class FlakyWhisperEngine:
+    """第一次識別拋出錯誤（模擬暫時性 OOM），之後正常返回"""
+
+    model_size = 'base'
+    target_rtf = None
+
+    def __init__(self):
+        self.calls = 0
+
+    async def recognize(self, audio, features, options):
+        self.calls += 1
+        if self.calls == 1:
+            raise RuntimeError('CUDA out of memory')
+        return {'text': '阿嬤你好', 'confidence': 0.9}
+
+
+class FakeCoordinator(ASRCoordinator):
+    """不載入模型的協調器：預處理與特徵檢測以固定值取代"""
+
+    def __init__(self):
+        self.whisper_engine = FlakyWhisperEngine()
+        self.funasr_engine = None
+        self.enable_funasr = False
+        self.fusion_algorithm = ConfidenceFusion()
+        self.result_cache = ASRResultCache(max_entries=4)
+
+    def preprocess_audio(self, audio_data):
+        return np.zeros(16000, dtype=np.float32), {'duration': 1.0}
+
+    def detect_features(self, audio, audio_info, options):
+        return {'language_hint': 'zh'}
+
+
+def test_engine_error_not_cached():
+    """引擎暫時性錯誤不寫入快取，重試時重新識別"""
+    coordinator = FakeCoordinator()
+    audio = b'RIFF-flaky-audio'
+
+    failed = asyncio.run(coordinator.recognize(audio))
+    assert failed['success'] is False
+    assert 'CUDA out of memory' in failed['error']
+    assert coordinator.result_cache.get_stats()['entries'] == 0
+
+    retried = asyncio.run(coordinator.recognize(audio))
+    assert retried['success'] is True and retried['text'] == '阿嬤你好'
+    assert not retried.get('from_cache')
+    assert coordinator.whisper_engine.calls == 2
+
+    cached = asyncio.run(coordinator.recognize(audio))
+    assert cached['from_cache'] is True
+    assert coordinator.whisper_engine.calls == 2
+
+    # 批次路徑同樣不快取引擎錯誤
+    cache = ASRResultCache(max_entries=4)
+    cache.set('partial', dict(_result('部分'), engine_errors={'whisper': 'decode failed'}))
+    assert cache.get('partial') is None
+    print("✓ 引擎錯誤不快取，重試重新識別")
+
+
+if __name__ == "__main__":
+    test_key_uses_effective_options()
+    test_memory_lru_eviction()
+    test_returns_copies_and_skips_failures()
+    test_disk_tier_survives_restart_and_clear()
+    test_disk_pruning()
+    test_disabled_cache()
+    test_engine_error_not_cached()
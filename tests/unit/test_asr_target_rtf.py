@@ -0,0 +1,51 @@
+"""
+測試 ASR 目標即時率參數解析：拒絕 NaN、無限大與非正數，引擎遇到無效值時改為一般解碼
+"""
+
+import math
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.whisper_engine import WhisperEngine, parse_target_rtf
+
+
+def test_parse_valid_values():
+    """空值返回 None，正數字串或數值轉為 float"""
+    assert parse_target_rtf(None) is None
+    assert parse_target_rtf('') is None
+    assert parse_target_rtf('  ') is None
+    assert parse_target_rtf('0.5') == 0.5
+    assert parse_target_rtf(1.2) == 1.2
+
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-inf', 'Infinity', '0', '-0.5', 'abc', math.nan, math.inf])
+def test_parse_rejects_invalid_values(value):
+    """NaN、無限大、非正數與非數值都拋出 ValueError"""
+    with pytest.raises(ValueError):
+        parse_target_rtf(value)
+
+
+def test_budget_target_ignores_invalid_values():
+    """延遲預算目標無效時返回 None（一般解碼），不讓批次識別整批失敗"""
+    engine = WhisperEngine.__new__(WhisperEngine)
+    engine.target_rtf = None
+    assert engine._budget_target({}) is None
+    assert engine._budget_target({'target_rtf': 0.5}) == 0.5
+    assert engine._budget_target({'target_rtf': 'nan'}) is None
+    assert engine._budget_target({'target_rtf': math.inf}) is None
+
+    engine.target_rtf = 0.8
+    assert engine._budget_target({}) == 0.8
+    assert engine._budget_target({'target_rtf': 0.3}) == 0.3
+
+    engine.target_rtf = math.nan
+    assert engine._budget_target({}) is None
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,176 @@
+"""
+測試廣播劇章節生成佇列：同一章節只生成一次、預先生成後續章節、生成中串流已完成的分段、章節不存在時不加入佇列
+"""
+
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import wave
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.voice_processing import qwen_audiobook_service as audiobook_module
+from modules.voice_processing.audiobook_job_queue import AudiobookJobQueue, PRIORITY_PLAY
+from modules.voice_processing.qwen_audiobook_service import QwenAudiobookService
+
+TEXT = '。'.join(f'第{i}句，今天天氣很好，記得多喝水' * 6 for i in range(10)) + '。'
+CHAPTERS = [f'chapter_{i:03d}' for i in range(1, 6)]
+
+
+class FakeTTSService(QwenAudiobookService):
+    """以文字長度產生 PCM 取代 Qwen TTS API（每個字 1 個 frame），可暫停指定分段"""
+
+    def __init__(self, output_dir):
+        super().__init__(api_key='test')
+        self.output_dir = output_dir
+        self.calls = []
+        self.lock = threading.Lock()
+        self.gate = threading.Event()
+        self.gate.set()
+        self.blocked_text = None
+
+    def _tts_synthesize_once(self, text, output_file, voice, language_type):
+        with self.lock:
+            self.calls.append((os.path.basename(os.path.dirname(output_file)), text))
+        if text == self.blocked_text:
+            self.gate.wait(timeout=10)
+        with open(output_file, 'wb') as f:
+            f.write(b'\x01\x00' * len(text))
+
+
+def _make_book(audiobooks_dir, book_id='book-1'):
+    book_dir = os.path.join(audiobooks_dir, book_id)
+    os.makedirs(book_dir)
+    for chapter_id in CHAPTERS:
+        with open(os.path.join(book_dir, f'{chapter_id}.txt'), 'w', encoding='utf-8') as f:
+            f.write(TEXT)
+    with open(os.path.join(book_dir, 'metadata.json'), 'w', encoding='utf-8') as f:
+        json.dump({'chapters': [{'id': chapter_id} for chapter_id in CHAPTERS]}, f)
+    return book_dir
+
+
+def _wait_done(queue, book_id, chapter_ids, dialect, timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if all(not queue.is_pending(book_id, chapter_id, dialect) for chapter_id in chapter_ids):
+            return
+        time.sleep(0.05)
+    raise AssertionError('生成逾時')
+
+
+def test_dedup_and_prefetch(monkeypatch):
+    """同一章節重複加入只生成一次，並依章節順序預先生成後續章節"""
+    monkeypatch.setattr(audiobook_module, 'DASHSCOPE_AVAILABLE', True)
+    monkeypatch.setattr(audiobook_module, 'EPUB_AVAILABLE', True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _make_book(tmp_dir)
+        service = FakeTTSService(tmp_dir)
+        queue = AudiobookJobQueue(service, db_path=os.path.join(tmp_dir, 'jobs.db'), workers=2)
+        audio_dir = os.path.join(tmp_dir, 'book-1', 'audio', 'mandarin')
+        audio_file = os.path.join(audio_dir, 'chapter_002.wav')
+
+        for _ in range(5):
+            queue.enqueue('book-1', 'chapter_002', 'mandarin', audio_file, PRIORITY_PLAY)
+        assert queue.prefetch_next('book-1', 'chapter_002', 'mandarin', tmp_dir, count=2) == [
+            'chapter_003', 'chapter_004'
+        ]
+        _wait_done(queue, 'book-1', ['chapter_002', 'chapter_003', 'chapter_004'], 'mandarin')
+
+        segments = service._split_text_into_segments(TEXT)
+        assert len(service.calls) == 3 * len(segments)
+        assert sorted(os.listdir(audio_dir)) == ['chapter_002.wav', 'chapter_003.wav', 'chapter_004.wav']
+        stats = queue.get_stats()
+        assert (stats['done'], stats['queued'], stats['running']) == (3, 0, 0)
+
+        # 已完成的章節再次加入不會重新生成
+        assert queue.enqueue('book-1', 'chapter_002', 'mandarin', audio_file, PRIORITY_PLAY) == 'done'
+        assert queue.prefetch_next('book-1', 'chapter_004', 'mandarin', tmp_dir, count=5) == ['chapter_005']
+        _wait_done(queue, 'book-1', ['chapter_005'], 'mandarin')
+        queue.stop()
+
+
+def test_stream_while_generating(monkeypatch):
+    """生成中串流已完成的分段，合併完成後由正式文件接續，內容與完整音頻相同"""
+    monkeypatch.setattr(audiobook_module, 'DASHSCOPE_AVAILABLE', True)
+    monkeypatch.setattr(audiobook_module, 'EPUB_AVAILABLE', True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _make_book(tmp_dir)
+        service = FakeTTSService(tmp_dir)
+        segments = service._split_text_into_segments(TEXT)
+        service.blocked_text = segments[-1]
+        service.gate.clear()
+
+        queue = AudiobookJobQueue(service, db_path=os.path.join(tmp_dir, 'jobs.db'), workers=1)
+        audio_file = os.path.join(tmp_dir, 'book-1', 'audio', 'minan', 'chapter_001.wav')
+        queue.enqueue('book-1', 'chapter_001', 'minan', audio_file, PRIORITY_PLAY)
+
+        stream = service.iter_chapter_audio(
+            'book-1', 'chapter_001', 'Roy', audio_file,
+            is_pending=lambda: queue.is_pending('book-1', 'chapter_001', 'minan'),
+            poll_interval=0.02, timeout=10
+        )
+        header = next(stream)
+        assert header[:4] == b'RIFF' and header[8:12] == b'WAVE' and len(header) == 44
+
+        # 最後一段尚未完成前，已可收到前面的分段
+        first = next(stream)
+        assert len(first) == 2 * len(segments[0])
+        assert not os.path.exists(audio_file)
+
+        service.gate.set()
+        body = first + b''.join(stream)
+        _wait_done(queue, 'book-1', ['chapter_001'], 'minan')
+
+        with wave.open(audio_file, 'rb') as wav_file:
+            assert body == wav_file.readframes(wav_file.getnframes())
+        assert len(body) == 2 * len(TEXT)
+        queue.stop()
+
+
+def test_stream_stops_when_job_fails(monkeypatch):
+    """背景工作失敗時串流結束，不會一直等待"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        _make_book(tmp_dir)
+        service = FakeTTSService(tmp_dir)
+        audio_file = os.path.join(tmp_dir, 'book-1', 'audio', 'mandarin', 'chapter_001.wav')
+        stream = service.iter_chapter_audio('book-1', 'chapter_001', 'Ethan', audio_file,
+                                            is_pending=lambda: False, poll_interval=0.01)
+        assert len(b''.join(stream)) == 44
+
+
+def test_missing_chapter_returns_404(monkeypatch):
+    """章節不存在時回傳 404 JSON 錯誤，不加入生成佇列；章節存在時才開始串流"""
+    from flask import Flask
+
+    monkeypatch.setattr(audiobook_module, 'DASHSCOPE_AVAILABLE', True)
+    monkeypatch.setattr(audiobook_module, 'EPUB_AVAILABLE', True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        audiobooks_dir = os.path.join(tmp_dir, 'static', 'audiobooks')
+        _make_book(audiobooks_dir)
+        service = FakeTTSService(audiobooks_dir)
+        queue = AudiobookJobQueue(service, db_path=os.path.join(tmp_dir, 'jobs.db'), workers=1)
+        monkeypatch.setattr(audiobook_module, '_job_queue', queue)
+
+        app = Flask(__name__, root_path=tmp_dir)
+        app.register_blueprint(audiobook_module.qwen_audiobook_bp)
+        client = app.test_client()
+
+        response = client.get('/api/audiobook/book/book-1/chapter/chapter_999/audio/mandarin')
+        assert response.status_code == 404
+        assert 'chapter_999' in response.get_json()['error']
+        assert queue.get_job('book-1', 'chapter_999', 'mandarin') is None
+        assert queue.get_stats()['queued'] == 0
+
+        response = client.get('/api/audiobook/book/book-1/chapter/chapter_005/audio/mandarin')
+        assert response.status_code == 200 and response.mimetype == 'audio/wav'
+        assert len(response.get_data()) == 44 + 2 * len(TEXT)
+        queue.stop()
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
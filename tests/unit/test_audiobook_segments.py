@@ -0,0 +1,94 @@
+"""
+測試 Qwen 廣播劇章節分段合成：完整合併所有分段、限流重試、中斷後沿用已完成的分段
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import wave
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.voice_processing import qwen_audiobook_service as audiobook_module
+from modules.voice_processing.qwen_audiobook_service import QwenAudiobookService, QwenTTSError
+
+TEXT = '。'.join(f'第{i}句，今天天氣很好，記得多喝水' * 6 for i in range(30)) + '。'
+
+
+class FakeTTSService(QwenAudiobookService):
+    """以文字長度產生 PCM 取代 Qwen TTS API（每個字 1 個 frame）"""
+
+    def __init__(self, fail_texts=(), throttle_first=0):
+        super().__init__(api_key='test')
+        self.fail_texts = set(fail_texts)
+        self.throttle_left = throttle_first
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def _tts_synthesize_once(self, text, output_file, voice, language_type):
+        with self.lock:
+            self.calls.append(text)
+            if self.throttle_left > 0:
+                self.throttle_left -= 1
+                raise QwenTTSError(429, 'Throttling.RateQuota', '請求過於頻繁')
+        if text in self.fail_texts:
+            raise QwenTTSError(400, 'InvalidParameter', '文本不合法')
+        with open(output_file, 'wb') as f:
+            f.write(b'\x01\x00' * len(text))
+
+
+def _frames(path):
+    with wave.open(path, 'rb') as wav_file:
+        return wav_file.getnframes()
+
+
+def test_split_keeps_all_text():
+    segments = QwenAudiobookService(api_key='test')._split_text_into_segments(TEXT + '長' * 450)
+    assert ''.join(segments) == TEXT + '長' * 450
+    assert max(len(segment) for segment in segments) <= audiobook_module.SEGMENT_MAX_LENGTH
+
+
+def test_chapter_concatenates_all_segments(monkeypatch):
+    """所有分段依序合併為一個 WAV，限流後重試成功"""
+    monkeypatch.setattr(audiobook_module, 'DASHSCOPE_AVAILABLE', True)
+    monkeypatch.setattr(audiobook_module, 'RATE_LIMIT_BASE_DELAY', 0.01)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        service = FakeTTSService(throttle_first=3)
+        output_file = os.path.join(tmp_dir, 'chapter_001.wav')
+
+        assert service._generate_chapter_audio(TEXT, 'chapter_001', tmp_dir, 'Ethan', 'Chinese') == output_file
+        assert _frames(output_file) == len(TEXT)
+        assert os.listdir(tmp_dir) == ['chapter_001.wav']
+        segments = service._split_text_into_segments(TEXT)
+        assert len(service.calls) == len(segments) + 3
+
+
+def test_resume_reuses_finished_segments(monkeypatch):
+    """分段失敗時保留已完成的檢查點，重新生成只合成未完成的分段"""
+    monkeypatch.setattr(audiobook_module, 'DASHSCOPE_AVAILABLE', True)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        segments = QwenAudiobookService(api_key='test')._split_text_into_segments(TEXT)
+        failing = FakeTTSService(fail_texts={segments[-1]})
+        output_file = os.path.join(tmp_dir, 'chapter_001.wav')
+
+        try:
+            failing._synthesize_chapter_file(TEXT, output_file, 'Ethan', 'Chinese')
+            assert False, '應該失敗'
+        except Exception as e:
+            assert '文本不合法' in str(e)
+        # 不可重試的錯誤不重試
+        assert failing.calls.count(segments[-1]) == 1
+        assert not os.path.exists(output_file)
+
+        resumed = FakeTTSService()
+        resumed._synthesize_chapter_file(TEXT, output_file, 'Ethan', 'Chinese')
+        assert resumed.calls == [segments[-1]]
+        assert _frames(output_file) == len(TEXT)
+        assert os.listdir(tmp_dir) == ['chapter_001.wav']
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
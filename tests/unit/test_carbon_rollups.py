@@ -0,0 +1,282 @@
+"""
+測試碳排放彙總表的增量維護與批次匯入
+"""
+
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+
+def _make_visit(rng):
+    """產生一筆隨機訪視資料"""
+    return {
+        'visit_date': f'2024-{rng.randint(5, 8):02d}-{rng.randint(1, 28):02d}',
+        'social_worker_id': f'SW{rng.randint(1, 4):03d}',
+        'social_worker_name': '測試社工',
+        'elder_id': f'E{rng.randint(1, 15):05d}',
+        'visit_type': '定期關懷',
+        'transport_type': rng.choice(['機車', '汽車', '大眾運輸']),
+        'distance': round(rng.uniform(1, 30), 1)
+    }
+
+
+def _raw_monthly(db, year, month):
+    """直接由原始記錄計算月度統計"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    prefix = f'{year}-{month:02d}-%'
+    cursor.execute('''
+    SELECT COUNT(*), COUNT(DISTINCT elder_id), SUM(distance), SUM(carbon_emission)
+    FROM visit_records WHERE visit_date LIKE ?
+    ''', (prefix,))
+    visits = cursor.fetchone()
+    cursor.execute('SELECT COUNT(*) FROM ai_care_records WHERE care_date LIKE ?', (prefix,))
+    ai_care = cursor.fetchone()[0]
+    conn.close()
+    return visits[0], visits[1], visits[2] or 0, visits[3] or 0, ai_care
+
+
+def _rollup_monthly(db, year, month):
+    """讀取月度彙總表"""
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    cursor.execute('''
+    SELECT physical_visits, total_elders, total_distance, total_carbon_emission, ai_care_count
+    FROM monthly_statistics WHERE year = ? AND month = ?
+    ''', (year, month))
+    row = cursor.fetchone() or (0, 0, 0, 0, 0)
+    conn.close()
+    return row
+
+
+def _assert_consistent(db):
+    for month in range(5, 9):
+        raw = _raw_monthly(db, 2024, month)
+        rollup = _rollup_monthly(db, 2024, month)
+        assert raw[0] == rollup[0] and raw[1] == rollup[1] and raw[4] == rollup[4], (month, raw, rollup)
+        assert abs(raw[2] - rollup[2]) < 1e-6 and abs(raw[3] - rollup[3]) < 1e-6, (month, raw, rollup)
+
+
+def test_rollups_follow_writes():
+    """新增、修改、刪除後彙總表應與原始記錄一致"""
+    rng = random.Random(42)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+
+        ids = [db.add_visit_record(_make_visit(rng)) for _ in range(200)]
+        for _ in range(50):
+            db.add_ai_care_record({
+                'care_date': f'2024-{rng.randint(5, 8):02d}-{rng.randint(1, 28):02d}',
+                'elder_id': 'E00001',
+                'care_type': '語音關懷'
+            })
+        _assert_consistent(db)
+
+        for record_id in rng.sample(ids, 60):
+            db.update_visit_record(record_id, _make_visit(rng))
+        _assert_consistent(db)
+
+        for record_id in rng.sample(ids, 80):
+            db.delete_visit_record(record_id)
+        _assert_consistent(db)
+
+        # 重建後結果應相同
+        before = [_rollup_monthly(db, 2024, m)[:2] for m in range(5, 9)]
+        db.rebuild_rollups()
+        _assert_consistent(db)
+        assert before == [_rollup_monthly(db, 2024, m)[:2] for m in range(5, 9)]
+
+
+def test_summary_and_distribution_match_raw():
+    """統計摘要與交通工具分布應與原始記錄一致"""
+    rng = random.Random(7)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+        for _ in range(150):
+            db.add_visit_record(_make_visit(rng))
+
+        for start, end in [('2024-06-01', '2024-07-31'), ('2024-05-10', '2024-08-03')]:
+            summary = db.get_statistics_summary(start, end)
+
+            conn = db.get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+            SELECT COUNT(*), COUNT(DISTINCT elder_id), SUM(distance), SUM(carbon_emission)
+            FROM visit_records WHERE visit_date BETWEEN ? AND ?
+            ''', (start, end))
+            raw = cursor.fetchone()
+            cursor.execute('''
+            SELECT transport_type, COUNT(*) FROM visit_records
+            WHERE visit_date BETWEEN ? AND ? GROUP BY transport_type
+            ''', (start, end))
+            raw_distribution = dict(cursor.fetchall())
+            conn.close()
+
+            assert summary['total_visits'] == raw[0]
+            assert summary['unique_elders'] == raw[1]
+            assert abs(summary['total_distance'] - raw[2]) < 1e-6
+            assert abs(summary['total_emission'] - raw[3]) < 1e-6
+
+            distribution = {
+                item['transport_type']: item['count']
+                for item in db.get_transport_distribution(start, end)
+            }
+            assert distribution == raw_distribution
+
+        period = db.get_period_statistics('2024-04-15', '2024-09-10')
+        assert [(item['year'], item['month']) for item in period] == [
+            (2024, 4), (2024, 5), (2024, 6), (2024, 7), (2024, 8), (2024, 9)
+        ]
+        assert period[0]['physical_visits'] == 0
+
+
+def test_bulk_import_reports_errors_and_updates_rollups():
+    """批次匯入應逐筆回報錯誤，且彙總表與原始記錄一致"""
+    rng = random.Random(3)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+        for _ in range(20):
+            db.add_visit_record(_make_visit(rng))
+
+        records = [_make_visit(rng) for _ in range(1000)]
+        records[10]['distance'] = 'abc'
+        records[20]['visit_date'] = '2024/06/01'
+        del records[30]['elder_id']
+        records[40]['travel_time'] = ''
+
+        result = db.add_visit_records_bulk(records, chunk_size=128)
+
+        assert result['inserted'] == 997
+        assert result['failed'] == 3
+        assert [error['row'] for error in result['errors']] == [11, 21, 31]
+        _assert_consistent(db)
+
+        # 碳排放應與逐筆計算一致
+        conn = db.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT transport_type, distance, carbon_emission FROM visit_records')
+        for transport_type, distance, carbon_emission in cursor.fetchall():
+            expected = db.calculate_carbon_emission(transport_type, distance)
+            assert abs(carbon_emission - expected) < 1e-9
+        conn.close()
+
+
+def test_dates_normalized_before_write():
+    """未補零的日期寫入前轉為 YYYY-MM-DD，格式錯誤時不寫入任何資料"""
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+        visit = _make_visit(rng)
+        visit['visit_date'] = '2024-6-5'
+        record_id = db.add_visit_record(visit)
+        assert db.get_visit_record_by_id(record_id)['visit_date'] == '2024-06-05'
+
+        visit['visit_date'] = '2024-7-1'
+        assert db.update_visit_record(record_id, visit)
+        assert db.get_visit_record_by_id(record_id)['visit_date'] == '2024-07-01'
+
+        db.add_ai_care_record({'care_date': '2024-8-9', 'elder_id': 'E00001', 'care_type': '語音關懷'})
+        _assert_consistent(db)
+
+        for bad_date in ['2024/06/01', '2024-13-01', '']:
+            visit['visit_date'] = bad_date
+            try:
+                db.add_visit_record(visit)
+                assert False, bad_date
+            except ValueError as e:
+                assert '日期格式錯誤' in str(e)
+        try:
+            db.update_visit_record(record_id, visit)
+            assert False
+        except ValueError as e:
+            assert '日期格式錯誤' in str(e)
+        assert db.get_visit_record_by_id(record_id)['visit_date'] == '2024-07-01'
+        assert _raw_monthly(db, 2024, 7)[0] == 1
+        _assert_consistent(db)
+
+
+def test_raw_sql_writes_update_rollups():
+    """腳本直接以 SQL 新增、修改、刪除原始記錄時，觸發器同步更新彙總表"""
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'carbon.db')
+        db = CarbonTrackingDB(db_path)
+        for _ in range(30):
+            db.add_visit_record(_make_visit(rng))
+
+        conn = sqlite3.connect(db_path)
+        for _ in range(100):
+            visit = _make_visit(rng)
+            conn.execute('''
+            INSERT INTO visit_records
+            (visit_date, social_worker_id, social_worker_name, elder_id,
+             visit_type, transport_type, distance, carbon_emission)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (visit['visit_date'], visit['social_worker_id'], visit['social_worker_name'],
+                  visit['elder_id'], visit['visit_type'], visit['transport_type'],
+                  visit['distance'], visit['distance'] * 0.1))
+        conn.executemany(
+            "INSERT INTO ai_care_records (care_date, elder_id, care_type) VALUES (?, 'E00001', '語音關懷')",
+            [(f'2024-{rng.randint(5, 8):02d}-{rng.randint(1, 28):02d}',) for _ in range(20)]
+        )
+        conn.commit()
+        _assert_consistent(db)
+
+        conn.execute("UPDATE visit_records SET visit_date = '2024-08-15', elder_id = 'E00001' WHERE id % 3 = 0")
+        conn.execute("UPDATE visit_records SET distance = distance + 1 WHERE id % 5 = 0")
+        conn.execute("UPDATE ai_care_records SET care_date = '2024-05-01' WHERE id % 2 = 0")
+        conn.execute("DELETE FROM visit_records WHERE id % 4 = 0")
+        conn.execute("DELETE FROM ai_care_records WHERE id % 3 = 0")
+        conn.commit()
+        conn.close()
+        _assert_consistent(db)
+
+
+def test_migration_rebuilds_stale_rollups():
+    """升級舊版資料庫時重建彙總表，補上先前直接以 SQL 寫入而未計入的記錄"""
+    rng = random.Random(9)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'carbon.db')
+        db = CarbonTrackingDB(db_path)
+        for _ in range(20):
+            db.add_visit_record(_make_visit(rng))
+
+        # 模擬舊版：彙總表未包含直接寫入的記錄
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE rollup_state SET deferred = 1 WHERE name = 'visit_rollups'")
+        conn.execute('''
+        INSERT INTO visit_records
+        (visit_date, social_worker_id, social_worker_name, elder_id, visit_type, transport_type, distance)
+        VALUES ('2024-06-10', 'SW001', '測試社工', 'E09999', '定期關懷', '機車', 12)
+        ''')
+        conn.execute("UPDATE rollup_state SET deferred = 0 WHERE name = 'visit_rollups'")
+        conn.execute('PRAGMA user_version = 2')
+        conn.commit()
+        conn.close()
+        assert _raw_monthly(db, 2024, 6)[0] != _rollup_monthly(db, 2024, 6)[0]
+
+        db = CarbonTrackingDB(db_path)
+        _assert_consistent(db)
+
+
+if __name__ == "__main__":
+    test_rollups_follow_writes()
+    test_summary_and_distribution_match_raw()
+    test_bulk_import_reports_errors_and_updates_rollups()
+    test_dates_normalized_before_write()
+    test_raw_sql_writes_update_rollups()
+    test_migration_rebuilds_stale_rollups()
+    print("✓ 彙總表測試通過")
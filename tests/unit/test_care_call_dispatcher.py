@@ -0,0 +1,156 @@
+"""
+測試語音關懷分段派送：每個排程只發送一次、失敗排程標記為 failed、各階段開始時延長認領
+"""
+
+import datetime
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.voice_processing.care_call_dispatcher import CareCallDispatcher
+
+
+class FakeCareService:
+    """以記憶體模擬 VoiceCareService 的派送介面（各階段以 sleep 模擬外部 API 延遲）"""
+
+    def __init__(self, schedule_ids, fail_ids=()):
+        self.status = {schedule_id: 'pending' for schedule_id in schedule_ids}
+        self.fail_ids = set(fail_ids)
+        self.sent = []
+        self.refreshed = []
+        self.cancel_after_weather = set()
+        self.lock = threading.Lock()
+
+    def claim_schedule(self, schedule_id):
+        with self.lock:
+            if self.status[schedule_id] != 'pending':
+                return False
+            self.status[schedule_id] = 'processing'
+            return True
+
+    def refresh_claim(self, schedule_id):
+        with self.lock:
+            self.refreshed.append(schedule_id)
+            return self.status[schedule_id] == 'processing'
+
+    def update_schedule_status(self, schedule_id, status):
+        with self.lock:
+            self.status[schedule_id] = status
+        return True
+
+    def get_schedule_weather(self, schedule):
+        time.sleep(0.002)
+        if schedule['id'] in self.cancel_after_weather:
+            self.update_schedule_status(schedule['id'], 'cancelled')
+        return {'condition': '晴天'}
+
+    def generate_care_message(self, schedule, weather_info):
+        time.sleep(0.005)
+        if schedule['id'] in self.fail_ids:
+            raise RuntimeError('LLM 逾時')
+        return f"{schedule['id']} 今天{weather_info['condition']}"
+
+    def synthesize_care_audio(self, schedule_id, message, language):
+        time.sleep(0.005)
+        return {language: f'{schedule_id}.wav'}
+
+    def complete_care_call(self, schedule_id, message, weather_info, audio_files):
+        with self.lock:
+            self.sent.append(schedule_id)
+            self.status[schedule_id] = 'completed'
+        return f'record-{schedule_id}'
+
+
+def test_each_schedule_sent_once():
+    """兩個派送器同時處理同一批排程，每個排程只應發送一次"""
+    schedules = [{'id': f's{i:03d}'} for i in range(60)]
+    service = FakeCareService([s['id'] for s in schedules], fail_ids={'s007', 's042'})
+    dispatcher = CareCallDispatcher(service, weather_workers=2, llm_workers=4, tts_workers=2, queue_size=2)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(dispatcher.dispatch(schedules)))
+        for _ in range(2)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(service.sent) == sorted(set(service.sent))
+    assert len(service.sent) == 58
+    assert service.status['s007'] == 'failed' and service.status['s042'] == 'failed'
+    assert all(status in ('completed', 'failed') for status in service.status.values())
+
+    assert sum(r['success'] for r in results) == 58
+    assert sum(r['failed'] for r in results) == 2
+    assert sum(r['claimed'] for r in results) == 60
+    assert sum(r['skipped'] for r in results) == 60
+    for result in results:
+        assert result['stages']['llm']['failed'] == result['failed']
+        assert result['stages']['weather']['max_queued'] <= 2
+
+
+def test_failed_stage_details():
+    """失敗明細應記錄失敗階段"""
+    service = FakeCareService(['a', 'b'], fail_ids={'b'})
+    result = CareCallDispatcher(service).dispatch([{'id': 'a'}, {'id': 'b'}], language='both')
+
+    assert result['success'] == 1 and result['failed'] == 1
+    details = {d['schedule_id']: d for d in result['details']}
+    assert details['a']['record_id'] == 'record-a'
+    assert details['b']['stage'] == 'llm'
+    assert result['throughput_per_minute'] > 0
+
+
+def test_claim_refreshed_each_stage():
+    """每個階段開始時延長認領；排程在排隊期間已不在處理中則略過，不會發送"""
+    service = FakeCareService(['a', 'b', 'c'])
+    service.cancel_after_weather = {'b'}
+    result = CareCallDispatcher(service).dispatch([{'id': 'a'}, {'id': 'b'}, {'id': 'c'}])
+
+    assert sorted(service.sent) == ['a', 'c']
+    assert service.refreshed.count('a') == 3 and service.refreshed.count('b') == 2
+    assert result['success'] == 2 and result['skipped'] == 1 and result['failed'] == 0
+    details = {d['schedule_id']: d for d in result['details']}
+    assert details['b'] == {'schedule_id': 'b', 'status': 'skipped', 'stage': 'llm'}
+
+
+def test_refreshed_claim_not_reclaimed(monkeypatch):
+    """延長認領後的排程不會被視為逾時而重新認領；未延長的逾時排程可重新認領"""
+    import database
+    from modules.voice_processing import voice_care_service as voice_care_module
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'customer_service.db')
+        monkeypatch.setattr(database, 'DATABASE', db_path)
+        monkeypatch.setattr(voice_care_module, 'DATABASE', db_path)
+        database.init_db()
+
+        service = voice_care_module.voice_care_service
+        now = datetime.datetime.now()
+        waiting, stalled = (service.create_schedule('user-1', f'關懷 {i}', now.isoformat()) for i in range(2))
+        assert not service.refresh_claim(waiting)
+        assert service.claim_schedule(waiting) and service.claim_schedule(stalled)
+
+        # 兩個排程都已認領超過逾時時間，其中一個在階段開始時延長認領
+        stale = (now - datetime.timedelta(minutes=voice_care_module.CLAIM_TIMEOUT_MINUTES + 10)).isoformat()
+        conn = sqlite3.connect(db_path)
+        conn.execute('UPDATE voice_care_schedules SET updated_at = ?', [stale])
+        conn.commit()
+        conn.close()
+
+        assert service.refresh_claim(waiting)
+        assert not service.claim_schedule(waiting)
+        assert service.claim_schedule(stalled)
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,155 @@
+"""
+測試 SQLite 連線池：跨執行緒重用連線與閒置連線上限、巢狀借用共用同一交易、內層不可提交或回滾外層未提交的交易
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+
+import pytest
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import db_pool
+
+
+@pytest.fixture
+def db_path():
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'pool.db')
+        conn = db_pool.get_connection(path)
+        conn.execute('CREATE TABLE items (name TEXT)')
+        conn.commit()
+        conn.close()
+        yield path
+        db_pool.close_idle_connections()
+
+
+def _names(path):
+    """以獨立連線讀取已提交的資料"""
+    conn = sqlite3.connect(path)
+    try:
+        return sorted(row[0] for row in conn.execute('SELECT name FROM items'))
+    finally:
+        conn.close()
+
+
+def test_nested_borrow_shares_transaction(db_path):
+    """巢狀借用的寫入隨外層一起提交；外層沒有交易時內層可自行提交"""
+    outer = db_pool.get_connection(db_path)
+    inner = db_pool.get_connection(db_path)
+    inner.execute("INSERT INTO items VALUES ('inner')")
+    inner.commit()
+    inner.close()
+    assert _names(db_path) == ['inner']
+
+    outer.execute("INSERT INTO items VALUES ('outer')")
+    reader = db_pool.get_connection(db_path)
+    assert reader.execute('SELECT COUNT(*) FROM items').fetchone()[0] == 2
+    reader.close()
+    outer.commit()
+    outer.close()
+    assert _names(db_path) == ['inner', 'outer']
+
+
+def test_nested_commit_refused_with_outer_transaction(db_path):
+    """外層有未提交的交易時，內層的 commit / rollback 被拒絕，外層的寫入不受影響"""
+    outer = db_pool.get_connection(db_path)
+    outer.execute("INSERT INTO items VALUES ('outer')")
+
+    inner = db_pool.get_connection(db_path)
+    inner.execute("INSERT INTO items VALUES ('inner')")
+    with pytest.raises(sqlite3.ProgrammingError):
+        inner.commit()
+    with pytest.raises(sqlite3.ProgrammingError):
+        inner.rollback()
+    inner.close()
+    assert _names(db_path) == []
+
+    outer.commit()
+    outer.close()
+    assert _names(db_path) == ['inner', 'outer']
+
+
+def test_nested_with_block_keeps_outer_transaction(db_path):
+    """內層 with 區塊發生例外時不回滾外層的交易，原本的例外照常拋出"""
+    outer = db_pool.get_connection(db_path)
+    outer.execute("INSERT INTO items VALUES ('outer')")
+
+    with pytest.raises(ValueError):
+        with db_pool.get_connection(db_path) as inner:
+            inner.execute("INSERT INTO items VALUES ('inner')")
+            raise ValueError('內層失敗')
+
+    assert outer.in_transaction
+    outer.rollback()
+    outer.close()
+    assert _names(db_path) == []
+
+    # 外層歸還後重新借用，可正常提交
+    conn = db_pool.get_connection(db_path)
+    with conn:
+        conn.execute("INSERT INTO items VALUES ('after')")
+    conn.close()
+    assert _names(db_path) == ['after']
+
+
+def test_connections_reused_across_threads(db_path, monkeypatch):
+    """每個請求一個執行緒時，連線由連線池取出重用，不會每個執行緒重新建立"""
+    opened = []
+    open_connection = db_pool._open_connection
+
+    def counting_open(path):
+        opened.append(path)
+        return open_connection(path)
+
+    monkeypatch.setattr(db_pool, '_open_connection', counting_open)
+
+    def request():
+        conn = db_pool.get_connection(db_path)
+        conn.execute("INSERT INTO items VALUES ('row')")
+        conn.commit()
+        conn.close()
+
+    for _ in range(20):
+        thread = threading.Thread(target=request)
+        thread.start()
+        thread.join()
+
+    assert len(opened) <= 1
+    assert _names(db_path) == ['row'] * 20
+
+
+def test_idle_connections_bounded(db_path, monkeypatch):
+    """同時借出超過上限時另開連線，歸還後只保留 POOL_SIZE 條閒置連線"""
+    monkeypatch.setattr(db_pool, 'POOL_SIZE', 2)
+    db_pool.close_idle_connections()
+    db_pool._idle.clear()
+
+    borrowed = threading.Barrier(5)
+    connections = []
+
+    def request():
+        conn = db_pool.get_connection(db_path)
+        conn.execute('SELECT COUNT(*) FROM items').fetchone()
+        connections.append(conn._entry.conn)
+        borrowed.wait(timeout=10)
+        conn.close()
+
+    threads = [threading.Thread(target=request) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(map(id, connections))) == 5
+    assert db_pool._idle_queue(os.path.abspath(db_path)).qsize() == 2
+    db_pool.close_idle_connections()
+    db_pool._idle.clear()
+
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,60 @@
+"""
+測試排放係數快取與批次碳排放計算
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import modules.carbon_tracking.database_carbon_tracking as carbon_db_module
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+
+def test_batch_matches_single():
+    """批次計算結果應與逐筆計算相同"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+
+        transport_types = ['機車', '汽車', '大眾運輸', '步行']
+        distances = [10, 3.5, 20, 1]
+
+        batch = db.calculate_carbon_emission_batch(transport_types, distances)
+        single = [db.calculate_carbon_emission(t, d) for t, d in zip(transport_types, distances)]
+
+        assert batch == single
+        assert batch[-1] == 0
+
+
+def test_cache_invalidated_on_change():
+    """係數更新（含直接修改資料表）後快取應失效"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'carbon.db')
+        db = CarbonTrackingDB(db_path)
+
+        assert abs(db.calculate_carbon_emission('機車', 10) - 0.695) < 1e-9
+
+        db.update_emission_coefficient('機車', 0.1)
+        assert abs(db.calculate_carbon_emission('機車', 10) - 1.0) < 1e-9
+
+        # 其他行程直接修改資料表，經過檢查間隔後應讀到新值
+        conn = sqlite3.connect(db_path)
+        conn.execute("UPDATE emission_coefficients SET coefficient = 0.2 WHERE transport_type = '機車'")
+        conn.commit()
+        conn.close()
+
+        interval = carbon_db_module.COEFFICIENT_CHECK_INTERVAL
+        carbon_db_module.COEFFICIENT_CHECK_INTERVAL = 0
+        try:
+            assert abs(db.calculate_carbon_emission('機車', 10) - 2.0) < 1e-9
+        finally:
+            carbon_db_module.COEFFICIENT_CHECK_INTERVAL = interval
+
+
+if __name__ == "__main__":
+    test_batch_matches_single()
+    test_cache_invalidated_on_change()
+    print("✓ 排放係數快取測試通過")
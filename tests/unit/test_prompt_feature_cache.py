@@ -0,0 +1,139 @@
+"""
+測試 GPT-SoVITS 多音色參考特徵快取：依筆數與記憶體淘汰、磁碟保存與重新載入、鍵不符、磁碟上限與檔案雜湊快取
+"""
+
+import importlib.util
+import os
+import sys
+import tempfile
+
+import torch
+
+# 直接載入模組檔案（TTS_infer_pack/__init__ 會載入整個 TTS 推理管線）
+PROMPT_CACHE_PATH = os.path.abspath(os.path.join(
+    os.path.dirname(__file__), '../../GPT-SoVITS-v2pro-20250604/GPT_SoVITS/TTS_infer_pack/prompt_cache.py'
+))
+_spec = importlib.util.spec_from_file_location('prompt_cache', PROMPT_CACHE_PATH)
+prompt_cache = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(prompt_cache)
+PromptFeatureCache = prompt_cache.PromptFeatureCache
+
+
+def _entry(value, size=100):
+    """模擬參考音頻特徵：size 個 float32（size * 4 bytes）"""
+    return {
+        'prompt_semantic': torch.full((size,), float(value)),
+        'refer_spec': [(torch.zeros(2, 3), None)],
+        'raw_sr': 32000,
+    }
+
+
+def _key(name):
+    return (f'{name}-sha1', '參考文本', 'zh', 'v2')
+
+
+def test_evict_by_count():
+    """超過筆數上限時淘汰最久未使用的音色"""
+    cache = PromptFeatureCache(max_entries=2)
+    cache.put(_key('a'), _entry(1))
+    cache.put(_key('b'), _entry(2))
+    assert cache.get(_key('a')) is not None  # a 成為最近使用
+    cache.put(_key('c'), _entry(3))
+
+    assert cache.get(_key('b')) is None
+    assert cache.get(_key('a')) is not None and cache.get(_key('c')) is not None
+    stats = cache.get_stats()
+    assert (stats['entries'], stats['evictions'], stats['hits'], stats['misses']) == (2, 1, 3, 1)
+
+
+def test_evict_by_bytes():
+    """超過記憶體上限時淘汰，單一條目超過上限時仍保留最新加入的條目"""
+    entry_bytes = prompt_cache._nbytes(_entry(0))
+    cache = PromptFeatureCache(max_entries=10, max_bytes=2 * entry_bytes + 1)
+    for name in 'abc':
+        cache.put(_key(name), _entry(ord(name)))
+    assert cache.get(_key('a')) is None
+    assert cache.total_bytes == 2 * entry_bytes
+
+    cache.put(_key('big'), _entry(0, size=10000))
+    assert cache.get_stats()['entries'] == 1
+    assert cache.get(_key('big')) is not None
+
+
+def test_disk_round_trip():
+    """保存到磁碟的條目在新實例中載入，內容相同"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = PromptFeatureCache(max_entries=4, cache_dir=tmp_dir)
+        cache.put(_key('a'), _entry(7))
+
+        restarted = PromptFeatureCache(max_entries=4, cache_dir=tmp_dir)
+        loaded = restarted.get(_key('a'), device='cpu')
+        assert torch.equal(loaded['prompt_semantic'], _entry(7)['prompt_semantic'])
+        assert loaded['raw_sr'] == 32000
+        assert restarted.get_stats()['disk_hits'] == 1
+
+        # 載入後放入記憶體層
+        assert restarted.get(_key('a')) is loaded
+        assert restarted.get_stats()['hits'] == 1
+
+        restarted.clear(disk=True)
+        assert PromptFeatureCache(max_entries=4, cache_dir=tmp_dir).get(_key('a')) is None
+
+
+def test_disk_key_mismatch():
+    """磁碟檔案保存的鍵與查詢的鍵不同（檔名雜湊碰撞）時視為未命中"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, 'same.pt')
+        cache = PromptFeatureCache(max_entries=4, cache_dir=tmp_dir)
+        cache._path = lambda key: path
+        cache.put(_key('a'), _entry(1))
+
+        other = PromptFeatureCache(max_entries=4, cache_dir=tmp_dir)
+        other._path = lambda key: path
+        assert other.get(_key('b')) is None
+        assert other.get_stats()['misses'] == 1
+        assert other.get(_key('a')) is not None
+
+
+def test_disk_pruned_by_recent_use():
+    """磁碟檔案超過上限時刪除最久未使用的檔案"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache = PromptFeatureCache(max_entries=1, cache_dir=tmp_dir, max_disk_entries=3)
+        for i, name in enumerate('abcd'):
+            cache.put(_key(name), _entry(i))
+            # 固定修改時間，避免同一時間戳記無法排序
+            os.utime(cache._path(_key(name)), ns=(i * 10 ** 9, i * 10 ** 9))
+        assert sorted(os.listdir(tmp_dir)) == sorted(os.path.basename(cache._path(_key(n))) for n in 'bcd')
+
+        # b 重新載入後成為最近使用，再加入 e 時淘汰 c
+        assert cache.get(_key('b')) is not None
+        cache.put(_key('e'), _entry(5))
+        remaining = {os.path.basename(cache._path(_key(n))) for n in 'bde'}
+        assert set(os.listdir(tmp_dir)) == remaining
+
+
+def test_file_digest_bounded(monkeypatch):
+    """檔案雜湊快取有上限，檔案內容改變時重新計算"""
+    monkeypatch.setattr(prompt_cache, 'DIGEST_CACHE_SIZE', 2)
+    prompt_cache._digest_cache.clear()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = []
+        for i in range(3):
+            path = os.path.join(tmp_dir, f'ref_{i}.wav')
+            with open(path, 'wb') as f:
+                f.write(bytes([i]) * 100)
+            paths.append(path)
+
+        digests = [prompt_cache.file_digest(path) for path in paths]
+        assert len(set(digests)) == 3
+        assert list(prompt_cache._digest_cache) == paths[1:]
+
+        with open(paths[2], 'wb') as f:
+            f.write(b'changed')
+        assert prompt_cache.file_digest(paths[2]) != digests[2]
+    prompt_cache._digest_cache.clear()
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,201 @@
+"""
+測試串流識別的能量 VAD 語音段切分，以及串流會話的 PCM 片段處理
+"""
+
+import asyncio
+import numpy as np
+import sys
+import os
+import threading
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.asr.streaming import EnergyVADSegmenter, StreamingRecognizer
+
+SR = 16000
+
+
+def _tone(seconds, freq=300, amplitude=0.3):
+    t = np.arange(int(SR * seconds)) / SR
+    return (amplitude * np.sin(2 * np.pi * freq * t)).astype(np.float32)
+
+
+def _noise(seconds, amplitude=0.002, seed=0):
+    rng = np.random.default_rng(seed)
+    return (amplitude * rng.standard_normal(int(SR * seconds))).astype(np.float32)
+
+
+def _push_in_chunks(segmenter, audio, chunk_ms=100):
+    """模擬客戶端以固定長度片段送出音頻"""
+    chunk = SR * chunk_ms // 1000
+    segments = []
+    for i in range(0, len(audio), chunk):
+        segments.extend(segmenter.push(audio[i:i + chunk]))
+    return segments
+
+
+def test_splits_on_silence():
+    """語音之間的靜音應切分為獨立語音段，起始位置接近實際語音開始"""
+    audio = np.concatenate([
+        _noise(1.0, seed=1), _tone(1.5), _noise(1.0, seed=2), _tone(2.0, freq=450), _noise(1.0, seed=3)
+    ])
+    segmenter = EnergyVADSegmenter(sample_rate=SR)
+    segments = _push_in_chunks(segmenter, audio) + segmenter.flush()
+
+    assert len(segments) == 2, f"預期 2 段，實際 {len(segments)} 段"
+
+    expected_starts = [1.0, 3.5]
+    for (start, segment), expected in zip(segments, expected_starts):
+        # 含 pre-roll 前導音，起始位置可略早於語音開始
+        assert expected - 0.4 <= start / SR <= expected + 0.1, f"起始 {start / SR:.2f}s，預期約 {expected}s"
+        assert len(segment) / SR >= 1.4
+
+    print(f"✓ 切分為 {len(segments)} 段: " +
+          ", ".join(f"{s / SR:.2f}s+{len(a) / SR:.2f}s" for s, a in segments))
+
+
+def test_forced_split_on_long_speech():
+    """連續語音超過 max_segment_s 時應強制切分"""
+    audio = np.concatenate([_noise(0.5), _tone(7.0), _noise(1.0, seed=4)])
+    segmenter = EnergyVADSegmenter(sample_rate=SR, max_segment_s=3.0)
+    segments = _push_in_chunks(segmenter, audio) + segmenter.flush()
+
+    assert len(segments) >= 3, f"預期至少 3 段，實際 {len(segments)} 段"
+    assert all(len(a) <= 3.0 * SR for _, a in segments)
+    print(f"✓ 長語音強制切分為 {len(segments)} 段")
+
+
+def test_flush_returns_open_segment():
+    """串流結束時尚未遇到靜音的語音段應由 flush 回傳"""
+    segmenter = EnergyVADSegmenter(sample_rate=SR)
+    segments = _push_in_chunks(segmenter, np.concatenate([_noise(0.5), _tone(1.0)]))
+    assert not segments
+    assert segmenter.in_speech and segmenter.current_segment() is not None
+
+    remaining = segmenter.flush()
+    assert len(remaining) == 1
+    assert not segmenter.in_speech
+    print("✓ flush 回傳進行中的語音段")
+
+
+def test_silence_only():
+    """只有背景噪音時不應產生語音段"""
+    segmenter = EnergyVADSegmenter(sample_rate=SR)
+    segments = _push_in_chunks(segmenter, _noise(5.0)) + segmenter.flush()
+    assert not segments
+    print("✓ 背景噪音不產生語音段")
+
+
+class _FakeCoordinator:
+    """記錄收到的語音段，不實際識別"""
+
+    target_sample_rate = SR
+
+    def __init__(self):
+        self.calls = []
+
+    async def recognize_array(self, audio, sample_rate, options=None):
+        self.calls.append((len(audio), sample_rate))
+        return {'success': True, 'text': '好', 'confidence': 0.9}
+
+
+def _run_recognizer(chunks, sample_rate, **kwargs):
+    """在背景事件迴圈上餵入片段，回傳 (recognizer, coordinator, 事件列表)"""
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    coordinator = _FakeCoordinator()
+    events = []
+    done = threading.Event()
+
+    def on_event(event):
+        events.append(event)
+        if event['type'] == 'end':
+            done.set()
+
+    try:
+        recognizer = StreamingRecognizer(coordinator, loop, on_event, sample_rate=sample_rate, **kwargs)
+        for chunk in chunks:
+            recognizer.feed(chunk)
+        recognizer.finish()
+        assert done.wait(timeout=10)
+    finally:
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=5)
+        loop.close()
+    return recognizer, coordinator, events
+
+
+def _pcm_bytes(audio):
+    return (np.clip(audio, -1, 1) * 32767).astype(np.int16).tobytes()
+
+
+def test_odd_length_chunks_keep_samples():
+    """奇數長度的 PCM16 片段不報錯，跨片段的樣本完整保留"""
+    pcm = _pcm_bytes(np.concatenate([_noise(0.5), _tone(1.5), _noise(1.0, seed=5)]))
+    chunks = [pcm[i:i + 3201] for i in range(0, len(pcm), 3201)]
+    assert any(len(c) % 2 for c in chunks)
+
+    _, coordinator, events = _run_recognizer(chunks, SR, partial_interval_s=0)
+
+    finals = [e for e in events if e['type'] == 'final']
+    assert len(finals) == 1
+    assert events[-1]['duration'] == round(len(pcm) // 2 / SR, 3)
+    print(f"✓ 奇數長度片段: {len(chunks)} 片，語音段 {finals[0]['start']}s ~ {finals[0]['end']}s")
+
+
+def test_segments_decoded_at_input_rate():
+    """非 16kHz 輸入以原採樣率切分，整段交給 coordinator 重採樣，時間戳以輸入採樣率計算"""
+    rate = 8000
+    t = np.arange(int(rate * 1.5)) / rate
+    tone = (0.3 * np.sin(2 * np.pi * 300 * t)).astype(np.float32)
+    rng = np.random.default_rng(6)
+    audio = np.concatenate([
+        (0.002 * rng.standard_normal(rate)).astype(np.float32), tone,
+        (0.002 * rng.standard_normal(rate)).astype(np.float32)
+    ])
+    chunk = rate // 10
+    chunks = [_pcm_bytes(audio[i:i + chunk]) for i in range(0, len(audio), chunk)]
+
+    _, coordinator, events = _run_recognizer(chunks, rate, partial_interval_s=0)
+
+    assert coordinator.calls and all(sample_rate == rate for _, sample_rate in coordinator.calls)
+    final = next(e for e in events if e['type'] == 'final')
+    assert 0.6 <= final['start'] <= 1.1
+    assert events[-1]['duration'] == round(len(audio) / rate, 3)
+    print(f"✓ 8kHz 輸入語音段 {final['start']}s ~ {final['end']}s")
+
+
+def test_partial_merges_segment_only_when_emitting():
+    """進行中的語音段只在輸出部分結果時合併，不會每個片段重新串接"""
+    audio = np.concatenate([_noise(0.5), _tone(3.5), _noise(1.0, seed=7)])
+    chunk = SR // 20
+    chunks = [audio[i:i + chunk] for i in range(0, len(audio), chunk)]
+
+    merges = []
+    original = EnergyVADSegmenter.current_segment
+
+    def counting_current_segment(self):
+        merges.append(1)
+        return original(self)
+
+    EnergyVADSegmenter.current_segment = counting_current_segment
+    try:
+        _, coordinator, events = _run_recognizer(chunks, SR, partial_interval_s=1.0)
+    finally:
+        EnergyVADSegmenter.current_segment = original
+
+    assert 1 <= len(merges) <= 4, f"合併 {len(merges)} 次"
+    assert any(e['type'] == 'partial' for e in events) or len(coordinator.calls) > 1
+    print(f"✓ {len(chunks)} 個片段只合併語音段 {len(merges)} 次")
+
+
+if __name__ == "__main__":
+    test_splits_on_silence()
+    test_forced_split_on_long_speech()
+    test_flush_returns_open_segment()
+    test_silence_only()
+    test_odd_length_chunks_keep_samples()
+    test_segments_decoded_at_input_rate()
+    test_partial_merges_segment_only_when_emitting()
@@ -0,0 +1,123 @@
+"""
+測試 GPT-SoVITS 文本前處理：批次 BERT 特徵與逐句計算結果一致、句段特徵快取命中與未命中
+以隨機初始化的小型 BERT 與字元詞表取代預訓練模型
+"""
+
+import os
+import sys
+import tempfile
+import types
+
+import torch
+from transformers import BertConfig, BertForMaskedLM, BertTokenizer
+
+GPT_SOVITS_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../GPT-SoVITS-v2pro-20250604'))
+
+sys.path.append(GPT_SOVITS_ROOT)
+sys.path.append(os.path.join(GPT_SOVITS_ROOT, 'GPT_SoVITS'))
+
+# TTS_infer_pack/__init__ 會載入整個 TTS 推理管線，只註冊套件路徑以載入文本前處理模組
+_package = types.ModuleType('TTS_infer_pack')
+_package.__path__ = [os.path.join(GPT_SOVITS_ROOT, 'GPT_SoVITS', 'TTS_infer_pack')]
+sys.modules.setdefault('TTS_infer_pack', _package)
+
+# GPT-SoVITS 以工作目錄為基準解析 i18n 語系檔路徑，載入後切換回原工作目錄
+_cwd = os.getcwd()
+os.chdir(GPT_SOVITS_ROOT)
+try:
+    from TTS_infer_pack import TextPreprocessor as text_preprocessor_module
+    from TTS_infer_pack.TextPreprocessor import TextPreprocessor
+finally:
+    os.chdir(_cwd)
+
+TEXTS = [
+    '早安',
+    '今天天氣很好',
+    '記得多喝水',
+    '下午社工會來家裡看您請在家等候',
+    '您',
+    '最近睡得好不好有沒有哪裡不舒服明天可能會下雨出門記得帶雨傘',
+    '吃藥了嗎',
+]
+
+
+def _build_preprocessor(tmp_dir):
+    chars = sorted(set(''.join(TEXTS)))
+    vocab_file = os.path.join(tmp_dir, 'vocab.txt')
+    with open(vocab_file, 'w', encoding='utf-8') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + chars) + '\n')
+    tokenizer = BertTokenizer(vocab_file)
+
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=len(tokenizer), hidden_size=32, num_hidden_layers=3,
+        num_attention_heads=4, intermediate_size=64, max_position_embeddings=128,
+    )
+    model = BertForMaskedLM(config).eval()
+    return TextPreprocessor(model, tokenizer, torch.device('cpu'))
+
+
+def _word2ph(text):
+    """每個字 1~3 個音素"""
+    return [i % 3 + 1 for i in range(len(text))]
+
+
+def test_batch_matches_single(monkeypatch):
+    """不同長度的句段補齊後一起計算，每句結果與單獨計算相同"""
+    # 縮小批次大小以涵蓋多個批次
+    monkeypatch.setattr(text_preprocessor_module, 'BERT_BATCH_SIZE', 3)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        preprocessor = _build_preprocessor(tmp_dir)
+        items = [(text, _word2ph(text)) for text in TEXTS]
+
+        batch_features = preprocessor.get_bert_feature_batch(items)
+        assert len(batch_features) == len(items)
+        for (text, word2ph), feature in zip(items, batch_features):
+            single = preprocessor.get_bert_feature(text, word2ph)
+            assert feature.shape == single.shape == (32, sum(word2ph))
+            assert torch.allclose(feature, single, atol=1e-5)
+
+
+class CountingPreprocessor(TextPreprocessor):
+    """以固定的音素取代語言切分與 G2P，記錄每個句段的處理次數"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cleaned = []
+
+    def clean_text_pieces(self, text, language, version, final=False):
+        self.cleaned.append((text, language, version, final))
+        word2ph = _word2ph(text)
+        return [(list(range(sum(word2ph))), word2ph, text, 'zh')]
+
+
+def test_feature_cache_hit_and_miss():
+    """(text, language, version, final) 相同時使用快取，任一項不同時重新計算"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        base = _build_preprocessor(tmp_dir)
+        preprocessor = CountingPreprocessor(base.bert_model, base.tokenizer, torch.device('cpu'))
+
+        first = preprocessor.get_phones_and_bert_batch(TEXTS[:3], 'zh', 'v2')
+        assert len(preprocessor.cleaned) == 3
+
+        # 同一批次內重複的句段只處理一次
+        again = preprocessor.get_phones_and_bert_batch([TEXTS[0], TEXTS[0], TEXTS[3]], 'zh', 'v2')
+        assert preprocessor.cleaned[3:] == [(TEXTS[3], 'zh', 'v2', False)]
+        assert again[0] is first[0] and again[1] is first[0]
+        stats = preprocessor.feature_cache.get_stats()
+        assert (stats['hits'], stats['entries']) == (2, 4)
+
+        for language, version, final in [('all_zh', 'v2', False), ('zh', 'v2Pro', False), ('zh', 'v2', True)]:
+            before = len(preprocessor.cleaned)
+            phones, bert, norm_text = preprocessor.get_phones_and_bert(TEXTS[0], language, version, final)
+            assert preprocessor.cleaned[before:] == [(TEXTS[0], language, version, final)]
+            assert norm_text == TEXTS[0] and bert.shape == (32, len(phones))
+
+        preprocessor.clear_feature_cache()
+        preprocessor.get_phones_and_bert(TEXTS[0], 'zh', 'v2')
+        assert preprocessor.cleaned[-1] == (TEXTS[0], 'zh', 'v2', False)
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,118 @@
+"""
+測試訪視記錄匯出：大量資料串流匯出 CSV / Excel 的筆數與標題列、Excel 分工作表與暫存檔清除
+"""
+
+import csv
+import glob
+import io
+import os
+import sys
+import tempfile
+
+from flask import Flask
+from openpyxl import load_workbook
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+from routes import carbon_tracking as carbon_routes
+
+RECORD_COUNT = 5000
+HEADERS = [header for header, _, _ in carbon_routes.EXPORT_COLUMNS]
+
+
+def _client(monkeypatch, tmp_dir):
+    db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+    db.add_visit_records_bulk([{
+        'visit_date': f'2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}',
+        'social_worker_id': f'SW{i % 5:03d}',
+        'social_worker_name': '測試社工',
+        'elder_id': f'E{i:05d}',
+        'visit_type': '定期關懷',
+        'transport_type': '機車',
+        'distance': 5
+    } for i in range(RECORD_COUNT)])
+    monkeypatch.setattr(carbon_routes, 'db', db)
+
+    app = Flask(__name__)
+    app.register_blueprint(carbon_routes.carbon_bp)
+    return app.test_client()
+
+
+def _temp_exports():
+    return set(glob.glob(os.path.join(tempfile.gettempdir(), '*.xlsx')))
+
+
+def test_csv_export_streams_all_rows(monkeypatch):
+    """CSV 匯出包含標題列與全部記錄"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = _client(monkeypatch, tmp_dir)
+        response = client.get('/carbon/api/export/csv')
+        assert response.status_code == 200
+        rows = list(csv.reader(io.StringIO(response.data.decode('utf-8-sig'))))
+        assert rows[0] == HEADERS
+        assert len(rows) == RECORD_COUNT + 1
+
+
+def test_excel_export_splits_sheets(monkeypatch):
+    """超過工作表列數上限時分成多個工作表，每個工作表都有標題列；傳送完畢後刪除暫存檔"""
+    monkeypatch.setattr(carbon_routes, 'EXCEL_SHEET_MAX_ROWS', 2001)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = _client(monkeypatch, tmp_dir)
+        before = _temp_exports()
+        response = client.get('/carbon/api/export/excel')
+        assert response.status_code == 200
+        data = response.data
+        response.close()
+        assert _temp_exports() == before
+
+        wb = load_workbook(io.BytesIO(data), read_only=True)
+        assert wb.sheetnames == ['訪視記錄', '訪視記錄 (2)', '訪視記錄 (3)']
+        total = 0
+        for ws in wb.worksheets:
+            rows = list(ws.iter_rows(values_only=True))
+            assert list(rows[0]) == HEADERS
+            assert len(rows) <= 2001
+            total += len(rows) - 1
+        assert total == RECORD_COUNT
+
+
+def test_excel_temp_file_removed_without_streaming(monkeypatch):
+    """回應未開始傳送就關閉（用戶端中斷）時仍刪除暫存檔"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = _client(monkeypatch, tmp_dir)
+        before = _temp_exports()
+        # 直接呼叫檢視函式，不迭代回應內容即關閉
+        with client.application.test_request_context('/carbon/api/export/excel'):
+            response = carbon_routes.export_excel()
+            assert response.status_code == 200
+            assert len(_temp_exports() - before) == 1
+            response.close()
+        assert _temp_exports() == before
+
+
+def test_excel_temp_file_removed_on_save_error(monkeypatch):
+    """儲存 Excel 失敗時回傳錯誤並刪除暫存檔"""
+    from openpyxl import Workbook
+
+    original_save = Workbook.save
+
+    def broken_save(self, filename):
+        # 寫入一部分後失敗（例如磁碟空間不足）
+        original_save(self, filename)
+        raise OSError('磁碟已滿')
+
+    monkeypatch.setattr(Workbook, 'save', broken_save)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        client = _client(monkeypatch, tmp_dir)
+        before = _temp_exports()
+        response = client.get('/carbon/api/export/excel')
+        assert response.status_code == 400
+        assert '磁碟已滿' in response.get_json()['error']
+        assert _temp_exports() == before
+
+
+if __name__ == "__main__":
+    import pytest
+    sys.exit(pytest.main([__file__, '-q']))
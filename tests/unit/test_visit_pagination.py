@@ -0,0 +1,69 @@
+"""
+測試訪視記錄的游標分頁與總筆數
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+
+def _collect_pages(db, page_size, **filters):
+    """依游標逐頁讀取，回傳所有記錄 id"""
+    ids = []
+    after = None
+    while True:
+        page = db.search_visit_records(limit=page_size, after=after, **filters)
+        ids.extend(record['id'] for record in page)
+        if len(page) < page_size:
+            return ids
+        after = db.encode_visit_cursor(page[-1])
+
+
+def test_keyset_pages_cover_all_rows():
+    """逐頁讀取不應重複或遺漏，總筆數應與實際相符"""
+    rng = random.Random(11)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+        # 同一天多筆記錄，確認以 id 區分順序
+        db.add_visit_records_bulk([{
+            'visit_date': f'2024-0{rng.randint(1, 3)}-{rng.randint(1, 5):02d}',
+            'social_worker_id': f'SW{rng.randint(1, 3):03d}',
+            'social_worker_name': '測試社工',
+            'elder_id': f'E{rng.randint(1, 30):05d}',
+            'visit_type': '定期關懷',
+            'transport_type': rng.choice(['機車', '汽車']),
+            'distance': 5
+        } for _ in range(300)])
+
+        for filters in [{}, {'worker_id': 'SW002'}, {'start_date': '2024-02-01', 'transport_type': '汽車'}]:
+            expected = [record['id'] for record in db.search_visit_records(limit=10000, **filters)]
+            assert _collect_pages(db, 7, **filters) == expected
+
+            total, is_estimate = db.count_visit_records(**filters)
+            assert total == len(expected) and not is_estimate
+
+        _, is_estimate = db.count_visit_records(keyword='E0001')
+        assert is_estimate
+
+
+def test_invalid_cursor_rejected():
+    """格式錯誤的游標應拋出 ValueError"""
+    for token in ['', 'not-base64!', CarbonTrackingDB.encode_visit_cursor({'visit_date': '2024-01-01', 'id': 'x'})]:
+        try:
+            CarbonTrackingDB.decode_visit_cursor(token)
+        except ValueError:
+            continue
+        raise AssertionError(token)
+
+
+if __name__ == "__main__":
+    test_keyset_pages_cover_all_rows()
+    test_invalid_cursor_rejected()
+    print("✓ 游標分頁測試通過")
@@ -0,0 +1,70 @@
+"""
+測試訪視記錄關鍵字全文索引與 LIKE 比對結果一致
+"""
+
+import os
+import random
+import sys
+import tempfile
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from modules.carbon_tracking.database_carbon_tracking import CarbonTrackingDB
+
+KEYWORDS = ['王小明', '小明', '陳', 'SW002', 'sw002', 'E0001', '0001', '林美', '美玲', 'X"Y', '不存在的人']
+
+
+def _make_visit(rng):
+    """產生一筆隨機訪視資料（含中文姓名）"""
+    return {
+        'visit_date': f'2024-0{rng.randint(1, 9)}-{rng.randint(1, 28):02d}',
+        'social_worker_id': f'SW{rng.randint(1, 5):03d}',
+        'social_worker_name': rng.choice(['王小明', '陳大文', '林美玲']),
+        'elder_id': f'E{rng.randint(1, 40):05d}',
+        'elder_name': rng.choice(['', '張阿嬤', '李阿公', '王小明']),
+        'visit_type': '定期關懷',
+        'transport_type': '機車',
+        'distance': 3
+    }
+
+
+def _ids(db, keyword, use_fts):
+    db.fts_enabled = use_fts
+    try:
+        return [record['id'] for record in db.search_visit_records(keyword=keyword, limit=100000)]
+    finally:
+        db.fts_enabled = True
+
+
+def _assert_matches_like(db):
+    for keyword in KEYWORDS:
+        assert _ids(db, keyword, True) == _ids(db, keyword, False), keyword
+
+
+def test_search_index_follows_writes():
+    """新增、批次匯入、修改、刪除後，全文索引結果應與 LIKE 相同"""
+    rng = random.Random(5)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db = CarbonTrackingDB(os.path.join(tmp_dir, 'carbon.db'))
+        assert db.fts_enabled
+
+        ids = [db.add_visit_record(_make_visit(rng)) for _ in range(100)]
+        db.add_visit_records_bulk([_make_visit(rng) for _ in range(400)], chunk_size=64)
+        _assert_matches_like(db)
+
+        for record_id in rng.sample(ids, 30):
+            db.update_visit_record(record_id, _make_visit(rng))
+        for record_id in rng.sample(ids, 30):
+            db.delete_visit_record(record_id)
+        _assert_matches_like(db)
+
+        # 重新開啟既有資料庫不應重複建立索引
+        reopened = CarbonTrackingDB(db.db_path)
+        _assert_matches_like(reopened)
+
+
+if __name__ == "__main__":
+    test_search_index_follows_writes()
+    print("✓ 全文索引測試通過")
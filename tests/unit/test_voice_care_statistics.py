@@ -0,0 +1,101 @@
+"""
+測試語音關懷統計彙總表：增量維護結果與重新計算一致
+"""
+
+import datetime
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+import database
+from modules.voice_processing import voice_care_service as voice_care_module
+
+
+def _snapshot(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {
+            table: sorted(conn.execute(f'SELECT * FROM {table}').fetchall())
+            for table in ('voice_care_status_counts', 'voice_care_language_counts', 'voice_care_daily_stats')
+        }
+    finally:
+        conn.close()
+
+
+def test_statistics_follow_writes(monkeypatch):
+    """建立排程、認領、完成、失敗與新增記錄後，彙總表應與重新計算相同"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'customer_service.db')
+        monkeypatch.setattr(database, 'DATABASE', db_path)
+        monkeypatch.setattr(voice_care_module, 'DATABASE', db_path)
+        database.init_db()
+
+        service = voice_care_module.voice_care_service
+        now = datetime.datetime.now().isoformat()
+        ids = [service.create_schedule('user-1', f'關懷 {i}', now) for i in range(12)]
+
+        languages = [{'mandarin': 'a.wav'}, {'minan': 'b.wav'}, {'mandarin': 'c.wav', 'minan': 'd.wav'}]
+        for i, schedule_id in enumerate(ids[:9]):
+            assert service.claim_schedule(schedule_id)
+            assert not service.claim_schedule(schedule_id)
+            if i % 4 == 3:
+                service.update_schedule_status(schedule_id, 'failed')
+                continue
+            service.complete_care_call(schedule_id, '您好', {}, languages[i % 3])
+        assert not service.update_schedule_status('missing', 'completed')
+
+        stats = service.get_statistics()
+        assert stats['pending_schedules'] == 3
+        assert stats['status_counts'] == {'pending': 3, 'processing': 0, 'completed': 7, 'failed': 2}
+        assert stats['total_calls'] == 7
+        assert stats['language_distribution'] == {'mandarin': 2, 'minan': 2, 'both': 3}
+        today = stats['daily_stats'][-1]
+        assert (today['sent'], today['completed'], today['failed']) == (7, 7, 2)
+        assert len(stats['daily_stats']) == 7
+        assert len(stats['recent_records']) == 7
+        assert all(record['status'] == 'completed' for record in stats['recent_records'])
+        assert abs(stats['answer_rate'] - 7 / 9) < 1e-9
+
+        incremental = _snapshot(db_path)
+        conn = sqlite3.connect(db_path)
+        database.rebuild_voice_care_stats(conn.cursor())
+        conn.commit()
+        conn.close()
+        rebuilt = _snapshot(db_path)
+        # 重新計算不保留計數為 0 的狀態
+        incremental['voice_care_status_counts'] = [
+            row for row in incremental['voice_care_status_counts'] if row[1]
+        ]
+        assert incremental == rebuilt
+
+
+def test_pending_query_uses_status_index(monkeypatch):
+    """待處理排程查詢應使用 (status, scheduled_time) 索引"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, 'customer_service.db')
+        monkeypatch.setattr(database, 'DATABASE', db_path)
+        database.init_db()
+
+        conn = sqlite3.connect(db_path)
+        plan = conn.execute('''
+            EXPLAIN QUERY PLAN
+            SELECT * FROM voice_care_schedules
+            WHERE status IN ('pending', 'processing')
+            AND scheduled_time BETWEEN ? AND ?
+            AND (status = 'pending' OR updated_at < ?)
+            ORDER BY scheduled_time
+        ''', ['2024-01-01', '2024-01-02', '2024-01-01']).fetchall()
+        conn.close()
+        assert any('idx_voice_care_schedules_status_time' in row[-1] for row in plan)
+
+
+def test_record_language():
+    assert database.voice_care_record_language(json.dumps({'mandarin': 'a.wav'})) == 'mandarin'
+    assert database.voice_care_record_language(json.dumps({'mandarin': 'a', 'minan': 'b'})) == 'both'
+    assert database.voice_care_record_language('not json') == 'unknown'
+    assert database.voice_care_record_language(None) == 'unknown'
@@ -0,0 +1,84 @@
+"""
+測試天氣共用快取：多個程序、多執行緒同時查詢時，每個縣市只呼叫一次 API
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+# Add parent directory to path to import from root
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from services.weather_service import CWAWeatherService
+
+CITIES = ['臺北市', '新北市', '桃園市', '臺中市', '臺南市', '高雄市']
+
+
+class CountingWeatherService(CWAWeatherService):
+    """以計數器取代中央氣象署 API（sleep 模擬網路延遲）"""
+
+    calls = []
+    calls_lock = threading.Lock()
+
+    def _call_weather_api(self, city):
+        with self.calls_lock:
+            self.calls.append(city)
+        time.sleep(0.05)
+        return {'city': city, 'temperature': 25, 'condition': '晴天', 'forecast': '晴朗'}
+
+
+def _addresses(count):
+    return [f"{CITIES[i % len(CITIES)].replace('臺', '台')}某區某路{i}號" for i in range(count)]
+
+
+def test_single_flight_across_services():
+    """兩個服務實例（模擬兩個工作程序）共用快取檔案，500 筆地址只查詢 6 次 API"""
+    CountingWeatherService.calls = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        cache_path = os.path.join(tmp_dir, 'weather_cache.db')
+        services = [CountingWeatherService(api_key='test', shared_cache_path=cache_path) for _ in range(2)]
+
+        results = []
+        addresses = _addresses(500)
+
+        def worker(index):
+            service = services[index % 2]
+            for address in addresses[index::8]:
+                results.append(service.get_weather_by_address(address))
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        assert len(results) == 500
+        assert sorted(CountingWeatherService.calls) == sorted(CITIES)
+        assert all(result['data_source'] != '模擬資料' for result in results if 'data_source' in result)
+
+        # 新的服務實例（重新啟動的程序）直接使用共用快取
+        restarted = CountingWeatherService(api_key='test', shared_cache_path=cache_path)
+        assert restarted.get_weather_by_city('高雄市')['from_cache'] is True
+        assert len(CountingWeatherService.calls) == len(CITIES)
+
+
+def test_prefetch_distinct_cities():
+    """批次預先查詢只依不同縣市呼叫 API"""
+    CountingWeatherService.calls = []
+    service = CountingWeatherService(api_key='test', shared_cache_path=None)
+
+    weather = service.prefetch(_addresses(500))
+    assert sorted(weather) == sorted(CITIES)
+    assert sorted(CountingWeatherService.calls) == sorted(CITIES)
+
+    service.get_weather_by_address('台中市西區')
+    assert len(CountingWeatherService.calls) == len(CITIES)
+    assert service.get_cache_info()['api_calls'] == len(CITIES)
+
+
+if __name__ == "__main__":
+    test_single_flight_across_services()
+    test_prefetch_distinct_cities()
+    print("✓ 天氣快取測試通過")